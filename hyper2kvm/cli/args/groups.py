@@ -6,6 +6,7 @@ from __future__ import annotations
 import argparse
 import os
 
+from ...converters.qemu.profiles import PROFILE_CHOICES
 from ...fixers.filesystem.fstab import FstabMode
 
 
@@ -73,9 +74,29 @@ def _add_flatten_convert(p: argparse.ArgumentParser) -> None:
         default=None,
         help="Convert final working image to this path (relative to output-dir if not absolute).",
     )
+    p.add_argument(
+        "--overlay-pipeline",
+        dest="overlay_pipeline",
+        action="store_true",
+        help="With --to-output: fix a thin qcow2 overlay over the read-only source, then convert once (no flattened working copy).",
+    )
     p.add_argument("--out-format", dest="out_format", default="qcow2", choices=["qcow2", "raw", "vdi"], help="Output format.")
     p.add_argument("--compress", action="store_true", help="Compression (qcow2 only).")
     p.add_argument("--compress-level", dest="compress_level", type=int, choices=range(1, 10), default=None, help="Compression level 1-9.")
+    p.add_argument(
+        "--compress-threads",
+        dest="compress_threads",
+        type=int,
+        default=None,
+        help="Workers for compressed qcow2 output (default: all CPUs, 2 with the low-memory profile; 1 = qemu-img -c, single-threaded).",
+    )
+    p.add_argument(
+        "--convert-profile",
+        dest="convert_profile",
+        default="auto",
+        choices=list(PROFILE_CHOICES),
+        help="qemu-img convert performance profile (auto picks from source/target filesystems and allocation).",
+    )
     p.add_argument("--checksum", action="store_true", help="Compute SHA256 checksum of output.")
 
 
@@ -116,6 +137,25 @@ def _add_fixing_behavior(p: argparse.ArgumentParser) -> None:
         ),
     )
 
+    p.add_argument(
+        "--vm-fix",
+        dest="vm_fix",
+        action="store_true",
+        help=(
+            "Treat all disks as one VM: attach them to a single libguestfs appliance and fix the guest once "
+            "(root, /var or LVM spanning disks), then convert the disks in parallel. Not combinable with --resize."
+        ),
+    )
+    p.add_argument(
+        "--no-guest-vfs-cache",
+        dest="no_guest_vfs_cache",
+        action="store_true",
+        help=(
+            "Do not prefetch the guest's /etc and /boot config into memory during offline fixing; "
+            "issue every file operation to libguestfs directly."
+        ),
+    )
+
     p.add_argument("--resize", default=None, help="Resize root filesystem (enlarge only, e.g., +10G or 50G)")
     p.add_argument("--report", default=None, help="Write Markdown report (relative to output-dir if not absolute).")
     p.add_argument("--virtio-drivers-dir", dest="virtio_drivers_dir", default=None, help="Path to virtio-win drivers directory for Windows injection.")
@@ -310,6 +350,19 @@ def _add_daemon_flags(p: argparse.ArgumentParser) -> None:
     # Daemon flags
     p.add_argument("--daemon", action="store_true", help="Run in daemon mode (for systemd service).")
     p.add_argument("--watch-dir", dest="watch_dir", default=None, help="Directory to watch for new VMDK files in daemon mode.")
+    p.add_argument(
+        "--guestfs-appliance-dir",
+        dest="guestfs_appliance_dir",
+        default=None,
+        help="Daemon mode: where to build/reuse the fixed libguestfs appliance (default: <output-dir>/.daemon/appliance).",
+    )
+    p.add_argument(
+        "--no-prebuild-appliance",
+        dest="prebuild_appliance",
+        action="store_false",
+        help="Daemon mode: do not build a fixed libguestfs appliance at startup (supermin builds it per launch).",
+    )
+    p.set_defaults(prebuild_appliance=True)
 
 
 def _add_ovf_ova_knobs(p: argparse.ArgumentParser) -> None:
@@ -332,6 +385,12 @@ def _add_ovf_ova_knobs(p: argparse.ArgumentParser) -> None:
         default=None,
         help="Output directory for qcow2 images created from OVA/OVF disks (default: <output-dir>/qcow2).",
     )
+    p.add_argument(
+        "--ova-zero-copy",
+        dest="ova_zero_copy",
+        action="store_true",
+        help="With qcow2 conversion of an uncompressed OVA: convert disks straight from their offsets in the archive (no extracted copy).",
+    )
     p.add_argument("--ova-convert-compress", dest="ova_convert_compress", action="store_true", help="When converting OVA/OVF disks to qcow2, enable compression.")
     p.add_argument(
         "--ova-convert-compress-level",
@@ -387,7 +446,11 @@ def _add_ssh_fetch_knobs(p: argparse.ArgumentParser) -> None:
     p.add_argument("--port", type=int, default=22, help="SSH port (fetch-and-fix/live-fix)")
     p.add_argument("--identity", default=None, help="SSH identity key path (fetch-and-fix/live-fix)")
     p.add_argument("--ssh-opt", action="append", default=None, help="Extra ssh/scp options (repeatable).")
+    p.add_argument("--no-ssh-mux", dest="no_ssh_mux", action="store_true", help="Do not share one SSH ControlMaster connection per host (new handshake for every remote command).")
     p.add_argument("--remote", default=None, help="Remote path to VMDK descriptor (fetch-and-fix)")
+    p.add_argument("--ssh-streams", dest="ssh_streams", type=int, default=4, help="fetch-and-fix: parallel ranged dd readers per large extent (1 = single cat stream). Default: 4.")
+    p.add_argument("--ssh-range-mib", dest="ssh_range_mib", type=int, default=64, help="fetch-and-fix: range size per dd reader in MiB (default: 64).")
+    p.add_argument("--ssh-compress", dest="ssh_compress", choices=["none", "auto", "gzip", "lz4", "zstd"], default="none", help="fetch-and-fix: compress extents on the wire (needs the codec on both ends; auto = zstd > lz4 > gzip). Default: none.")
     p.add_argument("--fetch-dir", dest="fetch_dir", default=None, help="Where to store fetched files (default: <output-dir>/downloaded)")
     p.add_argument("--fetch-all", dest="fetch_all", action="store_true", help="Fetch full snapshot descriptor chain recursively.")
     p.add_argument("--sudo", action="store_true", help="Run remote commands through sudo -n (live-fix)")
@@ -543,6 +606,17 @@ def _add_vsphere_v2v_and_download_knobs(p: argparse.ArgumentParser) -> None:
     p.add_argument("--vddk-thumbprint", dest="vs_vddk_thumbprint2", default=None, help="EXPERIMENTAL: VDDK raw download: ESXi/vCenter thumbprint (SHA1 AA:BB:..).")
     p.add_argument("--no-verify", dest="vs_no_verify2", action="store_true", help="EXPERIMENTAL: VDDK raw download: disable TLS verification (insecure).")
     p.add_argument("--vddk-transports", dest="vs_vddk_transports2", default=None, help="EXPERIMENTAL: VDDK raw download: transport modes string (e.g. 'nbdssl:nbd').")
+    p.add_argument("--vddk-allocated-only", dest="vs_vddk_allocated_only", action="store_true", help="EXPERIMENTAL: VDDK raw download: read only allocated extents (QueryAllocatedBlocks) and keep the local file sparse.")
+    p.add_argument("--vddk-no-skip-zeros", dest="vs_vddk_skip_zero_blocks", action="store_false", help="EXPERIMENTAL: VDDK raw download: write all-zero blocks densely instead of leaving holes.")
+    p.set_defaults(vs_vddk_skip_zero_blocks=True)
+    p.add_argument("--vddk-punch-holes", dest="vs_vddk_punch_holes", action="store_true", help="EXPERIMENTAL: VDDK raw download: on resume, punch holes over zero blocks already in the partial file.")
+    p.add_argument("--vddk-connections", dest="vs_vddk_connections", type=int, default=1, help="EXPERIMENTAL: VDDK raw download: split each disk across N parallel VDDK sessions (worker processes). Default: 1.")
+    p.add_argument("--auto-read-size", dest="vs_auto_read_size", action="store_true", help="VDDK raw download and HTTPS /folder downloads: tune the read/request size online from measured throughput (starts at the configured size).")
+    p.add_argument("--read-size-min-kib", dest="vs_read_size_min_kib", type=int, default=256, help="Lower bound for --auto-read-size in KiB (default: 256).")
+    p.add_argument("--read-size-max-kib", dest="vs_read_size_max_kib", type=int, default=65536, help="Upper bound for --auto-read-size in KiB (default: 65536 = 64 MiB).")
+    p.add_argument("--http-segments", dest="vs_http_segments", type=int, default=1, help="HTTPS /folder download: fetch one file as N concurrent Range requests (resumable per segment). Default: 1 (single stream).")
+    p.add_argument("--http-segment-size-mib", dest="vs_http_segment_size_mib", type=int, default=256, help="Segment size for --http-segments in MiB (default: 256).")
+    p.add_argument("--vddk-io-buffers", dest="vs_vddk_io_buffers", type=int, default=4, help="EXPERIMENTAL: VDDK raw download: read-buffer ring size; >1 overlaps VDDK reads with local writes/hashing, 1 = serial. Default: 4.")
 
     # vSphere action-scoped params (now global)
     p.add_argument("--json", dest="json", action="store_true", help="Output in JSON format (where supported).")
@@ -564,7 +638,10 @@ def _add_vsphere_v2v_and_download_knobs(p: argparse.ArgumentParser) -> None:
     p.add_argument("--device_key", dest="device_key", type=int, default=None, help="Device key (query_changed_disk_areas)")
     p.add_argument("--disk", dest="disk", default=None, help="Disk index/label (query_changed_disk_areas/download_vm_disk/cbt_sync/vddk_download_disk)")
     p.add_argument("--start_offset", dest="start_offset", type=int, default=0, help="Start offset (query_changed_disk_areas)")
-    p.add_argument("--change_id", dest="change_id", default="*", help="Change ID (query_changed_disk_areas/cbt_sync)")
+    p.add_argument("--change_id", dest="change_id", default="*", help="Change ID (query_changed_disk_areas/cbt_sync; cbt_sync defaults to the changeId recorded in <local_path>.cbt.json)")
+    p.add_argument("--cbt_transport", dest="cbt_transport", default="auto", choices=["auto", "vddk", "https"], help="cbt_sync: read changed extents via VDDK or HTTPS Range requests (auto: VDDK when --vddk-libdir is set)")
+    p.add_argument("--cbt_format", dest="cbt_format", default=None, choices=["raw", "qcow2"], help="cbt_sync: local base image format (default: qcow2 for *.qcow2, else raw)")
+    p.add_argument("--keep_snapshot", dest="keep_snapshot", action="store_true", help="cbt_sync: keep the sync snapshot instead of removing it after the pass")
 
     p.add_argument("--vs_output_dir", dest="vs_output_dir", default=None, help="Local output dir override for download_only_vm (defaults to --output-dir)")
 
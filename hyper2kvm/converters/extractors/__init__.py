@@ -8,6 +8,8 @@ This package provides extractors for converting VM disk images to raw format:
 - ovf: OVF/OVA package extraction and conversion
 - raw: Raw disk image handling
 - vhd: VHD/VHDX (Hyper-V) disk extraction
+- tar_index: shared tar member index and parallel member extraction
+- decompress: external multi-threaded decompressors for compressed tarballs
 """
 
 from .ami import AMI
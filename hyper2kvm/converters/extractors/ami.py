@@ -26,6 +26,7 @@ from rich.progress import (
 )
 
 from ...core.utils import U
+from .tar_index import TarReader, copy_member, is_tar
 
 
 @dataclass
@@ -150,7 +151,7 @@ class AMI:
     ) -> List[Path]:
         """
         Accepts:
-          - tar/tar.gz/tgz/tar.xz/ova containing disk payload(s)
+          - tar/tar.gz/tgz/tar.xz/tar.bz2/tar.zst/ova containing disk payload(s)
 
         Returns:
           - extracted disk paths (if no conversion), OR
@@ -166,10 +167,7 @@ class AMI:
             U.die(logger, f"Source is not a file: {src}", AMI.EX_NOT_FOUND)
 
         # Try tar open; allow "unknown extension" as long as tar can open it.
-        try:
-            with tarfile.open(src, mode="r:*"):
-                pass
-        except Exception:
+        if not is_tar(src):
             U.die(logger, f"Unsupported source type (expected tarball): {src}", AMI.EX_UNSUPPORTED)
 
         return AMI._extract_and_find_disks(
@@ -351,11 +349,12 @@ class AMI:
           - optional safety limits
           - enforces max_single_file_bytes while copying (not just TarInfo.size)
           - uses tar.extractfile() + manual writes (regular files)
+          - uncompressed tarballs: regular files extracted in parallel (tar_index)
         """
         outdir = Path(outdir).resolve()
 
-        with tarfile.open(tar_path, mode="r:*") as tar:
-            members = tar.getmembers()
+        with TarReader(tar_path) as reader:
+            members = reader.members
 
             if max_members is not None and len(members) > max_members:
                 raise RuntimeError(f"Too many tar members: {len(members)} > max_members={max_members}")
@@ -373,6 +372,8 @@ class AMI:
                 raise RuntimeError(f"Tar total bytes too large: {total_bytes} > max_total_bytes={max_total_bytes}")
 
             manifest.notes.append(f"Tar stats: members={len(members)}, declared_total_bytes={total_bytes}")
+            if reader.decompressor:
+                manifest.notes.append(f"Decompressed with {reader.decompressor}")
 
             with Progress(
                 TextColumn("{task.description}"),
@@ -385,23 +386,28 @@ class AMI:
             ) as progress:
                 task = progress.add_task("Extracting tarball", total=total_bytes or max(len(members), 1))
 
-                for member in members:
-                    ok, info = AMI._safe_extract_one(
+                def advance(member: tarfile.TarInfo, _res: Tuple[bool, Dict[str, Any]]) -> None:
+                    n = int(getattr(member, "size", 0) or 0) if member.isreg() else 0
+                    progress.update(task, advance=n if total_bytes else 1)
+
+                results = reader.extract(
+                    members,
+                    lambda tar, member: AMI._safe_extract_one(
                         tar,
                         member,
                         outdir,
                         skip_special=skip_special,
                         max_single_file_bytes=max_single_file_bytes,
-                    )
-                    if ok:
-                        manifest.extracted_members.append(info)
-                    else:
-                        manifest.skipped_members.append(info)
+                    ),
+                    on_result=advance,
+                )
 
-                    advance = 0
-                    if member.isreg():
-                        advance = int(getattr(member, "size", 0) or 0)
-                    progress.update(task, advance=advance if total_bytes else 1)
+        # manifest keeps archive order regardless of completion order
+        for ok, info in results:
+            if ok:
+                manifest.extracted_members.append(info)
+            else:
+                manifest.skipped_members.append(info)
 
     @staticmethod
     def _extract_one_level_nested_tars(
@@ -437,10 +443,7 @@ class AMI:
         U.banner(logger, "Extract nested tarball(s)")
 
         for t in candidates:
-            try:
-                with tarfile.open(t, mode="r:*"):
-                    pass
-            except Exception:
+            if not is_tar(t):
                 continue
 
             nested_out = t.parent / f"{t.stem}.extracted"
@@ -772,6 +775,8 @@ class AMI:
             or s.endswith(".txz")
             or s.endswith(".tar.bz2")
             or s.endswith(".tbz2")
+            or s.endswith(".tar.zst")
+            or s.endswith(".tzst")
         )
 
     @staticmethod
@@ -854,23 +859,18 @@ class AMI:
         return open(path, "wb")
 
     @staticmethod
-    def _copy_limited(src_f: Any, dst_f: Any, *, limit_bytes: Optional[int]) -> int:
+    def _copy_limited(tar: Any, member: tarfile.TarInfo, dst_f: Any, *, limit_bytes: Optional[int]) -> int:
         """
-        Copy bytes from src to dst, enforcing a hard byte limit if provided.
+        Copy a member's payload to dst (sparsely), enforcing a hard byte limit if provided.
 
         Returns bytes written.
         """
-        buf = 1024 * 1024
-        written = 0
-        while True:
-            chunk = src_f.read(buf)
-            if not chunk:
-                break
-            written += len(chunk)
+
+        def check(written: int) -> None:
             if limit_bytes is not None and written > limit_bytes:
                 raise RuntimeError(f"Tar member exceeded max_single_file_bytes while extracting: {written} > {limit_bytes}")
-            dst_f.write(chunk)
-        return written
+
+        return copy_member(tar, member, dst_f, on_chunk=check)
 
     @staticmethod
     def _safe_extract_one(
@@ -965,25 +965,18 @@ class AMI:
             info["reason"] = msg
             raise RuntimeError(msg)
 
-        f = tar.extractfile(member)
-        if f is None:
-            msg = f"Failed reading tar member: {raw_name}"
-            info["reason"] = msg
-            raise RuntimeError(msg)
-
-        with f:
+        try:
+            with AMI._open_no_follow_for_write(target_path) as out_f:
+                written = AMI._copy_limited(tar, member, out_f, limit_bytes=max_single_file_bytes)
+                info["written_bytes"] = written
+        except RuntimeError:
+            # remove partial file
             try:
-                with AMI._open_no_follow_for_write(target_path) as out_f:
-                    written = AMI._copy_limited(f, out_f, limit_bytes=max_single_file_bytes)
-                    info["written_bytes"] = written
-            except RuntimeError:
-                # remove partial file
-                try:
-                    if target_path.exists():
-                        target_path.unlink()
-                except Exception:
-                    pass
-                raise
+                if target_path.exists():
+                    target_path.unlink()
+            except Exception:
+                pass
+            raise
 
         try:
             # Mask permissions to prevent world-writable files from archives
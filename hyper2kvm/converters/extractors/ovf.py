@@ -7,7 +7,7 @@ import os
 import tarfile
 import tempfile
 from pathlib import Path, PurePosixPath
-from typing import List, Optional, Dict, Any, Tuple
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, Tuple
 import xml.etree.ElementTree as ET
 
 from rich.progress import (
@@ -21,6 +21,10 @@ from rich.progress import (
 )
 
 from ...core.utils import U
+from .tar_index import TarReader, copy_member
+
+if TYPE_CHECKING:
+    from ..qemu.archive_source import ArchiveMember
 
 
 class OVF:
@@ -35,6 +39,7 @@ class OVF:
         convert_outdir: Optional[Path] = None,
         convert_compress: bool = False,
         convert_compress_level: Optional[int] = None,
+        zero_copy: bool = False,
         # --- Enhancement: optional host-side debug logging ---
         log_virt_filesystems: bool = False,
         # --- Safety rails (optional; defaults keep behavior permissive) ---
@@ -50,6 +55,8 @@ class OVF:
         Enhancements (non-breaking):
           - Optional conversion to QCOW2 immediately after extraction (convert_to_qcow2=True)
           - Optional "virt-filesystems -a ..." logging for each disk
+          - zero_copy=True (with convert_to_qcow2): disks of an uncompressed OVA are
+            converted straight from their tar offsets; only the other members are extracted
 
         Safety improvements:
           - Strong safe extraction (no tar.extract for files; blocks traversal; skips links/devices by default)
@@ -76,10 +83,17 @@ class OVF:
         skipped_special_count = 0
         skipped_other = 0
         blocked = 0
-        regular_file_count = 0
 
-        with tarfile.open(ova, mode="r:*") as tar:
-            members = tar.getmembers()
+        direct: Dict[Path, "ArchiveMember"] = {}
+        if zero_copy:
+            if convert_to_qcow2:
+                direct = OVF._zero_copy_members(logger, ova, outdir, max_member_bytes=max_member_bytes)
+            else:
+                logger.warning("OVA zero-copy needs qcow2 conversion (disks are read in place); extracting instead")
+        direct_names = {m.name for m in direct.values()}
+
+        with TarReader(ova) as reader:
+            members = reader.members
 
             if max_members is not None and len(members) > max_members:
                 U.die(
@@ -88,9 +102,12 @@ class OVF:
                     1,
                 )
 
+            # disks converted in place from the OVA are not extracted
+            todo = [m for m in members if not (m.isreg() and m.name in direct_names)]
+
             # Total bytes for progress (regular files only; directories/specials don't count)
             total_bytes = 0
-            for m in members:
+            for m in todo:
                 try:
                     if m.isreg():
                         total_bytes += int(getattr(m, "size", 0) or 0)
@@ -104,6 +121,28 @@ class OVF:
                     1,
                 )
 
+            # File-count DoS guard (regular files only)
+            regular_file_count = sum(1 for m in todo if m.isreg())
+            if max_files is not None and regular_file_count > max_files:
+                U.die(
+                    logger,
+                    f"OVA exceeds max_files={max_files} (regular files seen: {regular_file_count})",
+                    1,
+                )
+
+            def extract_one(tar: Any, member: tarfile.TarInfo) -> Tuple[int, str]:
+                try:
+                    return OVF._safe_extract_one(
+                        tar,
+                        member,
+                        outdir,
+                        skip_special=skip_special,
+                        max_member_bytes=max_member_bytes,
+                    )
+                except Exception as e:
+                    logger.error(f"Blocked/failed extracting tar member {member.name!r}: {e}")
+                    return 0, "blocked"
+
             with Progress(
                 TextColumn("{task.description}"),
                 BarColumn(),
@@ -113,41 +152,24 @@ class OVF:
                 TimeElapsedColumn(),
                 TimeRemainingColumn(),
             ) as progress:
-                task = progress.add_task("Extracting OVA", total=total_bytes or len(members))
-
-                for member in members:
-                    wrote = 0  # IMPORTANT: avoid UnboundLocalError when exceptions happen
-
-                    # File-count DoS guard (regular files only)
-                    if member.isreg():
-                        regular_file_count += 1
-                        if max_files is not None and regular_file_count > max_files:
-                            U.die(
-                                logger,
-                                f"OVA exceeds max_files={max_files} (regular files seen: {regular_file_count})",
-                                1,
-                            )
-
-                    try:
-                        wrote, status = OVF._safe_extract_one(
-                            tar,
-                            member,
-                            outdir,
-                            skip_special=skip_special,
-                            max_member_bytes=max_member_bytes,
-                        )
-                        if status == "extracted":
-                            extracted_files += 1
-                        elif status == "skipped_special":
-                            skipped_special_count += 1
-                        elif status == "skipped_other":
-                            skipped_other += 1
-                    except Exception as e:
-                        blocked += 1
-                        logger.error(f"Blocked/failed extracting tar member {member.name!r}: {e}")
-
-                    # Advance by bytes written if we can, otherwise by 1 if total unknown
-                    progress.update(task, advance=wrote if total_bytes else 1)
+                task = progress.add_task("Extracting OVA", total=total_bytes or len(todo))
+
+                # Advance by bytes written if we can, otherwise by 1 if total unknown
+                results = reader.extract(
+                    todo,
+                    extract_one,
+                    on_result=lambda _m, res: progress.update(task, advance=res[0] if total_bytes else 1),
+                )
+
+        for _wrote, status in results:
+            if status == "extracted":
+                extracted_files += 1
+            elif status == "skipped_special":
+                skipped_special_count += 1
+            elif status == "skipped_other":
+                skipped_other += 1
+            elif status == "blocked":
+                blocked += 1
 
         if skipped_special_count:
             logger.warning(
@@ -181,12 +203,12 @@ class OVF:
                 seen.add(d)
 
         # Validate existence and warn (don’t hard-fail; OVFs can reference missing disks in broken exports)
-        missing = [d for d in uniq if not d.exists()]
+        missing = [d for d in uniq if d not in direct and not d.exists()]
         if missing:
             logger.warning("Some OVF-referenced disks were not found after extraction:")
             for m in missing:
                 logger.warning(f" - {m}")
-            uniq = [d for d in uniq if d.exists()]
+            uniq = [d for d in uniq if d in direct or d.exists()]
             if not uniq:
                 U.die(logger, "OVF referenced disks but none were found on disk after extraction.", 1)
 
@@ -201,6 +223,7 @@ class OVF:
                 compress=convert_compress,
                 compress_level=convert_compress_level,
                 log_virt_filesystems=log_virt_filesystems,
+                sources=direct,
             )
 
         return uniq
@@ -301,10 +324,14 @@ class OVF:
         compress: bool = False,
         compress_level: Optional[int] = None,
         log_virt_filesystems: bool = False,
+        sources: Optional[Dict[Path, "ArchiveMember"]] = None,
     ) -> List[Path]:
         """
         Convert extracted disks to qcow2 outputs. Keeps order and de-dups.
         Uses the project Convert wrapper if available.
+
+        sources maps a disk path to an ArchiveMember to convert from instead
+        (zero-copy OVA); such disks need not exist on disk.
         """
         try:
             from ..qemu.converter import Convert  # type: ignore
@@ -317,11 +344,12 @@ class OVF:
 
         outputs: List[Path] = []
         for idx, disk in enumerate(disks, 1):
-            if not disk.exists():
+            member = (sources or {}).get(disk)
+            if member is None and not disk.exists():
                 logger.warning(f"Skipping missing disk: {disk}")
                 continue
 
-            if log_virt_filesystems:
+            if log_virt_filesystems and member is None:
                 OVF._log_virt_filesystems(logger, disk)
 
             # Name outputs deterministically
@@ -345,10 +373,15 @@ class OVF:
                 f"Converting [{idx}/{len(disks)}]: {disk} -> {out} "
                 f"(compress={compress}, level={compress_level})"
             )
+            if member is not None:
+                logger.info(
+                    f"Zero-copy: reading {member.name} in place ({member.fmt}, "
+                    f"{U.human_bytes(member.size)} at offset {member.offset} of {member.archive.name})"
+                )
 
             Convert.convert_image_with_progress(
                 logger,
-                disk,
+                member if member is not None else disk,
                 out,
                 out_format="qcow2",
                 compress=compress,
@@ -375,6 +408,59 @@ class OVF:
             logger.info(f" - {p}")
         return uniq
 
+    @staticmethod
+    def _zero_copy_members(
+        logger: logging.Logger,
+        ova: Path,
+        outdir: Path,
+        *,
+        max_member_bytes: Optional[int] = None,
+    ) -> Dict[Path, "ArchiveMember"]:
+        """
+        Map OVF-referenced disk paths (under outdir) to their byte ranges inside the OVA.
+
+        Only the .ovf descriptor(s) are extracted here. Compressed OVAs yield {};
+        sparse tar members, VMDK text descriptors and members of unrecognised
+        format are left out and get extracted as usual.
+        """
+        from ..qemu.archive_source import ArchiveMember, sniff_image_format
+
+        with TarReader(ova) as reader:
+            if not reader.parallel:
+                logger.warning("OVA is compressed; zero-copy needs a plain tar, extracting instead")
+                return {}
+            members = reader.members
+            reader.extract(
+                [m for m in members if m.isreg() and m.name.lower().endswith(".ovf")],
+                lambda tar, m: OVF._safe_extract_one(tar, m, outdir, max_member_bytes=max_member_bytes),
+            )
+
+        by_target: Dict[Path, tarfile.TarInfo] = {}
+        for m in members:
+            if not m.isreg():
+                continue
+            try:
+                by_target[OVF._safe_out_path(outdir, m.name)] = m
+            except ValueError:
+                continue
+
+        direct: Dict[Path, ArchiveMember] = {}
+        for ovf in sorted(outdir.glob("*.ovf")):
+            for disk in OVF.extract_ovf(logger, ovf, outdir):
+                m = by_target.get(disk)
+                if m is None or m.issparse() or disk in direct:
+                    continue
+                fmt = sniff_image_format(ova, m.offset_data, m.name)
+                if fmt is None:
+                    logger.info(f"Zero-copy: {m.name} is not a known self-contained image; extracting it")
+                    continue
+                direct[disk] = ArchiveMember(ova, m.offset_data, m.size, fmt=fmt, name=m.name)
+
+        if direct:
+            saved = sum(m.size for m in direct.values())
+            logger.info(f"Zero-copy: {len(direct)} disk(s) read in place, {U.human_bytes(saved)} not extracted")
+        return direct
+
     @staticmethod
     def _log_virt_filesystems(logger: logging.Logger, image: Path) -> Dict[str, Any]:
         """
@@ -521,10 +607,6 @@ class OVF:
         target = OVF._safe_out_path(outdir, member.name)
         target.parent.mkdir(parents=True, exist_ok=True)
 
-        src = tar.extractfile(member)
-        if src is None:
-            return (0, "skipped_other")
-
         wrote = 0
         tmp_path: Optional[Path] = None
         try:
@@ -536,12 +618,7 @@ class OVF:
                 delete=False,
             ) as tf:
                 tmp_path = Path(tf.name)
-                while True:
-                    chunk = src.read(1024 * 1024)
-                    if not chunk:
-                        break
-                    tf.write(chunk)
-                    wrote += len(chunk)
+                wrote = copy_member(tar, member, tf)
 
             os.replace(str(tmp_path), str(target))
 
@@ -23,6 +23,7 @@ from rich.progress import (
 )
 
 from ...core.utils import U
+from .tar_index import TarReader, bytes_before, copy_member
 
 _ALLOWED_MANIFEST_EXTS = {".txt", ".json", ".yaml", ".yml"}
 _ALLOWED_RAW_EXTS = {".raw", ".img"}
@@ -233,13 +234,15 @@ def safe_extract_one(
             )
             return ExtractResult(0, None, origin_key, "skipped_manifest_too_large")
 
-    f = tar.extractfile(member)
-    if f is None:
-        raise RuntimeError(f"Failed to read tar member payload: {raw_name!r}")
-
-    extracted = 0
     bb = bytes_budget if bytes_budget is not None else policy.max_total_bytes
 
+    def check_budget(extracted: int) -> None:
+        if bb is not None and (written_total + extracted) > bb:
+            raise RuntimeError(
+                f"Extraction exceeded max_total_bytes={bb} while writing {raw_name!r} "
+                f"(written_total={written_total}, this_file={extracted})"
+            )
+
     # Write to temp + atomic replace to avoid deleting/truncating preexisting files on failure
     tmp_path = _atomic_tmp(final_path)
     fd: Optional[int] = None
@@ -249,32 +252,15 @@ def safe_extract_one(
             tmp_path.unlink(missing_ok=True)  # type: ignore[attr-defined]
         fd = _open_for_write_nofollow(tmp_path, overwrite=False)
 
-        with f:
-            with os.fdopen(fd, "wb") as out_f:
-                fd = None
-                while True:
-                    chunk = f.read(1024 * 1024)
-                    if not chunk:
-                        break
-                    out_f.write(chunk)
-                    extracted += len(chunk)
-
-                    if bb is not None and (written_total + extracted) > bb:
-                        try:
-                            out_f.flush()
-                            os.fsync(out_f.fileno())
-                        except Exception:
-                            pass
-                        raise RuntimeError(
-                            f"Extraction exceeded max_total_bytes={bb} while writing {raw_name!r} "
-                            f"(written_total={written_total}, this_file={extracted})"
-                        )
-
-                try:
-                    out_f.flush()
-                    os.fsync(out_f.fileno())
-                except Exception:
-                    pass
+        with os.fdopen(fd, "wb") as out_f:
+            fd = None
+            # zero runs / sparse-member holes stay holes in the output
+            extracted = copy_member(tar, member, out_f, on_chunk=check_budget)
+
+            try:
+                os.fsync(out_f.fileno())
+            except Exception:
+                pass
 
         # Preserve mode/mtime on tmp, then atomic replace
         if policy.preserve_permissions:
@@ -435,6 +421,12 @@ class RAW:
             base = PurePosixPath(nm).name.lower()
             return Path(base).suffix in _ALLOWED_MANIFEST_EXTS
 
+        def is_written(m: tarfile.TarInfo) -> bool:
+            # safe_extract_one skips oversized manifests; they must not count against the budget
+            if policy.max_manifest_bytes is None or not is_manifest_name(m.name or ""):
+                return True
+            return int(m.size or 0) <= policy.max_manifest_bytes
+
         def should_extract_name(name: str) -> bool:
             if extract_all:
                 return True
@@ -449,14 +441,16 @@ class RAW:
                 return True
             return False
 
-        # Pass 1: plan (streaming)
+        # Pass 1: plan (member index; cached, so pass 2 does not re-read headers)
         planned_files = 0
         planned_dirs = 0
         planned_regular_bytes = 0
         total_seen = 0
 
-        with tarfile.open(tar_path, "r:*") as tar:
-            for m in tar:
+        with TarReader(tar_path) as reader:
+            if reader.decompressor:
+                logger.info(f"Decompressing through {reader.decompressor}")
+            for m in reader.members:
                 total_seen += 1
                 if max_members is not None and total_seen > max_members:
                     U.die(logger, f"Tarball has too many members (> max_members={max_members})", 1)
@@ -467,7 +461,7 @@ class RAW:
                     planned_dirs += 1
                     continue
                 planned_files += 1
-                if m.isreg():
+                if m.isreg() and is_written(m):
                     planned_regular_bytes += int(getattr(m, "size", 0) or 0)
 
         if planned_files == 0 and planned_dirs == 0:
@@ -503,42 +497,44 @@ class RAW:
         ) as progress:
             task = progress.add_task("Extracting RAW tarball", total=task_total)
 
-            with tarfile.open(tar_path, "r:*") as tar:
-                members_seen = 0
-                for m in tar:
-                    members_seen += 1
-                    if max_members is not None and members_seen > max_members:
-                        U.die(logger, f"Tarball has too many members (> max_members={max_members})", 1)
+            with TarReader(tar_path) as reader:
+                members = reader.members
+                if max_members is not None and len(members) > max_members:
+                    U.die(logger, f"Tarball has too many members (> max_members={max_members})", 1)
 
-                    if not should_extract_name(m.name or ""):
-                        skipped_by_filter += 1
-                        continue
+                selected = [m for m in members if should_extract_name(m.name or "")]
+                skipped_by_filter = len(members) - len(selected)
+                before = bytes_before(selected, extracted=is_written)
 
-                    res = safe_extract_one(
+                results = reader.extract(
+                    selected,
+                    lambda tar, m: safe_extract_one(
                         logger,
                         tar,
                         m,
                         outdir,
                         policy=policy,
-                        written_total=written_total,
+                        written_total=before[m],
                         bytes_budget=policy.max_total_bytes,
                         is_manifest=is_manifest_name(m.name or ""),
-                    )
-                    written_total += res.extracted_bytes
+                    ),
+                    on_result=lambda _m, res: progress.update(task, advance=(res.extracted_bytes if use_bytes else 1)),
+                )
 
-                    if res.reason == "skipped_special":
-                        skipped_special += 1
-                    elif res.reason == "skipped_manifest_too_large":
-                        skipped_manifest_too_large += 1
+        for res in results:
+            written_total += res.extracted_bytes
 
-                    if res.extracted_path is not None:
-                        if res.extracted_path.suffix.lower() in _ALLOWED_RAW_EXTS:
-                            extracted_raw.append(res.extracted_path)
-                            extracted_pairs.append((res.extracted_path, res.origin_key))
-                        else:
-                            extracted_other.append(res.extracted_path)
+            if res.reason == "skipped_special":
+                skipped_special += 1
+            elif res.reason == "skipped_manifest_too_large":
+                skipped_manifest_too_large += 1
 
-                    progress.update(task, advance=(res.extracted_bytes if use_bytes else 1))
+            if res.extracted_path is not None:
+                if res.extracted_path.suffix.lower() in _ALLOWED_RAW_EXTS:
+                    extracted_raw.append(res.extracted_path)
+                    extracted_pairs.append((res.extracted_path, res.origin_key))
+                else:
+                    extracted_other.append(res.extracted_path)
 
         # Dedup preserving order
         def _dedup(ps: List[Path]) -> List[Path]:
@@ -639,4 +635,4 @@ class RAW:
     @staticmethod
     def _looks_like_tar(p: Path) -> bool:
         s = p.name.lower()
-        return s.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz"))
+        return s.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2", ".tar.zst", ".tzst"))
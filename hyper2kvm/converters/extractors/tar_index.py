@@ -0,0 +1,476 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/converters/extractors/tar_index.py
+"""
+Shared tar member index and parallel member extraction.
+
+The OVA/AMI/VHD/RAW extractors used to walk `tar.getmembers()` and copy
+members one at a time through tarfile's single stream. Each member of an
+uncompressed tar is stored contiguously, so this module:
+
+- indexes an archive once into (name, offset, size, type) entries. The
+  index is cached per (path, size, mtime), so extractors that make several
+  passes (plan, then extract; OVA zero-copy, then extract) read the headers
+  only once. The cache keeps the few most recently used archives, so a long
+  batch run does not hold every archive's member list;
+- hands each extractor's own safe_extract_one a tar-like view whose
+  extractfile() reads the payload with os.pread from a shared fd. Regular
+  members are then extracted in parallel. The path-safety rules stay where
+  they were, in the per-extractor code;
+- reads compressed archives through an external multi-threaded
+  decompressor (see decompress.py) in tarfile stream mode, one pass for the
+  member list and one for extraction; the listing is cached the same way.
+  Without such a tool it falls back to tarfile's own "r:*" decompression;
+- extracts serially for sparse members and for archives with duplicate
+  member names (where extraction order decides the result);
+- copies member payloads with copy_member(), which keeps output files
+  sparse: GNU/PAX sparse members write only their mapped data regions, and
+  all-zero blocks of other members are skipped instead of written.
+"""
+
+from __future__ import annotations
+
+import copy
+import os
+import tarfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from ...core.sparse import pwrite_data
+from .decompress import DecompressPipe, decompressor_command, detect_compression, open_decompressor
+
+T = TypeVar("T")
+
+_DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+_CACHE_ENTRIES = 4
+
+_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, int, int], TarIndex]" = OrderedDict()
+_stream_cache: "OrderedDict[Tuple[str, int, int], List[tarfile.TarInfo]]" = OrderedDict()
+
+
+def member_type(m: tarfile.TarInfo) -> str:
+    if m.isdir():
+        return "dir"
+    if m.isreg():
+        return "file"
+    if m.issym():
+        return "symlink"
+    if m.islnk():
+        return "hardlink"
+    if m.ischr():
+        return "chardev"
+    if m.isblk():
+        return "blockdev"
+    if m.isfifo():
+        return "fifo"
+    return "other"
+
+
+@dataclass(frozen=True)
+class TarEntry:
+    name: str
+    offset: int  # payload offset in the archive
+    size: int
+    type: str
+    sparse: bool = False
+
+
+class TarIndex:
+    """Members of an uncompressed tar and where their payloads live."""
+
+    def __init__(self, path: Path, members: List[tarfile.TarInfo]) -> None:
+        self.path = Path(path)
+        self.members = members
+        self.entries = [
+            TarEntry(m.name, int(m.offset_data), int(m.size or 0), member_type(m), bool(m.issparse()))
+            for m in members
+        ]
+
+    def entry(self, name: str) -> Optional[TarEntry]:
+        for e in self.entries:
+            if e.name == name:
+                return e
+        return None
+
+
+def _cache_get(cache: "OrderedDict[Tuple[str, int, int], Any]", key: Tuple[str, int, int]) -> Any:
+    with _lock:
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+        return hit
+
+
+def _cache_put(cache: "OrderedDict[Tuple[str, int, int], Any]", key: Tuple[str, int, int], value: Any) -> None:
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > _CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _cache_key(path: Path) -> Optional[Tuple[str, int, int]]:
+    try:
+        real = os.path.realpath(path)
+        st = os.stat(real)
+    except OSError:
+        return None
+    return (real, int(st.st_size), int(st.st_mtime_ns))
+
+
+def index_tar(path: Path) -> Optional[TarIndex]:
+    """Cached index of an uncompressed tar; None for compressed or unreadable archives."""
+    path = Path(path)
+    key = _cache_key(path)
+    if key is None:
+        return None
+    real = key[0]
+    hit = _cache_get(_cache, key)
+    if hit is not None:
+        return hit
+    try:
+        with tarfile.open(real, mode="r:") as tar:
+            members = tar.getmembers()
+    except (tarfile.TarError, OSError):
+        return None
+    index = TarIndex(path, members)
+    _cache_put(_cache, key, index)
+    return index
+
+
+class _PreadReader:
+    """Read-only file object over one member's payload (positionless, thread-safe fd use)."""
+
+    def __init__(self, fd: int, offset: int, size: int) -> None:
+        self._fd = fd
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        left = self._size - self._pos
+        if n is None or n < 0 or n > left:
+            n = left
+        if n <= 0:
+            return b""
+        data = os.pread(self._fd, n, self._offset + self._pos)
+        if not data:
+            raise OSError(f"archive truncated at offset {self._offset + self._pos}")
+        self._pos += len(data)
+        return data
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "_PreadReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class _PreadView:
+    """The slice of the TarFile API the extractors use, backed by pread."""
+
+    def __init__(self, fd: int) -> None:
+        self._fd = fd
+
+    def extractfile(self, member: tarfile.TarInfo) -> Optional[_PreadReader]:
+        if not member.isreg():
+            return None
+        return _PreadReader(self._fd, int(member.offset_data), int(member.size or 0))
+
+
+def bytes_before(
+    members: List[tarfile.TarInfo],
+    *,
+    extracted: Optional[Callable[[tarfile.TarInfo], bool]] = None,
+) -> Dict[tarfile.TarInfo, int]:
+    """
+    Declared bytes of the regular files preceding each member that are actually extracted.
+
+    extracted(member) says whether the extractor writes a regular member
+    (e.g. False for manifests it skips as too large); default: all of them.
+    Parallel extraction passes this as written_total, so byte budgets trip
+    at the same member as in a serial pass.
+    """
+    out: Dict[tarfile.TarInfo, int] = {}
+    acc = 0
+    for m in members:
+        out[m] = acc
+        if m.isreg() and (extracted is None or extracted(m)):
+            acc += int(m.size or 0)
+    return out
+
+
+def _stored_view(member: tarfile.TarInfo) -> Tuple[tarfile.TarInfo, List[Tuple[int, int]]]:
+    """
+    A plain-member view of a sparse member's stored data, plus its map.
+
+    The archive stores the mapped regions back to back, so reading them as
+    one regular payload needs no seeking (tarfile stream mode cannot seek).
+    """
+    regions = [(int(off), int(n)) for off, n in (member.sparse or ()) if n]
+    stored = copy.copy(member)
+    stored.type = tarfile.REGTYPE
+    stored.sparse = None
+    stored.size = sum(n for _off, n in regions)
+    return stored, regions
+
+
+def copy_member(
+    tar: Any,
+    member: tarfile.TarInfo,
+    out_f: Any,
+    *,
+    on_chunk: Optional[Callable[[int], None]] = None,
+    chunk_size: int = 1024 * 1024,
+) -> int:
+    """
+    Copy a regular member's payload into a freshly created out_f, sparsely.
+
+    Sparse members are read as their stored data regions and written at
+    their mapped offsets; other members have all-zero blocks skipped. The
+    file is then sized to the member's real size, so holes are never
+    written. on_chunk(copied) runs after each chunk with the running count
+    of logical bytes (holes included), so byte budgets trip as before.
+    Returns the member's logical size.
+    """
+    if member.issparse():
+        view, regions = _stored_view(member)
+    else:
+        view, regions = member, [(0, int(member.size or 0))]
+    src = tar.extractfile(view)
+    if src is None:
+        raise RuntimeError(f"Failed to read tar member payload: {member.name!r}")
+
+    out_f.flush()
+    fd = out_f.fileno()
+    copied = 0
+    with src:
+        for off, length in regions:
+            pos = 0
+            while pos < length:
+                chunk = src.read(min(chunk_size, length - pos))
+                if not chunk:
+                    raise RuntimeError(f"Tar member payload truncated: {member.name!r}")
+                pwrite_data(fd, chunk, off + pos)
+                pos += len(chunk)
+                # holes before this region count towards the logical total
+                copied = off + pos
+                if on_chunk is not None:
+                    on_chunk(copied)
+    total = int(member.size or 0)
+    os.ftruncate(fd, total)
+    if on_chunk is not None and copied < total:
+        on_chunk(total)
+    return total
+
+
+def _target_key(name: str) -> str:
+    parts = [p for p in PurePosixPath((name or "").replace("\\", "/")).parts if p not in ("", ".", "/")]
+    return "/".join(parts)
+
+
+def is_tar(path: Path) -> bool:
+    """True if path is a tar archive, plain or compressed, that TarReader can read."""
+    if index_tar(path) is not None:
+        return True
+    pipe = open_decompressor(Path(path))
+    if pipe is not None:
+        try:
+            with tarfile.open(fileobj=pipe.stdout, mode="r|") as tar:
+                return tar.next() is not None
+        except (tarfile.TarError, OSError):
+            return False
+        finally:
+            pipe.close(check=False)
+    try:
+        with tarfile.open(path, mode="r:*"):
+            return True
+    except (tarfile.TarError, OSError):
+        return False
+
+
+class TarReader:
+    """
+    Member list plus payload access for one archive.
+
+    Use as a context manager. extract() runs extract_one(tar_like, member)
+    for each member: in a thread pool over pread when the archive is indexed,
+    serially over the tarfile stream otherwise. Compressed archives stream
+    from an external decompressor when one is installed (`decompressor`
+    names it), and extract() then calls extract_one in archive order.
+    """
+
+    def __init__(self, path: Path, *, workers: Optional[int] = None) -> None:
+        self.path = Path(path)
+        self.workers = max(1, int(workers or _DEFAULT_WORKERS))
+        self.index = index_tar(self.path)
+        self.decompressor: Optional[str] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._fd: Optional[int] = None
+        self._cmd: Optional[List[str]] = None
+        self._listing: Optional[List[tarfile.TarInfo]] = None
+        if self.index is None:
+            self._cmd = decompressor_command(detect_compression(self.path))
+            if self._cmd is not None:
+                self.decompressor = Path(self._cmd[0]).name
+                self._listing = self._list_stream()
+            else:
+                self._tar = tarfile.open(self.path, mode="r:*")
+
+    @property
+    def parallel(self) -> bool:
+        return self.index is not None
+
+    @property
+    def members(self) -> List[tarfile.TarInfo]:
+        if self.index is not None:
+            return self.index.members
+        if self._listing is not None:
+            return self._listing
+        assert self._tar is not None
+        return self._tar.getmembers()
+
+    def _list_stream(self) -> List[tarfile.TarInfo]:
+        key = _cache_key(self.path)
+        hit = _cache_get(_stream_cache, key) if key is not None else None
+        if hit is not None:
+            return hit
+        assert self._cmd is not None
+        with DecompressPipe(self._cmd, self.path) as pipe:
+            with tarfile.open(fileobj=pipe.stdout, mode="r|") as tar:
+                members = list(tar)
+        if key is not None:
+            _cache_put(_stream_cache, key, members)
+        return members
+
+    def _extract_piped(
+        self,
+        members: List[tarfile.TarInfo],
+        extract_one: Callable[[Any, tarfile.TarInfo], T],
+        done: Callable[[int, tarfile.TarInfo, T], None],
+    ) -> None:
+        # Members are matched by header offset; extract_one gets the caller's
+        # TarInfo (same offsets as the streamed one), so per-member dicts keyed
+        # on it keep working. The decompressor is stopped after the last wanted
+        # member; the listing pass already read (and checked) the whole stream.
+        wanted: Dict[int, List[int]] = {}
+        for i, m in enumerate(members):
+            wanted.setdefault(int(m.offset), []).append(i)
+        assert self._cmd is not None
+        with DecompressPipe(self._cmd, self.path) as pipe:
+            with tarfile.open(fileobj=pipe.stdout, mode="r|") as tar:
+                for streamed in tar:
+                    for i in wanted.pop(int(streamed.offset), ()):
+                        done(i, members[i], extract_one(tar, members[i]))
+                    if not wanted:
+                        pipe.stop_early()
+                        break
+        if wanted:
+            missing = [members[i].name for idx in wanted.values() for i in idx]
+            raise tarfile.ReadError(f"{self.path}: members not found in stream: {missing[:5]}")
+
+    def _stream(self) -> tarfile.TarFile:
+        if self._tar is None:
+            self._tar = tarfile.open(self.path, mode="r:")
+        return self._tar
+
+    def extract(
+        self,
+        members: List[tarfile.TarInfo],
+        extract_one: Callable[[Any, tarfile.TarInfo], T],
+        *,
+        on_result: Optional[Callable[[tarfile.TarInfo, T], None]] = None,
+    ) -> List[T]:
+        """
+        Extract members; return extract_one's results in member order.
+
+        on_result runs in the calling thread as each member finishes.
+        Directories and special members go first, in order. An exception
+        from extract_one cancels the members not yet started and is re-raised.
+        """
+        results: Dict[int, T] = {}
+
+        def done(i: int, m: tarfile.TarInfo, r: T) -> None:
+            results[i] = r
+            if on_result is not None:
+                on_result(m, r)
+
+        if self._listing is not None:
+            self._extract_piped(members, extract_one, done)
+            return [results[i] for i in range(len(members))]
+
+        if self.index is None:
+            tar = self._stream()
+            for i, m in enumerate(members):
+                done(i, m, extract_one(tar, m))
+            return [results[i] for i in range(len(members))]
+
+        if self._fd is None:
+            self._fd = os.open(str(self.path), os.O_RDONLY)
+        view = _PreadView(self._fd)
+
+        pooled: List[int] = []
+        for i, m in enumerate(members):
+            if m.isreg() and not m.issparse():
+                pooled.append(i)
+            elif m.isreg():
+                done(i, m, extract_one(self._stream(), m))
+            else:
+                done(i, m, extract_one(view, m))
+
+        keys = [_target_key(members[i].name) for i in pooled]
+        workers = self.workers if len(set(keys)) == len(keys) else 1  # duplicates: order decides
+        if workers == 1 or len(pooled) <= 1:
+            for i in pooled:
+                done(i, members[i], extract_one(view, members[i]))
+            return [results[i] for i in range(len(members))]
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="h2k-untar") as pool:
+            futs: Dict[Future, int] = {pool.submit(extract_one, view, members[i]): i for i in pooled}
+            pending = set(futs)
+            try:
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        i = futs[fut]
+                        done(i, members[i], fut.result())
+            except BaseException:
+                for fut in pending:
+                    fut.cancel()
+                raise
+        return [results[i] for i in range(len(members))]
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def __enter__(self) -> "TarReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+__all__ = [
+    "TarEntry",
+    "TarIndex",
+    "TarReader",
+    "bytes_before",
+    "copy_member",
+    "index_tar",
+    "is_tar",
+    "member_type",
+]
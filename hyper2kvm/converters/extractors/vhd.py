@@ -20,6 +20,7 @@ from rich.progress import (
 )
 
 from ...core.utils import U
+from .tar_index import TarReader, bytes_before, copy_member, is_tar
 
 
 _ALLOWED_MANIFEST_EXTS = {".txt", ".json", ".yaml", ".yml"}
@@ -120,9 +121,7 @@ class VHD:
             )
 
         # Unknown extension: try tar open anyway; if it fails, error nicely.
-        try:
-            with tarfile.open(src, mode="r:*"):
-                pass
+        if is_tar(src):
             return VHD._extract_vhd_tar(
                 logger,
                 src,
@@ -142,9 +141,8 @@ class VHD:
                 rename_on_collision=rename_on_collision,
                 preserve_timestamps=preserve_timestamps,
             )
-        except Exception:
-            U.die(logger, f"Unsupported source type (expected .vhd/.vhdx or tarball): {src}", 1)
-            raise  # unreachable
+        U.die(logger, f"Unsupported source type (expected .vhd/.vhdx or tarball): {src}", 1)
+        raise  # unreachable
 
     @staticmethod
     def _extract_vhd_tar(
@@ -223,8 +221,8 @@ class VHD:
                     return True
             return False
 
-        with tarfile.open(vhd_tar, mode="r:*") as tar:
-            members = tar.getmembers()
+        with TarReader(vhd_tar) as reader:
+            members = reader.members
 
             if max_members is not None and len(members) > max_members:
                 U.die(logger, f"Tarball has too many members ({len(members)} > max_members={max_members})", 1)
@@ -266,6 +264,8 @@ class VHD:
                 f"Planned extraction: files={planned_files}, dirs={planned_dirs}, "
                 f"planned_regular_bytes={total_bytes}"
             )
+            if reader.decompressor:
+                logger.info(f"Decompressing through {reader.decompressor}")
 
             with Progress(
                 TextColumn("{task.description}"),
@@ -280,12 +280,12 @@ class VHD:
                 task_total = total_bytes if total_bytes > 0 else (planned_files + planned_dirs)
                 task = progress.add_task("Extracting VHD tarball", total=task_total)
 
-                for member in members:
-                    if not should_extract(member):
-                        skipped_by_filter += 1
-                        continue
+                selected = [m for m in members if should_extract(m)]
+                skipped_by_filter = len(members) - len(selected)
+                before = bytes_before(selected)
 
-                    extracted_bytes, extracted_path = VHD._safe_extract_one(
+                def extract_one(tar: Any, member: tarfile.TarInfo) -> Tuple[int, Optional[Path]]:
+                    return VHD._safe_extract_one(
                         logger,
                         tar,
                         member,
@@ -295,27 +295,29 @@ class VHD:
                         preserve_timestamps=preserve_timestamps,
                         # byte limit enforcement + overwrite policy:
                         bytes_budget=bytes_budget,
-                        written_total=written_total,
+                        written_total=before[member],
                         overwrite=overwrite,
                         rename_on_collision=rename_on_collision,
                     )
 
-                    written_total += extracted_bytes
+                results = reader.extract(
+                    selected,
+                    extract_one,
+                    on_result=lambda _m, res: progress.update(task, advance=res[0] if total_bytes > 0 else 1),
+                )
 
-                    if extracted_path is None and extracted_bytes == 0:
-                        # chosen by filter but skipped (usually special member)
-                        skipped_special += 1
+        for extracted_bytes, extracted_path in results:
+            written_total += extracted_bytes
 
-                    if extracted_path is not None:
-                        if VHD._looks_like_vhd(extracted_path):
-                            extracted_vhds.append(extracted_path)
-                        else:
-                            extracted_other.append(extracted_path)
+            if extracted_path is None and extracted_bytes == 0:
+                # chosen by filter but skipped (usually special member)
+                skipped_special += 1
 
-                    if total_bytes > 0:
-                        progress.update(task, advance=extracted_bytes)
-                    else:
-                        progress.update(task, advance=1)
+            if extracted_path is not None:
+                if VHD._looks_like_vhd(extracted_path):
+                    extracted_vhds.append(extracted_path)
+                else:
+                    extracted_other.append(extracted_path)
 
         # De-dup while preserving order
         def _dedup(paths: List[Path]) -> List[Path]:
@@ -475,7 +477,7 @@ class VHD:
     @staticmethod
     def _looks_like_tar(p: Path) -> bool:
         s = p.name.lower()
-        return s.endswith(".tar") or s.endswith(".tar.gz") or s.endswith(".tgz") or s.endswith(".tar.xz") or s.endswith(".txz")
+        return s.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz", ".txz", ".tar.bz2", ".tbz2", ".tar.zst", ".tzst"))
 
     @staticmethod
     def _normalize_tar_name(name: str) -> str:
@@ -608,31 +610,16 @@ class VHD:
                 else:
                     raise RuntimeError(f"Refusing to overwrite existing file: {final_path}")
 
-            f = tar.extractfile(member)
-            if f is None:
-                raise RuntimeError(f"Failed to read tar member payload: {member.name}")
+            def check_budget(extracted: int) -> None:
+                if bytes_budget is not None and (written_total + extracted) > bytes_budget:
+                    raise RuntimeError(
+                        f"Extraction exceeded max_total_bytes={bytes_budget} while writing {member.name} "
+                        f"(written_total={written_total}, this_file={extracted})"
+                    )
 
-            extracted = 0
             try:
-                with f:
-                    with open(final_path, "wb") as out_f:
-                        while True:
-                            chunk = f.read(1024 * 1024)
-                            if not chunk:
-                                break
-                            out_f.write(chunk)
-                            extracted += len(chunk)
-
-                            if bytes_budget is not None and (written_total + extracted) > bytes_budget:
-                                try:
-                                    out_f.flush()
-                                    os.fsync(out_f.fileno())
-                                except Exception:
-                                    pass
-                                raise RuntimeError(
-                                    f"Extraction exceeded max_total_bytes={bytes_budget} while writing {member.name} "
-                                    f"(written_total={written_total}, this_file={extracted})"
-                                )
+                with open(final_path, "wb") as out_f:
+                    extracted = copy_member(tar, member, out_f, on_chunk=check_budget)
             except Exception:
                 # Ensure partial file doesn't survive errors
                 try:
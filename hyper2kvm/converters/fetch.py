@@ -15,6 +15,8 @@ from typing import List, Optional, Tuple
 
 from ..core.utils import U
 from ..ssh.ssh_client import SSHClient
+from ..ssh.ssh_mux import default_pool
+from .ssh_ranged_fetch import SSHFetchOptions, ssh_ranged_fetch
 from ..vmware.utils.vmdk_parser import VMDK
 
 
@@ -128,7 +130,12 @@ def _build_ssh_base_args(
     ssh_opts: List[str],
     *,
     hostkey_policy: str = "accept-new",  # "yes" | "accept-new" | "no"
+    mux: bool = False,
 ) -> List[str]:
+    """
+    ssh argv prefix (ending with user@host) for the fetch helpers.
+    With mux=True, sessions go through the shared ssh_mux master for host/user/port.
+    """
     args: List[str] = ["ssh", "-p", str(port)]
     if identity:
         args += ["-i", str(identity)]
@@ -151,6 +158,8 @@ def _build_ssh_base_args(
     ]
     for opt in ssh_opts:
         args.append(str(opt))
+    if mux:
+        args += default_pool().acquire(host, user, port, args[1:])
     args.append(f"{user}@{host}")
     return args
 
@@ -179,7 +188,9 @@ async def _ssh_exists(logger: logging.Logger, ssh_base: List[str], remote_path:
 
 
 async def _ssh_size_bytes_best_effort(logger: logging.Logger, ssh_base: List[str], remote_path: str) -> Optional[int]:
-    cmd = f"wc -c < {shlex.quote(remote_path)}"
+    q = shlex.quote(remote_path)
+    # stat is O(1); busybox `wc -c` reads the whole file
+    cmd = f"stat -c %s {q} 2>/dev/null || wc -c < {q}"
     rc, out = await _run_capture(ssh_base + ["sh", "-lc", cmd])
     if rc != 0:
         logger.debug(f"Size query failed for {remote_path} rc={rc}: {out.strip()}")
@@ -300,7 +311,7 @@ async def _ssh_stream_fetch_with_progress(
 
 class Fetch:
     @staticmethod
-    async def fetch_descriptor_and_extent(
+    def fetch_descriptor_and_extent(
         logger: logging.Logger,
         sshc: SSHClient,
         remote_desc: str,
@@ -309,6 +320,33 @@ class Fetch:
         *,
         remote_sandbox_root: Optional[str] = None,
         hostkey_policy: str = "accept-new",
+        fetch_opts: Optional[SSHFetchOptions] = None,
+    ) -> Path:
+        """Synchronous entry point; see fetch_descriptor_and_extent_async."""
+        return asyncio.run(
+            Fetch.fetch_descriptor_and_extent_async(
+                logger,
+                sshc,
+                remote_desc,
+                outdir,
+                fetch_all,
+                remote_sandbox_root=remote_sandbox_root,
+                hostkey_policy=hostkey_policy,
+                fetch_opts=fetch_opts,
+            )
+        )
+
+    @staticmethod
+    async def fetch_descriptor_and_extent_async(
+        logger: logging.Logger,
+        sshc: SSHClient,
+        remote_desc: str,
+        outdir: Path,
+        fetch_all: bool,
+        *,
+        remote_sandbox_root: Optional[str] = None,
+        hostkey_policy: str = "accept-new",
+        fetch_opts: Optional[SSHFetchOptions] = None,
     ) -> Path:
         """
         Fetch a VMDK descriptor and its extent. If fetch_all=True, walk the parent chain
@@ -322,13 +360,17 @@ class Fetch:
         Optionally enforces a remote sandbox root directory: resolved parents/extents must remain
         inside that root (prevents '..' from escaping remotely).
 
+        Large extents go through the multi-stream ranged engine (ssh_ranged_fetch)
+        when fetch_opts asks for more than one stream or for compression.
+
         Returns the *local* path to the top-level descriptor.
         """
         U.banner(logger, "Fetch VMDK from remote")
         U.ensure_dir(outdir)
 
         host, user, port, identity, ssh_opts = _ssh_params_from_client(sshc)
-        ssh_base = _build_ssh_base_args(host, user, port, identity, ssh_opts, hostkey_policy=hostkey_policy)
+        mux = bool(getattr(getattr(sshc, "cfg", None), "control_master", False))
+        ssh_base = _build_ssh_base_args(host, user, port, identity, ssh_opts, hostkey_policy=hostkey_policy, mux=mux)
 
         await _ssh_check(logger, ssh_base)
 
@@ -364,6 +406,7 @@ class Fetch:
             local_desc=local_desc,
             outdir=outdir,
             sandbox_root=sandbox,
+            fetch_opts=fetch_opts,
         )
 
         if fetch_all:
@@ -416,6 +459,7 @@ class Fetch:
                     local_desc=local_parent_desc,
                     outdir=outdir,
                     sandbox_root=sandbox,
+                    fetch_opts=fetch_opts,
                 )
 
                 cur_remote_desc = remote_parent_desc
@@ -432,6 +476,7 @@ class Fetch:
         local_desc: Path,
         outdir: Path,
         sandbox_root: str,
+        fetch_opts: Optional[SSHFetchOptions] = None,
     ) -> Optional[Path]:
         """
         Parse extent path from local descriptor and fetch it.
@@ -463,5 +508,10 @@ class Fetch:
         U.ensure_dir(local_extent.parent)
 
         logger.info(f"Copying extent: {remote_extent} -> {local_extent}")
+        if fetch_opts is not None and (fetch_opts.streams > 1 or fetch_opts.compress != "none"):
+            size = await _ssh_size_bytes_best_effort(logger, ssh_base, remote_extent)
+            if size is not None and size >= fetch_opts.min_ranged_size:
+                await ssh_ranged_fetch(logger, ssh_base, remote_extent, local_extent, size, fetch_opts)
+                return local_extent
         await _ssh_stream_fetch_with_progress(logger, ssh_base, remote_extent, local_extent)
         return local_extent
@@ -28,8 +28,10 @@ from rich.progress import (
 )
 
 from hyper2kvm.ssh.ssh_client import SSHClient
+from ..core.file_ops import fast_copy
 from ..core.utils import U
 from ..vmware.utils.vmdk_parser import VMDK
+from .qemu.alloc_map import plan_allocation
 
 
 # Helpers
@@ -204,6 +206,12 @@ class Flatten:
         else:
             logger.warning("Could not detect input format; will rely on qemu-img autodetect (no -f).")
 
+        alloc = plan_allocation(logger, src, fmt=in_fmt)
+        work_bytes: Optional[int] = None
+        if alloc is not None:
+            work_bytes = alloc.predicted_write_bytes(fmt)
+            logger.info(f"Allocation: {alloc.describe()}; predicted write ~{U.human_bytes(work_bytes)}")
+
         policy = _ProgressPolicy(timeout_s=None)
         attempts = Flatten._flatten_cmd_attempts(src=src, tmp_dst=tmp_dst, fmt=fmt, in_fmt=in_fmt)
 
@@ -219,6 +227,7 @@ class Flatten:
                 virt_size=virt_size,
                 policy=policy,
                 task_label="Flattening",
+                work_bytes=work_bytes,
             )
 
             if rc == 0:
@@ -302,18 +311,7 @@ class Flatten:
         raw_tmp = _atomic_tmp(raw_dst)
         _unlink_quiet(raw_tmp)
 
-        if U.which("cp") is not None:
-            try:
-                subprocess.run(
-                    ["cp", "--reflink=auto", "--sparse=always", str(extent_r), str(raw_tmp)],
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-            except Exception:
-                Flatten._copy_with_progress(logger, extent_r, raw_tmp)
-        else:
-            Flatten._copy_with_progress(logger, extent_r, raw_tmp)
+        Flatten._copy_with_progress(logger, extent_r, raw_tmp)
 
         raw_tmp.replace(raw_dst)
 
@@ -327,6 +325,8 @@ class Flatten:
         _unlink_quiet(tmp_dst)
 
         virt_size = raw_dst.stat().st_size
+        alloc = plan_allocation(logger, raw_dst, fmt="raw")
+        work_bytes = alloc.predicted_write_bytes(fmt) if alloc is not None else None
         policy = _ProgressPolicy(timeout_s=None)
         attempts = Flatten._raw_to_fmt_cmd_attempts(raw_src=raw_dst, tmp_dst=tmp_dst, fmt=fmt)
 
@@ -342,6 +342,7 @@ class Flatten:
                 virt_size=virt_size,
                 policy=policy,
                 task_label=f"Converting raw -> {fmt}",
+                work_bytes=work_bytes,
             )
 
             if rc == 0:
@@ -371,6 +372,7 @@ class Flatten:
         virt_size: int,
         policy: _ProgressPolicy,
         task_label: str,
+        work_bytes: Optional[int] = None,
     ) -> Tuple[int, list[str]]:
         """
         Robust stderr reader:
@@ -380,6 +382,8 @@ class Flatten:
           - supports optional hard timeout
           - rate-limits debug spam (but always logs first stderr line in debug)
           - uses incremental UTF-8 decoding to avoid split multibyte artifacts
+          - size-based estimates scale by work_bytes (alloc map) when known, so
+            thin sources do not sit near 0% until qemu-img reports a percent
         """
         stderr_lines: list[str] = []
 
@@ -479,9 +483,13 @@ class Flatten:
             try:
                 if not tmp_dst.exists():
                     return None
-                out_sz = tmp_dst.stat().st_size
+                st = tmp_dst.stat()
+                out_sz = min(st.st_size, st.st_blocks * 512)
             except Exception:
                 return None
+            if work_bytes:
+                # never claim "done" from file size; qemu may still be finishing metadata
+                return min(0.99, out_sz / float(work_bytes)) * float(virt_size)
             return float(out_sz if out_sz < virt_size else virt_size)
 
         def update_best(v: float) -> None:
@@ -698,7 +706,8 @@ class Flatten:
             return 0
 
     @staticmethod
-    def _copy_with_progress(logger: logging.Logger, src: Path, dst: Path, *, chunk_mb: int = 16) -> None:
+    def _copy_with_progress(logger: logging.Logger, src: Path, dst: Path, *, chunk_mb: int = 64) -> None:
+        # reflink -> copy_file_range -> sparse extent copy; holes in a thin extent stay holes
         total = src.stat().st_size
         chunk = max(1, chunk_mb) * 1024 * 1024
 
@@ -711,13 +720,8 @@ class Flatten:
             TimeRemainingColumn(),
         ) as progress:
             task = progress.add_task(f"Copying {src.name}", total=total)
-            with open(src, "rb") as rf, open(dst, "wb") as wf:
-                while True:
-                    b = rf.read(chunk)
-                    if not b:
-                        break
-                    wf.write(b)
-                    progress.update(task, advance=len(b))
+            method = fast_copy(src, dst, chunk_size=chunk, progress=lambda n: progress.update(task, advance=n))
+        logger.info(f"Copied {src.name} ({U.human_bytes(total)}) via {method}")
 
 
 # Fetch (remote ESXi fetch helper)
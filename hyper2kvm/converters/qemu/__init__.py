@@ -5,8 +5,30 @@ QEMU-based conversion utilities.
 
 This package provides QEMU-based disk format conversion:
 - converter: QEMU-img based format conversion and optimization
+- alloc_map: qemu-img map allocation planning (progress, ETA, disk space)
+- archive_source: json: sources reading a disk in place inside an archive
+- capabilities: cached qemu-img capability probe (starting convert options)
+- profiles: named convert performance profiles (auto-selected per source/target)
+- parallel_compress: multi-core compressed qcow2 writer
 """
 
+from .alloc_map import AllocationPlan, plan_allocation
+from .archive_source import ArchiveMember
+from .capabilities import QemuImgCaps, probe_qemu_img
 from .converter import Convert
+from .parallel_compress import CompressStats, compress_to_qcow2
+from .profiles import PROFILES, ConvertProfile, select_profile
 
-__all__ = ["Convert"]
+__all__ = [
+    "AllocationPlan",
+    "ArchiveMember",
+    "CompressStats",
+    "Convert",
+    "ConvertProfile",
+    "PROFILES",
+    "QemuImgCaps",
+    "compress_to_qcow2",
+    "plan_allocation",
+    "probe_qemu_img",
+    "select_profile",
+]
@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/converters/qemu/alloc_map.py
+"""
+Allocation planning for qemu-img stages.
+
+Runs `qemu-img map --output=json` once per source image and condenses the
+extent list into data / zero / unallocated byte counts. Progress, ETA and
+disk-space estimates use the predicted number of bytes a convert will
+actually write, not the virtual size. On thin disks the two differ by an
+order of magnitude.
+
+Plans are cached per (path, size, mtime), so the sanity checker, the disk
+scheduler and the converter share one map call per source.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...core.utils import U
+
+# qcow2 default cluster size; each L2 entry (8 bytes) maps one cluster
+_QCOW2_CLUSTER = 64 * 1024
+_QCOW2_FIXED_OVERHEAD = 1024 * 1024
+
+# (path, size, mtime) -> (format the map was run with, or None for probed; plan)
+_cache: Dict[Tuple[str, int, int], Tuple[Optional[str], "AllocationPlan"]] = {}
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class AllocationPlan:
+    virtual_size: int
+    data_bytes: int  # extents that read back as data
+    zero_bytes: int  # extents that read back as zeroes (allocated or not)
+    allocated_bytes: int  # extents present in the image chain
+    extents: int
+
+    @property
+    def unallocated_bytes(self) -> int:
+        return max(0, self.virtual_size - self.allocated_bytes)
+
+    @property
+    def skip_bytes(self) -> int:
+        """Bytes qemu-img convert can skip (zeroes and holes)."""
+        return max(0, self.virtual_size - self.data_bytes)
+
+    def predicted_write_bytes(self, out_format: str = "qcow2") -> int:
+        """
+        Upper bound of bytes a convert into out_format writes.
+
+        Convert skips zero runs, so only data is written, plus qcow2 metadata
+        (L2 tables + header/refcounts). Compression only makes it smaller.
+        """
+        n = self.data_bytes
+        if (out_format or "").lower() == "qcow2":
+            n += (self.virtual_size // _QCOW2_CLUSTER) * 8 + _QCOW2_FIXED_OVERHEAD
+        return n
+
+    def describe(self) -> str:
+        return (
+            f"data={U.human_bytes(self.data_bytes)} zero={U.human_bytes(self.zero_bytes)} "
+            f"unallocated={U.human_bytes(self.unallocated_bytes)} of virtual={U.human_bytes(self.virtual_size)} "
+            f"({self.extents} extent(s))"
+        )
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "virtual_size": self.virtual_size,
+            "data_bytes": self.data_bytes,
+            "zero_bytes": self.zero_bytes,
+            "allocated_bytes": self.allocated_bytes,
+            "unallocated_bytes": self.unallocated_bytes,
+            "extents": self.extents,
+        }
+
+
+def parse_map(entries: List[Dict[str, Any]]) -> AllocationPlan:
+    """Condense `qemu-img map --output=json` entries into an AllocationPlan."""
+    data = zero = allocated = end = 0
+    for e in entries:
+        length = int(e.get("length", 0) or 0)
+        end = max(end, int(e.get("start", 0) or 0) + length)
+        if e.get("zero"):
+            zero += length
+        elif e.get("data"):
+            data += length
+        # "present" is only reported by newer qemu-img; fall back to data/zero
+        if e.get("present", bool(e.get("data")) or bool(e.get("offset") is not None)):
+            allocated += length
+    return AllocationPlan(
+        virtual_size=end,
+        data_bytes=data,
+        zero_bytes=zero,
+        allocated_bytes=allocated,
+        extents=len(entries),
+    )
+
+
+def plan_allocation(
+    logger: logging.Logger,
+    src: Path,
+    *,
+    fmt: Optional[str] = None,
+    timeout_s: float = 300.0,
+) -> Optional[AllocationPlan]:
+    """
+    Map src once and return its AllocationPlan (cached).
+
+    The cache is keyed on the file (path, size, mtime), not on fmt: a map
+    probed without fmt serves callers that pass the detected format and
+    vice versa. Only an explicit fmt that differs from the one a cached map
+    was run with maps again.
+
+    Returns None when qemu-img is missing or the map fails; callers fall
+    back to virtual-size estimates.
+    """
+    src = Path(src)
+    try:
+        st = src.stat()
+    except OSError:
+        return None
+    key = (str(src.resolve()), int(st.st_size), int(st.st_mtime_ns))
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit is not None:
+        hit_fmt, hit_plan = hit
+        if fmt is None or hit_fmt is None or hit_fmt == fmt:
+            return hit_plan
+
+    if U.which("qemu-img") is None:
+        return None
+
+    cmd = ["qemu-img", "map", "--output=json"]
+    if fmt:
+        cmd += ["-f", fmt]
+    cmd.append(str(src))
+    logger.debug(f"Executing map command: {' '.join(cmd)}")
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout_s)
+        entries = json.loads(res.stdout or "[]")
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError) as e:
+        logger.debug(f"qemu-img map failed for {src}: {e}")
+        return None
+    if not isinstance(entries, list):
+        return None
+
+    plan = parse_map(entries)
+    with _cache_lock:
+        _cache[key] = (fmt, plan)
+    return plan
+
+
+__all__ = ["AllocationPlan", "parse_map", "plan_allocation"]
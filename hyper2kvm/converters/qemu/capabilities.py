@@ -0,0 +1,265 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/converters/qemu/capabilities.py
+"""
+One-time capability probe of the installed qemu-img.
+
+Convert._fallback_plan used to find out what the local qemu-img supports by
+failing: a full qemu-img launch (and a partially written output) for every
+rejected option. This module asks once instead:
+
+- `qemu-img --version`                  version string (cache key)
+- `qemu-img --help`                     convert flags: -m, -W, --target-is-zero, --bitmaps
+- `qemu-img create -o compression_type` which qcow2 compression types are built in
+- `qemu-img create -o extended_l2=on`   qcow2 subclusters (qemu >= 5.2)
+
+Results are cached on disk (~/.cache/hyper2kvm/qemu-img-caps.json, or under
+$XDG_CACHE_HOME), keyed by the binary's resolved path, mtime and version.
+An upgrade therefore re-probes on its own. Whether `-t none` (O_DIRECT) works
+depends on the filesystem, not the binary, so direct_io_ok() probes that per
+directory and only caches it in memory.
+"""
+
+from __future__ import annotations
+
+import errno
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ...core.utils import U
+
+# bump when the probe gains fields so old cache entries are ignored
+_SCHEMA = 2
+_CACHE_NAME = "qemu-img-caps.json"
+_PROBE_TIMEOUT_S = 30
+
+_RE_VERSION = re.compile(r"version\s+(\d+(?:\.\d+)*)")
+
+_lock = threading.Lock()
+_mem: Dict[str, "QemuImgCaps"] = {}
+_versions: Dict[str, str] = {}  # "<path>|<mtime>" -> version
+_direct_io: Dict[int, bool] = {}
+
+
+@dataclass(frozen=True)
+class QemuImgCaps:
+    version: str = ""
+    compression_types: Tuple[str, ...] = ("zlib",)
+    threads: bool = False  # convert -m N
+    parallel_writes: bool = False  # convert -W
+    target_is_zero: bool = False  # convert --target-is-zero
+    bitmaps: bool = False  # convert --bitmaps
+    extended_l2: bool = False  # qcow2 -o extended_l2=on
+    schema: int = field(default=_SCHEMA)
+
+    def to_dict(self) -> Dict[str, object]:
+        d = asdict(self)
+        d["compression_types"] = list(self.compression_types)
+        return d
+
+    @staticmethod
+    def from_dict(d: Dict[str, object]) -> "QemuImgCaps":
+        return QemuImgCaps(
+            version=str(d.get("version") or ""),
+            compression_types=tuple(str(x) for x in (d.get("compression_types") or ("zlib",))),  # type: ignore[union-attr]
+            threads=bool(d.get("threads")),
+            parallel_writes=bool(d.get("parallel_writes")),
+            target_is_zero=bool(d.get("target_is_zero")),
+            bitmaps=bool(d.get("bitmaps")),
+            extended_l2=bool(d.get("extended_l2")),
+            schema=int(d.get("schema") or 0),  # type: ignore[arg-type]
+        )
+
+
+def cache_path() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path("~/.cache").expanduser())
+    return Path(base) / "hyper2kvm" / _CACHE_NAME
+
+
+def _run(cmd: List[str]) -> Tuple[int, str]:
+    try:
+        cp = subprocess.run(cmd, capture_output=True, text=True, timeout=_PROBE_TIMEOUT_S)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return 127, str(e)
+    return cp.returncode, (cp.stdout or "") + (cp.stderr or "")
+
+
+def _convert_synopsis(help_text: str) -> str:
+    # the "convert [...] filename ... output_filename" line of the command list
+    for line in help_text.splitlines():
+        s = line.strip()
+        if s.startswith("convert "):
+            return s
+    return ""
+
+
+def _probe(binary: str, version: str) -> QemuImgCaps:
+    _rc, help_text = _run([binary, "--help"])
+    synopsis = _convert_synopsis(help_text)
+
+    ctypes: List[str] = []
+    with tempfile.TemporaryDirectory(prefix="h2k-qemu-probe-") as td:
+        for ctype in ("zstd", "zlib"):
+            img = os.path.join(td, f"{ctype}.qcow2")
+            rc, _ = _run([binary, "create", "-q", "-f", "qcow2", "-o", f"compression_type={ctype}", img, "1M"])
+            if rc == 0:
+                ctypes.append(ctype)
+        img = os.path.join(td, "extl2.qcow2")
+        rc, _ = _run([binary, "create", "-q", "-f", "qcow2", "-o", "extended_l2=on,cluster_size=128k", img, "1M"])
+        extended_l2 = rc == 0
+    if not ctypes:
+        # qemu-img < 5.1 has no compression_type option; zlib is implied
+        ctypes = ["zlib"]
+
+    return QemuImgCaps(
+        version=version,
+        compression_types=tuple(ctypes),
+        threads=bool(re.search(r"\[-m\s", synopsis)),
+        parallel_writes=bool(re.search(r"\[-W\]", synopsis)),
+        target_is_zero="--target-is-zero" in synopsis,
+        bitmaps="--bitmaps" in synopsis,
+        extended_l2=extended_l2,
+    )
+
+
+def _cache_key(binary: str) -> Tuple[str, str]:
+    real = os.path.realpath(binary)
+    stamp = f"{real}|{int(os.stat(real).st_mtime_ns)}"
+    with _lock:
+        version = _versions.get(stamp)
+    if version is None:
+        rc, out = _run([real, "--version"])
+        m = _RE_VERSION.search(out) if rc == 0 else None
+        version = m.group(1) if m else ""
+        with _lock:
+            _versions[stamp] = version
+    return real, f"{stamp}|{version}"
+
+
+def _load_cache() -> Dict[str, Dict[str, object]]:
+    try:
+        data = json.loads(cache_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_cache(data: Dict[str, Dict[str, object]]) -> None:
+    # tmp + rename: concurrent runs never read a torn file
+    p = cache_path()
+    try:
+        U.ensure_dir(p.parent)
+        tmp = p.with_suffix(p.suffix + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, p)
+    except OSError:
+        pass
+
+
+def _store_cache(key: str, caps: QemuImgCaps) -> None:
+    data = _load_cache()
+    data[key] = caps.to_dict()
+    _write_cache(data)
+
+
+def probe_qemu_img(logger: logging.Logger, *, refresh: bool = False) -> Optional[QemuImgCaps]:
+    """
+    Capabilities of the qemu-img on PATH (None if it is not installed).
+
+    Served from memory, then from the on-disk cache; probes only when the
+    binary changed or refresh=True.
+    """
+    binary = U.which("qemu-img")
+    if binary is None:
+        return None
+    try:
+        real, key = _cache_key(binary)
+    except OSError:
+        return None
+    version = key.rsplit("|", 1)[-1]
+
+    with _lock:
+        if not refresh and key in _mem:
+            return _mem[key]
+
+        if not refresh:
+            entry = _load_cache().get(key)
+            if isinstance(entry, dict) and entry.get("schema") == _SCHEMA:
+                caps = QemuImgCaps.from_dict(entry)
+                _mem[key] = caps
+                logger.debug(f"qemu-img capabilities (cached): {caps}")
+                return caps
+
+        caps = _probe(real, version)
+        _mem[key] = caps
+        _store_cache(key, caps)
+        logger.debug(f"qemu-img capabilities (probed): {caps}")
+        return caps
+
+
+def forget(logger: logging.Logger) -> None:
+    """
+    Drop the cached capabilities of the current qemu-img.
+
+    Called when qemu-img still rejected an option the probe said it supports,
+    so the next run probes again instead of repeating the failure.
+    """
+    binary = U.which("qemu-img")
+    if binary is None:
+        return
+    try:
+        _real, key = _cache_key(binary)
+    except OSError:
+        return
+    with _lock:
+        _mem.pop(key, None)
+        data = _load_cache()
+        if data.pop(key, None) is not None:
+            _write_cache(data)
+    logger.debug("qemu-img capability cache entry dropped")
+
+
+def direct_io_ok(directory: Path) -> bool:
+    """True if files in directory can be opened with O_DIRECT (qemu-img -t none)."""
+    o_direct = getattr(os, "O_DIRECT", None)
+    if o_direct is None:
+        return False
+    directory = Path(directory)
+    try:
+        dev = directory.stat().st_dev
+    except OSError:
+        return False
+    with _lock:
+        if dev in _direct_io:
+            return _direct_io[dev]
+
+    ok = False
+    try:
+        fd, name = tempfile.mkstemp(prefix=".h2k-odirect-", dir=str(directory))
+        os.close(fd)
+        try:
+            fd = os.open(name, os.O_RDWR | o_direct)
+            os.close(fd)
+            ok = True
+        except OSError as e:
+            ok = e.errno not in (errno.EINVAL, errno.EOPNOTSUPP)
+        finally:
+            os.unlink(name)
+    except OSError:
+        # cannot create a probe file (read-only source dir): assume the default works
+        ok = True
+
+    with _lock:
+        _direct_io[dev] = ok
+    return ok
+
+
+__all__ = ["QemuImgCaps", "cache_path", "direct_io_ok", "forget", "probe_qemu_img"]
@@ -7,12 +7,13 @@ import logging
 import os
 import re
 import selectors
+import shutil
 import subprocess
 import sys
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Callable, Iterable, Optional, Tuple
+from typing import Callable, Iterable, Optional, Tuple, Union
 
 from rich.progress import (
     BarColumn,
@@ -25,6 +26,11 @@ from rich.progress import (
 )
 
 from ...core.utils import U
+from .alloc_map import AllocationPlan, plan_allocation
+from .archive_source import ArchiveMember
+from .capabilities import QemuImgCaps, direct_io_ok, forget as forget_capabilities, probe_qemu_img
+from .parallel_compress import CompressStats, compress_to_qcow2, supported_compression_types
+from .profiles import ConvertProfile, select_profile
 
 
 class Convert:
@@ -34,6 +40,8 @@ class Convert:
         qemu-img requires -n (no-create) for --target-is-zero, which doesn't fit
         this fresh-file atomic workflow. If you later add a "precreate + -n"
         pathway (block/LV targets), implement that as a separate mode.
+        Performance profiles (profiles.py) leave it off for the same reason: a
+        freshly created file target already reports zero-init, so it gains nothing.
     """
 
     _RE_PAREN = re.compile(r"\((\d+(?:\.\d+)?)/100%\)")
@@ -59,22 +67,38 @@ class Convert:
         compression_type: Optional[str] = "zstd"  # zstd|zlib|None (omit)
         compression_level: Optional[int] = None  # compression_level=...
         preallocation: Optional[str] = None  # preallocation=metadata, ...
+        parallel_writes: bool = False  # -W (never with -c)
+        sparse_size: Optional[str] = None  # -S
+        cluster_size: Optional[str] = None  # qcow2 cluster_size=...
+        extended_l2: bool = False  # qcow2 extended_l2=on
 
         def short(self) -> str:
-            return (
+            s = (
                 f"cache={self.cache_mode or 'off'} "
                 f"threads={self.threads or 'off'} "
                 f"ctype={self.compression_type or 'omit'} "
                 f"clevel={self.compression_level if self.compression_level is not None else 'omit'} "
                 f"prealloc={self.preallocation or 'omit'}"
             )
+            if self.parallel_writes:
+                s += " W=on"
+            if self.sparse_size:
+                s += f" S={self.sparse_size}"
+            if self.cluster_size:
+                s += f" cluster={self.cluster_size}"
+            if self.extended_l2:
+                s += " extl2=on"
+            return s
+
+        def without_tuning(self) -> "Convert.ConvertOptions":
+            return replace(self, parallel_writes=False, sparse_size=None, cluster_size=None, extended_l2=False)
 
     # Public API
 
     @staticmethod
     def convert_image_with_progress(
         logger: logging.Logger,
-        src: Path,
+        src: Union[Path, ArchiveMember],
         dst: Path,
         *,
         out_format: str,
@@ -85,20 +109,46 @@ class Convert:
         in_format: Optional[str] = None,
         preallocation: Optional[str] = None,
         atomic: bool = True,
-        cache_mode: str = "none",
+        cache_mode: Optional[str] = None,
         threads: Optional[int] = None,
         ui_poll_s: float = 0.20,
         max_stderr_tail: int = 200,
-    ) -> None:
-        src = Path(src)
+        alloc: Optional[AllocationPlan] = None,
+        profile: Optional[str] = None,
+        compress_threads: Optional[int] = None,
+    ) -> Optional[AllocationPlan]:
+        """
+        Convert src -> dst with live progress and option fallbacks.
+
+        profile names a performance profile (see profiles.py; None/"auto" picks
+        one from the filesystems and allocation); explicit cache_mode/threads win.
+
+        Compressed qcow2 output is written by the multi-core engine in
+        parallel_compress.py with compress_threads workers (None: the profile's
+        worker count, all CPUs unless low-memory) and the profile's in-flight cap;
+        compress_threads=1, an engine failure, or too little free space to
+        stage a non-raw source uses qemu-img -c instead.
+
+        src may be an ArchiveMember (a disk inside an uncompressed archive);
+        it is read in place through a json: source and in_format is ignored.
+
+        Returns the source AllocationPlan (pass one in via alloc to skip the
+        qemu-img map), or None if the source could not be mapped.
+        """
         dst = Path(dst)
 
         if U.which("qemu-img") is None:
             U.die(logger, "qemu-img not found.", 1)
 
-        src = Convert._prefer_descriptor_for_flat(logger, src)
-        if not src.is_file():
-            raise FileNotFoundError(f"Source image file not found: {src}")
+        member = src if isinstance(src, ArchiveMember) else None
+        if member is not None:
+            # the json: spec names its own format driver; -f would conflict with it
+            in_format = None
+            src_file = Path(member.archive)
+        else:
+            src = src_file = Convert._prefer_descriptor_for_flat(logger, Path(src))
+        if not src_file.is_file():
+            raise FileNotFoundError(f"Source image file not found: {src_file}")
 
         U.ensure_dir(dst.parent)
 
@@ -106,16 +156,71 @@ class Convert:
         tmp_dst = dst.with_suffix(dst.suffix + ".part") if atomic else dst
 
         virt_size, detected_fmt = Convert._qemu_img_info(logger, src)
-        if in_format is None:
+        if in_format is None and member is None:
             in_format = detected_fmt
 
-        base = Convert.ConvertOptions(
-            cache_mode=cache_mode,
-            threads=threads,
+        if alloc is None and member is None:
+            alloc = plan_allocation(logger, src_file, fmt=in_format)
+        work_bytes: Optional[int] = None
+        if alloc is not None:
+            work_bytes = alloc.predicted_write_bytes(out_format)
+            logger.info(f"Allocation: {alloc.describe()}; predicted write ~{U.human_bytes(work_bytes)}")
+
+        prof = select_profile(logger, src=src_file, dst_dir=tmp_dst.parent, alloc=alloc, override=profile)
+        base = replace(
+            Convert.options_from_profile(prof, out_format=out_format, compress=compress),
             compression_type=compression_type,
             compression_level=compress_level,
             preallocation=preallocation,
         )
+        if cache_mode is not None:
+            base = replace(base, cache_mode=cache_mode)
+        if threads is not None:
+            base = replace(base, threads=threads)
+
+        caps = probe_qemu_img(logger)
+        if caps is not None:
+            base = Convert._apply_capabilities(
+                logger, base, caps, src_dir=src_file.parent, dst_dir=tmp_dst.parent, out_format=out_format, compress=compress
+            )
+
+        workers = prof.compress_workers or os.cpu_count() or 1
+        if compress_threads is not None:
+            workers = int(compress_threads)
+        if (
+            out_format == "qcow2"
+            and compress
+            and workers > 1
+            and Convert._room_for_parallel(logger, tmp_dst, in_format=in_format, alloc=alloc, virt_size=virt_size)
+        ):
+            ctype = base.compression_type or "zlib"
+            if ctype not in supported_compression_types():
+                ctype = "zlib"
+            if atomic and tmp_dst.exists():
+                tmp_dst.unlink(missing_ok=True)
+            try:
+                stats = Convert._convert_compressed_parallel(
+                    logger,
+                    src,
+                    tmp_dst,
+                    in_format=in_format,
+                    alloc=alloc,
+                    profile=profile,
+                    workers=workers,
+                    max_inflight_bytes=prof.compress_inflight_bytes,
+                    compression_type=ctype,
+                    level=compress_level,
+                    progress_callback=progress_callback,
+                )
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Parallel qcow2 compression failed ({e}); falling back to qemu-img -c")
+                tmp_dst.unlink(missing_ok=True)
+            else:
+                if atomic:
+                    tmp_dst.replace(final_dst)
+                Convert._safe_progress_callback(progress_callback, 1.0, logger=logger)
+                logger.info(f"Compressed {final_dst.name}: {stats.describe()}")
+                return alloc
 
         plan = list(Convert._fallback_plan(base, out_format=out_format, compress=compress))
 
@@ -143,12 +248,14 @@ class Convert:
             logger.debug(f"[attempt {attempt_no}/{len(plan)}] opts: {opt.short()}")
             logger.debug(f"[attempt {attempt_no}/{len(plan)}] cmd: {' '.join(cmd)}")
 
+            t0 = time.monotonic()
             try:
                 rc, stderr_lines = Convert._run_convert_process(
                     logger,
                     cmd,
                     tmp_dst=tmp_dst,
                     virt_size=virt_size,
+                    work_bytes=work_bytes,
                     ui_poll_s=ui_poll_s,
                     progress_callback=progress_callback,
                 )
@@ -162,7 +269,20 @@ class Convert:
                 Convert._safe_progress_callback(progress_callback, 1.0, logger=logger)
                 if stderr_lines:
                     logger.debug("qemu-img stderr (tail):\n" + "\n".join(stderr_lines[-80:]))
-                return
+                if alloc is not None:
+                    dt = max(1e-6, time.monotonic() - t0)
+                    logger.info(
+                        f"Converted {U.human_bytes(alloc.data_bytes)} of data "
+                        f"({U.human_bytes(alloc.skip_bytes)} zero/unallocated skipped) in {dt:.1f}s "
+                        f"({alloc.data_bytes / dt / 1024 / 1024:.1f} MB/s)"
+                    )
+                    if compress and out_format == "qcow2":
+                        out_size = final_dst.stat().st_size
+                        logger.info(
+                            f"Compressed {final_dst.name}: ratio {alloc.data_bytes / float(max(1, out_size)):.2f}x "
+                            f"({U.human_bytes(out_size)} on disk, qemu-img single-threaded)"
+                        )
+                return alloc
 
             tail_lines = stderr_lines[-max_stderr_tail:] if stderr_lines else []
             tail = "\n".join(tail_lines) if tail_lines else ""
@@ -171,6 +291,9 @@ class Convert:
             is_expected = match is not None
 
             if is_expected:
+                if caps is not None and attempt_no == 1:
+                    # the probe said these options work; re-probe next run rather than trust it again
+                    forget_capabilities(logger)
                 snippet = Convert._extract_match_snippet(tail, match, radius=140)
                 U.banner(logger, f"Fallback attempt {attempt_no}/{len(plan)} (options rejected)")
                 logger.warning(f"Reason: {snippet}")
@@ -214,6 +337,123 @@ class Convert:
             in_format=in_format,
         )
 
+    @staticmethod
+    def _room_for_parallel(
+        logger: logging.Logger,
+        dst: Path,
+        *,
+        in_format: Optional[str],
+        alloc: Optional[AllocationPlan],
+        virt_size: int,
+    ) -> bool:
+        """
+        True if dst's filesystem can hold the parallel engine's raw stage plus its output.
+
+        Raw sources are read in place and need no check. The stage is sparse:
+        it takes the plan's data bytes (the virtual size when unmapped).
+        """
+        if (in_format or "").lower() == "raw":
+            return True
+        if alloc is not None:
+            need = alloc.data_bytes + alloc.predicted_write_bytes("qcow2")
+        else:
+            need = 2 * max(0, int(virt_size or 0))
+        try:
+            free = shutil.disk_usage(dst.parent).free
+        except OSError as e:
+            logger.debug(f"disk_usage({dst.parent}) failed: {e}")
+            return False
+        if need > free:
+            logger.info(
+                f"Not enough space to stage {dst.name} for parallel compression "
+                f"(need ~{U.human_bytes(need)}, free {U.human_bytes(free)}); using qemu-img -c"
+            )
+            return False
+        return True
+
+    @staticmethod
+    def _convert_compressed_parallel(
+        logger: logging.Logger,
+        src: Union[Path, ArchiveMember],
+        dst: Path,
+        *,
+        in_format: Optional[str],
+        alloc: Optional[AllocationPlan],
+        profile: Optional[str],
+        workers: int,
+        max_inflight_bytes: int,
+        compression_type: str,
+        level: Optional[int],
+        progress_callback: Optional[Callable[[float], None]],
+    ) -> CompressStats:
+        """
+        Compressed qcow2 via the multi-core engine.
+
+        Non-raw sources are first staged to a sparse raw file next to dst
+        (uncompressed qemu-img convert, first half of the progress range).
+        """
+        stage: Optional[Path] = None
+        lo = 0.0
+        if (in_format or "").lower() != "raw":
+            stage = dst.with_suffix(dst.suffix + ".stage.raw")
+            lo = 0.5
+        try:
+            if stage is not None:
+                Convert.convert_image_with_progress(
+                    logger,
+                    src,
+                    stage,
+                    out_format="raw",
+                    compress=False,
+                    in_format=in_format,
+                    alloc=alloc,
+                    profile=profile,
+                    atomic=False,
+                    progress_callback=lambda f: Convert._safe_progress_callback(
+                        progress_callback, lo * f, logger=logger
+                    ),
+                )
+            U.banner(logger, f"Compress to QCOW2 ({workers} workers, {compression_type})")
+            return compress_to_qcow2(
+                logger,
+                stage or Path(str(src)),
+                dst,
+                workers=workers,
+                compression_type=compression_type,
+                level=level,
+                max_inflight_bytes=max_inflight_bytes,
+                progress=lambda f: Convert._safe_progress_callback(
+                    progress_callback, lo + (1.0 - lo) * f, logger=logger
+                ),
+            )
+        finally:
+            if stage is not None:
+                stage.unlink(missing_ok=True)
+
+    @staticmethod
+    def create_overlay(logger: logging.Logger, base: Path, overlay: Path) -> Path:
+        """
+        Create a qcow2 overlay on top of base (which is never written).
+
+        Writes to the overlay stay in the overlay; reading it returns base data
+        for everything else, so `qemu-img convert overlay out` reads through the
+        whole chain (including VMDK snapshot parents) in one pass.
+        """
+        if U.which("qemu-img") is None:
+            U.die(logger, "qemu-img not found.", 1)
+        base = Convert._prefer_descriptor_for_flat(logger, Path(base)).resolve()
+        overlay = Path(overlay)
+        _virt, fmt = Convert._qemu_img_info(logger, base)
+        if not fmt:
+            raise RuntimeError(f"Cannot create overlay: unknown format for {base}")
+
+        U.ensure_dir(overlay.parent)
+        overlay.unlink(missing_ok=True)
+        cmd = ["qemu-img", "create", "-q", "-f", "qcow2", "-b", str(base), "-F", fmt, str(overlay)]
+        U.run_cmd(logger, cmd, check=True, capture=True)
+        logger.info(f"Overlay: {overlay} (backing {fmt}: {base}, read-only)")
+        return overlay
+
     @staticmethod
     def validate(logger: logging.Logger, path: Path) -> None:
         path = Convert._prefer_descriptor_for_flat(logger, Path(path))
@@ -234,6 +474,58 @@ class Convert:
             logger.debug("stdout:\n" + (cp.stdout or ""))
             logger.debug("stderr:\n" + (cp.stderr or ""))
 
+    @staticmethod
+    def options_from_profile(prof: ConvertProfile, *, out_format: str, compress: bool) -> ConvertOptions:
+        is_qcow2 = (out_format or "").lower() == "qcow2"
+        return Convert.ConvertOptions(
+            cache_mode=prof.cache_mode,
+            threads=prof.threads,
+            # qemu-img: "Out of order write and compress are mutually exclusive"
+            parallel_writes=prof.wants_parallel_writes(out_format) and not compress,
+            sparse_size=prof.sparse_size,
+            cluster_size=prof.cluster_size if is_qcow2 else None,
+            extended_l2=prof.extended_l2 and is_qcow2,
+        )
+
+    # Capability-based starting options
+
+    @staticmethod
+    def _apply_capabilities(
+        logger: logging.Logger,
+        base: ConvertOptions,
+        caps: QemuImgCaps,
+        *,
+        src_dir: Path,
+        dst_dir: Path,
+        out_format: str,
+        compress: bool,
+    ) -> ConvertOptions:
+        """
+        Drop/downgrade options the installed qemu-img (or the filesystems) cannot
+        honour, so the first attempt is one known to work instead of a failed launch.
+        """
+        threads = base.threads if caps.threads else None
+
+        ctype = base.compression_type
+        if out_format == "qcow2" and compress and ctype and ctype not in caps.compression_types:
+            ctype = "zlib" if "zlib" in caps.compression_types else None
+
+        cache_mode = base.cache_mode
+        if cache_mode == "none" and not (direct_io_ok(src_dir) and direct_io_ok(dst_dir)):
+            cache_mode = ""
+
+        tuned = replace(
+            base,
+            threads=threads,
+            compression_type=ctype,
+            cache_mode=cache_mode,
+            parallel_writes=base.parallel_writes and caps.parallel_writes,
+            extended_l2=base.extended_l2 and caps.extended_l2,
+        )
+        if tuned != base:
+            logger.info(f"qemu-img {caps.version or '(unknown version)'}: starting with {tuned.short()}")
+        return tuned
+
     # Fallback Policy (deduped)
 
     @staticmethod
@@ -243,27 +535,21 @@ class Convert:
         out_format: str,
         compress: bool,
     ) -> Iterable[ConvertOptions]:
-        def key(o: Convert.ConvertOptions) -> tuple:
-            return (
-                o.cache_mode,
-                o.threads,
-                o.compression_type,
-                o.compression_level,
-                o.preallocation,
-            )
-
-        seen: set[tuple] = set()
+        seen: set[Convert.ConvertOptions] = set()
         ordered: list[Convert.ConvertOptions] = []
 
         def emit(opt: Convert.ConvertOptions) -> None:
-            k = key(opt)
-            if k in seen:
+            if opt in seen:
                 return
-            seen.add(k)
+            seen.add(opt)
             ordered.append(opt)
 
         emit(base)
 
+        # profile tuning (-W/-S/cluster layout) is the first thing to give up
+        emit(base.without_tuning())
+        base = base.without_tuning()
+
         if base.threads:
             emit(
                 Convert.ConvertOptions(
@@ -343,6 +629,7 @@ class Convert:
         virt_size: int,
         ui_poll_s: float,
         progress_callback: Optional[Callable[[float], None]],
+        work_bytes: Optional[int] = None,  # predicted bytes to write (alloc map); else virt_size
         callback_min_delta: float = 0.001,  # 0.1%
         size_poll_s: float = 0.50,
         log_every_s: float = 30.0,  # liveness logging even if % flat (non-interactive)
@@ -504,11 +791,16 @@ class Convert:
                 else:
                     update_best(pct)
 
+        # estimates divide by what will really be written, not the virtual size
+        est_total = int(work_bytes) if work_bytes else virt_size
+
         def tmp_written_bytes() -> Optional[int]:
             try:
                 if not tmp_dst.exists():
                     return None
-                return int(tmp_dst.stat().st_size)
+                st = tmp_dst.stat()
+                # raw targets are created at full size; count allocated blocks instead
+                return int(min(st.st_size, st.st_blocks * 512))
             except Exception:
                 return None
 
@@ -516,9 +808,9 @@ class Convert:
             nonlocal best_pct
             if last_seen_pct is not None:
                 return
-            if virt_size <= 0 or written_b is None:
+            if est_total <= 0 or written_b is None:
                 return
-            est = 100.0 * float(written_b) / float(virt_size)
+            est = 100.0 * float(written_b) / float(est_total)
             # never claim "done" from file size; qemu may still be finishing metadata
             if est > 99.0:
                 est = 99.0
@@ -614,9 +906,9 @@ class Convert:
             if (not interactive) and (now - last_emit_t) < log_every_s:
                 return
 
-            if virt_size > 0 and last_seen_pct is not None:
+            if est_total > 0 and last_seen_pct is not None:
                 pct_for_rate = last_seen_pct  # truth-phase
-                est_bytes = (pct_for_rate / 100.0) * float(virt_size)
+                est_bytes = (pct_for_rate / 100.0) * float(est_total)
                 mb_s = (est_bytes / max(1e-6, (now - start))) / 1024 / 1024
                 logger.info(f"⏳ Conversion progress: {best_pct:.1f}% (~{mb_s:.1f} MB/s avg)")
             else:
@@ -765,7 +1057,7 @@ class Convert:
     @staticmethod
     def _build_convert_cmd(
         *,
-        src: Path,
+        src: Union[Path, ArchiveMember],
         dst: Path,
         in_format: Optional[str],
         out_format: str,
@@ -780,6 +1072,12 @@ class Convert:
         if opt.threads and opt.threads > 0:
             cmd += ["-m", str(int(opt.threads))]
 
+        if opt.parallel_writes and not compress:
+            cmd.append("-W")
+
+        if opt.sparse_size:
+            cmd += ["-S", str(opt.sparse_size)]
+
         if in_format:
             cmd += ["-f", in_format]
 
@@ -789,6 +1087,10 @@ class Convert:
             opts: list[str] = []
             if opt.preallocation:
                 opts.append(f"preallocation={opt.preallocation}")
+            if opt.cluster_size:
+                opts.append(f"cluster_size={opt.cluster_size}")
+            if opt.extended_l2:
+                opts.append("extended_l2=on")
 
             if compress:
                 cmd.append("-c")
@@ -814,7 +1116,7 @@ class Convert:
         return src
 
     @staticmethod
-    def _qemu_img_info(logger: logging.Logger, src: Path) -> Tuple[int, Optional[str]]:
+    def _qemu_img_info(logger: logging.Logger, src: Union[Path, ArchiveMember]) -> Tuple[int, Optional[str]]:
         info_cmd = ["qemu-img", "info", "--output=json", str(src)]
         logger.debug(f"Executing info command: {' '.join(info_cmd)}")
         try:
@@ -0,0 +1,420 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/converters/qemu/parallel_compress.py
+"""
+Multi-core compressed qcow2 writer.
+
+qemu-img compresses clusters on a single thread. -m only adds coroutines to
+that thread, and `_fallback_plan` drops it on older builds anyway. On a
+64-core conversion host `convert -c` therefore runs at one core's deflate
+speed.
+
+This module writes a standard compressed qcow2 (version 3, 64k clusters,
+16-bit refcounts) itself:
+
+- A thread pool reads batches of clusters from a raw source with pread and
+  compresses them. zlib and zstandard release the GIL, so the workers scale
+  across cores.
+- The main thread appends the results in virtual-offset order, packing
+  compressed clusters byte-tight like qemu does.
+- All-zero clusters and holes (SEEK_DATA) are left unallocated.
+- Clusters that do not shrink are stored uncompressed and cluster-aligned.
+- L2 tables, the L1 table and the refcount structures are written after the
+  data. The header is written last.
+
+Only raw input is read directly. Convert stages other formats through a
+sparse raw file first, which qemu-img writes at disk speed with -W.
+`qemu-img check` (Convert.validate) accepts the result like any
+qemu-written image.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from ...core.file_ops import data_extents
+from ...core.sparse import is_zero
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+CLUSTER_BITS = 16
+CLUSTER_SIZE = 1 << CLUSTER_BITS
+
+_L2_ENTRIES = CLUSTER_SIZE // 8
+_REFCOUNT_ORDER = 4  # 16-bit refcounts (qemu default)
+_RC_ENTRIES = CLUSTER_SIZE * 8 >> _REFCOUNT_ORDER
+
+_MAGIC = 0x514649FB  # "QFI\xfb"
+_HEADER_FMT = ">IIQIIQIIQQIIQQQQII"  # qcow2 v3 header, 104 bytes
+_OFLAG_COPIED = 1 << 63
+_OFLAG_COMPRESSED = 1 << 62
+_CSIZE_SHIFT = 62 - (CLUSTER_BITS - 8)  # compressed descriptor: sector count field
+_INCOMPAT_COMPRESSION_TYPE = 1 << 3
+
+_ZLIB_WBITS = -12  # raw deflate, 4k window: what qemu's qcow2 zlib decoder expects
+_BATCH_CLUSTERS = 64  # 4 MiB per worker task
+INFLIGHT_BYTES = 256 * 1024 * 1024  # default cap on source bytes read but not yet written
+_FLUSH_BYTES = 8 * 1024 * 1024
+
+ProgressFn = Callable[[float], None]
+
+
+def supported_compression_types() -> Tuple[str, ...]:
+    return ("zstd", "zlib") if zstandard is not None else ("zlib",)
+
+
+@dataclass(frozen=True)
+class CompressStats:
+    virtual_size: int
+    data_bytes: int  # non-zero source clusters read
+    stored_bytes: int  # cluster payload written (compressed + incompressible)
+    output_bytes: int  # final file size, metadata included
+    seconds: float
+    workers: int
+    compression_type: str
+
+    @property
+    def ratio(self) -> float:
+        return self.data_bytes / float(self.stored_bytes) if self.stored_bytes else 1.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.data_bytes / max(1e-6, self.seconds) / 1024 / 1024
+
+    def describe(self) -> str:
+        return (
+            f"{self.data_bytes / 1024 / 1024:.1f} MiB data -> {self.output_bytes / 1024 / 1024:.1f} MiB "
+            f"({self.compression_type}, ratio {self.ratio:.2f}x) in {self.seconds:.1f}s, "
+            f"{self.mb_per_s:.1f} MB/s on {self.workers} workers"
+        )
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "virtual_size": self.virtual_size,
+            "data_bytes": self.data_bytes,
+            "stored_bytes": self.stored_bytes,
+            "output_bytes": self.output_bytes,
+            "seconds": round(self.seconds, 3),
+            "workers": self.workers,
+            "compression_type": self.compression_type,
+            "ratio": round(self.ratio, 3),
+            "mb_per_s": round(self.mb_per_s, 1),
+        }
+
+
+def _compressor(ctype: str, level: Optional[int]) -> Callable[[bytes], bytes]:
+    if ctype == "zstd":
+        if zstandard is None:
+            raise ValueError("compression_type=zstd needs the 'zstandard' module")
+        local = threading.local()
+        zlevel = int(level) if level is not None else 3
+
+        def zstd_compress(buf: bytes) -> bytes:
+            c = getattr(local, "c", None)
+            if c is None:
+                c = local.c = zstandard.ZstdCompressor(level=zlevel)
+            return c.compress(buf)
+
+        return zstd_compress
+
+    if ctype != "zlib":
+        raise ValueError(f"unsupported compression_type: {ctype!r}")
+    dlevel = int(level) if level is not None else zlib.Z_DEFAULT_COMPRESSION
+
+    def deflate(buf: bytes) -> bytes:
+        c = zlib.compressobj(dlevel, zlib.DEFLATED, _ZLIB_WBITS)
+        return c.compress(buf) + c.flush()
+
+    return deflate
+
+
+def _cluster_runs(fd: int, size: int) -> Iterator[Tuple[int, int]]:
+    """(first_cluster, count) batches covering the data extents of fd."""
+    nxt = 0
+    for start, end in data_extents(fd, size):
+        first = max(start // CLUSTER_SIZE, nxt)
+        last = (end + CLUSTER_SIZE - 1) // CLUSTER_SIZE
+        while first < last:
+            n = min(_BATCH_CLUSTERS, last - first)
+            yield first, n
+            first += n
+        nxt = max(nxt, last)
+
+
+def _align_up(v: int) -> int:
+    return (v + CLUSTER_SIZE - 1) & ~(CLUSTER_SIZE - 1)
+
+
+def _be(values: array) -> bytes:
+    """Big-endian bytes of an array (qcow2 metadata byte order)."""
+    if sys.byteorder == "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _div_up(a: int, b: int) -> int:
+    return (a + b - 1) // b
+
+
+class _Writer:
+    """
+    Sequential qcow2 data writer; tracks L2 entries and refcounts.
+
+    L2 tables are array('Q') (8 bytes per entry, only for touched 512 MiB
+    ranges) and refcounts one array('H') slot per host cluster, i.e. the
+    on-disk sizes of the qcow2 metadata rather than boxed ints per cluster.
+    """
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+        self.pos = CLUSTER_SIZE  # cluster 0 is the header
+        self.buf = bytearray()
+        self.buf_off = self.pos
+        self.l2: Dict[int, array] = {}
+        self.refcounts = array("H", [1])
+        self.stored = 0
+
+    def _append(self, data: bytes) -> None:
+        self.buf += data
+        self.pos += len(data)
+        if len(self.buf) >= _FLUSH_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buf:
+            os.pwrite(self.fd, self.buf, self.buf_off)
+        self.buf = bytearray()
+        self.buf_off = self.pos
+
+    def _map(self, vcluster: int, entry: int) -> None:
+        table = self.l2.get(vcluster // _L2_ENTRIES)
+        if table is None:
+            table = self.l2[vcluster // _L2_ENTRIES] = array("Q", bytes(CLUSTER_SIZE))
+        table[vcluster % _L2_ENTRIES] = entry
+
+    def _ref(self, hc: int, *, add: bool = False) -> None:
+        """Count a reference to host cluster hc (add=True: one more, else set to 1)."""
+        rc = self.refcounts
+        if hc >= len(rc):
+            # grow a refcount block's worth at a time
+            rc.frombytes(bytes(2 * max(hc + 1 - len(rc), _RC_ENTRIES)))
+        try:
+            rc[hc] = rc[hc] + 1 if add else 1
+        except OverflowError:
+            raise ValueError("refcount overflow") from None
+
+    def add_compressed(self, vcluster: int, payload: bytes) -> None:
+        off = self.pos
+        extra = ((off + len(payload) - 1) >> 9) - (off >> 9)
+        # qemu-img check counts one reference per host cluster the sectors touch
+        last = ((off >> 9) + extra) * 512 + 511
+        for hc in range(off >> CLUSTER_BITS, (last >> CLUSTER_BITS) + 1):
+            self._ref(hc, add=True)
+        self._append(payload)
+        self.stored += len(payload)
+        self._map(vcluster, _OFLAG_COMPRESSED | (extra << _CSIZE_SHIFT) | off)
+
+    def add_plain(self, vcluster: int, data: bytes) -> None:
+        pad = _align_up(self.pos) - self.pos
+        if pad:
+            self._append(bytes(pad))
+        off = self.pos
+        self._ref(off >> CLUSTER_BITS)
+        self._append(data)
+        self.stored += len(data)
+        self._map(vcluster, _OFLAG_COPIED | off)
+
+    def finish(self, virtual_size: int, ctype: str) -> int:
+        """Write L2/L1/refcount metadata and the header; return the file size."""
+        self.flush()
+        pos = _align_up(self.pos)
+
+        l1_size = max(1, _div_up(virtual_size, CLUSTER_SIZE * _L2_ENTRIES))
+        l1 = [0] * l1_size
+        meta: List[Tuple[int, bytes]] = []
+        for idx in sorted(self.l2):
+            meta.append((pos, _be(self.l2[idx])))
+            l1[idx] = _OFLAG_COPIED | pos
+            self._ref(pos >> CLUSTER_BITS)
+            pos += CLUSTER_SIZE
+
+        l1_offset = pos
+        l1_clusters = _div_up(l1_size * 8, CLUSTER_SIZE)
+        meta.append((l1_offset, struct.pack(f">{l1_size}Q", *l1)))
+        for i in range(l1_clusters):
+            self._ref((l1_offset >> CLUSTER_BITS) + i)
+        pos += l1_clusters * CLUSTER_SIZE
+
+        # refcount blocks + table must also cover themselves: iterate to a fixed point
+        base = pos >> CLUSTER_BITS
+        nblocks, rt_clusters = 1, 1
+        while True:
+            total = base + nblocks + rt_clusters
+            want_blocks = _div_up(total, _RC_ENTRIES)
+            want_rt = _div_up(want_blocks * 8, CLUSTER_SIZE)
+            if (want_blocks, want_rt) == (nblocks, rt_clusters):
+                break
+            nblocks, rt_clusters = want_blocks, want_rt
+        for i in range(nblocks + rt_clusters):
+            self._ref(base + i)
+
+        rt_offset = pos + nblocks * CLUSTER_SIZE
+        table: List[int] = []
+        for b in range(nblocks):
+            counts = self.refcounts[b * _RC_ENTRIES : (b + 1) * _RC_ENTRIES]
+            counts.extend(array("H", bytes(2 * (_RC_ENTRIES - len(counts)))))
+            blk_off = pos + b * CLUSTER_SIZE
+            meta.append((blk_off, _be(counts)))
+            table.append(blk_off)
+        meta.append((rt_offset, struct.pack(f">{len(table)}Q", *table)))
+        end = rt_offset + rt_clusters * CLUSTER_SIZE
+
+        for off, blob in meta:
+            os.pwrite(self.fd, blob, off)
+
+        incompat = 0
+        header_len = struct.calcsize(_HEADER_FMT)
+        extra = b""
+        if ctype == "zstd":
+            # compression_type field (1 = zstd) plus padding to a multiple of 8
+            incompat |= _INCOMPAT_COMPRESSION_TYPE
+            extra = bytes([1]) + bytes(7)
+            header_len += len(extra)
+        header = struct.pack(
+            _HEADER_FMT,
+            _MAGIC,
+            3,  # version
+            0,  # backing_file_offset
+            0,  # backing_file_size
+            CLUSTER_BITS,
+            virtual_size,
+            0,  # crypt_method
+            l1_size,
+            l1_offset,
+            rt_offset,
+            rt_clusters,
+            0,  # nb_snapshots
+            0,  # snapshots_offset
+            incompat,
+            0,  # compatible_features
+            0,  # autoclear_features
+            _REFCOUNT_ORDER,
+            header_len,
+        )
+        # the zeroed bytes after the header double as the end-of-extensions marker
+        os.pwrite(self.fd, header + extra, 0)
+        os.ftruncate(self.fd, end)
+        return end
+
+
+def compress_to_qcow2(
+    logger: logging.Logger,
+    src: Path,
+    dst: Path,
+    *,
+    workers: Optional[int] = None,
+    compression_type: str = "zlib",
+    level: Optional[int] = None,
+    max_inflight_bytes: int = INFLIGHT_BYTES,
+    progress: Optional[ProgressFn] = None,
+) -> CompressStats:
+    """
+    Write raw image src as a compressed qcow2 dst using a pool of workers.
+
+    workers defaults to os.cpu_count(). max_inflight_bytes caps the source
+    data queued or held by workers (at least one batch is always in flight),
+    so memory use does not grow with the core count. compression_type "zstd"
+    needs the optional zstandard module and qemu >= 5.1 to read the result.
+    progress receives the fraction of the source scanned.
+    """
+    src = Path(src)
+    dst = Path(dst)
+    ctype = (compression_type or "zlib").lower()
+    compress = _compressor(ctype, level)
+    nworkers = max(1, int(workers or os.cpu_count() or 1))
+
+    t0 = time.monotonic()
+    sfd = os.open(str(src), os.O_RDONLY)
+    try:
+        size = os.fstat(sfd).st_size
+        dfd = os.open(str(dst), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            writer = _Writer(dfd)
+            data_bytes = 0
+
+            def work(first: int, count: int) -> List[Tuple[int, bool, bytes]]:
+                buf = os.pread(sfd, count * CLUSTER_SIZE, first * CLUSTER_SIZE)
+                out: List[Tuple[int, bool, bytes]] = []
+                for i in range(count):
+                    chunk = buf[i * CLUSTER_SIZE : (i + 1) * CLUSTER_SIZE]
+                    if not chunk or is_zero(chunk):
+                        continue
+                    if len(chunk) < CLUSTER_SIZE:  # tail of an unaligned image
+                        chunk = chunk + bytes(CLUSTER_SIZE - len(chunk))
+                    packed = compress(chunk)
+                    if len(packed) < CLUSTER_SIZE:
+                        out.append((first + i, True, packed))
+                    else:
+                        out.append((first + i, False, chunk))
+                return out
+
+            with ThreadPoolExecutor(max_workers=nworkers, thread_name_prefix="h2k-qcow2z") as pool:
+                pending: Deque[Tuple[int, int, Future]] = deque()
+                runs = _cluster_runs(sfd, size)
+                nxt = next(runs, None)
+                inflight = 0
+                while True:
+                    while nxt is not None and (not pending or inflight + nxt[1] * CLUSTER_SIZE <= max_inflight_bytes):
+                        pending.append((nxt[0], nxt[1], pool.submit(work, *nxt)))
+                        inflight += nxt[1] * CLUSTER_SIZE
+                        nxt = next(runs, None)
+                    if not pending:
+                        break
+                    first, count, fut = pending.popleft()
+                    inflight -= count * CLUSTER_SIZE
+                    for vcluster, compressed, payload in fut.result():
+                        data_bytes += CLUSTER_SIZE
+                        if compressed:
+                            writer.add_compressed(vcluster, payload)
+                        else:
+                            writer.add_plain(vcluster, payload)
+                    if progress is not None and size:
+                        progress(min(1.0, (first + count) * CLUSTER_SIZE / float(size)))
+
+            out_bytes = writer.finish(size, ctype)
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    finally:
+        os.close(sfd)
+
+    stats = CompressStats(
+        virtual_size=size,
+        data_bytes=data_bytes,
+        stored_bytes=writer.stored,
+        output_bytes=out_bytes,
+        seconds=time.monotonic() - t0,
+        workers=nworkers,
+        compression_type=ctype,
+    )
+    logger.debug(f"parallel qcow2 compress: {src.name} -> {dst.name}: {stats.describe()}")
+    return stats
+
+
+__all__ = ["CLUSTER_SIZE", "CompressStats", "compress_to_qcow2", "supported_compression_types"]
@@ -0,0 +1,227 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/converters/qemu/profiles.py
+"""
+Named qemu-img convert performance profiles.
+
+A profile fills in the convert knobs the caller did not set explicitly:
+cache mode, coroutines (-m), out-of-order writes (-W), the zero-detection
+threshold (-S). Those only change how fast the image is written, never what
+is written. The qcow2 cluster layout (cluster_size / extended_l2) changes the
+delivered image, so only a profile the user names explicitly sets it.
+
+Why each profile has its defaults (benchmark_profiles() measures them on a
+given host; run it there before changing a default):
+
+  throughput  local disks. -t none avoids double caching in the page cache.
+              -m 8 saturates SATA/SAS SSDs and spinning RAID. -W only for raw
+              targets, because out-of-order writes fragment qcow2 files.
+  nvme        NVMe target. Deep queues keep gaining up to -m 16, and -W is
+              cheap even for qcow2 there.
+  nfs         NFS/CIFS/Ceph/Gluster on either side. O_DIRECT round trips
+              dominate, so writeback caching is used with -m 16 and -W to
+              hide latency.
+  nfs-subclusters
+              nfs plus 2M clusters with extended_l2 (64k subclusters). Cuts
+              metadata round trips 32x and keeps sparse granularity, but needs
+              QEMU >= 5.2 on every host that opens the image. Never chosen by
+              auto.
+  low-memory  under 2 GiB available. -m 2 and no -W keep bounce buffers small.
+              Parallel qcow2 compression runs 2 workers with 32 MiB in flight
+              (other profiles: one worker per CPU, 256 MiB in flight).
+
+auto picks a speed-only profile from the source/target filesystem types and free memory.
+Dense sources (>= 75% data) also get -S 64k: zero scanning at 4k granularity
+costs CPU and only punches small holes that fragment the output.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .alloc_map import AllocationPlan
+from .parallel_compress import INFLIGHT_BYTES
+
+AUTO = "auto"
+
+NETWORK_FS = ("nfs", "nfs4", "cifs", "smb3", "ceph", "glusterfs", "fuse.glusterfs", "fuse.sshfs", "9p")
+
+_LOW_MEMORY_BYTES = 2 * 1024**3
+_DENSE_RATIO = 0.75
+
+
+@dataclass(frozen=True)
+class ConvertProfile:
+    name: str
+    cache_mode: str = "none"  # -t/-T
+    threads: int = 8  # -m coroutines
+    parallel_writes: str = "raw"  # -W: never | raw (raw targets only) | always
+    sparse_size: Optional[str] = None  # -S
+    cluster_size: Optional[str] = None  # qcow2 -o cluster_size
+    extended_l2: bool = False  # qcow2 -o extended_l2=on
+    compress_workers: Optional[int] = None  # parallel qcow2 compression (None: all CPUs)
+    compress_inflight_bytes: int = INFLIGHT_BYTES  # source bytes the compression engine may hold
+
+    def wants_parallel_writes(self, out_format: str) -> bool:
+        if self.parallel_writes == "always":
+            return True
+        return self.parallel_writes == "raw" and (out_format or "").lower() == "raw"
+
+
+PROFILES: Dict[str, ConvertProfile] = {
+    "throughput": ConvertProfile("throughput"),
+    "nvme": ConvertProfile("nvme", threads=16, parallel_writes="always"),
+    "nfs": ConvertProfile("nfs", cache_mode="writeback", threads=16, parallel_writes="always"),
+    "nfs-subclusters": ConvertProfile(
+        "nfs-subclusters",
+        cache_mode="writeback",
+        threads=16,
+        parallel_writes="always",
+        cluster_size="2M",
+        extended_l2=True,
+    ),
+    "low-memory": ConvertProfile(
+        "low-memory",
+        threads=2,
+        parallel_writes="never",
+        compress_workers=2,
+        compress_inflight_bytes=32 * 1024 * 1024,
+    ),
+}
+
+PROFILE_CHOICES: Tuple[str, ...] = (AUTO,) + tuple(PROFILES)
+
+
+def fs_type(path: Path) -> Optional[str]:
+    """Filesystem type of the mount holding path (longest /proc/self/mounts prefix)."""
+    try:
+        target = os.path.realpath(str(path))
+        with open("/proc/self/mounts", "r", encoding="utf-8", errors="replace") as f:
+            mounts = [line.split() for line in f]
+    except OSError:
+        return None
+    best: Tuple[int, Optional[str]] = (-1, None)
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+        mnt = fields[1].replace("\\040", " ")
+        if target == mnt or target.startswith(mnt.rstrip("/") + "/"):
+            if len(mnt) > best[0]:
+                best = (len(mnt), fields[2])
+    return best[1]
+
+
+def is_nvme(path: Path) -> bool:
+    """True if path lives on an NVMe block device (via /sys/dev/block)."""
+    try:
+        st = os.stat(path)
+        sys_path = os.path.realpath(f"/sys/dev/block/{os.major(st.st_dev)}:{os.minor(st.st_dev)}")
+    except OSError:
+        return False
+    return "/nvme" in sys_path
+
+
+def mem_available() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def select_profile(
+    logger: logging.Logger,
+    *,
+    src: Path,
+    dst_dir: Path,
+    alloc: Optional[AllocationPlan] = None,
+    override: Optional[str] = None,
+) -> ConvertProfile:
+    """
+    Resolve override (a profile name or "auto"/None) to a ConvertProfile.
+
+    auto: low-memory host -> low-memory; network filesystem on either side ->
+    nfs; NVMe target -> nvme; otherwise throughput. Dense sources also get -S 64k.
+    """
+    name = (override or AUTO).strip().lower()
+    reason = "configured"
+    if name != AUTO and name not in PROFILES:
+        logger.warning(f"Unknown convert profile {name!r}; using auto")
+        name = AUTO
+
+    if name == AUTO:
+        src_fs = fs_type(src) or "?"
+        dst_fs = fs_type(dst_dir) or "?"
+        mem = mem_available()
+        if mem is not None and mem < _LOW_MEMORY_BYTES:
+            name, reason = "low-memory", f"MemAvailable {mem // 1024**2} MiB"
+        elif src_fs in NETWORK_FS or dst_fs in NETWORK_FS:
+            name, reason = "nfs", f"src fs={src_fs}, dst fs={dst_fs}"
+        elif is_nvme(dst_dir):
+            name, reason = "nvme", "target on NVMe"
+        else:
+            name, reason = "throughput", f"src fs={src_fs}, dst fs={dst_fs}"
+
+    profile = PROFILES[name]
+    if profile.sparse_size is None and alloc is not None and alloc.virtual_size > 0:
+        ratio = alloc.data_bytes / float(alloc.virtual_size)
+        if ratio >= _DENSE_RATIO:
+            profile = replace(profile, sparse_size="64k")
+            reason += f", dense source ({ratio:.0%} data)"
+
+    logger.info(f"Convert profile: {profile.name} ({reason})")
+    return profile
+
+
+def benchmark_profiles(
+    logger: logging.Logger,
+    src: Path,
+    workdir: Path,
+    *,
+    out_format: str = "qcow2",
+    names: Optional[Iterable[str]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Micro-benchmark: convert src once per profile into workdir, return (name, MB/s).
+
+    Used to justify the PROFILES defaults on a given host; outputs are removed.
+    """
+    from .converter import Convert
+
+    results: List[Tuple[str, float]] = []
+    size = Path(src).stat().st_size
+    for name in names or PROFILES:
+        profile = PROFILES[name]
+        dst = Path(workdir) / f"bench-{name}.{out_format}"
+        opt = Convert.options_from_profile(profile, out_format=out_format, compress=False)
+        cmd = Convert._build_convert_cmd(
+            src=Path(src), dst=dst, in_format=None, out_format=out_format, compress=False, opt=opt
+        )
+        t0 = time.monotonic()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        dt = max(1e-6, time.monotonic() - t0)
+        dst.unlink(missing_ok=True)
+        mbs = size / dt / 1024 / 1024
+        logger.info(f"profile {name:<15} {mbs:8.1f} MB/s  ({opt.short()})")
+        results.append((name, mbs))
+    return results
+
+
+__all__ = [
+    "AUTO",
+    "ConvertProfile",
+    "PROFILES",
+    "PROFILE_CHOICES",
+    "benchmark_profiles",
+    "fs_type",
+    "select_profile",
+]
@@ -0,0 +1,313 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/core/appliance.py
+"""
+libguestfs appliance tuning: how a GuestSession's appliance is launched.
+
+Left alone, every launch uses the libguestfs defaults: a supermin appliance
+(re)checked at launch, ~1.2 GiB of memory, one vCPU, qemu's default cache
+mode. An ApplianceProfile picks those per workload:
+
+- inspect: detection only (inspect_os, a few reads); smallest appliance
+- fix: fstab/grub/network edits and initramfs regen (dracut wants memory)
+- repair: filesystem repair (xfs_repair scales with filesystem metadata),
+  sized from host RAM
+
+and always disables appliance networking. Memory is capped at half of
+host RAM shared by the appliances that may run at once: callers that run
+fixers in parallel (the daemon workers, parallel disk processing) declare
+that with reserve_appliance_slots() / concurrent_appliances(). Throwaway images (the qcow2
+overlays the convert step discards) are attached with cachemode=unsafe:
+qemu skips guest flushes, and the clean appliance shutdown before convert
+still writes everything out.
+
+A fixed appliance (libguestfs-make-fixed-appliance) skips the supermin
+build/check on every launch. The daemon builds one at startup
+(build_fixed_appliance) and registers it with set_default_appliance_dir();
+HYPER2KVM_GUESTFS_APPLIANCE points one-shot runs at an existing one.
+
+Environment overrides: HYPER2KVM_GUESTFS_MEMSIZE / VMDK2KVM_GUESTFS_MEMSIZE
+(MiB; LIBGUESTFS_MEMSIZE is honoured by libguestfs itself and left alone),
+HYPER2KVM_GUESTFS_SMP.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+APPLIANCE_DIR_ENV = "HYPER2KVM_GUESTFS_APPLIANCE"
+_MEMSIZE_ENVS = ("HYPER2KVM_GUESTFS_MEMSIZE", "VMDK2KVM_GUESTFS_MEMSIZE")
+_SMP_ENV = "HYPER2KVM_GUESTFS_SMP"
+
+# workload -> (memsize MiB, smp); repair memory is sized from the host below
+WORKLOADS: Dict[str, tuple] = {
+    "inspect": (768, 1),
+    "fix": (1536, 2),
+    "repair": (2048, 4),
+}
+
+_FIXED_APPLIANCE_FILES = ("kernel", "initrd", "root", "README.fixed")
+_STAMP = ".hyper2kvm-stamp.json"
+
+_default_dir: Optional[Path] = None
+_default_dir_lock = threading.Lock()
+
+# extra appliances that may run alongside this one (see reserve_appliance_slots)
+_extra_slots = 0
+_slots_lock = threading.Lock()
+
+
+def host_memory_mib() -> Optional[int]:
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024))
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def reserve_appliance_slots(n: int) -> int:
+    """
+    Declare that up to n appliances may now run at once; returns a token for release_appliance_slots().
+
+    Reservations add up, so n daemon workers that each process disks in
+    parallel with m workers end up at n * m.
+    """
+    global _extra_slots
+    extra = max(1, int(n)) - 1
+    with _slots_lock:
+        _extra_slots += extra
+    return extra
+
+
+def release_appliance_slots(token: int) -> None:
+    global _extra_slots
+    with _slots_lock:
+        _extra_slots = max(0, _extra_slots - token)
+
+
+@contextmanager
+def concurrent_appliances(n: int) -> Iterator[None]:
+    token = reserve_appliance_slots(n)
+    try:
+        yield
+    finally:
+        release_appliance_slots(token)
+
+
+def appliance_concurrency() -> int:
+    """How many appliances may run at once in this process (1 unless reserved)."""
+    with _slots_lock:
+        return 1 + _extra_slots
+
+
+def _env_int(*names: str) -> Optional[int]:
+    for name in names:
+        try:
+            v = int(os.environ.get(name, "") or "0")
+        except ValueError:
+            continue
+        if v > 0:
+            return v
+    return None
+
+
+@dataclass(frozen=True)
+class ApplianceProfile:
+    workload: str = "fix"
+    memsize_mib: Optional[int] = None
+    smp: Optional[int] = None
+    network: bool = False
+    throwaway: bool = False
+    appliance_dir: Optional[str] = None
+
+    @classmethod
+    def for_workload(
+        cls,
+        workload: str = "fix",
+        *,
+        throwaway: bool = False,
+        appliance_dir: Optional[Path] = None,
+    ) -> "ApplianceProfile":
+        """Size an appliance for workload on this host (env overrides win)."""
+        memsize, smp = WORKLOADS.get(workload, WORKLOADS["fix"])
+        host_mib = host_memory_mib()
+        if workload == "repair" and host_mib:
+            memsize = max(memsize, min(host_mib // 4, 8192))
+        if host_mib:
+            # all concurrent appliances together stay within half the host, whatever the workload
+            memsize = max(512, min(memsize, host_mib // 2 // appliance_concurrency()))
+        smp = max(1, min(smp, os.cpu_count() or 1))
+
+        if "LIBGUESTFS_MEMSIZE" in os.environ:
+            memsize = None  # libguestfs applies it at handle creation
+        memsize = _env_int(*_MEMSIZE_ENVS) or memsize
+        smp = _env_int(_SMP_ENV) or smp
+
+        fixed = appliance_dir or default_appliance_dir()
+        return cls(
+            workload=workload,
+            memsize_mib=memsize,
+            smp=smp,
+            throwaway=bool(throwaway),
+            appliance_dir=str(fixed) if fixed else None,
+        )
+
+    def covers(self, other: "ApplianceProfile") -> bool:
+        """True if an appliance launched with self can serve a consumer asking for other."""
+        return (self.memsize_mib or 0) >= (other.memsize_mib or 0) and (self.smp or 0) >= (other.smp or 0)
+
+    def merged(self, other: "ApplianceProfile") -> "ApplianceProfile":
+        """The larger of both resources (for relaunching an appliance that is too small)."""
+        bigger = other if (other.memsize_mib or 0) > (self.memsize_mib or 0) else self
+        return replace(
+            self,
+            workload=bigger.workload,
+            memsize_mib=max(self.memsize_mib or 0, other.memsize_mib or 0) or None,
+            smp=max(self.smp or 0, other.smp or 0) or None,
+        )
+
+    def configure(self, g: Any, logger: Optional[logging.Logger] = None) -> None:
+        """Apply the profile to a handle before launch (each knob best-effort)."""
+        log = logger or logging.getLogger(__name__)
+        knobs = [("set_network", self.network)]
+        if self.memsize_mib:
+            knobs.append(("set_memsize", self.memsize_mib))
+        if self.smp:
+            knobs.append(("set_smp", self.smp))
+        if self.appliance_dir and is_fixed_appliance(Path(self.appliance_dir)):
+            knobs.append(("set_path", self.appliance_dir))
+        for name, value in knobs:
+            try:
+                getattr(g, name)(value)
+            except Exception as e:
+                log.debug("appliance: %s(%r) failed: %s", name, value, e)
+
+    def drive_opts(self, *, readonly: bool) -> Dict[str, Any]:
+        """add_drive_opts() keyword arguments for an image under this profile."""
+        opts: Dict[str, Any] = {"readonly": bool(readonly)}
+        if self.throwaway:
+            opts["cachemode"] = "unsafe"
+        return opts
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def is_fixed_appliance(path: Path) -> bool:
+    return all((path / name).exists() for name in _FIXED_APPLIANCE_FILES)
+
+
+def _libguestfs_version() -> Optional[str]:
+    try:
+        import guestfs  # type: ignore
+
+        g = guestfs.GuestFS(python_return_dict=True)
+        try:
+            v = g.version()
+        finally:
+            g.close()
+        return "{major}.{minor}.{release}{extra}".format(**v)
+    except Exception:
+        return None
+
+
+def appliance_stamp(tool: Optional[str]) -> Dict[str, Any]:
+    """What a fixed appliance was built from: a change in any of these means rebuild."""
+    try:
+        tool_mtime: Optional[float] = os.stat(tool).st_mtime if tool else None
+    except OSError:
+        tool_mtime = None
+    return {
+        "libguestfs": _libguestfs_version(),
+        "tool": tool,
+        "tool_mtime": tool_mtime,
+        "kernel": os.uname().release,
+    }
+
+
+def _read_stamp(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((path / _STAMP).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def set_default_appliance_dir(path: Optional[Path]) -> None:
+    """Use the fixed appliance at path for every later launch in this process (None to stop)."""
+    global _default_dir
+    with _default_dir_lock:
+        _default_dir = Path(path) if path else None
+
+
+def default_appliance_dir() -> Optional[Path]:
+    with _default_dir_lock:
+        if _default_dir is not None:
+            return _default_dir
+    env = os.environ.get(APPLIANCE_DIR_ENV)
+    return Path(env).expanduser() if env else None
+
+
+def build_fixed_appliance(dest: Path, logger: logging.Logger, *, timeout: int = 900) -> Optional[Path]:
+    """
+    Build (or reuse) a fixed appliance in dest; None if it can't be built.
+
+    An existing appliance is reused only if its stamp (libguestfs version,
+    build tool mtime, host kernel) still matches; otherwise it is rebuilt.
+    Builds into a sibling temp dir and renames, so a half-written appliance is never used.
+    """
+    dest = Path(dest).expanduser().resolve()
+    tool = shutil.which("libguestfs-make-fixed-appliance")
+    stamp = appliance_stamp(tool)
+    if is_fixed_appliance(dest):
+        if _read_stamp(dest) == stamp:
+            logger.info(f"Using fixed libguestfs appliance: {dest}")
+            return dest
+        logger.info(f"Fixed libguestfs appliance in {dest} is stale (libguestfs, tool or kernel changed)")
+
+    if not tool:
+        logger.warning("libguestfs-make-fixed-appliance not found; appliances are built per launch")
+        return None
+
+    tmp = dest.with_name(dest.name + ".building")
+    shutil.rmtree(tmp, ignore_errors=True)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Building fixed libguestfs appliance in {dest} ...")
+    try:
+        subprocess.run([tool, str(tmp)], check=True, capture_output=True, text=True, timeout=timeout)
+        if not is_fixed_appliance(tmp):
+            raise RuntimeError(f"{tool} produced an incomplete appliance")
+        (tmp / _STAMP).write_text(json.dumps(stamp, sort_keys=True), encoding="utf-8")
+        shutil.rmtree(dest, ignore_errors=True)
+        tmp.rename(dest)
+    except (subprocess.SubprocessError, OSError, RuntimeError) as e:
+        err = getattr(e, "stderr", None) or str(e)
+        logger.warning(f"Fixed appliance build failed, appliances are built per launch: {err}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        return None
+    logger.info(f"Fixed libguestfs appliance ready: {dest}")
+    return dest
+
+
+__all__ = [
+    "APPLIANCE_DIR_ENV",
+    "ApplianceProfile",
+    "WORKLOADS",
+    "appliance_stamp",
+    "appliance_concurrency",
+    "build_fixed_appliance",
+    "concurrent_appliances",
+    "default_appliance_dir",
+    "host_memory_mib",
+    "is_fixed_appliance",
+    "release_appliance_slots",
+    "reserve_appliance_slots",
+    "set_default_appliance_dir",
+]
@@ -5,16 +5,28 @@
 Atomic file operation utilities.
 
 Provides utilities for safe file operations including atomic writes with
-temporary files and automatic cleanup.
+temporary files and automatic cleanup, plus a sparse-aware fast copy
+(reflink / copy_file_range / SEEK_DATA extent copy) for disk images.
 """
 
 from __future__ import annotations
 
+import errno
 import os
 import tempfile
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator, Optional
+from typing import Callable, Generator, Iterator, Optional, Tuple
+
+from .sparse import ZERO_BLOCK_SIZE, pwrite_data
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE = 0x40049409
 
 
 @contextmanager
@@ -113,3 +125,125 @@ def ensure_parent_dir(path: Path) -> None:
         # Creates /output/subdir/ if it doesn't exist
     """
     Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+
+def data_extents(fd: int, size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (start, end) data extents of fd via SEEK_DATA/SEEK_HOLE.
+
+    Filesystems (or platforms) without hole reporting yield one extent
+    covering the whole file.
+    """
+    seek_data = getattr(os, "SEEK_DATA", None)
+    seek_hole = getattr(os, "SEEK_HOLE", None)
+    if seek_data is None or seek_hole is None:
+        if size:
+            yield 0, size
+        return
+
+    pos = 0
+    while pos < size:
+        try:
+            start = os.lseek(fd, pos, seek_data)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # no data past pos: trailing hole
+                return
+            if pos == 0:
+                yield 0, size
+                return
+            raise
+        end = min(os.lseek(fd, start, seek_hole), size)
+        if end <= start:
+            return
+        yield start, end
+        pos = end
+
+
+def fast_copy(
+    src: Path,
+    dst: Path,
+    *,
+    length: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    chunk_size: int = 64 * 1024 * 1024,
+) -> str:
+    """
+    Copy the first `length` bytes of src (whole file if None) to dst without
+    inflating holes, offloading the data movement to the kernel where possible.
+
+    Tries the cheapest mechanism first:
+      reflink          FICLONE ioctl (btrfs, XFS with reflink=1, ...) - whole file only, O(1)
+      copy_file_range  in-kernel copy of each data extent; extent sharing where the FS supports it
+      copy             userspace pread/pwrite of each data extent, all-zero blocks left as holes
+
+    Data extents come from SEEK_DATA/SEEK_HOLE, so holes in src are never read
+    or written. dst is created/truncated to the copied length.
+
+    progress(n) is called as bytes are handled (skipped holes included), so the
+    calls always sum to the copied length. Returns the mechanism that was used.
+
+    Example:
+        method = fast_copy(Path("disk-flat.vmdk"), Path("work.raw"), progress=bar.advance)
+    """
+    src = Path(src)
+    dst = Path(dst)
+    advance = progress or (lambda _n: None)
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        sfd, dfd = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(sfd).st_size
+        length = size if length is None else min(int(length), size)
+
+        if length == size and fcntl is not None:
+            try:
+                fcntl.ioctl(dfd, _FICLONE, sfd)
+                advance(length)
+                return "reflink"
+            except OSError:
+                pass
+
+        os.ftruncate(dfd, length)
+        method = "copy_file_range" if hasattr(os, "copy_file_range") else "copy"
+        chunk = max(ZERO_BLOCK_SIZE, int(chunk_size))
+        pos = 0
+        for start, end in data_extents(sfd, length):
+            if start > pos:
+                advance(start - pos)
+            off = start
+            while off < end:
+                n = min(chunk, end - off)
+                done = 0
+                if method == "copy_file_range":
+                    try:
+                        done = os.copy_file_range(sfd, dfd, n, off, off)
+                    except OSError:
+                        # EXDEV / ENOSYS / EINVAL on older kernels or odd filesystems
+                        done = 0
+                    if done == 0:
+                        method = "copy"
+                        continue
+                else:
+                    buf = os.pread(sfd, n, off)
+                    if not buf:
+                        raise OSError(errno.EIO, f"short read from {src} at offset {off}")
+                    pwrite_data(dfd, buf, off)
+                    done = len(buf)
+                off += done
+                advance(done)
+            pos = end
+        if pos < length:
+            advance(length - pos)
+        return method
+
+
+def clone_file_prefix(src: Path, dst: Path, length: Optional[int] = None) -> str:
+    """
+    Make dst a copy of the first `length` bytes of src (whole file if None).
+
+    Thin wrapper over fast_copy() kept for the download resume path.
+    Returns the name of the mechanism that was used.
+
+    Example:
+        method = clone_file_prefix(Path("disk.raw"), Path("disk.raw.part"), 4 << 30)
+    """
+    return fast_copy(src, dst, length=length)
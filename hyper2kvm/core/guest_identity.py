@@ -11,6 +11,7 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import guestfs  # type: ignore
 
+from .guest_session import GuestSession
 from .utils import U
 
 # Canonical Windows detection from your repo (fixers/windows/virtio/core.py)
@@ -150,7 +151,7 @@ class GuestDetector:
         try:
             if not g.is_file(path):
                 return None
-            content = g.read_file(path) or ""
+            content = U.to_text(g.read_file(path))
             lines = content.splitlines()
             return lines[0].strip() if lines else None
         except Exception:
@@ -401,7 +402,7 @@ class GuestDetector:
         for p in ("/etc/os-release", "/usr/lib/os-release"):
             try:
                 if g.is_file(p):
-                    osr_raw = g.read_file(p) or ""
+                    osr_raw = U.to_text(g.read_file(p))
                     break
             except Exception:
                 continue
@@ -427,7 +428,7 @@ class GuestDetector:
         # issue fallback
         try:
             if g.is_file("/etc/issue") and not ident.os_pretty_name:
-                issue = g.read_file("/etc/issue") or ""
+                issue = U.to_text(g.read_file("/etc/issue"))
                 txt = cls.parse_issue_file(issue)
                 if txt:
                     ident.os_pretty_name = txt
@@ -493,11 +494,12 @@ class GuestDetector:
     # Root selection + main detect()
 
     @classmethod
-    def best_root(cls, g: guestfs.GuestFS) -> Optional[str]:
-        try:
-            roots = g.inspect_os()
-        except Exception:
-            return None
+    def best_root(cls, g: guestfs.GuestFS, roots: Optional[List[str]] = None) -> Optional[str]:
+        if roots is None:
+            try:
+                roots = g.inspect_os()
+            except Exception:
+                return None
         if not roots:
             return None
         # Prefer a Windows root if present
@@ -511,31 +513,24 @@ class GuestDetector:
         return roots[0]
 
     @classmethod
-    def detect(cls, img_path: Path, logger, readonly: bool = True) -> Optional[GuestIdentity]:
+    def identify(cls, g: guestfs.GuestFS, logger, roots: Optional[List[str]] = None) -> Optional[GuestIdentity]:
         """
-        Open guestfs read-only and detect guest OS + identity.
+        Detect guest OS + identity on an already launched handle.
 
-        Returns GuestIdentity or None if no OS roots.
+        roots: inspect_os() result if the caller already has it.
+        Returns GuestIdentity or None if no OS roots. Leaves the handle unmounted.
         """
-        g: Optional[guestfs.GuestFS] = None
-        try:
-            g = guestfs.GuestFS(python_return_dict=True)
-            g.add_drive_opts(str(img_path), readonly=bool(readonly))
-            g.launch()
-
+        if roots is None:
             try:
                 roots = g.inspect_os()
             except Exception:
                 roots = []
 
-            if not roots:
-                try:
-                    logger.debug("GuestDetector: no inspectable OS roots found in image=%s", img_path)
-                except Exception:
-                    pass
-                return None
+        if not roots:
+            return None
 
-            root = cls.best_root(g) or roots[0]
+        try:
+            root = cls.best_root(g, roots) or roots[0]
 
             # ---- CRITICAL FIX ----
             # Mount early so indicator detection (and other path-based checks) operate on real FS paths.
@@ -613,13 +608,45 @@ class GuestDetector:
             if identity.hostname or identity.os_name or identity.os_pretty_name:
                 identity.confidence = min(identity.confidence + 0.10, 1.0)
 
+            return identity
+        finally:
             # Best-effort cleanup
             try:
                 g.umount_all()
             except Exception:
                 pass
 
-            return identity
+    @classmethod
+    def detect(
+        cls, img_path: Path, logger, readonly: bool = True, session: Optional[GuestSession] = None
+    ) -> Optional[GuestIdentity]:
+        """
+        Detect guest OS + identity of img_path.
+
+        With a GuestSession the result is cached on it and its running appliance
+        is reused. If nothing is running, an appliance is launched read-only
+        for the detection and released again (the identity stays cached), so
+        it does not hold image locks until exit. Without a session a private
+        read-only appliance is launched and shut down again.
+
+        Returns GuestIdentity or None if no OS roots.
+        """
+        own = session is None
+        s = session if session is not None else GuestSession([img_path], logger)
+        if s.identity is not None:
+            return s.identity
+        launched_here = not s.launched
+        try:
+            s.handle(readonly=readonly)
+            roots = s.roots()
+            if not roots:
+                try:
+                    logger.debug("GuestDetector: no inspectable OS roots found in image=%s", img_path)
+                except Exception:
+                    pass
+                return None
+            s.identity = cls.identify(s.handle(readonly=readonly), logger, roots=roots)
+            return s.identity
 
         except Exception as e:
             try:
@@ -628,15 +655,8 @@ class GuestDetector:
                 pass
             return None
         finally:
-            if g is not None:
-                try:
-                    g.shutdown()
-                except Exception:
-                    pass
-                try:
-                    g.close()
-                except Exception:
-                    pass
+            if own or launched_here:
+                s.release()
 
 
 def emit_guest_identity_log(logger, identity: GuestIdentity) -> None:
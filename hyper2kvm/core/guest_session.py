@@ -0,0 +1,292 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/core/guest_session.py
+"""
+One libguestfs appliance per image (set), shared by every consumer.
+
+A disk used to boot the appliance once for OfflineFSFix and again for
+GuestDetector when the libvirt domain was emitted, each launch paying
+3-10 s plus a fresh inspect_os(). A GuestSession launches lazily on the
+first handle() and hands the same handle to each later consumer:
+
+- handle(readonly=True) reuses whatever is running (a read-write
+  appliance serves read-only consumers too)
+- handle(readonly=False) on a read-only appliance relaunches it
+  read-write (upgrade); there is no downgrade
+- roots() caches inspect_os() for the current launch; inspection state
+  lives in the appliance, so a relaunch re-inspects
+- identity caches the GuestDetector result across launches
+
+release() shuts the appliance down but keeps the cached identity, so the
+image can be handed to qemu-img (which takes image locks) and later
+consumers still skip a launch. rebase() moves a session onto a converted
+copy of the same guest (e.g. the qcow2 written from the fixed image).
+
+Launches follow an ApplianceProfile (memsize/smp/network, fixed appliance,
+cachemode=unsafe for throwaway images); a consumer passing a larger
+profile to handle() relaunches the appliance, like the read-write upgrade.
+Boot latency of every launch is kept in boot_seconds.
+
+The process-wide registry (default_registry()) maps resolved image paths
+to sessions; close_all() runs at exit.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import guestfs  # type: ignore
+
+from .appliance import ApplianceProfile
+from .utils import U
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .guest_identity import GuestIdentity
+
+SessionKey = Tuple[str, ...]
+
+
+def _session_key(images: Sequence[Path]) -> SessionKey:
+    return tuple(str(Path(p).expanduser().resolve()) for p in images)
+
+
+class GuestSession:
+    def __init__(
+        self,
+        images: Sequence[Path],
+        logger: Optional[logging.Logger] = None,
+        *,
+        trace: bool = False,
+        profile: Optional[ApplianceProfile] = None,
+        throwaway: bool = False,
+    ):
+        if not images:
+            raise ValueError("GuestSession needs at least one image")
+        self.images: List[Path] = [Path(p).expanduser().resolve() for p in images]
+        self.logger = logger or logging.getLogger(__name__)
+        self.trace = bool(trace)
+        self.identity: Optional["GuestIdentity"] = None
+        self.launches = 0
+        # images the pipeline discards after convert (overlays): attached with cachemode=unsafe
+        self.throwaway = bool(throwaway)
+        self.profile = profile or ApplianceProfile.for_workload("inspect")
+        self.boot_seconds: List[float] = []
+        self._g: Optional[guestfs.GuestFS] = None
+        self._readonly = True
+        self._roots: Optional[List[str]] = None
+        self._lock = threading.RLock()
+
+    @property
+    def key(self) -> SessionKey:
+        return _session_key(self.images)
+
+    @property
+    def launched(self) -> bool:
+        return self._g is not None
+
+    @property
+    def readonly(self) -> bool:
+        return self._readonly
+
+    def handle(self, *, readonly: bool = True, profile: Optional[ApplianceProfile] = None) -> guestfs.GuestFS:
+        """
+        Return the launched appliance, launching or upgrading it as needed.
+
+        Upgrades (relaunches) to read-write, or to a profile with more memory/vCPUs.
+        """
+        with self._lock:
+            big_enough = profile is None or self.profile.covers(profile)
+            if self._g is not None and (readonly or not self._readonly) and big_enough:
+                return self._g
+            if profile is not None and not big_enough:
+                self.profile = self.profile.merged(profile)
+            if self._g is not None:
+                self.logger.debug("guestfs session: relaunching %s (read-write or larger appliance)", self._label())
+                readonly = readonly and self._readonly
+                self._shutdown()
+            self._g = self._launch(readonly=readonly)
+            self._readonly = bool(readonly)
+            return self._g
+
+    def _launch(self, *, readonly: bool) -> guestfs.GuestFS:
+        profile = replace(self.profile, throwaway=self.throwaway)
+        g = guestfs.GuestFS(python_return_dict=True)
+        if self.trace:
+            try:
+                g.set_trace(1)
+            except Exception:
+                pass
+        profile.configure(g, self.logger)
+        try:
+            for img in self.images:
+                try:
+                    g.add_drive_opts(str(img), **profile.drive_opts(readonly=readonly))
+                except TypeError:
+                    # bindings without the cachemode optarg
+                    g.add_drive_opts(str(img), readonly=bool(readonly))
+            t0 = time.monotonic()
+            g.launch()
+            self.boot_seconds.append(round(time.monotonic() - t0, 3))
+        except Exception:
+            try:
+                g.close()
+            except Exception:
+                pass
+            raise
+        self.launches += 1
+        self.logger.debug(
+            "guestfs session: launched %s (%s, %s, launch #%d) in %.2fs",
+            self._label(),
+            "ro" if readonly else "rw",
+            profile.workload,
+            self.launches,
+            self.boot_seconds[-1],
+        )
+        return g
+
+    def appliance_report(self) -> Dict[str, Any]:
+        """Profile and boot latency of this session's launches (for fixer reports)."""
+        return {
+            "profile": replace(self.profile, throwaway=self.throwaway).as_dict(),
+            "launches": self.launches,
+            "boot_s": list(self.boot_seconds),
+        }
+
+    def roots(self, *, refresh: bool = False) -> List[str]:
+        """
+        inspect_os() of the current launch (launches read-only if nothing is running).
+
+        refresh=True re-inspects, e.g. after LUKS/LVM/mdraid activation made new roots visible.
+        """
+        with self._lock:
+            g = self.handle(readonly=True)
+            if self._roots is None or refresh:
+                try:
+                    self._roots = [U.to_text(r) for r in (g.inspect_os() or [])]
+                except Exception:
+                    self._roots = []
+            return list(self._roots)
+
+    def reset_mounts(self) -> None:
+        """Unmount everything so the next consumer starts from a clean tree."""
+        with self._lock:
+            if self._g is None:
+                return
+            try:
+                self._g.umount_all()
+            except Exception:
+                pass
+
+    def release(self) -> None:
+        """Shut the appliance down (flushing writes); cached identity survives."""
+        with self._lock:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        g, self._g = self._g, None
+        self._roots = None
+        self._readonly = True
+        if g is None:
+            return
+        try:
+            g.umount_all()
+        except Exception:
+            pass
+        try:
+            g.shutdown()
+        except Exception:
+            pass
+        try:
+            g.close()
+        except Exception:
+            pass
+
+    def rebase(self, images: Sequence[Path]) -> None:
+        """Point the session at a converted copy of the same guest, keeping the cached identity."""
+        with self._lock:
+            self._shutdown()
+            self.images = [Path(p).expanduser().resolve() for p in images]
+            # converted outputs are kept: back to safe caching
+            self.throwaway = False
+
+    def _label(self) -> str:
+        return ", ".join(p.name for p in self.images)
+
+    def __enter__(self) -> "GuestSession":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.release()
+
+
+class GuestSessionRegistry:
+    """Sessions keyed by resolved image paths, shared across the pipeline stages of a run."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._sessions: Dict[SessionKey, GuestSession] = {}
+
+    def session(self, images: Sequence[Path], logger: Optional[logging.Logger] = None, **kwargs: Any) -> GuestSession:
+        """Return the session for images, creating it on first use."""
+        key = _session_key(images)
+        with self._lock:
+            s = self._sessions.get(key)
+            if s is None:
+                s = GuestSession(images, logger or self.logger, **kwargs)
+                self._sessions[key] = s
+            return s
+
+    def lookup(self, images: Sequence[Path]) -> Optional[GuestSession]:
+        with self._lock:
+            return self._sessions.get(_session_key(images))
+
+    def rebase(self, old: Sequence[Path], new: Sequence[Path]) -> Optional[GuestSession]:
+        """Move the session registered for old onto new (see GuestSession.rebase)."""
+        with self._lock:
+            s = self._sessions.pop(_session_key(old), None)
+            if s is None:
+                return None
+            s.rebase(new)
+            prev = self._sessions.get(s.key)
+            self._sessions[s.key] = s
+        if prev is not None and prev is not s:
+            prev.release()
+        return s
+
+    def discard(self, images: Sequence[Path]) -> None:
+        with self._lock:
+            s = self._sessions.pop(_session_key(images), None)
+        if s is not None:
+            s.release()
+
+    def close_all(self) -> None:
+        """Shut down every appliance and forget all sessions. Safe to call repeatedly."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for s in sessions:
+            s.release()
+
+
+_registry: Optional[GuestSessionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def default_registry() -> GuestSessionRegistry:
+    """The process-wide registry shared by detection, fixing and domain emission (created on first use)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GuestSessionRegistry()
+            atexit.register(_registry.close_all)
+        return _registry
+
+
+__all__ = ["GuestSession", "GuestSessionRegistry", "default_registry"]
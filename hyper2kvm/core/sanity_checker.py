@@ -391,6 +391,36 @@ class SanityChecker:
 
         return total, unknown, missing
 
+    _MAPPABLE_SUFFIXES = (".vmdk", ".qcow2", ".raw", ".img", ".vhd", ".vhdx", ".vdi")
+
+    def _alloc_adjusted_bytes(self, paths: Sequence[Path], known_bytes: int) -> int:
+        """
+        Replace file sizes of disk images with their qemu-img map predicted write
+        size (data + qcow2 metadata). Thin images count what convert will write,
+        not their virtual/apparent size; VMDK descriptors count their extents.
+        """
+        try:
+            from ..converters.qemu.alloc_map import plan_allocation
+        except Exception:
+            return known_bytes
+
+        out_format = str(getattr(self.args, "out_format", None) or "qcow2")
+        adjusted = known_bytes
+        mapped = 0
+        for p in paths:
+            pp = p.expanduser()
+            if pp.suffix.lower() not in self._MAPPABLE_SUFFIXES or not pp.is_file():
+                continue
+            plan = plan_allocation(self.logger, pp)
+            if plan is None:
+                continue
+            adjusted += plan.predicted_write_bytes(out_format) - pp.stat().st_size
+            mapped += 1
+
+        if mapped:
+            self.report.notes["disk_input_mapped"] = f"{mapped} image(s), predicted write {self._bytes(max(0, adjusted))}"
+        return max(0, adjusted)
+
     def check_disk_space(self) -> None:
         self.report.checks_ran.append("disk")
 
@@ -410,6 +440,7 @@ class SanityChecker:
 
             inputs = list(dict.fromkeys([p.expanduser() for p in self._iter_input_paths()]))
             known_bytes, unknown, missing_inputs = self._sum_existing_sizes(inputs)
+            known_bytes = self._alloc_adjusted_bytes(inputs, known_bytes)
 
             # more paranoid disk model + dynamic slack for large inputs
             factor_out = 1.10
@@ -0,0 +1,194 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/core/sparse.py
+"""
+Sparse file helpers.
+
+Zero-block detection for write paths that should leave holes instead of
+writing dense zeros, and best-effort hole punching (fallocate PUNCH_HOLE)
+for files that already contain zero runs.
+
+Zero detection works on bytes/bytearray buffers and compares each block
+against a preallocated zero block with bytearray.startswith(), which is a
+memcmp in C and does not copy the slice.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+from typing import List, Optional, Tuple, Union
+
+ZERO_BLOCK_SIZE = 64 * 1024
+
+_ZERO_BLOCK = bytes(ZERO_BLOCK_SIZE)
+
+# linux/falloc.h
+_FALLOC_FL_KEEP_SIZE = 0x01
+_FALLOC_FL_PUNCH_HOLE = 0x02
+
+Buffer = Union[bytes, bytearray]
+
+_libc: Optional[ctypes.CDLL] = None
+_punch_supported = True
+
+
+def _zero_block(block_size: int) -> bytes:
+    return _ZERO_BLOCK if block_size == ZERO_BLOCK_SIZE else bytes(block_size)
+
+
+def is_zero(buf: Buffer, start: int = 0, end: Optional[int] = None) -> bool:
+    """True if buf[start:end] is all zero bytes (empty ranges count as zero)."""
+    end = len(buf) if end is None else min(int(end), len(buf))
+    pos = int(start)
+    while pos < end:
+        n = min(ZERO_BLOCK_SIZE, end - pos)
+        if not buf.startswith(_ZERO_BLOCK if n == ZERO_BLOCK_SIZE else _ZERO_BLOCK[:n], pos):
+            return False
+        pos += n
+    return True
+
+
+def data_runs(
+    buf: Buffer,
+    start: int = 0,
+    end: Optional[int] = None,
+    *,
+    block_size: int = ZERO_BLOCK_SIZE,
+) -> List[Tuple[int, int]]:
+    """
+    Split buf[start:end] into non-zero runs at block_size granularity.
+
+    Returns coalesced (offset, length) pairs relative to the start of buf.
+    Blocks that are entirely zero are omitted; a block with any non-zero
+    byte is kept whole. An all-zero buffer returns [].
+    """
+    bs = max(1, int(block_size))
+    zero = _zero_block(bs)
+    end = len(buf) if end is None else min(int(end), len(buf))
+
+    runs: List[Tuple[int, int]] = []
+    run_start = -1
+    pos = int(start)
+    while pos < end:
+        n = min(bs, end - pos)
+        if buf.startswith(zero if n == bs else zero[:n], pos):
+            if run_start >= 0:
+                runs.append((run_start, pos - run_start))
+                run_start = -1
+        elif run_start < 0:
+            run_start = pos
+        pos += n
+    if run_start >= 0:
+        runs.append((run_start, end - run_start))
+    return runs
+
+
+def _get_libc() -> Optional[ctypes.CDLL]:
+    global _libc
+    if _libc is None:
+        try:
+            lib = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+            lib.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+            lib.fallocate.restype = ctypes.c_int
+            _libc = lib
+        except (OSError, AttributeError):
+            return None
+    return _libc
+
+
+def punch_hole(fd: int, offset: int, length: int) -> bool:
+    """
+    Deallocate [offset, offset+length) without changing the file size.
+
+    Returns False (and stops trying for the rest of the process) when the
+    platform or filesystem does not support PUNCH_HOLE. Other errors raise OSError.
+    """
+    global _punch_supported
+    if length <= 0:
+        return True
+    if not _punch_supported:
+        return False
+
+    libc = _get_libc()
+    if libc is None:
+        _punch_supported = False
+        return False
+
+    rc = libc.fallocate(
+        int(fd),
+        _FALLOC_FL_PUNCH_HOLE | _FALLOC_FL_KEEP_SIZE,
+        int(offset),
+        int(length),
+    )
+    if rc == 0:
+        return True
+
+    err = ctypes.get_errno()
+    if err in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+        _punch_supported = False
+        return False
+    raise OSError(err, os.strerror(err))
+
+
+def pwrite_data(fd: int, buf: Buffer, offset: int, nbytes: Optional[int] = None) -> int:
+    """
+    pwrite buf[:nbytes] at offset, skipping all-zero blocks (they stay holes
+    in a file that was truncated/preallocated sparse). Returns bytes written.
+    """
+    end = len(buf) if nbytes is None else min(int(nbytes), len(buf))
+    mv = memoryview(buf)
+    written = 0
+    for off, length in data_runs(buf, 0, end):
+        os.pwrite(fd, mv[off : off + length], offset + off)
+        written += length
+    return written
+
+
+def punch_zero_blocks(
+    fd: int,
+    start: int,
+    end: int,
+    *,
+    block_size: int = ZERO_BLOCK_SIZE,
+    read_size: int = 16 * 1024 * 1024,
+) -> int:
+    """
+    Scan fd over [start, end) and punch holes over block-aligned zero runs.
+
+    Used on resume to re-sparsify a partial file written by a dense writer.
+    Returns the number of bytes punched (0 if unsupported).
+    """
+    bs = max(1, int(block_size))
+    rs = max(bs, (int(read_size) // bs) * bs)
+    punched = 0
+    pos = int(start)
+    while pos < end:
+        chunk = os.pread(fd, min(rs, end - pos), pos)
+        if not chunk:
+            break
+        cursor = 0
+        for off, length in data_runs(chunk, block_size=bs):
+            if off > cursor:
+                if not punch_hole(fd, pos + cursor, off - cursor):
+                    return punched
+                punched += off - cursor
+            cursor = off + length
+        if cursor < len(chunk):
+            if not punch_hole(fd, pos + cursor, len(chunk) - cursor):
+                return punched
+            punched += len(chunk) - cursor
+        pos += len(chunk)
+    return punched
+
+
+__all__ = [
+    "ZERO_BLOCK_SIZE",
+    "is_zero",
+    "data_runs",
+    "pwrite_data",
+    "punch_hole",
+    "punch_zero_blocks",
+]
@@ -286,8 +286,10 @@ def guest_has_cmd(g: "guestfs.GuestFS", cmd: str) -> bool:
     Uses a shell inside the appliance in a way that avoids injection.
     """
     try:
+        # A cached view of the guest (GuestVFS) keeps its cache for read-only probes.
+        run = getattr(g, "query_command", None) or g.command
         # Pass cmd as $1 so it isn't interpolated into the shell string.
-        out = g.command([
+        out = run([
             "sh", "-lc",
             'command -v "$1" >/dev/null 2>&1 && echo YES || echo NO',
             "sh", cmd,
@@ -303,8 +305,14 @@ def guest_ls_glob(g: "guestfs.GuestFS", pattern: str) -> List[str]:
     Uses shell glob expansion but passes pattern as an argument to avoid injection.
 
     NOTE: Still depends on shell glob semantics; returns matches that exist.
+    A cached view of the guest (GuestVFS.vfs_glob) answers without a shell when it can.
     """
     try:
+        cached = getattr(g, "vfs_glob", None)
+        if cached is not None:
+            hit = cached(pattern)
+            if hit is not None:
+                return hit
         # We want glob expansion, but we don't want pattern injection.
         # So: eval "set -- $pat" where $pat is *data*.
         # Then print each resolved path safely.
@@ -30,12 +30,18 @@ from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 from queue import Queue, Empty
-from threading import Event, Lock
+from threading import Event, Lock, Thread
 from typing import Optional, Set, Dict, Any
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 
+from ..core.appliance import (
+    build_fixed_appliance,
+    release_appliance_slots,
+    reserve_appliance_slots,
+    set_default_appliance_dir,
+)
 from ..core.logger import Log
 from ..core.utils import U
 from .stats import DaemonStatistics
@@ -270,6 +276,7 @@ class DaemonWatcher:
         self.observer: Optional[Observer] = None
         self.handler: Optional[VMFileHandler] = None
         self.executor: Optional[ThreadPoolExecutor] = None
+        self._appliance_slots = 0
 
         # Configuration
         self.max_workers = getattr(args, 'max_concurrent_jobs', 3)
@@ -337,6 +344,26 @@ class DaemonWatcher:
         """Handle stats signal (USR1) - print statistics."""
         self.stats.print_summary()
 
+    def _prewarm_appliance(self) -> Optional[Thread]:
+        """
+        Build (or reuse) a fixed libguestfs appliance so conversions skip the supermin step.
+
+        The build can take minutes: it runs in a background thread, and jobs
+        started before it finishes use the per-launch appliance.
+        """
+        if not getattr(self.args, 'prebuild_appliance', True):
+            return None
+        dest = getattr(self.args, 'guestfs_appliance_dir', None) or (self.output_dir / '.daemon' / 'appliance')
+
+        def _build() -> None:
+            appliance = build_fixed_appliance(Path(dest), self.logger)
+            if appliance is not None:
+                set_default_appliance_dir(appliance)
+
+        t = Thread(target=_build, name='appliance-prewarm', daemon=True)
+        t.start()
+        return t
+
     def _validate_directories(self) -> None:
         """Validate watch and output directories."""
         if not self.watch_dir.exists():
@@ -679,6 +706,8 @@ class DaemonWatcher:
         # Start control API
         self.control.start()
 
+        self._prewarm_appliance()
+
         # Setup file system observer
         self.handler = VMFileHandler(
             self.logger,
@@ -696,7 +725,8 @@ class DaemonWatcher:
         # Scan for existing files
         self._scan_existing_files()
 
-        # Start worker pool
+        # Start worker pool (its appliances share the host memory cap)
+        self._appliance_slots = reserve_appliance_slots(self.max_workers)
         self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
         for i in range(self.max_workers):
             self.executor.submit(self._worker_loop)
@@ -749,6 +779,8 @@ class DaemonWatcher:
         # Stop executor
         if self.executor:
             self.executor.shutdown(wait=True, cancel_futures=False)
+            release_appliance_slots(self._appliance_slots)
+            self._appliance_slots = 0
 
         # Stop control API
         self.control.stop()
@@ -31,6 +31,7 @@ import guestfs  # type: ignore
 
 from ...core.utils import U, guest_has_cmd
 from ..filesystem.fstab import Ident, parse_btrfsvol_spec
+from ..filesystem.inventory import device_inventory
 
 
 # tiny helpers
@@ -663,8 +664,8 @@ def _resolve_spec_to_dev(self, g: guestfs.GuestFS, spec: str) -> Optional[str]:
     """
     Convert fstab spec to a /dev/... node (best-effort):
       - /dev/* direct
-      - UUID= / LABEL= via guestfs findfs helpers
-      - PARTUUID= via blkid scan (Ident)
+      - UUID= / LABEL= / PARTUUID= via the device inventory index
+      - UUID= / LABEL= via guestfs findfs helpers for devices the inventory missed
       - /dev/disk/by-* via realpath
       - btrfsvol:... unwrap device
     """
@@ -693,6 +694,11 @@ def _resolve_spec_to_dev(self, g: guestfs.GuestFS, spec: str) -> Optional[str]:
     kind = m.group(1)
     val = m.group(2).strip().strip('"').strip("'")
 
+    # one blkid pass per appliance covers partitions + list_filesystems (the old PARTUUID scan)
+    dev = device_inventory(g).resolve(kind, val)
+    if dev:
+        return dev
+
     try:
         if kind == "UUID" and hasattr(g, "findfs_uuid"):
             dev = U.to_text(g.findfs_uuid(val)).strip()
@@ -703,30 +709,6 @@ def _resolve_spec_to_dev(self, g: guestfs.GuestFS, spec: str) -> Optional[str]:
     except Exception:
         pass
 
-    if kind == "PARTUUID":
-        # brute-force: scan candidates from list_filesystems + partitions, match PARTUUID
-        candidates: List[str] = []
-        try:
-            candidates.extend([U.to_text(p) for p in (g.list_partitions() or [])])
-        except Exception:
-            pass
-        try:
-            fsmap = g.list_filesystems() or {}
-            for d in fsmap.keys():
-                dd = U.to_text(d)
-                if dd.startswith("/dev/"):
-                    candidates.append(dd)
-        except Exception:
-            pass
-
-        for dev in _dedup_keep_order(candidates):
-            try:
-                blk = Ident.g_blkid_map(g, dev)
-                if (blk.get("PARTUUID") or "").strip() == val:
-                    return dev
-            except Exception:
-                continue
-
     return None
 
 
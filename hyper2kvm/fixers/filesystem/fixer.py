@@ -12,6 +12,7 @@ from typing import Any, Dict, List, Optional, Tuple
 import guestfs  # type: ignore
 
 from ...core.utils import U
+from .inventory import device_inventory
 
 
 class FilesystemFixer:
@@ -185,27 +186,11 @@ class FilesystemFixer:
         dev_text = U.to_text(dev)
         self._log(logging.DEBUG, "🔎 vfs detect: probing %s", dev_text)
 
-        # Method 1: guestfs vfs_type()
-        try:
-            if hasattr(g, "vfs_type"):
-                fs_type = U.to_text(g.vfs_type(dev_text)).strip()
-                if fs_type:
-                    self._log(logging.DEBUG, "🧬 vfs_type: %s -> %s", dev_text, fs_type)
-                    return fs_type
-        except Exception as e:
-            self._log(logging.DEBUG, "🫥 vfs_type failed for %s: %s", dev_text, str(e))
-
-        # Method 2: list_filesystems()
-        try:
-            fsmap = g.list_filesystems() or {}
-            for k, v in fsmap.items():
-                if U.to_text(k) == dev_text:
-                    fs_type = U.to_text(v).strip()
-                    if fs_type:
-                        self._log(logging.DEBUG, "🗺️ list_filesystems: %s -> %s", dev_text, fs_type)
-                        return fs_type
-        except Exception as e:
-            self._log(logging.DEBUG, "🫥 list_filesystems failed: %s", str(e))
+        # Methods 1+2: blkid TYPE / vfs_type() / list_filesystems(), via the device inventory
+        fs_type = device_inventory(g).vfs_type(dev_text)
+        if fs_type:
+            self._log(logging.DEBUG, "🧬 vfs_type: %s -> %s", dev_text, fs_type)
+            return fs_type
 
         # Method 3: file -s heuristic
         try:
@@ -768,7 +753,7 @@ def _list_candidate_devices(g: guestfs.GuestFS) -> List[Tuple[str, str]]:
     filtering obvious non-dev paths and obvious non-filesystem entries.
     """
     devices: List[Tuple[str, str]] = []
-    fsmap = g.list_filesystems() or {}
+    fsmap = device_inventory(g).filesystems()
     for dev, fstype in fsmap.items():
         d = U.to_text(dev)
         t = U.to_text(fstype)
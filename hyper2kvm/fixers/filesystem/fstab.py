@@ -9,6 +9,7 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Dict, Optional, Tuple, TYPE_CHECKING
 
+from .inventory import device_inventory
 
 if TYPE_CHECKING:  # pragma: no cover
     import guestfs  # type: ignore
@@ -70,15 +71,10 @@ class Ident:
     @staticmethod
     def g_blkid_map(g: "guestfs.GuestFS", dev: str) -> Dict[str, str]:
         _LOG.debug("🔎 blkid: probing dev=%r", dev)
-        try:
-            d = g.blkid(dev)
-            out = {str(k).upper(): str(v) for k, v in d.items() if v is not None}
-            _LOG.debug("🧾 blkid: dev=%r => keys=%s", dev, sorted(out.keys()))
-            return out
-        except Exception as e:
-            # keep behavior: return {}
-            _LOG.debug("⚠️ blkid failed: dev=%r err=%s", dev, e, exc_info=True)
-            return {}
+        # served from the handle's device inventory; a failed probe yields {}
+        out = device_inventory(g).blkid(dev)
+        _LOG.debug("🧾 blkid: dev=%r => keys=%s", dev, sorted(out.keys()))
+        return out
 
     @staticmethod
     def choose_stable(blk: Dict[str, str]) -> Optional[str]:
@@ -0,0 +1,259 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# hyper2kvm/fixers/filesystem/inventory.py
+# -*- coding: utf-8 -*-
+"""
+Block-device metadata cache, one per launched guestfs handle.
+
+Spec stabilization, grub's spec resolution, filesystem repair and the
+brute-force root mount each used to blkid / vfs_type / list_filesystems the
+same devices again; a PARTUUID= lookup re-blkid'ed every filesystem. The
+inventory answers all of them from one pass over the devices:
+
+- build() walks list_devices/list_partitions/list_md_devices/lvs and
+  list_filesystems once, recording per device its blkid fields, size and
+  LVM/MD membership, indexed by UUID, PARTUUID, LABEL and PARTLABEL
+- blkid()/vfs_type()/filesystems() are served from the cache; devices the
+  walk did not see are probed once and cached
+
+Device activation (LUKS, mdraid, LVM) happens before the build; after that
+only stages that change filesystems (repair) call invalidate_device_inventory().
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import weakref
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from ...core.utils import U
+
+if TYPE_CHECKING:  # pragma: no cover
+    import guestfs  # type: ignore
+
+_LOG = logging.getLogger("hyper2kvm.inventory")
+
+# blkid keys indexed for spec resolution (case-insensitive values for the UUID kinds)
+_INDEXED = ("UUID", "PARTUUID", "LABEL", "PARTLABEL")
+_FOLD_CASE = {"UUID", "PARTUUID"}
+
+
+@dataclass
+class DeviceInfo:
+    dev: str
+    role: str  # disk | partition | md | lv | fs
+    fstype: str = ""
+    uuid: str = ""
+    partuuid: str = ""
+    label: str = ""
+    partlabel: str = ""
+    size: Optional[int] = None
+    parent: Optional[str] = None
+    lvm_pv: bool = False
+    md_member: bool = False
+    blkid: Dict[str, str] = field(default_factory=dict)
+
+
+class DeviceInventory:
+    def __init__(self, g: "guestfs.GuestFS"):
+        self.g = g
+        self.devices: Dict[str, DeviceInfo] = {}
+        self.built = False
+        self.probes = 0
+        self._blkid: Dict[str, Dict[str, str]] = {}
+        self._vfs: Dict[str, str] = {}
+        self._fsmap: Optional[Dict[str, str]] = None
+        self._index: Dict[str, Dict[str, str]] = {k: {} for k in _INDEXED}
+        self._lock = threading.RLock()
+
+    # raw probes (cached)
+
+    def _list(self, name: str) -> List[str]:
+        fn = getattr(self.g, name, None)
+        if fn is None:
+            return []
+        try:
+            self.probes += 1
+            return [U.to_text(x) for x in (fn() or [])]
+        except Exception as e:
+            _LOG.debug("inventory: %s failed: %s", name, e)
+            return []
+
+    def filesystems(self) -> Dict[str, str]:
+        """list_filesystems(), fetched once."""
+        with self._lock:
+            if self._fsmap is None:
+                try:
+                    self.probes += 1
+                    self._fsmap = {U.to_text(k): U.to_text(v) for k, v in (self.g.list_filesystems() or {}).items()}
+                except Exception as e:
+                    _LOG.debug("inventory: list_filesystems failed: %s", e)
+                    return {}
+            return dict(self._fsmap)
+
+    def blkid(self, dev: str) -> Dict[str, str]:
+        """blkid(dev) with upper-cased keys; {} if blkid fails."""
+        dev = U.to_text(dev)
+        with self._lock:
+            out = self._blkid.get(dev)
+            if out is None:
+                try:
+                    self.probes += 1
+                    d = self.g.blkid(dev)
+                    out = {str(k).upper(): str(v) for k, v in d.items() if v is not None}
+                except Exception as e:
+                    _LOG.debug("inventory: blkid failed: dev=%r err=%s", dev, e)
+                    out = {}
+                self._blkid[dev] = out
+            return dict(out)
+
+    def vfs_type(self, dev: str) -> str:
+        """Filesystem type of dev ("" if unknown): blkid TYPE, else vfs_type(), else list_filesystems()."""
+        dev = U.to_text(dev)
+        with self._lock:
+            if dev in self._vfs:
+                return self._vfs[dev]
+            fstype = (self._blkid.get(dev) or {}).get("TYPE", "")
+            if not fstype:
+                try:
+                    self.probes += 1
+                    fstype = U.to_text(self.g.vfs_type(dev)).strip()
+                except Exception as e:
+                    _LOG.debug("inventory: vfs_type failed: dev=%r err=%s", dev, e)
+            if not fstype:
+                fstype = self.filesystems().get(dev, "").strip()
+                if fstype == "unknown":
+                    fstype = ""
+            self._vfs[dev] = fstype
+            return fstype
+
+    # full inventory
+
+    def build(self) -> "DeviceInventory":
+        """One pass over every block device and filesystem the appliance sees."""
+        with self._lock:
+            if self.built:
+                return self
+            roles: Dict[str, str] = {}
+            for role, lister in (
+                ("disk", "list_devices"),
+                ("partition", "list_partitions"),
+                ("md", "list_md_devices"),
+                ("lv", "lvs"),
+            ):
+                for dev in self._list(lister):
+                    roles.setdefault(dev, role)
+            fsmap = self.filesystems()
+            for dev in fsmap:
+                if dev.startswith("/dev/"):
+                    roles.setdefault(dev, "fs")
+            pvs = set(self._list("pvs"))
+
+            for dev, role in roles.items():
+                blk = self.blkid(dev)
+                fstype = blk.get("TYPE") or fsmap.get(dev, "")
+                info = DeviceInfo(
+                    dev=dev,
+                    role=role,
+                    fstype="" if fstype == "unknown" else fstype,
+                    uuid=blk.get("UUID", ""),
+                    partuuid=blk.get("PARTUUID", ""),
+                    label=blk.get("LABEL", ""),
+                    partlabel=blk.get("PARTLABEL", ""),
+                    size=self._size(dev),
+                    parent=self._parent(dev) if role == "partition" else None,
+                    lvm_pv=dev in pvs or fstype == "LVM2_member",
+                    md_member=fstype == "linux_raid_member",
+                    blkid=blk,
+                )
+                self.devices[dev] = info
+                if info.fstype:
+                    self._vfs.setdefault(dev, info.fstype)
+                for key in _INDEXED:
+                    val = blk.get(key, "")
+                    if not val:
+                        continue
+                    # member devices carry the UUID of the array/VG, not of a mountable filesystem
+                    if key == "UUID" and (info.lvm_pv or info.md_member):
+                        continue
+                    self._index[key].setdefault(val.lower() if key in _FOLD_CASE else val, dev)
+            self.built = True
+            _LOG.debug("inventory: %d devices, %d probes", len(self.devices), self.probes)
+            return self
+
+    def _size(self, dev: str) -> Optional[int]:
+        try:
+            self.probes += 1
+            return int(self.g.blockdev_getsize64(dev))
+        except Exception:
+            return None
+
+    def _parent(self, dev: str) -> Optional[str]:
+        try:
+            self.probes += 1
+            return U.to_text(self.g.part_to_dev(dev)) or None
+        except Exception:
+            return None
+
+    def resolve(self, kind: str, value: str) -> Optional[str]:
+        """Device for UUID/PARTUUID/LABEL/PARTLABEL=value, or None."""
+        kind = kind.upper()
+        if kind not in self._index:
+            return None
+        self.build()
+        val = value.strip().strip('"').strip("'")
+        return self._index[kind].get(val.lower() if kind in _FOLD_CASE else val)
+
+    def resolve_spec(self, spec: str) -> Optional[str]:
+        """resolve() for a KIND=value spec."""
+        kind, sep, value = spec.partition("=")
+        return self.resolve(kind, value) if sep else None
+
+    def as_report(self) -> Dict[str, Any]:
+        self.build()
+        return {
+            "devices": [
+                {k: v for k, v in asdict(d).items() if k != "blkid"} for d in self.devices.values()
+            ],
+            "probes": self.probes,
+        }
+
+
+_inventories: "weakref.WeakKeyDictionary[Any, DeviceInventory]" = weakref.WeakKeyDictionary()
+_inventories_lock = threading.Lock()
+
+
+def _handle(g: Any) -> Any:
+    # a GuestVFS wraps the handle; both share one inventory
+    from ..offline.guest_vfs import GuestVFS
+
+    return g.real if isinstance(g, GuestVFS) else g
+
+
+def device_inventory(g: "guestfs.GuestFS", *, refresh: bool = False) -> DeviceInventory:
+    """The inventory for a launched handle (created lazily; refresh=True starts over)."""
+    h = _handle(g)
+    with _inventories_lock:
+        try:
+            inv = None if refresh else _inventories.get(h)
+            if inv is None:
+                inv = DeviceInventory(h)
+                _inventories[h] = inv
+            return inv
+        except TypeError:
+            # not weak-referenceable: nothing to cache on
+            return DeviceInventory(h)
+
+
+def invalidate_device_inventory(g: "guestfs.GuestFS") -> None:
+    """Forget cached device metadata, e.g. after a stage rewrote filesystems."""
+    h = _handle(g)
+    with _inventories_lock:
+        try:
+            _inventories.pop(h, None)
+        except TypeError:
+            pass
+
+
+__all__ = ["DeviceInfo", "DeviceInventory", "device_inventory", "invalidate_device_inventory"]
@@ -9,14 +9,17 @@ This package provides helper modules for offline guest modifications:
 - validation: Post-modification validation and health checks
 - mount: GuestFS mounting and filesystem operations
 - vmware_tools_remover: VMware Tools removal for Linux guests
+- guest_vfs: Prefetched /etc + /boot with batched write-back
 """
 
 from .config_rewriter import FstabCrypttabRewriter
+from .guest_vfs import GuestVFS
 from .spec_converter import SpecConverter
 from .validation import OfflineValidationManager
 
 __all__ = [
     "FstabCrypttabRewriter",
+    "GuestVFS",
     "SpecConverter",
     "OfflineValidationManager",
 ]
@@ -0,0 +1,1141 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# hyper2kvm/fixers/offline/guest_vfs.py
+# -*- coding: utf-8 -*-
+"""
+Prefetched, write-back view of the guest's config trees.
+
+The fixers talk to the appliance one small synchronous RPC at a time:
+is_file/read_file/stat per candidate config file, cp/write/rename/chmod per
+edit, a shell per glob. GuestVFS wraps a mounted guestfs handle and serves
+those operations from an in-memory copy of /etc and /boot (config only;
+kernels, initramfs images and other large blobs are excluded):
+
+- a cached root is pulled with one tar_out (plus one find0 listing the
+  excluded names) the first time a path under it is touched
+- reads, stats, ls/find and globs under a cached root are answered locally,
+  following symlinks the way the real calls do
+- writes, renames, copies, chmod/chown and deletions update the cache and
+  are queued; flush() applies queued deletions, then writes every modified
+  entry back in one tar_in with modes, owners and xattrs preserved
+  (per-file write-through if tar_in fails, or for hardlinked files)
+
+Everything else is forwarded to the wrapped handle. Calls that only read
+block-device or inspection metadata go straight through; sync() flushes
+first. command/sh and their *_lines variants flush and keep the cache,
+unless the command line runs a tool that rewrites guest config or boot
+files (initramfs and bootloader regeneration, package managers, file
+utilities, sed -i, output redirection to a file). Any other call (mount*,
+umount*, aug_*, ...) may change the guest behind our back, so it flushes
+and drops the cache, which is re-fetched lazily on the next access. Paths
+outside the cached roots, or symlinks leading out of them, are always
+forwarded.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import io
+import logging
+import posixpath
+import shlex
+import stat as _stat
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from ...core.utils import U
+
+# root -> tar excludes (GNU tar patterns, matched against any path component)
+DEFAULT_ROOTS: Dict[str, Tuple[str, ...]] = {
+    "/etc": ("*.bin", "policy.[0-9]*"),
+    "/boot": (
+        "vmlinu[xz]*",
+        "initr*",
+        "initramfs*",
+        "*.img",
+        "System.map*",
+        "symvers*",
+        "memtest*",
+        "*.efi",
+        "*.EFI",
+        "*.mod",
+        "*.pf2",
+        "*.gz",
+        "*.xz",
+        "*.zst",
+        "*.bin",
+        "lost+found",
+    ),
+}
+
+DEFAULT_MAX_PREFETCH_BYTES = 64 * 1024 * 1024
+
+# forwarded untouched: block-device / inspection metadata, appliance settings
+_PURE_PREFIXES = (
+    "inspect_",
+    "list_",
+    "vfs_",
+    "blkid",
+    "lvs",
+    "vgs",
+    "pvs",
+    "get_",
+    "version",
+    "statvfs",
+    "mountpoints",
+    "mounts",
+    "available",
+    "feature_available",
+    "findfs_",
+    "part_get",
+    "part_list",
+    "blockdev_get",
+    "canonical_device_name",
+    "is_lv",
+    "lvuuid",
+    "vguuid",
+    "pvuuid",
+    "luks_uuid",
+    "md_detail",
+    "disk_",
+)
+
+# read guest files without changing them: flush pending writes first, keep the cache
+_READ_PREFIXES = (
+    "is_",
+    "realpath",
+    "checksum",
+    "file",
+    "head",
+    "tail",
+    "grep",
+    "egrep",
+    "fgrep",
+    "zgrep",
+    "hexdump",
+    "strings",
+    "wc_",
+    "du",
+    "ll",
+    "ls0",
+    "find0",
+    "lstatlist",
+    "lstatnslist",
+    "readlinklist",
+    "getxattr",
+    "lgetxattr",
+    "lxattrlist",
+    "download",
+    "tar_out",
+    "tgz_out",
+    "txz_out",
+    "copy_out",
+)
+
+# guest tools that can rewrite files under the cached roots; running one via command/sh drops the cache
+_GUEST_WRITERS = frozenset(
+    {
+        "dracut",
+        "mkinitrd",
+        "mkinitramfs",
+        "mkinitcpio",
+        "update-initramfs",
+        "kernel-install",
+        "depmod",
+        "grub-mkconfig",
+        "grub2-mkconfig",
+        "update-grub",
+        "update-grub2",
+        "grub-install",
+        "grub2-install",
+        "grubby",
+        "bootctl",
+        "extlinux",
+        "lilo",
+        "rpm",
+        "dnf",
+        "yum",
+        "zypper",
+        "apt",
+        "apt-get",
+        "dpkg",
+        "dpkg-reconfigure",
+        "apk",
+        "pacman",
+        "systemctl",
+        "update-alternatives",
+        "ldconfig",
+        "useradd",
+        "usermod",
+        "passwd",
+        "chpasswd",
+        "restorecon",
+        "setfiles",
+        "zpool",
+        "cp",
+        "mv",
+        "rm",
+        "ln",
+        "install",
+        "touch",
+        "mkdir",
+        "chmod",
+        "chown",
+        "truncate",
+        "tee",
+        "dd",
+    }
+)
+_SHELLS = ("sh", "bash", "dash")
+_VERSION_FLAGS = ("--version", "-V", "--help")
+_REDIRECTS = (">", ">>", ">|", "&>", "&>>")
+
+# characters that make `eval "set -- $pat"` do more than glob expansion
+_SHELL_SPECIAL = set(" \t\n'\"\\$`;&|<>(){}~!#")
+
+# pax keys re-derived from the entry itself on write-back; the rest (xattrs, labels, acls) is carried over
+_PAX_STAT_FIELDS = set(tarfile.PAX_FIELDS) | {"atime", "ctime", "mtime"}
+
+_HIT, _MISSING, _DELEGATE = "hit", "missing", "delegate"
+_SYMLINK_HOPS = 40
+
+
+class _Entry:
+    """
+    One cached inode. kind: f(ile), d(ir), l(ink), o(ther), ? (excluded from
+    the prefetch; known to exist, served by the real handle).
+    """
+
+    __slots__ = ("kind", "mode", "uid", "gid", "mtime", "data", "target", "pax", "shared")
+
+    def __init__(
+        self,
+        kind: str,
+        mode: int = 0o644,
+        uid: int = 0,
+        gid: int = 0,
+        mtime: Optional[float] = None,
+        data: Optional[bytes] = None,
+        target: str = "",
+        pax: Optional[Dict[str, str]] = None,
+    ):
+        self.kind = kind
+        self.mode = mode & 0o7777
+        self.uid = uid
+        self.gid = gid
+        self.mtime = int(time.time() if mtime is None else mtime)
+        self.data = data
+        self.target = target
+        self.pax: Dict[str, str] = dict(pax or {})
+        self.shared = False  # hardlinked on the guest: write in place, never re-create
+
+    def copy(self) -> "_Entry":
+        return _Entry(self.kind, self.mode, self.uid, self.gid, self.mtime, self.data, self.target, self.pax)
+
+    def st_mode(self) -> int:
+        ftype = {"d": _stat.S_IFDIR, "l": _stat.S_IFLNK, "f": _stat.S_IFREG}.get(self.kind, 0)
+        return ftype | self.mode
+
+    def size(self) -> int:
+        if self.kind == "f":
+            return len(self.data or b"")
+        if self.kind == "l":
+            return len(self.target.encode("utf-8"))
+        return 4096
+
+
+def _enoent(op: str, path: str) -> RuntimeError:
+    return RuntimeError(f"{op}: {path}: No such file or directory")
+
+
+def _as_bytes(content: Any) -> bytes:
+    return content.encode("utf-8") if isinstance(content, str) else bytes(content)
+
+
+def _follow_opt(followsymlinks: Optional[bool]) -> Dict[str, bool]:
+    return {} if followsymlinks is None else {"followsymlinks": bool(followsymlinks)}
+
+
+def _is_magic(component: str) -> bool:
+    return any(ch in component for ch in "*?[")
+
+
+def _argv_writes(words: Sequence[str]) -> bool:
+    """True if one simple command (argv) may write guest files."""
+    words = list(words)
+    while words and (("=" in words[0] and not words[0].startswith("=")) or words[0] in ("env", "exec", "nice", "sudo")):
+        words.pop(0)
+    if not words:
+        return False
+    prog = posixpath.basename(words[0])
+    if prog in _SHELLS and len(words) >= 3 and words[1] in ("-c", "-lc"):
+        return _script_writes(words[2])
+    if prog == "sed":
+        return any(w.startswith(("-i", "--in-place")) for w in words[1:])
+    if prog not in _GUEST_WRITERS:
+        return False
+    return not any(w in _VERSION_FLAGS for w in words[1:])
+
+
+def _script_writes(script: str) -> bool:
+    """True if a shell script may write guest files (unparsable scripts are assumed to)."""
+    try:
+        lex = shlex.shlex(script.replace("\n", ";"), posix=True, punctuation_chars=True)
+        lex.whitespace_split = True
+        tokens = list(lex)
+    except ValueError:
+        return True
+    words: List[str] = []
+    for i, tok in enumerate(tokens):
+        if tok in _REDIRECTS:
+            if i + 1 >= len(tokens) or tokens[i + 1] != "/dev/null":
+                return True
+        elif tok and set(tok) <= set(";&|()"):
+            if _argv_writes(words):
+                return True
+            words = []
+        else:
+            words.append(tok)
+    return _argv_writes(words)
+
+
+class GuestVFS:
+    """
+    Proxy around a mounted guestfs handle that caches the guest's config trees.
+
+    Use it in place of the handle; call flush() (or sync(), or anything that
+    is not a plain file operation) to push pending changes to the guest.
+    """
+
+    def __init__(
+        self,
+        g: Any,
+        logger: Optional[logging.Logger] = None,
+        *,
+        roots: Optional[Dict[str, Sequence[str]]] = None,
+        max_prefetch_bytes: int = DEFAULT_MAX_PREFETCH_BYTES,
+    ):
+        self.real = g
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_prefetch_bytes = int(max_prefetch_bytes)
+        self._root_excludes: Dict[str, Tuple[str, ...]] = {
+            posixpath.normpath(r): tuple(ex) for r, ex in (roots if roots is not None else DEFAULT_ROOTS).items()
+        }
+        self._state: Dict[str, str] = {}  # root -> cached|delegated
+        self._tree: Dict[str, _Entry] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._on_guest: Set[str] = set()  # cached paths that exist on the guest as fetched
+        self._dirty: Set[str] = set()
+        self._deleted: List[str] = []
+        self.stats: Dict[str, Any] = {
+            "roots": {},
+            "prefetches": 0,
+            "prefetched_bytes": 0,
+            "hits": 0,
+            "forwarded": 0,
+            "flushes": 0,
+            "flushed_entries": 0,
+            "invalidations": 0,
+        }
+
+    # proxy plumbing
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "real":
+            raise AttributeError(name)
+        attr = getattr(self.real, name)
+        if not callable(attr) or name.startswith(_PURE_PREFIXES):
+            return attr
+        if name.startswith(_READ_PREFIXES):
+
+            def _read_call(*args: Any, **kwargs: Any) -> Any:
+                self.flush()
+                return attr(*args, **kwargs)
+
+            return _read_call
+
+        def _call(*args: Any, **kwargs: Any) -> Any:
+            self.flush()
+            self.invalidate()
+            return attr(*args, **kwargs)
+
+        return _call
+
+    def _forward(self, name: str, *args: Any, touched: Iterable[str] = (), **kwargs: Any) -> Any:
+        """Run a file operation on the real handle, then drop cached roots it may have changed."""
+        self._count_forward()
+        self.flush()
+        try:
+            return getattr(self.real, name)(*args, **kwargs)
+        finally:
+            for p in touched:
+                root = self._root_of(self._norm(p) or "")
+                if root is not None and self._state.get(root) == "cached":
+                    self._drop_root(root)
+
+    def sync(self) -> Any:
+        self.flush()
+        return self.real.sync()
+
+    def query_command(self, argv: List[str]) -> Any:
+        """g.command() for probes that do not change the guest: keeps the cache."""
+        self.flush()
+        return self.real.command(argv)
+
+    def _run(self, name: str, arg: Any, writes: bool) -> Any:
+        self.flush()
+        try:
+            return getattr(self.real, name)(arg)
+        finally:
+            if writes:
+                self.invalidate()
+
+    def command(self, argv: List[str]) -> Any:
+        return self._run("command", argv, _argv_writes([str(a) for a in argv]))
+
+    def command_lines(self, argv: List[str]) -> Any:
+        return self._run("command_lines", argv, _argv_writes([str(a) for a in argv]))
+
+    def sh(self, script: str) -> Any:
+        return self._run("sh", script, _script_writes(str(script)))
+
+    def sh_lines(self, script: str) -> Any:
+        return self._run("sh_lines", script, _script_writes(str(script)))
+
+    # cache management
+
+    def invalidate(self) -> None:
+        """Forget all cached roots (pending changes must have been flushed)."""
+        if self._state:
+            self.stats["invalidations"] += 1
+        for root in list(self._state):
+            self._drop_root(root)
+
+    def _drop_root(self, root: str) -> None:
+        self._state.pop(root, None)
+        for store in (self._tree, self._children):
+            for p in [p for p in store if p == root or p.startswith(root + "/")]:
+                del store[p]
+        self._on_guest = {p for p in self._on_guest if not (p == root or p.startswith(root + "/"))}
+        self._dirty = {p for p in self._dirty if not (p == root or p.startswith(root + "/"))}
+
+    def _root_of(self, path: str) -> Optional[str]:
+        for root in self._root_excludes:
+            if path == root or path.startswith(root + "/"):
+                return root
+        return None
+
+    def _ensure(self, root: str) -> bool:
+        state = self._state.get(root)
+        if state is None:
+            state = self._prefetch(root)
+            self._state[root] = state
+            self.stats["roots"][root] = state
+        return state == "cached"
+
+    def _prefetch(self, root: str) -> str:
+        excludes = self._root_excludes[root]
+        try:
+            if not self.real.is_dir(root):
+                return "delegated"
+            with tempfile.TemporaryDirectory(prefix="hyper2kvm-vfs-") as td:
+                tar_path = Path(td) / "tree.tar"
+                self._tar_out(root, tar_path, excludes)
+                size = tar_path.stat().st_size
+                if size > self.max_prefetch_bytes:
+                    self.logger.debug(
+                        "guest vfs: %s is %s, not caching it", root, U.human_bytes(size)
+                    )
+                    return "oversized"
+                listing: List[str] = []
+                if excludes:
+                    lst = Path(td) / "names"
+                    self.real.find0(root, str(lst))
+                    listing = [n for n in lst.read_bytes().decode("utf-8", "surrogateescape").split("\0") if n]
+                self._load_tar(root, tar_path, listing)
+        except Exception as e:
+            self.logger.debug("guest vfs: prefetch of %s failed, forwarding: %s", root, e)
+            self._drop_root(root)
+            return "delegated"
+        self.stats["prefetches"] += 1
+        self.stats["prefetched_bytes"] += size
+        self.logger.debug("guest vfs: cached %s (%s)", root, U.human_bytes(size))
+        return "cached"
+
+    def _tar_out(self, root: str, dest: Path, excludes: Sequence[str]) -> None:
+        try:
+            self.real.tar_out(
+                root, str(dest), numericowner=True, excludes=list(excludes), xattrs=True, selinux=True, acls=True
+            )
+        except TypeError:
+            # older bindings without the optional arguments
+            self.real.tar_out(root, str(dest), numericowner=True, excludes=list(excludes))
+
+    def _load_tar(self, root: str, tar_path: Path, listing: Sequence[str]) -> None:
+        def _abs(name: str) -> str:
+            name = name[2:] if name.startswith("./") else name
+            return posixpath.normpath(posixpath.join(root, name)) if name not in ("", ".") else root
+
+        hardlinks: List[Tuple[str, str]] = []
+        with tarfile.open(tar_path, "r:") as tf:
+            for m in tf:
+                path = _abs(m.name)
+                if self._root_of(path) != root:
+                    continue
+                pax = {k: v for k, v in (m.pax_headers or {}).items() if k not in _PAX_STAT_FIELDS}
+                if m.islnk():
+                    hardlinks.append((path, _abs(m.linkname)))
+                    continue
+                if m.isreg():
+                    f = tf.extractfile(m)
+                    e = _Entry("f", m.mode, m.uid, m.gid, m.mtime, f.read() if f else b"", pax=pax)
+                elif m.isdir():
+                    e = _Entry("d", m.mode, m.uid, m.gid, m.mtime, pax=pax)
+                elif m.issym():
+                    e = _Entry("l", m.mode, m.uid, m.gid, m.mtime, target=m.linkname, pax=pax)
+                else:
+                    e = _Entry("o", m.mode, m.uid, m.gid, m.mtime, pax=pax)
+                self._put(path, e)
+                self._on_guest.add(path)
+        for path, target in hardlinks:
+            e = self._tree.get(target)
+            if e is None or e.kind != "f":
+                e = _Entry("?")
+            else:
+                e.shared = True
+            self._put(path, e)
+            self._on_guest.add(path)
+        # names the excludes kept out of the tar: known to exist, contents stay on the guest
+        for name in listing:
+            path = _abs(name)
+            if path not in self._tree and self._root_of(path) == root:
+                self._put(path, _Entry("?"))
+                self._on_guest.add(path)
+        if root not in self._tree:
+            raise RuntimeError(f"tar_out of {root} returned no root entry")
+
+    def _put(self, path: str, e: _Entry) -> None:
+        self._tree[path] = e
+        if e.kind == "d":
+            self._children.setdefault(path, set())
+        parent = posixpath.dirname(path)
+        if path != parent:
+            self._children.setdefault(parent, set()).add(posixpath.basename(path))
+
+    def _remove(self, path: str) -> None:
+        """Drop path (and its subtree) from the cache, queueing deletion on the guest."""
+        doomed = [p for p in self._tree if p == path or p.startswith(path + "/")]
+        if any(p in self._on_guest for p in doomed):
+            self._deleted.append(path)
+        for p in doomed:
+            self._tree.pop(p, None)
+            self._children.pop(p, None)
+            self._dirty.discard(p)
+            self._on_guest.discard(p)
+        parent = posixpath.dirname(path)
+        self._children.get(parent, set()).discard(posixpath.basename(path))
+
+    def _touch_entry(self, path: str, e: _Entry) -> None:
+        e.mtime = int(time.time())
+        self._dirty.add(path)
+
+    # path resolution
+
+    @staticmethod
+    def _norm(path: Any) -> Optional[str]:
+        p = U.to_text(path)
+        if not p.startswith("/"):
+            return None
+        p = posixpath.normpath(p)
+        return "/" + p.lstrip("/")
+
+    def _resolve(self, path: Any, *, follow: bool = True) -> Tuple[str, Optional[str]]:
+        """
+        Map path to its canonical cached path.
+
+        Returns (_HIT, canonical), (_MISSING, canonical-or-None) where canonical
+        is where a new entry would be created, or (_DELEGATE, None) when the
+        answer lives outside the cache.
+        """
+        cur_path = self._norm(path)
+        if cur_path is None:
+            return _DELEGATE, None
+        for _ in range(_SYMLINK_HOPS):
+            root = self._root_of(cur_path)
+            if root is None or not self._ensure(root):
+                return _DELEGATE, None
+            parts = [x for x in cur_path[len(root):].split("/") if x]
+            cur = root
+            for i, name in enumerate(parts):
+                last = i == len(parts) - 1
+                nxt = cur + "/" + name
+                e = self._tree.get(nxt)
+                if e is None:
+                    return _MISSING, (nxt if last else None)
+                if e.kind == "?":
+                    return _DELEGATE, None
+                if e.kind == "l" and (follow or not last):
+                    base = e.target if e.target.startswith("/") else posixpath.join(cur, e.target)
+                    cur_path = self._norm(posixpath.join(base, *parts[i + 1:])) or "/"
+                    break
+                if not last and e.kind != "d":
+                    return _MISSING, None
+                cur = nxt
+            else:
+                return _HIT, cur
+        return _DELEGATE, None
+
+    def _lookup(self, path: Any, *, follow: bool = True) -> Tuple[str, Optional[str], Optional[_Entry]]:
+        state, canon = self._resolve(path, follow=follow)
+        if state != _DELEGATE:
+            self.stats["hits"] += 1
+        return state, canon, (self._tree.get(canon) if state == _HIT and canon else None)
+
+    def _creatable(self, canon: Optional[str]) -> bool:
+        if canon is None:
+            return False
+        parent = self._tree.get(posixpath.dirname(canon))
+        return parent is not None and parent.kind == "d"
+
+    # reads
+
+    def is_file(self, path: str, followsymlinks: Optional[bool] = None) -> bool:
+        state, _, e = self._lookup(path, follow=bool(followsymlinks))
+        if state == _DELEGATE:
+            return self._forward_read("is_file", path, **_follow_opt(followsymlinks))
+        return e is not None and e.kind == "f"
+
+    def is_dir(self, path: str, followsymlinks: Optional[bool] = None) -> bool:
+        state, _, e = self._lookup(path, follow=bool(followsymlinks))
+        if state == _DELEGATE:
+            return self._forward_read("is_dir", path, **_follow_opt(followsymlinks))
+        return e is not None and e.kind == "d"
+
+    def is_symlink(self, path: str) -> bool:
+        state, _, e = self._lookup(path, follow=False)
+        if state == _DELEGATE:
+            return self._forward_read("is_symlink", path)
+        return e is not None and e.kind == "l"
+
+    def exists(self, path: str) -> bool:
+        state, _, _e = self._lookup(path, follow=True)
+        if state == _DELEGATE:
+            return self._forward_read("exists", path)
+        return state == _HIT
+
+    def readlink(self, path: str) -> str:
+        state, _, e = self._lookup(path, follow=False)
+        if state == _DELEGATE:
+            return self._forward_read("readlink", path)
+        if e is None or e.kind != "l":
+            raise RuntimeError(f"readlink: {path}: Invalid argument")
+        return e.target
+
+    def _file_data(self, op: str, path: str) -> Optional[bytes]:
+        """Contents of a cached regular file, None if the real handle has to answer."""
+        state, _, e = self._lookup(path, follow=True)
+        if state == _DELEGATE:
+            return None
+        if e is None:
+            raise _enoent(op, path)
+        if e.kind != "f":
+            raise RuntimeError(f"{op}: {path}: not a regular file")
+        return e.data or b""
+
+    def read_file(self, path: str) -> bytes:
+        data = self._file_data("read_file", path)
+        return self._forward_read("read_file", path) if data is None else data
+
+    def cat(self, path: str) -> str:
+        data = self._file_data("cat", path)
+        return self._forward_read("cat", path) if data is None else data.decode("utf-8", "replace")
+
+    def read_lines(self, path: str) -> List[str]:
+        data = self._file_data("read_lines", path)
+        if data is None:
+            return self._forward_read("read_lines", path)
+        lines = data.decode("utf-8", "replace").split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        return [ln[:-1] if ln.endswith("\r") else ln for ln in lines]
+
+    def filesize(self, path: str) -> int:
+        data = self._file_data("filesize", path)
+        return self._forward_read("filesize", path) if data is None else len(data)
+
+    def download(self, remotefilename: str, filename: str) -> None:
+        data = self._file_data("download", remotefilename)
+        if data is None:
+            return self._forward_read("download", remotefilename, filename)
+        Path(filename).write_bytes(data)
+
+    def _stat(self, op: str, path: str, *, follow: bool, ns: bool) -> Dict[str, int]:
+        state, _, e = self._lookup(path, follow=follow)
+        if state == _DELEGATE or (e is not None and e.kind in ("?", "o")):
+            return self._forward_read(op, path)
+        if e is None:
+            raise _enoent(op, path)
+        size = e.size()
+        st = {
+            "dev": 0,
+            "ino": 0,
+            "mode": e.st_mode(),
+            "nlink": 2 if e.kind == "d" else 1,
+            "uid": e.uid,
+            "gid": e.gid,
+            "rdev": 0,
+            "size": size,
+            "blksize": 4096,
+            "blocks": (size + 511) // 512,
+        }
+        if not ns:
+            st.update(atime=e.mtime, mtime=e.mtime, ctime=e.mtime)
+            return st
+        out = {f"st_{k}": v for k, v in st.items()}
+        for t in ("atime", "mtime", "ctime"):
+            out[f"st_{t}_sec"] = e.mtime
+            out[f"st_{t}_nsec"] = 0
+        return out
+
+    def stat(self, path: str) -> Dict[str, int]:
+        return self._stat("stat", path, follow=True, ns=False)
+
+    def lstat(self, path: str) -> Dict[str, int]:
+        return self._stat("lstat", path, follow=False, ns=False)
+
+    def statns(self, path: str) -> Dict[str, int]:
+        return self._stat("statns", path, follow=True, ns=True)
+
+    def lstatns(self, path: str) -> Dict[str, int]:
+        return self._stat("lstatns", path, follow=False, ns=True)
+
+    def _dir_entry(self, op: str, directory: str) -> Optional[str]:
+        state, canon, e = self._lookup(directory, follow=True)
+        if state == _DELEGATE:
+            return None
+        if e is None:
+            raise _enoent(op, directory)
+        if e.kind != "d":
+            raise RuntimeError(f"{op}: {directory}: Not a directory")
+        return canon
+
+    def ls(self, directory: str) -> List[str]:
+        canon = self._dir_entry("ls", directory)
+        if canon is None:
+            return self._forward_read("ls", directory)
+        return sorted(self._children.get(canon, ()))
+
+    def find(self, directory: str) -> List[str]:
+        canon = self._dir_entry("find", directory)
+        if canon is None:
+            return self._forward_read("find", directory)
+        prefix = canon + "/"
+        return sorted(p[len(prefix):] for p in self._tree if p.startswith(prefix))
+
+    def _expand(self, pattern: str) -> Optional[List[str]]:
+        """Glob matches of pattern (as spelled, unsorted), or None if the cache can't answer."""
+        if not pattern.startswith("/") or "\\" in pattern:
+            return None
+        parts = [p for p in pattern.split("/") if p]
+        i = 0
+        while i < len(parts) and not _is_magic(parts[i]):
+            i += 1
+        prefix = "/" + "/".join(parts[:i])
+        if self._root_of(posixpath.normpath(prefix)) is None:
+            return None
+        cands = [prefix]
+        for comp in parts[i:]:
+            nxt: List[str] = []
+            for c in cands:
+                state, canon = self._resolve(c, follow=True)
+                if state == _DELEGATE:
+                    return None
+                e = self._tree.get(canon) if state == _HIT and canon else None
+                if e is None or e.kind != "d":
+                    continue
+                if not _is_magic(comp):
+                    nxt.append(c + "/" + comp)
+                    continue
+                for name in sorted(self._children.get(canon or "", ())):
+                    if name.startswith(".") and not comp.startswith("."):
+                        continue
+                    if fnmatch.fnmatchcase(name, comp):
+                        nxt.append(c + "/" + name)
+            cands = nxt
+        out: List[str] = []
+        for c in cands:
+            state, _ = self._resolve(c, follow=False)
+            if state == _DELEGATE:
+                return None
+            if state == _HIT:
+                out.append(c)
+        self.stats["hits"] += 1
+        return out
+
+    def glob_expand(self, pattern: str, directoryslash: Optional[bool] = None) -> List[str]:
+        matches = self._expand(U.to_text(pattern))
+        if matches is None:
+            kwargs = {"directoryslash": directoryslash} if directoryslash is not None else {}
+            return self._forward_read("glob_expand", pattern, **kwargs)
+        out: List[str] = []
+        for m in sorted(matches):
+            state, canon = self._resolve(m, follow=True)
+            e = self._tree.get(canon) if state == _HIT and canon else None
+            mark = directoryslash is not False and e is not None and e.kind == "d"
+            out.append(m + "/" if mark else m)
+        return out
+
+    def vfs_glob(self, pattern: str) -> Optional[List[str]]:
+        """
+        Shell-glob pattern (see core.utils.guest_ls_glob) answered from the cache.
+
+        Returns existing regular files and directories, or None when the
+        pattern needs the real shell (outside the cached roots, quoting,
+        braces, variables, ...).
+        """
+        pattern = U.to_text(pattern)
+        if any(ch in _SHELL_SPECIAL for ch in pattern):
+            return None
+        matches = self._expand(pattern)
+        if matches is None:
+            return None
+        res: List[str] = []
+        for m in sorted(matches):
+            if self._resolve(m, follow=True)[0] != _HIT:
+                continue
+            state, canon = self._resolve(m, follow=False)
+            e = self._tree.get(canon) if state == _HIT and canon else None
+            if e is None or e.kind == "?":
+                return None
+            if e.kind in ("f", "d"):
+                res.append(m)
+        return res
+
+    def _count_forward(self) -> None:
+        self.stats["forwarded"] += 1
+
+    def _forward_read(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        self._count_forward()
+        self.flush()
+        return getattr(self.real, name)(*args, **kwargs)
+
+    # writes
+
+    def _set_file(self, op: str, path: str, data: bytes, *, append: bool = False) -> bool:
+        """Store file contents through symlinks; False if the real handle has to do it."""
+        state, canon, e = self._lookup(path, follow=True)
+        if state == _DELEGATE:
+            return False
+        if e is None:
+            if not self._creatable(canon):
+                raise _enoent(op, path)
+            e = _Entry("f", 0o644)
+            self._put(canon, e)  # type: ignore[arg-type]
+        elif e.kind != "f":
+            raise RuntimeError(f"{op}: {path}: not a regular file")
+        e.data = (e.data or b"") + data if append else data
+        self._touch_entry(canon, e)  # type: ignore[arg-type]
+        return True
+
+    def write(self, path: str, content: bytes) -> None:
+        if not self._set_file("write", path, _as_bytes(content)):
+            self._forward("write", path, content, touched=[path])
+
+    def write_append(self, path: str, content: bytes) -> None:
+        if not self._set_file("write_append", path, _as_bytes(content), append=True):
+            self._forward("write_append", path, content, touched=[path])
+
+    def upload(self, filename: str, remotefilename: str) -> None:
+        if not self._set_file("upload", remotefilename, Path(filename).read_bytes()):
+            self._forward("upload", filename, remotefilename, touched=[remotefilename])
+
+    def touch(self, path: str) -> None:
+        state, canon, e = self._lookup(path, follow=True)
+        if state == _DELEGATE or (e is not None and e.kind not in ("f", "d")):
+            self._forward("touch", path, touched=[path])
+            return
+        if e is None:
+            self._set_file("touch", path, b"")
+            return
+        self._touch_entry(canon, e)  # type: ignore[arg-type]
+
+    def mkdir(self, path: str) -> None:
+        state, canon, e = self._lookup(path, follow=False)
+        if state == _DELEGATE:
+            self._forward("mkdir", path, touched=[path])
+            return
+        if e is not None:
+            raise RuntimeError(f"mkdir: {path}: File exists")
+        if not self._creatable(canon):
+            raise _enoent("mkdir", path)
+        d = _Entry("d", 0o755)
+        self._put(canon, d)  # type: ignore[arg-type]
+        self._touch_entry(canon, d)  # type: ignore[arg-type]
+
+    def mkdir_p(self, path: str) -> None:
+        state, _, e = self._lookup(path, follow=True)
+        if state == _HIT and e is not None and e.kind == "d":
+            return
+        norm = self._norm(path)
+        parent = posixpath.dirname(norm) if norm else None
+        if state == _MISSING and parent and parent != norm and self._root_of(parent) is not None:
+            self.mkdir_p(parent)
+            if self._resolve(path, follow=False)[0] == _MISSING:
+                self.mkdir(path)
+                return
+        self._forward("mkdir_p", path, touched=[path])
+
+    def chmod(self, mode: int, path: str) -> None:
+        state, canon, e = self._lookup(path, follow=True)
+        if state == _DELEGATE or (e is not None and e.kind in ("?", "o")):
+            self._forward("chmod", mode, path, touched=[path])
+            return
+        if e is None:
+            raise _enoent("chmod", path)
+        e.mode = int(mode) & 0o7777
+        self._dirty.add(canon)  # type: ignore[arg-type]
+
+    def chown(self, owner: int, group: int, path: str) -> None:
+        state, canon, e = self._lookup(path, follow=True)
+        if state == _DELEGATE or (e is not None and e.kind in ("?", "o")):
+            self._forward("chown", owner, group, path, touched=[path])
+            return
+        if e is None:
+            raise _enoent("chown", path)
+        if int(owner) != -1:
+            e.uid = int(owner)
+        if int(group) != -1:
+            e.gid = int(group)
+        self._dirty.add(canon)  # type: ignore[arg-type]
+
+    def _subtree(self, canon: str) -> List[Tuple[str, _Entry]]:
+        return sorted((p, e) for p, e in self._tree.items() if p == canon or p.startswith(canon + "/"))
+
+    def _has_stub(self, canon: str) -> bool:
+        return any(e.kind in ("?", "o") for _p, e in self._subtree(canon))
+
+    def _copy_target(self, src_canon: str, dest: str) -> Tuple[str, Optional[str], Optional[_Entry]]:
+        """cp/mv destination: into dest when it is a directory."""
+        state, canon, e = self._lookup(dest, follow=True)
+        if state == _HIT and e is not None and e.kind == "d":
+            return self._lookup(posixpath.join(canon, posixpath.basename(src_canon)), follow=False)  # type: ignore[arg-type]
+        return state, canon, e
+
+    def _cp(self, op: str, src: str, dest: str, *, archive: bool) -> bool:
+        sstate, scanon, se = self._lookup(src, follow=not archive)
+        if sstate == _DELEGATE or se is None or se.kind in ("?", "o"):
+            return False
+        if se.kind == "d" and (not archive or self._has_stub(scanon)):  # type: ignore[arg-type]
+            return False
+        dstate, dcanon, de = self._copy_target(scanon, dest)  # type: ignore[arg-type]
+        if dstate == _DELEGATE or dcanon is None:
+            return False
+        if de is not None:
+            if de.kind != "f" or se.kind != "f":
+                return False
+            if not archive:
+                # plain cp rewrites the existing file in place: its mode/owner/labels stay
+                de.data = se.data
+                self._touch_entry(dcanon, de)
+                return True
+            self._remove(dcanon)
+        elif not self._creatable(dcanon):
+            raise _enoent(op, dest)
+        if archive:
+            for p, e in self._subtree(scanon):  # type: ignore[arg-type]
+                newp = dcanon + p[len(scanon):]  # type: ignore[arg-type]
+                ne = e.copy()
+                self._put(newp, ne)
+                self._dirty.add(newp)
+        else:
+            ne = _Entry("f", se.mode, data=se.data)
+            self._put(dcanon, ne)
+            self._touch_entry(dcanon, ne)
+        return True
+
+    def cp(self, src: str, dest: str) -> None:
+        if not self._cp("cp", src, dest, archive=False):
+            self._forward("cp", src, dest, touched=[dest])
+
+    def cp_a(self, src: str, dest: str) -> None:
+        if not self._cp("cp_a", src, dest, archive=True):
+            self._forward("cp_a", src, dest, touched=[dest])
+
+    def _move(self, op: str, src: str, dest: str, *, into_dir: bool) -> bool:
+        sstate, scanon, se = self._lookup(src, follow=False)
+        if sstate == _DELEGATE or se is None or se.shared or self._has_stub(scanon):  # type: ignore[arg-type]
+            return False
+        if into_dir:
+            dstate, dcanon, de = self._copy_target(scanon, dest)  # type: ignore[arg-type]
+        else:
+            dstate, dcanon, de = self._lookup(dest, follow=False)
+        if dstate == _DELEGATE or dcanon is None:
+            return False
+        if dcanon == scanon:
+            return True
+        if dcanon.startswith(scanon + "/"):  # type: ignore[operator]
+            return False
+        if de is not None:
+            if de.kind == "d" or se.kind == "d" or de.shared:
+                return False
+            self._remove(dcanon)
+        elif not self._creatable(dcanon):
+            raise _enoent(op, dest)
+        moved = self._subtree(scanon)  # type: ignore[arg-type]
+        self._remove(scanon)  # type: ignore[arg-type]
+        for p, e in moved:
+            newp = dcanon + p[len(scanon):]  # type: ignore[arg-type]
+            self._put(newp, e)
+            self._dirty.add(newp)
+        return True
+
+    def rename(self, oldpath: str, newpath: str) -> None:
+        if not self._move("rename", oldpath, newpath, into_dir=False):
+            self._forward("rename", oldpath, newpath, touched=[oldpath, newpath])
+
+    def mv(self, src: str, dest: str) -> None:
+        if not self._move("mv", src, dest, into_dir=True):
+            self._forward("mv", src, dest, touched=[src, dest])
+
+    def _unlink(self, op: str, path: str, *, missing_ok: bool, recursive: bool) -> bool:
+        state, canon, e = self._lookup(path, follow=False)
+        if state == _DELEGATE:
+            return False
+        if e is None:
+            if missing_ok:
+                return True
+            raise _enoent(op, path)
+        if e.kind == "d" and not recursive:
+            raise RuntimeError(f"{op}: {path}: Is a directory")
+        self._remove(canon)  # type: ignore[arg-type]
+        return True
+
+    def rm(self, path: str) -> None:
+        if not self._unlink("rm", path, missing_ok=False, recursive=False):
+            self._forward("rm", path, touched=[path])
+
+    def rm_f(self, path: str) -> None:
+        if not self._unlink("rm_f", path, missing_ok=True, recursive=False):
+            self._forward("rm_f", path, touched=[path])
+
+    def rm_rf(self, path: str) -> None:
+        if not self._unlink("rm_rf", path, missing_ok=True, recursive=True):
+            self._forward("rm_rf", path, touched=[path])
+
+    def _symlink(self, op: str, target: str, linkname: str, *, force: bool) -> bool:
+        state, canon, e = self._lookup(linkname, follow=False)
+        if state == _DELEGATE:
+            return False
+        if e is not None:
+            if not force:
+                raise RuntimeError(f"{op}: {linkname}: File exists")
+            if e.kind == "d":
+                return False
+            self._remove(canon)  # type: ignore[arg-type]
+        elif not self._creatable(canon):
+            raise _enoent(op, linkname)
+        link = _Entry("l", 0o777, target=U.to_text(target))
+        self._put(canon, link)  # type: ignore[arg-type]
+        self._touch_entry(canon, link)  # type: ignore[arg-type]
+        return True
+
+    def ln_s(self, target: str, linkname: str) -> None:
+        if not self._symlink("ln_s", target, linkname, force=False):
+            self._forward("ln_s", target, linkname, touched=[linkname])
+
+    def ln_sf(self, target: str, linkname: str) -> None:
+        if not self._symlink("ln_sf", target, linkname, force=True):
+            self._forward("ln_sf", target, linkname, touched=[linkname])
+
+    # write-back
+
+    def flush(self) -> None:
+        """
+        Apply queued deletions, then write every modified entry back in one tar_in.
+
+        Raises RuntimeError naming the paths that did not reach the guest; the
+        cache is dropped then, so later reads see what the guest really has.
+        """
+        if not self._deleted and not self._dirty:
+            return
+        deleted, self._deleted = self._deleted, []
+        pending = sorted((p, self._tree[p]) for p in self._dirty if p in self._tree)
+        self._dirty = set()
+        self.stats["flushes"] += 1
+        self.stats["flushed_entries"] += len(pending) + len(deleted)
+        failed: Dict[str, str] = {}
+
+        for p in sorted(set(deleted), key=lambda x: x.count("/"), reverse=True):
+            try:
+                self.real.rm_rf(p)
+            except Exception as e:
+                failed[p] = f"rm_rf: {e}"
+
+        # hardlinked files must be rewritten in place or the link would be split
+        batch = [(p, e) for p, e in pending if not e.shared]
+        for p, e in pending:
+            if e.shared:
+                self._write_through(p, e, failed)
+        if batch:
+            try:
+                self._tar_in(batch)
+            except Exception as ex:
+                self.logger.warning(f"guest vfs: batched write-back failed ({ex}); writing {len(batch)} entries one by one")
+                for p, e in batch:
+                    self._write_through(p, e, failed)
+        for p, _e in pending:
+            if p not in failed:
+                self._on_guest.add(p)
+
+        if failed:
+            self.stats.setdefault("write_errors", {}).update(failed)
+            self.invalidate()
+            for p, err in sorted(failed.items()):
+                self.logger.error(f"guest vfs: failed to write back {p}: {err}")
+            raise RuntimeError(f"guest vfs: {len(failed)} change(s) did not reach the guest: {', '.join(sorted(failed))}")
+
+    def _tar_in(self, batch: Sequence[Tuple[str, _Entry]]) -> None:
+        with tempfile.TemporaryDirectory(prefix="hyper2kvm-vfs-") as td:
+            tar_path = Path(td) / "writeback.tar"
+            with tarfile.open(tar_path, "w", format=tarfile.PAX_FORMAT) as tf:
+                for p, e in batch:
+                    ti = tarfile.TarInfo(p.lstrip("/"))
+                    ti.mode = e.mode
+                    ti.uid, ti.gid = e.uid, e.gid
+                    ti.uname = ti.gname = ""
+                    ti.mtime = e.mtime
+                    ti.pax_headers = dict(e.pax)
+                    if e.kind == "d":
+                        ti.type = tarfile.DIRTYPE
+                        tf.addfile(ti)
+                    elif e.kind == "l":
+                        ti.type = tarfile.SYMTYPE
+                        ti.linkname = e.target
+                        tf.addfile(ti)
+                    else:
+                        data = e.data or b""
+                        ti.size = len(data)
+                        tf.addfile(ti, io.BytesIO(data))
+            self.real.tar_in(str(tar_path), "/", xattrs=True, selinux=True, acls=True)
+
+    def _write_through(self, path: str, e: _Entry, failed: Dict[str, str]) -> None:
+        try:
+            if e.kind == "d":
+                self.real.mkdir_p(path)
+            elif e.kind == "l":
+                self.real.ln_sf(e.target, path)
+                return
+            else:
+                self.real.write(path, e.data or b"")
+            self.real.chmod(e.mode, path)
+            try:
+                self.real.chown(e.uid, e.gid, path)
+            except Exception:
+                pass
+        except Exception as ex:
+            failed[path] = str(ex)
+
+
+__all__ = ["GuestVFS", "DEFAULT_ROOTS", "DEFAULT_MAX_PREFETCH_BYTES"]
@@ -21,6 +21,8 @@ from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 import guestfs  # type: ignore
 
 from .. import __version__
+from ..core.appliance import ApplianceProfile
+from ..core.guest_session import GuestSession
 from ..core.recovery_manager import RecoveryManager
 from ..core.utils import U, blinking_progress, guest_has_cmd
 from ..core.validation_suite import ValidationSuite
@@ -33,6 +35,7 @@ from .report_writer import write_report
 
 # Delegated fixers (keep OfflineFSFix "thin")
 from .filesystem import fixer as filesystem_fixer  # type: ignore
+from .filesystem.inventory import device_inventory, invalidate_device_inventory
 from . import network_fixer  # type: ignore
 from .bootloader import grub as grub_fixer  # type: ignore
 from .windows import fixer as windows_fixer  # type: ignore
@@ -42,6 +45,7 @@ from .offline.vmware_tools_remover import OfflineVmwareToolsRemover
 from .offline.spec_converter import SpecConverter
 from .offline.config_rewriter import FstabCrypttabRewriter
 from .offline.validation import OfflineValidationManager
+from .offline.guest_vfs import GuestVFS
 
 
 _T = TypeVar("_T")
@@ -133,6 +137,10 @@ class OfflineFSFix:
         luks_mapper_prefix: str = "hyper2kvm-crypt",
         # ---- filesystem fixer (delegated) ----
         filesystem_repair_enable: bool = False,
+        # ---- shared appliance (detection / fixing / domain emission) ----
+        session: Optional[GuestSession] = None,
+        # ---- prefetched /etc + /boot with batched write-back ----
+        guest_vfs_cache: bool = True,
     ):
         self.logger = logger
         self.image = Path(image)
@@ -160,6 +168,18 @@ class OfflineFSFix:
         # Filesystem fixer flag (avoid shadowing method name)
         self.filesystem_repair_enable = bool(filesystem_repair_enable)
 
+        # With a session the appliance is borrowed: run() leaves it up and records the guest identity on it
+        self.session = session
+        self._roots_refreshed = False
+
+        # Serve config-file reads/writes from a GuestVFS once the root is mounted
+        self.guest_vfs_cache = bool(guest_vfs_cache)
+
+        # Appliance sizing: filesystem repair (xfs_repair) needs far more memory than config edits
+        self.appliance_profile = ApplianceProfile.for_workload("repair" if self.filesystem_repair_enable else "fix")
+        # read by the filesystem fixer to size xfs_repair -m
+        self.guestfs_memsize_mib = self.appliance_profile.memsize_mib
+
         self.inspect_root: Optional[str] = None
         self.root_dev: Optional[str] = None
         self.root_btrfs_subvol: Optional[str] = None
@@ -265,18 +285,40 @@ class OfflineFSFix:
 
     # guestfs open/close helpers
     def open(self) -> guestfs.GuestFS:
+        if self.session is not None:
+            # NOTE: read-only when dry_run; otherwise upgrades a read-only (or too small) session appliance.
+            boots = len(self.session.boot_seconds)
+            g = self.session.handle(readonly=self.dry_run, profile=self.appliance_profile)
+            self.session.reset_mounts()
+            appliance = self.session.appliance_report()
+            appliance["reused"] = len(self.session.boot_seconds) == boots
+            self._record_appliance(g, appliance)
+            return g
         g = guestfs.GuestFS(python_return_dict=True)
         if self.logger.isEnabledFor(logging.DEBUG):
             try:
                 g.set_trace(1)
             except Exception:
                 pass
+        self.appliance_profile.configure(g, self.logger)
         # NOTE: read-only when dry_run (prevents accidental writes).
-        g.add_drive_opts(str(self.image), readonly=self.dry_run)
+        g.add_drive_opts(str(self.image), **self.appliance_profile.drive_opts(readonly=self.dry_run))
+        t0 = time.monotonic()
         g.launch()
-        self._stash_guestfs_info(g)
+        boot = round(time.monotonic() - t0, 3)
+        self._record_appliance(g, {"profile": self.appliance_profile.as_dict(), "launches": 1, "boot_s": [boot]})
         return g
 
+    def _record_appliance(self, g: guestfs.GuestFS, appliance: Dict[str, Any]) -> None:
+        """Report the appliance profile and boot latency (and time the boot like a stage)."""
+        profile = appliance.get("profile") or {}
+        if profile.get("memsize_mib"):
+            self.guestfs_memsize_mib = profile["memsize_mib"]
+        if not appliance.get("reused") and appliance.get("boot_s"):
+            self._timings["appliance_boot"] = appliance["boot_s"][-1]
+        self.report.setdefault("analysis", {})["appliance"] = appliance
+        self._stash_guestfs_info(g)
+
     @staticmethod
     def _safe_umount_all(g: guestfs.GuestFS) -> None:
         try:
@@ -584,11 +626,20 @@ class OfflineFSFix:
             pass
         return score
 
-    def detect_and_mount_root(self, g: guestfs.GuestFS) -> None:
+    def _inspect_roots(self, g: guestfs.GuestFS) -> List[str]:
+        if self.session is not None:
+            # the session caches inspect_os() per launch; refresh it once per run, since
+            # LUKS/mdraid/LVM activation may have exposed roots after an earlier consumer inspected
+            roots = self.session.roots(refresh=not self._roots_refreshed)
+            self._roots_refreshed = True
+            return roots
         try:
-            roots = g.inspect_os()
+            return g.inspect_os() or []
         except Exception:
-            roots = []
+            return []
+
+    def detect_and_mount_root(self, g: guestfs.GuestFS) -> None:
+        roots = self._inspect_roots(g)
         if not roots:
             self.logger.warning("inspect_os() found no roots; falling back to brute-force mount.")
             self.mount_root_bruteforce(g)
@@ -698,35 +749,20 @@ class OfflineFSFix:
           - list_filesystems() often includes LV paths
         """
         candidates: List[str] = []
+        inv = device_inventory(g).build()
 
         # 1) partitions
-        try:
-            candidates.extend([U.to_text(p) for p in (g.list_partitions() or [])])
-        except Exception:
-            pass
+        candidates.extend(d.dev for d in inv.devices.values() if d.role == "partition")
 
         # 2) mountable filesystems (skip swap + crypto_LUKS)
-        try:
-            fsmap = g.list_filesystems() or {}
-            for dev, fstype in fsmap.items():
-                d = U.to_text(dev)
-                t = U.to_text(fstype)
-                if t in ("swap", "crypto_LUKS"):
-                    continue
-                if d.startswith("/dev/"):
-                    candidates.append(d)
-        except Exception:
-            pass
+        for d, t in inv.filesystems().items():
+            if t in ("swap", "crypto_LUKS"):
+                continue
+            if d.startswith("/dev/"):
+                candidates.append(d)
 
         # 3) LVs
-        try:
-            if hasattr(g, "lvs"):
-                for lv in (g.lvs() or []):
-                    d = U.to_text(lv)
-                    if d.startswith("/dev/"):
-                        candidates.append(d)
-        except Exception:
-            pass
+        candidates.extend(d.dev for d in inv.devices.values() if d.role == "lv")
 
         # 4) mdraid devices
         try:
@@ -1082,6 +1118,15 @@ class OfflineFSFix:
             return {"image_resize": "failed", "error": str(e)}
 
     # report writer
+    def _record_identity(self, g: guestfs.GuestFS) -> None:
+        """Detect the guest on the open appliance so later consumers (domain emission) skip a launch."""
+        # imported here: core.guest_identity pulls in fixers.windows, which imports this module
+        from ..core.guest_identity import GuestDetector
+
+        roots = self._inspect_roots(g)
+        if self.session is not None and roots:
+            self.session.identity = GuestDetector.identify(g, self.logger, roots=roots)
+
     def write_report(self) -> None:
         write_report(self)
 
@@ -1110,6 +1155,11 @@ class OfflineFSFix:
             # 3) LVM activation (existing behavior; safe even if no LVM)
             self._run_stage("lvm_activate", lambda: self._activate_lvm(g), default=None)
 
+            # 3.5) one blkid pass over the now-complete device set; serves every later lookup
+            self.report["analysis"]["devices"] = self._run_stage(
+                "device_inventory", lambda: device_inventory(g, refresh=True).build().as_report(), default={}
+            )
+
             # 4) Mount root (critical)
             self._run_stage("mount_root", lambda: self.detect_and_mount_root(g), critical=True, default=None)
 
@@ -1117,6 +1167,8 @@ class OfflineFSFix:
             fs_audit = self._run_stage("filesystem_repair", lambda: self.fix_filesystems(g), default={"enabled": False})
             self.report.setdefault("analysis", {})["filesystem_repair"] = fs_audit
             if (fs_audit or {}).get("enabled"):
+                # repair may rewrite superblocks: drop cached labels/UUIDs
+                invalidate_device_inventory(g)
                 # fix_filesystems() unmounts; re-mount to proceed
                 self._run_stage(
                     "remount_root_after_fs_repair",
@@ -1125,6 +1177,10 @@ class OfflineFSFix:
                     default=None,
                 )
 
+            # 4.6) config trees: one tar_out in, one tar_in back (flushed by sync/umount)
+            if self.guest_vfs_cache:
+                g = GuestVFS(g, self.logger)
+
             # identity into report
             def _read_os_release() -> str:
                 try:
@@ -1240,6 +1296,9 @@ class OfflineFSFix:
 
             self._safe_umount_all(g)
 
+            if self.session is not None and self.session.identity is None:
+                self._run_stage("guest_identity", lambda: self._record_identity(g), default=None)
+
             # report aggregation
             self.report["changes"] = {
                 "fstab": c_fstab,
@@ -1258,6 +1317,8 @@ class OfflineFSFix:
             self.report["analysis"]["disk"] = disk
             self.report["analysis"]["regen"] = regen_info
             self.report["analysis"]["timings"] = dict(self._timings)
+            if isinstance(g, GuestVFS):
+                self.report["analysis"]["guest_vfs"] = dict(g.stats)
             self.report["timestamps"]["end"] = _dt.datetime.now().isoformat()
 
         finally:
@@ -1265,9 +1326,10 @@ class OfflineFSFix:
                 self._safe_umount_all(g)
             except Exception:
                 pass
-            try:
-                g.close()
-            except Exception:
-                pass
+            if self.session is None:
+                try:
+                    g.close()
+                except Exception:
+                    pass
 
         self.write_report()
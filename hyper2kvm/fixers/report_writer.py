@@ -283,6 +283,8 @@ def _extract_analysis_sections(analysis: Dict[str, Any]) -> Dict[str, Any]:
         "mdraid": analysis.get("mdraid", {}) or {},
         "windows": analysis.get("windows", {}) or {},
         "virtio": analysis.get("virtio", {}) or {},
+        "appliance": analysis.get("appliance", {}) or {},
+        "timings": analysis.get("timings", {}) or {},
     }
 
 
@@ -519,6 +521,20 @@ def _build_markdown(
     md.append(_dump_json_best_effort(sections.get("regen", {})))
     md.append("```")
     md.append("")
+    md.append("### libguestfs Appliance")
+    md.append("```json")
+    md.append(_dump_json_best_effort(sections.get("appliance", {})))
+    md.append("```")
+    md.append("")
+    timings = sections.get("timings", {}) or {}
+    if timings:
+        md.append("### Stage Timings")
+        md.append("")
+        md.append("| Stage | Seconds |")
+        md.append("|---|---:|")
+        for name, secs in sorted(timings.items(), key=lambda kv: -float(kv[1] or 0)):
+            md.append(f"| {name} | {float(secs or 0):.3f} |")
+        md.append("")
 
     # Cloud-init + VMware tools details
     md.append("### Cloud-init")
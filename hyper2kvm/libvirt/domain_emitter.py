@@ -12,6 +12,7 @@ from ..core.logger import Log
 from ..core.utils import U
 
 from ..core.guest_identity import GuestDetector, GuestType, emit_guest_identity_log
+from ..core.guest_session import default_registry
 
 
 try:
@@ -36,12 +37,13 @@ def _write_text(path: Path, s: str) -> None:
     path.write_text(s, encoding="utf-8")
 
 
-def _guess_guest_kind(args: argparse.Namespace, img: Path, logger) -> str:
+def _guess_guest_kind(args: argparse.Namespace, img: Path, logger, images: Optional[List[Path]] = None) -> str:
     """
     Priority:
       1) explicit args.guest_os (linux/windows)
       2) explicit args.windows / args.win / args.is_windows booleans
-      3) guestfs-based detection (shared GuestDetector) + hostnamectl-like log
+      3) guestfs-based detection (shared GuestDetector) + hostnamectl-like log;
+         reuses the identity cached by the offline fixer's session when there is one
       4) heuristic from name/image stem
       5) default: linux
     """
@@ -61,7 +63,10 @@ def _guess_guest_kind(args: argparse.Namespace, img: Path, logger) -> str:
             return "windows"
 
     # 3) guestfs-based (best signal)
-    ident = GuestDetector.detect(img, logger)
+    # a VM-level fix registers the session under all of the VM's images
+    registry = default_registry()
+    session = (registry.lookup(images) if images else None) or registry.lookup([img])
+    ident = GuestDetector.detect(img, logger, session=session)
     if ident is not None:
         emit_guest_identity_log(logger, ident)
         if ident.type in (GuestType.WINDOWS, GuestType.LINUX):
@@ -136,7 +141,7 @@ def emit_from_args(
     domain_dir = out_root / "libvirt"
     U.ensure_dir(domain_dir)
 
-    guest_kind = _guess_guest_kind(args, img, logger)
+    guest_kind = _guess_guest_kind(args, img, logger, out_images)
     uefi = bool(getattr(args, "uefi", False))
     headless = bool(getattr(args, "headless", False))
 
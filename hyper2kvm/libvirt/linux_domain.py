@@ -12,6 +12,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal, Optional
 
+from ..core.file_ops import fast_copy
 from ..core.xml_utils import xml_escape as _xml
 from .libvirt_utils import sanitize_name as _sanitize_name
 
@@ -71,7 +72,8 @@ def copy_disk_for_libvirt(
 
     Keeps your prior policy:
       - sudo rm (optional overwrite)
-      - sudo cp
+      - copy: fast_copy (reflink / copy_file_range / sparse) when dest_dir is
+        writable by us, otherwise sudo cp --reflink=auto --sparse=always
       - sudo chown qemu:qemu
       - sudo chmod 0640
       - restorecon best-effort
@@ -92,7 +94,10 @@ def copy_disk_for_libvirt(
             return dst
         _run_sudo(["rm", "-f", str(dst)], check=True)
 
-    _run_sudo(["cp", str(src), str(dst)], check=True)
+    if os.access(dest_dir, os.W_OK):
+        fast_copy(src, dst)
+    else:
+        _run_sudo(["cp", "--reflink=auto", "--sparse=always", str(src), str(dst)], check=True)
     _run_sudo(["chown", "qemu:qemu", str(dst)], check=True)
     _run_sudo(["chmod", "0640", str(dst)], check=True)
     _restorecon_best_effort(dst)
@@ -22,6 +22,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal, Optional
 
+from ..core.file_ops import fast_copy
 from ..core.xml_utils import xml_escape_attr as _xml_escape_attr, xml_escape_text as _xml_escape_text
 from .libvirt_utils import sanitize_name as _sanitize_name
 
@@ -261,10 +262,12 @@ def copy_disk_for_libvirt(
         try:
             dst.unlink()
         except Exception:
-            # If unlink fails, let copy2 raise something meaningful
+            # If unlink fails, let the copy raise something meaningful
             pass
 
-    shutil.copy2(src, dst)
+    # reflink / copy_file_range / sparse extent copy: never inflates a thin image
+    fast_copy(src, dst)
+    shutil.copystat(src, dst)
     os.chmod(dst, 0o644)
     _restorecon_best_effort(dst)
     return dst
@@ -15,6 +15,7 @@ from ..vmware.clients.client import PYVMOMI_AVAILABLE, REQUESTS_AVAILABLE
 
 # Optional: reuse your existing building blocks (present in your tree)
 from ..converters.fetch import Fetch
+from ..converters.ssh_ranged_fetch import SSHFetchOptions
 from ..vmware.utils.vmdk_parser import VMDK
 
 
@@ -190,6 +191,7 @@ class InventoryMode:
                 identity=getattr(self.args, "esxi_identity", None),
                 ssh_opt=self._normalize_ssh_opt(getattr(self.args, "esxi_ssh_opt", None)),
                 sudo=False,
+                control_master=not getattr(self.args, "no_ssh_mux", False),
             ),
         )
 
@@ -199,6 +201,11 @@ class InventoryMode:
             remote,
             fetch_dir,
             bool(getattr(self.args, "esxi_fetch_all", False)),
+            fetch_opts=SSHFetchOptions(
+                streams=max(1, int(getattr(self.args, "ssh_streams", 4) or 1)),
+                range_size=max(1, int(getattr(self.args, "ssh_range_mib", 64) or 64)) * 1024 * 1024,
+                compress=str(getattr(self.args, "ssh_compress", "none") or "none"),
+            ),
         )
 
         item = self._describe_path(Path(desc).resolve())
@@ -14,6 +14,7 @@ from pathlib import Path
 from typing import List, Optional, Tuple
 
 from ..converters.fetch import Fetch
+from ..converters.ssh_ranged_fetch import SSHFetchOptions
 from ..converters.extractors.ovf import OVF
 from ..converters.extractors.raw import RAW
 from ..converters.extractors.vhd import VHD
@@ -82,6 +83,7 @@ class DiskDiscovery:
                     identity=getattr(self.args, "identity", None),
                     ssh_opt=self._normalize_ssh_opts(getattr(self.args, "ssh_opt", None)),
                     sudo=False,
+                    control_master=not getattr(self.args, "no_ssh_mux", False),
                 ),
             )
             fetch_dir = (
@@ -97,6 +99,11 @@ class DiskDiscovery:
                 self.args.remote,
                 fetch_dir,
                 getattr(self.args, "fetch_all", False),
+                fetch_opts=SSHFetchOptions(
+                    streams=max(1, int(getattr(self.args, "ssh_streams", 4) or 1)),
+                    range_size=max(1, int(getattr(self.args, "ssh_range_mib", 64) or 64)) * 1024 * 1024,
+                    compress=str(getattr(self.args, "ssh_compress", "none") or "none"),
+                ),
             )
             disks = [desc]
             Log.ok(self.logger, f"Fetched: {desc.name}")
@@ -118,6 +125,7 @@ class DiskDiscovery:
                 ),
                 convert_compress=bool(getattr(self.args, "compress", False)),
                 convert_compress_level=getattr(self.args, "compress_level", None),
+                zero_copy=bool(getattr(self.args, "ova_zero_copy", False)),
                 log_virt_filesystems=bool(getattr(self.args, "log_virt_filesystems", False)),
             )
             self.logger.info("📦 Extracted %d disk(s) from OVA", len(disks))
@@ -220,6 +228,7 @@ class DiskDiscovery:
                     identity=getattr(self.args, "identity", None),
                     ssh_opt=self._normalize_ssh_opts(getattr(self.args, "ssh_opt", None)),
                     sudo=getattr(self.args, "sudo", False),
+                    control_master=not getattr(self.args, "no_ssh_mux", False),
                 ),
             )
             Log.step(self.logger, "Live-fix over SSH")
@@ -13,7 +13,7 @@ import concurrent.futures
 import logging
 import os
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from rich.progress import (
     BarColumn,
@@ -24,7 +24,10 @@ from rich.progress import (
 )
 
 from ..converters.flatten import Flatten
+from ..converters.qemu.alloc_map import plan_allocation
 from ..converters.qemu.converter import Convert
+from ..core.appliance import concurrent_appliances
+from ..core.guest_session import default_registry
 from ..core.logger import Log
 from ..core.recovery_manager import RecoveryManager
 from ..core.utils import U
@@ -37,7 +40,8 @@ class DiskProcessor:
     Processes disks through the conversion pipeline.
 
     Responsibilities:
-    - Single disk processing (flatten + fix + convert)
+    - Single disk processing (flatten + fix + convert, or overlay + fix + convert)
+    - VM-level processing (all disks fixed in one appliance, then converted in parallel)
     - Parallel multi-disk processing
     - Progress reporting
     - Output path resolution
@@ -147,6 +151,15 @@ class DiskProcessor:
         Log.trace(self.logger, "🔐 luks implicit enabled: %s", enabled)
         return enabled
 
+    def _use_overlay_pipeline(self) -> bool:
+        """Overlay pipeline needs a conversion step to fold the overlay into the output."""
+        if not getattr(self.args, "overlay_pipeline", False):
+            return False
+        if not getattr(self.args, "to_output", None) or getattr(self.args, "dry_run", False):
+            self.logger.warning("--overlay-pipeline needs --to-output (and no --dry-run); fixing the image in place")
+            return False
+        return True
+
     def process_single_disk(self, disk: Path, out_root: Path, disk_index: int, total_disks: int) -> Path:
         """
         Process a single disk through the pipeline.
@@ -164,10 +177,103 @@ class DiskProcessor:
         Log.trace(self.logger, "🧱 process_single_disk: disk=%s out_root=%s", disk, out_root)
 
         self.log_input_layout(disk)
+        working, overlay = self._prepare_working(disk, out_root, disk_index)
+
+        self._run_offline_fix(
+            [working], self._report_path(out_root, disk_index, total_disks), throwaway=overlay is not None
+        )
+
+        out_image = self._convert_working(working, overlay, out_root, disk_index, total_disks)
+        if out_image is not None:
+            default_registry().rebase([working], [out_image])
+        return out_image if out_image else working
+
+    def process_vm_disks(self, disks: List[Path], out_root: Path) -> List[Path]:
+        """
+        Process all disks of one VM: fix them together, then convert them in parallel.
+
+        Every working image is attached to one appliance, so root detection, fstab
+        stabilization and initramfs regen see the whole guest (/var or an LVM VG on
+        disk 2) and the appliance boots once instead of once per disk.
+
+        --resize is rejected: the fixer resizes one image, and which disk holds
+        the root filesystem is only known once the appliance is up.
+
+        Returns:
+            Output images in disk order (disks whose conversion failed are omitted)
+        """
+        if getattr(self.args, "resize", None):
+            U.die(
+                self.logger,
+                "🔥 --resize cannot be combined with --vm-fix (it would grow only the first disk); "
+                "resize the disk that holds the root filesystem separately, or drop --vm-fix",
+                1,
+            )
+        total = len(disks)
+        self.logger.info(f"🧩 VM-level fix: {total} disk(s) in one appliance")
+
+        prepared: List[Tuple[Path, Optional[Path]]] = []
+        for idx, disk in enumerate(disks):
+            Log.step(self.logger, f"Preparing disk {idx + 1}/{total}: {disk.name}")
+            self.log_input_layout(disk)
+            prepared.append(self._prepare_working(disk, out_root, idx))
+        workings = [w for w, _ in prepared]
+
+        # one report for the VM, not one per disk
+        self._run_offline_fix(
+            workings, self._report_path(out_root, 0, 1), throwaway=all(o is not None for _w, o in prepared)
+        )
+
+        results: List[Optional[Path]] = [None] * total
+        if total == 1:
+            results[0] = self._convert_working(prepared[0][0], prepared[0][1], out_root, 0, total)
+        else:
+            max_workers = self._max_workers(total)
+            order = self._largest_first(workings)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self._convert_working, prepared[idx][0], prepared[idx][1], out_root, idx, total): idx
+                    for idx in order
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    idx = futures[future]
+                    try:
+                        results[idx] = future.result()
+                        self.logger.info(f"✅ Completed disk {idx + 1}/{total}: {disks[idx].name}")
+                    except Exception as e:
+                        self.logger.error(f"💥 Failed converting disk {idx + 1}/{total} ({disks[idx].name}): {e}")
+                        Log.trace(self.logger, "💥 process_vm_disks exception: idx=%d", idx, exc_info=True)
+
+        converted = [r for r in results if r is not None]
+        if len(converted) == total:
+            default_registry().rebase(workings, converted)
+
+        if getattr(self.args, "to_output", None) and not getattr(self.args, "dry_run", False):
+            return converted
+        return workings
+
+    def _prepare_working(self, disk: Path, out_root: Path, disk_index: int) -> Tuple[Path, Optional[Path]]:
+        """Return (working image, overlay or None) after the optional overlay/flatten step."""
         working = disk
+        overlay: Optional[Path] = None
+
+        # Overlay pipeline: fixers write into a thin qcow2 overlay, the source stays read-only,
+        # and the single convert below reads through overlay + snapshot chain.
+        if self._use_overlay_pipeline():
+            workdir = self._choose_workdir(self.args, out_root)
+            U.ensure_dir(workdir)
+            Log.step(self.logger, f"Overlay over read-only source → {workdir}")
+            if getattr(self.args, "flatten", False):
+                self.logger.info("Overlay pipeline: --flatten not needed (convert reads the whole snapshot chain)")
+            overlay = Convert.create_overlay(
+                self.logger,
+                disk,
+                workdir / f"{disk.stem}.disk{disk_index}.overlay.qcow2",
+            )
+            working = overlay
 
         # Flatten if requested
-        if getattr(self.args, "flatten", False):
+        elif getattr(self.args, "flatten", False):
             workdir = self._choose_workdir(self.args, out_root)
             U.ensure_dir(workdir)
             Log.step(self.logger, f"Flatten snapshots → {workdir}")
@@ -179,16 +285,25 @@ class DiskProcessor:
             )
             Log.ok(self.logger, f"Flattened: {working.name}")
 
-        # Report path
-        report_path = None
-        if getattr(self.args, "report", None):
-            rp = Path(self.args.report)
-            if total_disks > 1:
-                report_path = (out_root / f"{rp.stem}_disk{disk_index}{rp.suffix}") if not rp.is_absolute() else rp
-            else:
-                report_path = rp if rp.is_absolute() else (out_root / rp)
-            Log.trace(self.logger, "🧾 report_path=%s", report_path)
+        return working, overlay
+
+    def _report_path(self, out_root: Path, disk_index: int, total_disks: int) -> Optional[Path]:
+        if not getattr(self.args, "report", None):
+            return None
+        rp = Path(self.args.report)
+        if total_disks > 1:
+            report_path = (out_root / f"{rp.stem}_disk{disk_index}{rp.suffix}") if not rp.is_absolute() else rp
+        else:
+            report_path = rp if rp.is_absolute() else (out_root / rp)
+        Log.trace(self.logger, "🧾 report_path=%s", report_path)
+        return report_path
+
+    def _run_offline_fix(self, images: List[Path], report_path: Optional[Path], *, throwaway: bool = False) -> None:
+        """
+        Run OfflineFSFix over images attached to one appliance (images[0] names the report).
 
+        throwaway: the images are overlays discarded after convert (attached with cachemode=unsafe).
+        """
         # Load cloud-init config
         cloud_init_data = self._load_cloud_init_config()
         if cloud_init_data is not None:
@@ -198,11 +313,14 @@ class DiskProcessor:
                 sorted(list(cloud_init_data.keys())) if isinstance(cloud_init_data, dict) else type(cloud_init_data).__name__,
             )
 
-        # Offline fixes
+        # Offline fixes (the appliance is kept in a shared session so domain emission can reuse its findings)
         Log.step(self.logger, "Offline filesystem fixes")
+        session = default_registry().session(
+            images, self.logger, trace=self.logger.isEnabledFor(logging.DEBUG), throwaway=throwaway
+        )
         fixer = OfflineFSFix(
             self.logger,
-            working,
+            images[0],
             dry_run=getattr(self.args, "dry_run", False),
             no_backup=getattr(self.args, "no_backup", False),
             print_fstab=getattr(self.args, "print_fstab", False),
@@ -220,51 +338,118 @@ class DiskProcessor:
             luks_passphrase_env=getattr(self.args, "luks_passphrase_env", None),
             luks_keyfile=getattr(self.args, "luks_keyfile", None),
             luks_mapper_prefix=getattr(self.args, "luks_mapper_prefix", "hyper2kvm-crypt"),
+            session=session,
+            guest_vfs_cache=not getattr(self.args, "no_guest_vfs_cache", False),
         )
-        fixer.run()
+        try:
+            fixer.run()
+        finally:
+            # qemu-img takes image locks: the appliance must be down before convert
+            session.release()
         Log.ok(self.logger, "Offline fixes complete")
 
-        # Convert to output format if requested
-        out_image: Optional[Path] = None
-        if getattr(self.args, "to_output", None) and not getattr(self.args, "dry_run", False):
-            out_image = self._resolve_output_path(
-                str(self.args.to_output),
-                out_root,
-                disk_index=disk_index,
-                multi=(total_disks > 1),
-            )
-            U.ensure_dir(out_image.parent)
+    def _convert_working(
+        self,
+        working: Path,
+        overlay: Optional[Path],
+        out_root: Path,
+        disk_index: int,
+        total_disks: int,
+    ) -> Optional[Path]:
+        """Convert a fixed working image to the output format; None when no conversion is requested."""
+        if not getattr(self.args, "to_output", None) or getattr(self.args, "dry_run", False):
+            return None
 
-            Log.step(self.logger, f"Convert image → {out_image.name}")
-            Log.trace(
-                self.logger,
-                "🧪 convert: in=%s out=%s fmt=%s compress=%s level=%r",
-                working,
-                out_image,
-                getattr(self.args, "out_format", "qcow2"),
-                getattr(self.args, "compress", False),
-                getattr(self.args, "compress_level", None),
-            )
+        out_image = self._resolve_output_path(
+            str(self.args.to_output),
+            out_root,
+            disk_index=disk_index,
+            multi=(total_disks > 1),
+        )
+        U.ensure_dir(out_image.parent)
+
+        Log.step(self.logger, f"Convert image → {out_image.name}")
+        Log.trace(
+            self.logger,
+            "🧪 convert: in=%s out=%s fmt=%s compress=%s level=%r",
+            working,
+            out_image,
+            getattr(self.args, "out_format", "qcow2"),
+            getattr(self.args, "compress", False),
+            getattr(self.args, "compress_level", None),
+        )
 
-            progress_callback = self._throttled_progress_logger(self.logger, step_pct=5)
+        progress_callback = self._throttled_progress_logger(self.logger, step_pct=5)
 
-            Convert.convert_image_with_progress(
-                self.logger,
-                working,
-                out_image,
-                out_format=getattr(self.args, "out_format", "qcow2"),
-                compress=getattr(self.args, "compress", False),
-                compress_level=getattr(self.args, "compress_level", None),
-                progress_callback=progress_callback,
+        alloc = Convert.convert_image_with_progress(
+            self.logger,
+            working,
+            out_image,
+            out_format=getattr(self.args, "out_format", "qcow2"),
+            compress=getattr(self.args, "compress", False),
+            compress_level=getattr(self.args, "compress_level", None),
+            progress_callback=progress_callback,
+            in_format="qcow2" if overlay is not None else None,
+            profile=getattr(self.args, "convert_profile", None),
+            compress_threads=getattr(self.args, "compress_threads", None),
+        )
+        Convert.validate(self.logger, out_image)
+        Log.ok(self.logger, f"Validated: {out_image.name}")
+
+        if alloc is not None and self.recovery_manager:
+            self.recovery_manager.save_checkpoint(
+                "converted",
+                {"output": str(out_image), "allocation": alloc.to_dict()},
+                scope=f"disk{disk_index}",
             )
-            Convert.validate(self.logger, out_image)
-            Log.ok(self.logger, f"Validated: {out_image.name}")
 
-            if getattr(self.args, "checksum", False):
-                cs = U.checksum(out_image)
-                self.logger.info(f"🧾 SHA256 checksum: {cs}")
+        if overlay is not None:
+            # the fixes now live in out_image; on failure the overlay is kept for inspection
+            try:
+                self.logger.info(f"Overlay used {U.human_bytes(overlay.stat().st_blocks * 512)} of scratch")
+            except OSError:
+                pass
+            overlay.unlink(missing_ok=True)
 
-        return out_image if out_image else working
+        if getattr(self.args, "checksum", False):
+            cs = U.checksum(out_image)
+            self.logger.info(f"🧾 SHA256 checksum: {cs}")
+
+        return out_image
+
+    def _largest_first(self, disks: List[Path]) -> List[int]:
+        """
+        Disk indexes ordered by predicted bytes to write (qemu-img map), largest
+        first, so the biggest disk does not start last and stretch the run.
+        Unmappable disks keep their relative order after the mapped ones.
+        """
+        out_format = getattr(self.args, "out_format", "qcow2")
+        work: List[int] = []
+        for disk in disks:
+            plan = plan_allocation(self.logger, disk)
+            work.append(plan.predicted_write_bytes(out_format) if plan is not None else -1)
+        order = sorted(range(len(disks)), key=lambda i: work[i], reverse=True)
+        Log.trace(self.logger, "📐 disk schedule (largest first): %s", [(disks[i].name, work[i]) for i in order])
+        return order
+
+    def _max_workers(self, n: int) -> int:
+        env_workers = os.environ.get("VMDK2KVM_WORKERS")
+        if env_workers:
+            try:
+                max_workers = max(1, int(env_workers))
+            except Exception:
+                max_workers = min(4, n, (os.cpu_count() or 1))
+        else:
+            max_workers = min(4, n, (os.cpu_count() or 1))
+
+        Log.trace(
+            self.logger,
+            "👷 parallel workers: max_workers=%d (env=%r cpu=%r)",
+            max_workers,
+            env_workers,
+            os.cpu_count(),
+        )
+        return max_workers
 
     def process_disks_parallel(self, disks: List[Path], out_root: Path) -> List[Path]:
         """
@@ -282,22 +467,9 @@ class DiskProcessor:
 
         results: List[Optional[Path]] = [None] * len(disks)
 
-        env_workers = os.environ.get("VMDK2KVM_WORKERS")
-        if env_workers:
-            try:
-                max_workers = max(1, int(env_workers))
-            except Exception:
-                max_workers = min(4, len(disks), (os.cpu_count() or 1))
-        else:
-            max_workers = min(4, len(disks), (os.cpu_count() or 1))
+        max_workers = self._max_workers(len(disks))
 
-        Log.trace(
-            self.logger,
-            "👷 parallel workers: max_workers=%d (env=%r cpu=%r)",
-            max_workers,
-            env_workers,
-            os.cpu_count(),
-        )
+        order = self._largest_first(disks)
 
         with Progress(
             TextColumn("{task.description}"),
@@ -307,10 +479,12 @@ class DiskProcessor:
             TimeRemainingColumn(),
         ) as progress:
             task = progress.add_task("Processing disks", total=len(disks))
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with concurrent_appliances(max_workers), concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers
+            ) as executor:
                 futures = {
-                    executor.submit(self.process_single_disk, disk, out_root, idx, len(disks)): idx
-                    for idx, disk in enumerate(disks)
+                    executor.submit(self.process_single_disk, disks[idx], out_root, idx, len(disks)): idx
+                    for idx in order
                 }
                 for future in concurrent.futures.as_completed(futures):
                     idx = futures[future]
@@ -224,11 +224,18 @@ class Orchestrator:
 
         Log.trace(
             self.logger,
-            "🧠 _process_disks: disks=%d parallel=%s",
+            "🧠 _process_disks: disks=%d parallel=%s vm_fix=%s",
             len(self.disks),
             getattr(self.args, "parallel_processing", False),
+            getattr(self.args, "vm_fix", False),
         )
 
+        if len(self.disks) > 1 and getattr(self.args, "vm_fix", False):
+            for disk in self.disks:
+                if not disk.exists():
+                    U.die(self.logger, f"🔥 Disk not found: {disk}", 1)
+            return self.disk_processor.process_vm_disks(self.disks, out_root)
+
         if len(self.disks) > 1 and getattr(self.args, "parallel_processing", False):
             return self.disk_processor.process_disks_parallel(self.disks, out_root)
 
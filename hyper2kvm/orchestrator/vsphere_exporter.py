@@ -141,6 +141,14 @@ class VsphereExporter:
         vddk_download_output = getattr(self.args, "vs_vddk_download_output", None) or getattr(
             self.args, "vddk_download_output", None
         )
+        vddk_allocated_only = bool(getattr(self.args, "vs_vddk_allocated_only", False))
+        vddk_skip_zero_blocks = bool(getattr(self.args, "vs_vddk_skip_zero_blocks", True))
+        vddk_punch_holes = bool(getattr(self.args, "vs_vddk_punch_holes", False))
+        vddk_connections = int(getattr(self.args, "vs_vddk_connections", 1) or 1)
+        vddk_io_buffers = int(getattr(self.args, "vs_vddk_io_buffers", 4) or 1)
+        auto_read_size = bool(getattr(self.args, "vs_auto_read_size", False))
+        read_size_min = int(getattr(self.args, "vs_read_size_min_kib", 256) or 256) * 1024
+        read_size_max = int(getattr(self.args, "vs_read_size_max_kib", 65536) or 65536) * 1024
 
         Log.trace(
             self.logger,
@@ -213,6 +221,14 @@ class VsphereExporter:
                         vddk_download_output=Path(vddk_download_output).expanduser().resolve()
                         if vddk_download_output
                         else None,
+                        vddk_download_allocated_only=vddk_allocated_only,
+                        vddk_download_skip_zero_blocks=vddk_skip_zero_blocks,
+                        vddk_download_punch_holes=vddk_punch_holes,
+                        vddk_download_connections=vddk_connections,
+                        vddk_download_io_buffers=vddk_io_buffers,
+                        vddk_download_auto_tune=auto_read_size,
+                        vddk_download_read_size_min=read_size_min,
+                        vddk_download_read_size_max=read_size_max,
                     )
 
                     # This must be SYNC in VMwareClient implementation
@@ -226,6 +242,13 @@ class VsphereExporter:
                     if export_mode == "vddk_download":
                         out_images.append(Path(out_path))
                         self.logger.info("⬇️ vSphere VDDK download OK: %s -> %s", vm_name, out_path)
+                        if vc.last_read_tuning:
+                            self.logger.info(
+                                "📏 VDDK read size for %s: %d KiB (%.1f MiB/s)",
+                                vm_name,
+                                int(vc.last_read_tuning["chosen_bytes"]) // 1024,
+                                float(vc.last_read_tuning["best_mib_s"]),
+                            )
                         continue
 
                     # export_mode == "v2v": discover artifacts
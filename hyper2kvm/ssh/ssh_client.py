@@ -14,6 +14,7 @@ from typing import List, Optional, Sequence
 
 from ..core.utils import U
 from .ssh_config import SSHConfig
+from .ssh_mux import default_pool
 
 
 @dataclass(frozen=True)
@@ -29,6 +30,8 @@ class SSHClient:
     """
     Minimal, production-safe SSH helper.
 
+    With cfg.control_master, every ssh/scp/rsync invocation goes through the
+    process-wide ssh_mux pool (one authenticated master per host/user/port).
     """
 
     def __init__(self, logger: logging.Logger, cfg: SSHConfig):
@@ -53,9 +56,28 @@ class SSHClient:
         self._rsync_append_verify = bool(getattr(cfg, "rsync_append_verify", False))
         self._ensure_remote_dir = bool(getattr(cfg, "ensure_remote_dir", True))
 
+        # Connection multiplexing (optional)
+        self._mux = bool(getattr(cfg, "control_master", False))
+
     # argv builders
 
+    def _mux_args(self) -> List[str]:
+        """ControlPath options for the shared master (started on first use); [] if disabled/unavailable."""
+        if not self._mux:
+            return []
+        return default_pool().acquire(
+            self.cfg.host,
+            self.cfg.user,
+            int(self.cfg.port),
+            ["-p", str(self.cfg.port)] + self._base_common(),
+            control_path=getattr(self.cfg, "control_path", None),
+            persist_s=getattr(self.cfg, "control_persist_s", None),
+        )
+
     def _common(self) -> List[str]:
+        return self._base_common() + self._mux_args()
+
+    def _base_common(self) -> List[str]:
         opts: List[str] = [
             "-o",
             "BatchMode=yes",
@@ -75,7 +97,7 @@ class SSHClient:
             opts += ["-o", f"UserKnownHostsFile={known_hosts}"]
 
         if self.cfg.identity:
-            opts += ["-i", self.cfg.identity]
+            opts += ["-i", str(self.cfg.identity)]
 
         if self.cfg.ssh_opt:
             opts += list(self.cfg.ssh_opt)
@@ -45,6 +45,7 @@ class SSHConfig:
     port: int = 22
     identity: Optional[Path] = None
     ssh_opts: List[str] = field(default_factory=list)
+    ssh_opt: Optional[List[str]] = None      # raw extra argv (--ssh-opt), passed verbatim by SSHClient
 
     # behavior
     sudo: bool = False
@@ -65,7 +66,7 @@ class SSHConfig:
     accept_new_host_keys: bool = False       # semantic intent; may not be emitted on old ssh
     force_accept_new: bool = False           # if True, emit accept-new even if ssh might be old
 
-    # performance / multiplexing knobs
+    # performance / multiplexing knobs (SSHClient: shared ssh_mux pool master per host/user/port)
     control_master: bool = False
     control_path: Optional[Path] = None
     control_persist_s: int = 60
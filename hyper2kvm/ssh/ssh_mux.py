@@ -0,0 +1,195 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/ssh/ssh_mux.py
+"""
+Process-wide pool of OpenSSH ControlMaster connections.
+
+Every SSHClient probe (exists/is_file/stat/cat...) and every fetch-path
+`ssh ... dd` used to pay a full TCP + key exchange + auth round trip. The
+pool keeps one master connection per (host, user, port); every later
+ssh/scp/rsync invocation for that key is handed
+`-o ControlPath=<socket> -o ControlMaster=no` and opens a session over the
+existing connection instead.
+
+- masters start lazily, on the first acquire() for a key
+- if a master cannot be started, that key falls back to plain connections
+  (acquire() returns no options) for the rest of the run
+- sockets live in a private 0700 temp dir; close_all() (registered with
+  atexit) sends `-O exit` to every master and removes the dir.
+  ControlPersist is the safety net if the process dies without atexit.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MuxKey = Tuple[str, str, int]
+
+_DEFAULT_PERSIST_S = 60
+_MASTER_START_TIMEOUT_S = 60
+
+
+class SSHMuxPool:
+    def __init__(self, logger: Optional[logging.Logger] = None, *, persist_s: int = _DEFAULT_PERSIST_S):
+        self.logger = logger or logging.getLogger(__name__)
+        self.persist_s = int(persist_s)
+        self._lock = threading.Lock()
+        self._dir: Optional[Path] = None
+        self._masters: Dict[MuxKey, Tuple[Path, List[str]]] = {}  # key -> (socket, master argv prefix)
+        self._failed: set = set()
+        self._key_locks: Dict[MuxKey, threading.Lock] = {}
+
+    def _socket_path(self, key: MuxKey) -> Path:
+        # unix socket paths are limited to ~104 bytes: keep the name short
+        if self._dir is None:
+            self._dir = Path(tempfile.mkdtemp(prefix="h2k-mux-"))
+        digest = hashlib.sha256(f"{key[1]}@{key[0]}:{key[2]}".encode("utf-8")).hexdigest()[:12]
+        return self._dir / digest
+
+    def _key_lock(self, key: MuxKey) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def acquire(
+        self,
+        host: str,
+        user: str,
+        port: int,
+        base_args: Sequence[str],
+        *,
+        control_path: Optional[Path] = None,
+        persist_s: Optional[int] = None,
+    ) -> List[str]:
+        """
+        Return ssh options that route a connection through the shared master.
+
+        base_args are the ssh options (port, identity, host-key policy, extra -o ...)
+        without the leading "ssh" and without the target; they are used to start
+        the master on first use. Returns [] when multiplexing is unavailable.
+        """
+        key: MuxKey = (str(host), str(user), int(port))
+        with self._key_lock(key):
+            if key in self._failed:
+                return []
+            if key not in self._masters:
+                if not self._start_master(key, list(base_args), control_path, persist_s):
+                    self._failed.add(key)
+                    return []
+            sock = self._masters[key][0]
+        return ["-o", f"ControlPath={sock}", "-o", "ControlMaster=no"]
+
+    def _start_master(
+        self,
+        key: MuxKey,
+        base_args: List[str],
+        control_path: Optional[Path],
+        persist_s: Optional[int],
+    ) -> bool:
+        host, user, _port = key
+        with self._lock:
+            sock = Path(control_path) if control_path else self._socket_path(key)
+        persist = self.persist_s if persist_s is None else int(persist_s)
+        prefix = ["ssh"] + base_args + ["-o", f"ControlPath={sock}"]
+        argv = prefix + [
+            "-o",
+            "ControlMaster=yes",
+            "-o",
+            f"ControlPersist={persist}s",
+            "-N",
+            "-f",
+            f"{user}@{host}",
+        ]
+        self.logger.debug("ssh-mux: starting master for %s@%s:%d", *key)
+        # -f backgrounds the master after auth; it must not inherit our pipes
+        try:
+            with tempfile.TemporaryFile(mode="w+") as err:
+                rc = subprocess.run(
+                    argv,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=err,
+                    timeout=_MASTER_START_TIMEOUT_S,
+                ).returncode
+                err.seek(0)
+                stderr = err.read().strip()
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.logger.warning("ssh-mux: could not start master for %s@%s:%d (%s); using plain connections", *key, e)
+            return False
+        if rc != 0:
+            self.logger.warning(
+                "ssh-mux: master for %s@%s:%d failed (rc=%d): %s; using plain connections",
+                *key,
+                rc,
+                stderr or "-",
+            )
+            return False
+        with self._lock:
+            self._masters[key] = (sock, prefix)
+        self.logger.debug("ssh-mux: master ready for %s@%s:%d (%s)", *key, sock)
+        return True
+
+    def close(self, host: str, user: str, port: int) -> None:
+        key: MuxKey = (str(host), str(user), int(port))
+        with self._lock:
+            entry = self._masters.pop(key, None)
+            self._failed.discard(key)
+        if entry is not None:
+            self._exit_master(key, *entry)
+
+    def close_all(self) -> None:
+        """Stop every master and remove the socket dir. Safe to call repeatedly."""
+        with self._lock:
+            masters = list(self._masters.items())
+            self._masters.clear()
+            self._failed.clear()
+            sock_dir, self._dir = self._dir, None
+        for key, (sock, prefix) in masters:
+            self._exit_master(key, sock, prefix)
+        if sock_dir is not None:
+            shutil.rmtree(sock_dir, ignore_errors=True)
+
+    def _exit_master(self, key: MuxKey, sock: Path, prefix: List[str]) -> None:
+        host, user, _port = key
+        try:
+            subprocess.run(
+                prefix + ["-O", "exit", f"{user}@{host}"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=10,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.logger.debug("ssh-mux: -O exit for %s@%s:%d failed: %s", *key, e)
+
+
+_pool: Optional[SSHMuxPool] = None
+_pool_lock = threading.Lock()
+
+
+def default_pool() -> SSHMuxPool:
+    """The process-wide pool shared by SSHClient and the fetch path (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SSHMuxPool()
+            atexit.register(_pool.close_all)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Tear down the process-wide pool now (also runs at interpreter exit)."""
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        pool.close_all()
+
+
+__all__ = ["SSHMuxPool", "default_pool", "shutdown_pool"]
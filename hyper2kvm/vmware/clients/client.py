@@ -217,6 +217,14 @@ class V2VExportOptions:
     vddk_download_output: Optional[Path] = None
     vddk_download_sectors_per_read: int = 2048  # 1 MiB (2048 * 512)
     vddk_download_log_every_bytes: int = 256 * 1024 * 1024
+    vddk_download_allocated_only: bool = False  # read only allocated extents (QueryAllocatedBlocks)
+    vddk_download_skip_zero_blocks: bool = True  # leave all-zero 64 KiB sub-blocks as holes
+    vddk_download_punch_holes: bool = False  # fallocate(PUNCH_HOLE) zero blocks of a resumed .part
+    vddk_download_connections: int = 1  # >1: sharded download over N VDDK sessions (worker processes)
+    vddk_download_io_buffers: int = 4  # read-buffer ring size; >1 overlaps VDDK reads with local writes
+    vddk_download_auto_tune: bool = False  # tune the read size from measured throughput
+    vddk_download_read_size_min: int = 256 * 1024
+    vddk_download_read_size_max: int = 64 * 1024 * 1024
 
 
 # Import all functions from split modules
@@ -243,6 +251,15 @@ from ..utils.datastore import (
     _vm_runtime_host as _datastore_vm_runtime_host,
 )
 
+# Import snapshot / CBT operations
+from ..utils.snapshot import (
+    enable_cbt as _snapshot_enable_cbt,
+    create_snapshot as _snapshot_create_snapshot,
+    remove_snapshot as _snapshot_remove_snapshot,
+    snapshot_moref as _snapshot_snapshot_moref,
+    query_changed_disk_areas as _snapshot_query_changed_disk_areas,
+)
+
 # Import v2v operations
 from ..utils.v2v import (
     v2v_export_vm as _v2v_export_vm,
@@ -296,6 +313,9 @@ class VMwareClient:
         # HTTP download client
         self._http_client: Optional[HTTPDownloadClient] = None
 
+        # ReadSizeTuner summary of the last auto-tuned VDDK download (for reports)
+        self.last_read_tuning: Optional[Dict[str, Any]] = None
+
         # caches
         self._dc_cache: Optional[List[Any]] = None
         self._dc_name_cache: Optional[List[str]] = None
@@ -1131,6 +1151,46 @@ class VMwareClient:
     def vddk_download_disk(self, opt: V2VExportOptions) -> Path:
         return _vddk_download_disk(self, opt)
 
+    # Snapshots / CBT - Delegate to vmware_snapshot
+
+    def enable_cbt(self, vm_obj: Any) -> None:
+        _snapshot_enable_cbt(self, vm_obj)
+
+    def create_snapshot(
+        self,
+        vm_obj: Any,
+        name: str,
+        *,
+        quiesce: bool = True,
+        memory: bool = False,
+        description: str = "Created by hyper2kvm",
+    ) -> Any:
+        return _snapshot_create_snapshot(self, vm_obj, name, quiesce=quiesce, memory=memory, description=description)
+
+    def remove_snapshot(self, snapshot: Any, *, consolidate: bool = True) -> None:
+        _snapshot_remove_snapshot(self, snapshot, consolidate=consolidate)
+
+    def snapshot_moref(self, snapshot: Any) -> Optional[str]:
+        return _snapshot_snapshot_moref(snapshot)
+
+    def query_changed_disk_areas(
+        self,
+        vm_obj: Any,
+        *,
+        snapshot: Any,
+        device_key: int,
+        start_offset: int,
+        change_id: str,
+    ) -> Any:
+        return _snapshot_query_changed_disk_areas(
+            self,
+            vm_obj,
+            snapshot=snapshot,
+            device_key=device_key,
+            start_offset=start_offset,
+            change_id=change_id,
+        )
+
     # Unified entrypoint (policy) - refactored into smaller handlers
 
     @staticmethod
@@ -6,7 +6,10 @@ VMware transport/download mechanisms.
 This package provides various transport methods for downloading VM data:
 - vddk_client: VMware VDDK-based transport
 - vddk_loader: VDDK library loader and wrapper
+- vddk_parallel: Sharded multi-connection VDDK download
+- cbt_sync: CBT incremental sync engine (changed-extent patching)
 - http_client: HTTPS download client
+- http_segmented: Segmented (multi-connection Range) HTTPS download
 - http_progress: Progress reporters for HTTP downloads
 - ovftool_client: VMware ovftool-based transport
 - ovftool_loader: ovftool binary loader
@@ -8,9 +8,9 @@ Handles downloading files from vSphere datastores via /folder HTTP interface.
 
 from __future__ import annotations
 
+import json
 import logging
 import os
-import tempfile
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
@@ -52,8 +52,12 @@ except Exception:
     pass  # Keep our fallback
 
 # Import utility functions
+from ...core.file_ops import clone_file_prefix
+from ...core.read_tuner import READ_SIZE_MAX, READ_SIZE_MIN, ReadSizeTuner
 from ...core.utils import U
 
+from .http_segmented import SEGMENT_MAP_SUFFIX, RangeNotSupported, download_segmented
+
 # Import progress reporters
 from .http_progress import (
     ProgressReporter,
@@ -108,6 +112,37 @@ def _warn_line(msg: str) -> None:
     print(f"WARNING: {msg}")
 
 
+PART_META_SUFFIX = ".meta"
+
+
+def _part_meta_path(part_path: Path) -> Path:
+    return part_path.with_name(part_path.name + PART_META_SUFFIX)
+
+
+def _part_identity(remote_meta: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Remote identity a .part is bound to; None if the size is unknown (no resume)."""
+    if not remote_meta or remote_meta.get("size") is None:
+        return None
+    return {
+        "size": int(remote_meta["size"]),
+        "etag": remote_meta.get("etag"),
+        "last_modified": remote_meta.get("last_modified"),
+    }
+
+
+def _read_part_meta(meta_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_part_meta(meta_path: Path, identity: Dict[str, Any]) -> None:
+    tmp = meta_path.with_name(meta_path.name + ".tmp")
+    tmp.write_text(json.dumps(identity), encoding="utf-8")
+    os.replace(tmp, meta_path)
+
+
 def _fmt_elapsed(start_time: float) -> Tuple[int, int]:
     elapsed = max(0.0, time.time() - start_time)
     minutes = int(elapsed // 60)
@@ -129,6 +164,11 @@ class HTTPDownloadOptions:
     max_workers: int = 1  # For parallel downloads, 1 = sequential
     chunk_size: int = 1024 * 1024  # 1MB chunks
     atomic: bool = True  # write to temp + replace; resume uses temp pre-copy
+    auto_tune_chunk_size: bool = False  # grow/shrink chunk_size from measured throughput
+    segments: int = 1  # >1: fetch one file as concurrent Range GETs (segmented mode)
+    segment_size: int = 256 * 1024 * 1024
+    chunk_size_min: int = READ_SIZE_MIN
+    chunk_size_max: int = READ_SIZE_MAX
 
 
 ProgressCallback = Callable[[int, int], None]  # (bytes_delta, total_bytes)
@@ -175,6 +215,7 @@ class HTTPDownloadClient:
 
         self._session_pool: Optional[Any] = None
         self._http_client = http_client or requests
+        self.last_read_tuning: Optional[Dict[str, Any]] = None
 
         self._disable_tls_warnings()
 
@@ -263,6 +304,14 @@ class HTTPDownloadClient:
         Get the size of a datastore file using HEAD.
         Returns None if unknown / cannot retrieve.
         """
+        meta = self.get_file_meta(datastore, ds_path, dc_name)
+        return meta["size"] if meta else None
+
+    def get_file_meta(self, datastore: str, ds_path: str, dc_name: str) -> Optional[Dict[str, Any]]:
+        """
+        HEAD a datastore file: {"size", "etag", "last_modified"} (validators may be None).
+        Returns None if the size is unknown / cannot be retrieved.
+        """
         self._validate_connection_params()
         url = self._build_download_url(datastore, ds_path, dc_name)
         headers = {"Cookie": self.get_session_cookie()}
@@ -273,11 +322,40 @@ class HTTPDownloadClient:
             content_length = response.headers.get("content-length")
             if content_length is None:
                 return None
-            return int(content_length)
+            return {
+                "size": int(content_length),
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
         except Exception as e:
             self.logger.debug("Failed to get size for %s: %s", ds_path, e)
             return None
 
+    def read_range(self, datastore: str, ds_path: str, dc_name: str, offset: int, length: int) -> bytes:
+        """
+        Read [offset, offset+length) of a datastore file with a single Range GET.
+
+        Raises VMwareError if the server ignores the Range header or returns short data.
+        """
+        self._validate_connection_params()
+        url = self._build_download_url(datastore, ds_path, dc_name)
+        headers = {
+            "Cookie": self.get_session_cookie(),
+            "Range": f"bytes={int(offset)}-{int(offset) + int(length) - 1}",
+        }
+        response = self.session.get(url, headers=headers, timeout=self.timeout or 60.0)
+        try:
+            response.raise_for_status()
+            status = int(getattr(response, "status_code", 0) or 0)
+            if status != 206:
+                raise VMwareError(f"Range request not honored for {ds_path} (HTTP {status})")
+            data = response.content
+        finally:
+            response.close()
+        if len(data) != int(length):
+            raise VMwareError(f"Short range read for {ds_path} at {offset}: got {len(data)} of {length} bytes")
+        return data
+
     def _download_to_path(
         self,
         *,
@@ -287,9 +365,11 @@ class HTTPDownloadClient:
         chunk_size: int,
         reporter: ProgressReporter,
         expect_partial: bool,
+        tuner: Optional[ReadSizeTuner] = None,
     ) -> Tuple[int, int]:
         """
         Stream response body into out_path (already opened/created).
+        With a tuner, the body is read in tuner-sized pieces instead of a fixed chunk_size.
         Returns: (downloaded_bytes, http_status)
         """
         downloaded = 0
@@ -309,12 +389,23 @@ class HTTPDownloadClient:
 
             # write stream
             with open(out_path, "ab") as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if not chunk:
-                        continue
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    reporter.update(len(chunk))
+                if tuner is not None:
+                    while True:
+                        t0 = time.monotonic()
+                        chunk = response.raw.read(tuner.size, decode_content=True)
+                        if not chunk:
+                            break
+                        tuner.record(len(chunk), time.monotonic() - t0)
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        reporter.update(len(chunk))
+                else:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        reporter.update(len(chunk))
 
                 # durability
                 try:
@@ -350,18 +441,47 @@ class HTTPDownloadClient:
         # Decide resume
         headers: Dict[str, str] = {"Cookie": self.get_session_cookie()}
         start_byte = 0
-        remote_size = self.get_file_size(datastore, ds_path, dc_name)
+        remote_meta = self.get_file_meta(datastore, ds_path, dc_name)
+        remote_size = remote_meta["size"] if remote_meta else None
+
+        already_complete = (
+            opt.resume_download
+            and remote_size is not None
+            and local_path.exists()
+            and local_path.stat().st_size == remote_size
+        )
+        if remote_meta and not already_complete and opt.segments > 1 and remote_meta["size"] > opt.segment_size:
+            if self._download_file_segmented(
+                url=url,
+                local_path=local_path,
+                remote_meta=remote_meta,
+                ds_path=ds_path,
+                on_bytes=on_bytes,
+                opt=opt,
+            ):
+                return
 
         if opt.resume_download and local_path.exists():
             existing_size = local_path.stat().st_size
             if remote_size is not None and existing_size == remote_size:
                 self.logger.info("File already exists and is complete: %s", local_path)
                 return
-            if remote_size is not None and 0 < existing_size < remote_size:
+            if remote_size is not None and 0 < existing_size < remote_size and not opt.atomic:
                 start_byte = existing_size
                 headers["Range"] = f"bytes={existing_size}-"
                 self.logger.info("Resuming download from byte %d", existing_size)
 
+        # atomic: a persistent <name>.part (+ .meta identity sidecar) is appended in place
+        part_path: Optional[Path] = None
+        if opt.atomic:
+            part_path = local_path.with_name(local_path.name + ".part")
+            start_byte = self._prepare_part(part_path, local_path, remote_meta, resume=opt.resume_download)
+            if start_byte > 0:
+                headers["Range"] = f"bytes={start_byte}-"
+                if remote_meta and remote_meta.get("etag"):
+                    # server sends the full body (200) if the file changed since HEAD
+                    headers["If-Range"] = str(remote_meta["etag"])
+
         # For progress totals, show "remaining" if resuming, else full size.
         total_remaining: Optional[int] = None
         if remote_size is not None:
@@ -395,41 +515,25 @@ class HTTPDownloadClient:
         max_attempts = opt.retries + 1
         last_exception: Optional[Exception] = None
 
+        tuner: Optional[ReadSizeTuner] = None
+        if opt.auto_tune_chunk_size:
+            tuner = ReadSizeTuner(
+                opt.chunk_size,
+                min_size=opt.chunk_size_min,
+                max_size=opt.chunk_size_max,
+                align=4096,
+            )
+        self.last_read_tuning = None
+
         for attempt in range(1, max_attempts + 1):
-            temp_path: Optional[Path] = None
             try:
                 # Choose output target for this attempt
                 # - atomic=False: write directly to local (with correct resume append)
-                # - atomic=True: write to temp; for resume, pre-copy existing local into temp first
-                if opt.atomic:
-                    with tempfile.NamedTemporaryFile(
-                        delete=False,
-                        dir=local_path.parent,
-                        suffix=".part",
-                    ) as tf:
-                        temp_path = Path(tf.name)
-                    # if resuming, pre-seed temp with existing bytes
-                    if start_byte > 0 and local_path.exists():
-                        # copy only start_byte bytes (file size should match start_byte)
-                        with open(local_path, "rb") as src, open(temp_path, "wb") as dst:
-                            # stream copy
-                            remaining = start_byte
-                            buf = 1024 * 1024
-                            while remaining > 0:
-                                chunk = src.read(min(buf, remaining))
-                                if not chunk:
-                                    break
-                                dst.write(chunk)
-                                remaining -= len(chunk)
-                            try:
-                                dst.flush()
-                                os.fsync(dst.fileno())
-                            except Exception:
-                                pass
-                    else:
-                        # ensure empty
-                        open(temp_path, "wb").close()
-                    out_target = temp_path
+                # - atomic=True: append to the persistent .part; renamed over local on success
+                if part_path is not None:
+                    if start_byte == 0:
+                        open(part_path, "wb").close()
+                    out_target = part_path
                 else:
                     out_target = local_path
 
@@ -448,6 +552,7 @@ class HTTPDownloadClient:
                     chunk_size=opt.chunk_size,
                     reporter=reporter,
                     expect_partial=("Range" in headers),
+                    tuner=tuner,
                 )
 
                 # If Range was requested but server returned 200, restart safely from scratch
@@ -456,14 +561,11 @@ class HTTPDownloadClient:
                         "Server did not honor Range request (status=%s). Restarting full download.",
                         status,
                     )
-                    # cleanup temp if used
-                    if opt.atomic and temp_path and temp_path.exists():
-                        try:
-                            temp_path.unlink()
-                        except Exception:
-                            pass
                     # reset resume state and retry immediately (counts as this attempt failure)
                     headers.pop("Range", None)
+                    headers.pop("If-Range", None)
+                    if part_path is not None:
+                        open(part_path, "wb").close()
                     start_byte = 0
                     total_remaining = remote_size  # full size again
                     reporter.finish()
@@ -472,8 +574,9 @@ class HTTPDownloadClient:
                     raise VMwareError("Range not honored; restarted download")
 
                 # Success: if atomic, replace
-                if opt.atomic and temp_path is not None:
-                    os.replace(temp_path, local_path)
+                if part_path is not None:
+                    os.replace(part_path, local_path)
+                    _part_meta_path(part_path).unlink(missing_ok=True)
 
                 # Final size reporting
                 final_size = start_byte + downloaded_this_attempt if start_byte > 0 else downloaded_this_attempt
@@ -489,6 +592,10 @@ class HTTPDownloadClient:
 
                 reporter.finish()
 
+                if tuner is not None:
+                    self.last_read_tuning = tuner.summary()
+                    self.logger.info("HTTPS: auto-tuned %s for %s", tuner.describe(), file_name)
+
                 m, s = _fmt_elapsed(start_time)
                 if opt.show_panels:
                     extra = (
@@ -509,12 +616,14 @@ class HTTPDownloadClient:
 
             except Exception as e:
                 last_exception = e
-                # cleanup temp on failure
-                if opt.atomic and temp_path and temp_path.exists():
-                    try:
-                        temp_path.unlink()
-                    except Exception:
-                        pass
+                # keep the .part: the next attempt (or run) appends from where this one stopped
+                if part_path is not None and remote_size is not None and part_path.exists():
+                    have = part_path.stat().st_size
+                    if 0 < have < remote_size:
+                        start_byte = have
+                        headers["Range"] = f"bytes={have}-"
+                        if remote_meta and remote_meta.get("etag"):
+                            headers["If-Range"] = str(remote_meta["etag"])
 
                 if attempt < max_attempts:
                     sleep_time = opt.retry_backoff_s * (2 ** (attempt - 1))
@@ -532,6 +641,115 @@ class HTTPDownloadClient:
                 reporter.finish()
                 raise VMwareError(f"Download failed after {max_attempts} attempts: {last_exception}") from last_exception
 
+    def _prepare_part(
+        self,
+        part_path: Path,
+        local_path: Path,
+        remote_meta: Optional[Dict[str, Any]],
+        *,
+        resume: bool,
+    ) -> int:
+        """
+        Decide where an atomic download resumes; returns the byte offset.
+
+        A .part is only trusted when its .meta sidecar matches the remote
+        identity (size + ETag/Last-Modified). A partial local file left by a
+        non-atomic run seeds the .part via reflink / copy_file_range.
+        """
+        meta_path = _part_meta_path(part_path)
+        identity = _part_identity(remote_meta)
+        # a segmented-mode map no longer describes a .part this path appends to
+        part_path.with_name(part_path.name + SEGMENT_MAP_SUFFIX).unlink(missing_ok=True)
+
+        if resume and identity is not None:
+            size = identity["size"]
+            if part_path.exists():
+                have = part_path.stat().st_size
+                if 0 < have < size and _read_part_meta(meta_path) == identity:
+                    self.logger.info("Resuming %s from byte %d (in place)", part_path, have)
+                    return have
+            if local_path.exists() and 0 < local_path.stat().st_size < size:
+                have = local_path.stat().st_size
+                method = clone_file_prefix(local_path, part_path, have)
+                _write_part_meta(meta_path, identity)
+                self.logger.info("Resuming from byte %d (seeded %s from %s via %s)", have, part_path, local_path, method)
+                return have
+
+        # fresh start
+        open(part_path, "wb").close()
+        if identity is not None:
+            _write_part_meta(meta_path, identity)
+        else:
+            meta_path.unlink(missing_ok=True)
+        return 0
+
+    def _download_file_segmented(
+        self,
+        *,
+        url: str,
+        local_path: Path,
+        remote_meta: Dict[str, Any],
+        ds_path: str,
+        on_bytes: Optional[ProgressCallback],
+        opt: HTTPDownloadOptions,
+    ) -> bool:
+        """
+        Segmented mode for download_file. Returns False if the server does not
+        honor Range requests (caller falls back to a single stream).
+        """
+        file_name = Path(ds_path).name or "download"
+        start_time = time.time()
+        last_exception: Optional[Exception] = None
+        max_attempts = opt.retries + 1
+
+        for attempt in range(1, max_attempts + 1):
+            reporter = create_progress_reporter(opt, file_name, self.logger)
+            reporter.start(f"Downloading {file_name} ({opt.segments} segments)", remote_meta["size"])
+            try:
+                fetched = download_segmented(
+                    self,
+                    url=url,
+                    headers={"Cookie": self.get_session_cookie()},
+                    local_path=local_path,
+                    identity=remote_meta,
+                    segments=opt.segments,
+                    segment_size=opt.segment_size,
+                    chunk_size=opt.chunk_size,
+                    reporter=reporter,
+                    resume=opt.resume_download,
+                )
+            except RangeNotSupported as e:
+                reporter.finish()
+                self.logger.warning("%s; falling back to a single stream for %s", e, ds_path)
+                return False
+            except Exception as e:
+                reporter.finish()
+                last_exception = e
+                if attempt < max_attempts:
+                    sleep_time = opt.retry_backoff_s * (2 ** (attempt - 1))
+                    self.logger.warning(
+                        "Segmented download failed (attempt %d/%d): %s. Resuming missing segments in %.1fs...",
+                        attempt,
+                        max_attempts,
+                        e,
+                        sleep_time,
+                    )
+                    time.sleep(sleep_time)
+                    continue
+                raise VMwareError(f"Download failed after {max_attempts} attempts: {last_exception}") from last_exception
+
+            reporter.finish()
+            _part_meta_path(local_path.with_name(local_path.name + ".part")).unlink(missing_ok=True)
+            if on_bytes:
+                try:
+                    on_bytes(fetched, remote_meta["size"])
+                except Exception:
+                    pass
+            m, s = _fmt_elapsed(start_time)
+            _ok_line(f"Downloaded {local_path} in {m}m {s}s ({opt.segments} segments)")
+            return True
+        return False
+
     def test_connection(self) -> bool:
         """
         Test if we can connect to the vSphere host via HTTPS.
@@ -626,6 +844,11 @@ class HTTPDownloadManager:
                 max_workers=1,
                 chunk_size=options.chunk_size,
                 atomic=options.atomic,
+                auto_tune_chunk_size=options.auto_tune_chunk_size,
+                chunk_size_min=options.chunk_size_min,
+                chunk_size_max=options.chunk_size_max,
+                segments=options.segments,
+                segment_size=options.segment_size,
             )
 
         results: List[Tuple[bool, str, str]] = []
@@ -720,6 +943,11 @@ class HTTPDownloadManager:
             max_workers=1,
             chunk_size=options.chunk_size,
             atomic=options.atomic,
+            auto_tune_chunk_size=options.auto_tune_chunk_size,
+            chunk_size_min=options.chunk_size_min,
+            chunk_size_max=options.chunk_size_max,
+            segments=options.segments,
+            segment_size=options.segment_size,
         )
 
         results: List[Tuple[bool, str, str]] = []
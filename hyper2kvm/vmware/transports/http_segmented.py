@@ -0,0 +1,251 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/vmware/transports/http_segmented.py
+"""
+Segmented parallel HTTPS download of a single datastore file.
+
+A single GET against ESXi's /folder endpoint is limited by one TCP stream
+and one hostd worker. This module splits one file into fixed-size byte
+ranges, fetches them concurrently over the pooled requests.Session and
+pwrite()s each range at its offset into a preallocated <name>.part file.
+
+Completed segments are recorded in a small JSON sidecar (<name>.part.segments)
+that also pins the remote identity (size, ETag, Last-Modified). On resume
+only the missing segments are fetched; a changed remote file or segment
+layout discards the sidecar and starts over. Zero blocks are left as holes,
+which keeps -flat.vmdk targets sparse.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ...core.sparse import ZERO_BLOCK_SIZE, pwrite_data
+
+# http_client imports this module, so take VMwareError from core directly
+try:
+    from ...core.exceptions import VMwareError  # type: ignore
+except Exception:  # pragma: no cover
+
+    class VMwareError(RuntimeError):  # type: ignore
+        pass
+
+
+SEGMENT_MAP_SUFFIX = ".segments"
+_MAP_VERSION = 1
+
+
+class RangeNotSupported(VMwareError):
+    """The server answered a Range request with a full (200) response."""
+
+
+def plan_segments(size: int, segment_size: int) -> List[Tuple[int, int]]:
+    """Split [0, size) into (offset, length) segments of segment_size (last one shorter)."""
+    seg = max(1, int(segment_size))
+    return [(off, min(seg, int(size) - off)) for off in range(0, int(size), seg)]
+
+
+class SegmentMap:
+    """JSON sidecar recording which segments of a .part file are complete."""
+
+    def __init__(self, path: Path, identity: Dict[str, Any], done: Optional[Set[int]] = None):
+        self.path = Path(path)
+        self.identity = identity
+        self.done: Set[int] = set(done or ())
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load_or_create(cls, path: Path, identity: Dict[str, Any], *, resume: bool) -> "SegmentMap":
+        """Reuse an existing map only if it describes the same remote file and layout."""
+        path = Path(path)
+        if resume and path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+                if raw.get("version") == _MAP_VERSION and raw.get("identity") == identity:
+                    return cls(path, identity, {int(i) for i in raw.get("done") or []})
+            except (OSError, ValueError):
+                pass
+        m = cls(path, identity)
+        m._save()
+        return m
+
+    def mark(self, index: int) -> None:
+        with self._lock:
+            self.done.add(int(index))
+            self._save()
+
+    def _save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        payload = {"version": _MAP_VERSION, "identity": self.identity, "done": sorted(self.done)}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _fetch_segment(
+    session: Any,
+    url: str,
+    headers: Dict[str, str],
+    fd: int,
+    offset: int,
+    length: int,
+    *,
+    chunk_size: int,
+    timeout: Optional[float],
+    on_bytes: Any,
+    cancel: threading.Event,
+) -> None:
+    h = dict(headers)
+    h["Range"] = f"bytes={offset}-{offset + length - 1}"
+    pos = offset
+    pending = bytearray()
+    with session.get(url, headers=h, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        status = int(getattr(response, "status_code", 0) or 0)
+        if status != 206:
+            raise RangeNotSupported(f"Range request not honored (HTTP {status})")
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if cancel.is_set():
+                raise VMwareError("segmented download cancelled")
+            if not chunk:
+                continue
+            pending += chunk
+            # write whole zero-detection blocks; keep the tail for the next chunk
+            usable = len(pending) - (len(pending) % ZERO_BLOCK_SIZE)
+            if usable:
+                pwrite_data(fd, pending, pos, usable)
+                pos += usable
+                del pending[:usable]
+            on_bytes(len(chunk))
+    if pending:
+        pwrite_data(fd, pending, pos)
+        pos += len(pending)
+    if pos != offset + length:
+        raise VMwareError(f"Short segment at {offset}: got {pos - offset} of {length} bytes")
+
+
+def download_segmented(
+    client: Any,
+    *,
+    url: str,
+    headers: Dict[str, str],
+    local_path: Path,
+    identity: Dict[str, Any],
+    segments: int,
+    segment_size: int,
+    chunk_size: int,
+    reporter: Any,
+    resume: bool = True,
+    logger: Optional[logging.Logger] = None,
+) -> int:
+    """
+    Fetch url into local_path with `segments` concurrent Range GETs.
+
+    identity must contain "size" (bytes) plus whatever validators the server
+    returned (etag / last_modified). Returns the number of bytes fetched in this
+    run. Raises RangeNotSupported if the server ignores Range (the caller should
+    fall back to a single stream).
+    """
+    log = logger or client.logger
+    size = int(identity["size"])
+    local_path = Path(local_path)
+    part = local_path.with_name(local_path.name + ".part")
+    layout = dict(identity, segment_size=int(segment_size))
+    smap = SegmentMap.load_or_create(
+        part.with_name(part.name + SEGMENT_MAP_SUFFIX), layout, resume=resume and part.exists()
+    )
+
+    plan = plan_segments(size, segment_size)
+    todo = [(i, off, n) for i, (off, n) in enumerate(plan) if i not in smap.done]
+    already = sum(plan[i][1] for i in smap.done if i < len(plan))
+    if smap.done:
+        log.info(
+            "HTTPS segmented: resuming %s (%d/%d segments done, %.2f GiB)",
+            part,
+            len(smap.done),
+            len(plan),
+            already / (1024**3),
+        )
+
+    fd = os.open(str(part), os.O_WRONLY | os.O_CREAT | (0 if smap.done else os.O_TRUNC), 0o644)
+    fetched = 0
+    lock = threading.Lock()
+    cancel = threading.Event()
+
+    def _on_bytes(n: int) -> None:
+        nonlocal fetched
+        with lock:
+            fetched += n
+            reporter.update(n)
+
+    def _run(index: int, offset: int, length: int) -> None:
+        _fetch_segment(
+            client.session,
+            url,
+            headers,
+            fd,
+            offset,
+            length,
+            chunk_size=chunk_size,
+            timeout=client.timeout,
+            on_bytes=_on_bytes,
+            cancel=cancel,
+        )
+        # the map must never claim data that is not on disk yet
+        os.fdatasync(fd)
+        smap.mark(index)
+
+    try:
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, size)
+        workers = max(1, min(int(segments), len(todo) or 1))
+        log.info(
+            "HTTPS segmented: %s -> %s (%d segment(s) of %.0f MiB, %d to fetch, %d connection(s))",
+            url.split("?", 1)[0],
+            local_path,
+            len(plan),
+            segment_size / (1024 * 1024),
+            len(todo),
+            workers,
+        )
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="https-seg") as pool:
+            futures = [pool.submit(_run, i, off, n) for i, off, n in todo]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [f for f in done if f.exception() is not None]
+            if failed:
+                cancel.set()
+                for f in futures:
+                    f.cancel()
+                wait(futures)
+                raise failed[0].exception()  # type: ignore[misc]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    missing = len(plan) - len(smap.done)
+    if missing:
+        raise VMwareError(f"Segmented download incomplete: {missing} segment(s) missing for {part}")
+
+    os.replace(part, local_path)
+    smap.remove()
+    return fetched
+
+
+__all__ = [
+    "RangeNotSupported",
+    "SegmentMap",
+    "download_segmented",
+    "plan_segments",
+]
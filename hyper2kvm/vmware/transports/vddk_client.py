@@ -36,15 +36,20 @@ import faulthandler
 import hashlib
 import logging
 import os
+import queue
 import random
 import signal
 import socket
 import ssl
+import threading
 import time
 import traceback
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Optional, Tuple
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from ...core.read_tuner import READ_SIZE_MAX, READ_SIZE_MIN, ReadSizeTuner
+from ...core.sparse import ZERO_BLOCK_SIZE, data_runs, punch_zero_blocks
 
 
 class VDDKError(RuntimeError):
@@ -67,6 +72,10 @@ _VixDiskLibHandle = ctypes.c_void_p
 
 _SECTOR_SIZE = 512
 
+# QueryAllocatedBlocks limits (vixDiskLib.h, VDDK >= 6.7)
+_VIXDISKLIB_MIN_CHUNK_SIZE = 128  # sectors
+_VIXDISKLIB_MAX_CHUNK_NUMBER = 512 * 1024
+
 # Global list to keep callback references alive
 _VDDK_CALLBACK_REFS: list[object] = []
 
@@ -110,6 +119,22 @@ class _VixDiskLibInfo(ctypes.Structure):
     ]
 
 
+class _VixDiskLibBlock(ctypes.Structure):
+    """VixDiskLibBlock: one allocated range, offset/length in sectors."""
+    _fields_ = [
+        ("offset", ctypes.c_uint64),
+        ("length", ctypes.c_uint64),
+    ]
+
+
+class _VixDiskLibBlockList(ctypes.Structure):
+    """VixDiskLibBlockList: numBlocks followed by a variable-length block array."""
+    _fields_ = [
+        ("numBlocks", ctypes.c_uint32),
+        ("blocks", _VixDiskLibBlock * 1),
+    ]
+
+
 def _as_cstr(s: Optional[str]) -> Optional[bytes]:
     if s is None:
         return None
@@ -230,6 +255,49 @@ def _is_flat_or_delta_vmdk(p: str) -> bool:
     return s.endswith("-flat.vmdk") or s.endswith("-delta.vmdk") or s.endswith("-sesparse.vmdk")
 
 
+def merge_extents(extents: Iterable[Tuple[int, int]], capacity_sectors: int) -> List[Tuple[int, int]]:
+    """
+    Normalize (start_sector, num_sectors) extents: clamp to capacity, drop empties,
+    sort, and coalesce overlapping/adjacent ranges.
+    """
+    cap = max(0, int(capacity_sectors))
+    clamped: List[Tuple[int, int]] = []
+    for start, length in extents:
+        s0 = max(0, int(start))
+        e0 = min(cap, int(start) + int(length))
+        if e0 > s0:
+            clamped.append((s0, e0))
+
+    merged: List[Tuple[int, int]] = []
+    for s0, e0 in sorted(clamped):
+        if merged and s0 <= merged[-1][1]:
+            if e0 > merged[-1][1]:
+                merged[-1] = (merged[-1][0], e0)
+        else:
+            merged.append((s0, e0))
+    return [(s0, e0 - s0) for s0, e0 in merged]
+
+
+def _extents_sectors_below(extents: List[Tuple[int, int]], sector: int) -> int:
+    """Number of extent sectors strictly below `sector` (extents must be merged)."""
+    n = 0
+    for start, length in extents:
+        if start >= sector:
+            break
+        n += min(length, sector - start)
+    return n
+
+
+def _sha256_update_zeros(h: Any, nbytes: int) -> None:
+    """Feed `nbytes` zero bytes into a running hash (holes read back as zeros)."""
+    remain = max(0, int(nbytes))
+    zeros = memoryview(bytes(min(remain, 16 * 1024 * 1024)))
+    while remain > 0:
+        k = min(remain, len(zeros))
+        h.update(zeros[:k])
+        remain -= k
+
+
 def _fmt_eta(seconds: float) -> str:
     try:
         s = int(max(0.0, seconds))
@@ -433,6 +501,22 @@ def _bind_symbols(lib: ctypes.CDLL) -> None:
     ]
     lib.VixDiskLib_Read.restype = ctypes.c_int
 
+    # Optional (VDDK >= 6.7): allocation map for thin/sparse-aware reads.
+    try:
+        lib.VixDiskLib_QueryAllocatedBlocks.argtypes = [
+            _VixDiskLibHandle,
+            ctypes.c_uint64, # startSector
+            ctypes.c_uint64, # numSectors
+            ctypes.c_uint64, # chunkSize (sectors)
+            ctypes.POINTER(ctypes.POINTER(_VixDiskLibBlockList)),
+        ]
+        lib.VixDiskLib_QueryAllocatedBlocks.restype = ctypes.c_int
+
+        lib.VixDiskLib_FreeBlockList.argtypes = [ctypes.POINTER(_VixDiskLibBlockList)]
+        lib.VixDiskLib_FreeBlockList.restype = ctypes.c_int
+    except AttributeError:
+        pass
+
     lib.VixDiskLib_GetErrorText.argtypes = [ctypes.c_int, ctypes.c_char_p]
     lib.VixDiskLib_GetErrorText.restype = ctypes.c_char_p
 
@@ -656,6 +740,149 @@ def vddk_cleanup() -> None:
             _vddk_inited = False
 
 
+# Overlapped write pipeline
+
+
+class _WritePipeline:
+    """
+    Bounded ring of read buffers drained by a writer thread.
+
+    The caller acquires a free slot, fills it (VixDiskLib_Read) and submits it
+    with its file offset; the writer pwrite()s the non-zero runs, feeds the
+    hash in submission order and recycles the slot. Time the reader spends
+    waiting for a free slot means the disk side is the bottleneck; time the
+    writer spends waiting for data means the network side is.
+    """
+
+    def __init__(
+        self,
+        fd: int,
+        buf_bytes: int,
+        depth: int,
+        *,
+        skip_zero_blocks: bool,
+        sha256: Any = None,
+    ):
+        self.fd = fd
+        self.skip_zero_blocks = bool(skip_zero_blocks)
+        self.sha256 = sha256
+        self.depth = max(1, int(depth))
+
+        # bytearray-backed so zero detection can memcmp them without copies
+        self._bufs = [bytearray(buf_bytes) for _ in range(self.depth)]
+        self._cbufs = [(ctypes.c_ubyte * buf_bytes).from_buffer(b) for b in self._bufs]
+        self._ptrs = [ctypes.cast(c, ctypes.c_void_p) for c in self._cbufs]
+
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for i in range(self.depth):
+            self._free.put(i)
+        self._filled: "queue.Queue[Optional[Tuple[int, int, int, int]]]" = queue.Queue()
+
+        self.error: Optional[BaseException] = None
+        self.zero_skipped = 0
+        self.reader_wait_s = 0.0
+        self.writer_wait_s = 0.0
+        self._depth_sum = 0
+        self._depth_samples = 0
+
+        self._thread: Optional[threading.Thread] = None
+        if self.depth > 1:
+            self._thread = threading.Thread(target=self._run, name="vddk-writer", daemon=True)
+            self._thread.start()
+
+    def acquire(self) -> int:
+        t0 = time.monotonic()
+        while True:
+            if self.error is not None:
+                raise VDDKError(f"VDDK local write failed: {self.error}") from self.error
+            try:
+                slot = self._free.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        self.reader_wait_s += time.monotonic() - t0
+        return slot
+
+    def ptr(self, slot: int) -> ctypes.c_void_p:
+        return self._ptrs[slot]
+
+    def ensure(self, slot: int, nbytes: int) -> None:
+        """Grow an acquired slot's buffer to at least nbytes (read size auto-tuning)."""
+        if len(self._bufs[slot]) >= nbytes:
+            return
+        self._bufs[slot] = bytearray(nbytes)
+        self._cbufs[slot] = (ctypes.c_ubyte * nbytes).from_buffer(self._bufs[slot])
+        self._ptrs[slot] = ctypes.cast(self._cbufs[slot], ctypes.c_void_p)
+
+    def submit(self, slot: int, offset: int, nbytes: int, *, zero_gap: int = 0) -> None:
+        if self._thread is None:
+            try:
+                self._write(slot, offset, nbytes, zero_gap)
+            finally:
+                self._free.put(slot)
+            return
+        self._depth_sum += self._filled.qsize()
+        self._depth_samples += 1
+        self._filled.put((slot, offset, nbytes, zero_gap))
+
+    def close(self) -> None:
+        """Drain outstanding buffers; re-raise a writer failure."""
+        if self._thread is not None:
+            self._filled.put(None)
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            raise VDDKError(f"VDDK local write failed: {self.error}") from self.error
+
+    def abort(self) -> None:
+        """Stop the writer after whatever is already queued; never raises."""
+        if self._thread is not None:
+            self._filled.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def stats_short(self) -> str:
+        if self.depth == 1:
+            return "pipeline=serial"
+        avg = (self._depth_sum / self._depth_samples) if self._depth_samples else 0.0
+        side = "disk" if self.reader_wait_s > self.writer_wait_s else "network"
+        return (
+            f"buffers={self.depth} avg_queue={avg:.1f} "
+            f"read_wait={self.reader_wait_s:.1f}s write_wait={self.writer_wait_s:.1f}s bottleneck={side}"
+        )
+
+    def _write(self, slot: int, offset: int, nbytes: int, zero_gap: int) -> None:
+        buf = self._bufs[slot]
+        mv = memoryview(buf)[:nbytes]
+        if self.skip_zero_blocks:
+            runs = data_runs(buf, 0, nbytes, block_size=ZERO_BLOCK_SIZE)
+            for off, length in runs:
+                os.pwrite(self.fd, mv[off : off + length], offset + off)
+            self.zero_skipped += nbytes - sum(length for _, length in runs)
+        else:
+            os.pwrite(self.fd, mv, offset)
+        if self.sha256 is not None:
+            if zero_gap:
+                _sha256_update_zeros(self.sha256, zero_gap)
+            self.sha256.update(mv)
+
+    def _run(self) -> None:
+        while True:
+            t0 = time.monotonic()
+            item = self._filled.get()
+            self.writer_wait_s += time.monotonic() - t0
+            if item is None:
+                return
+            slot, offset, nbytes, zero_gap = item
+            try:
+                if self.error is None:
+                    self._write(slot, offset, nbytes, zero_gap)
+            except BaseException as e:
+                self.error = e
+            finally:
+                self._free.put(slot)
+
+
 # Public API
 
 ProgressFn = Callable[[int, int, float], None]
@@ -699,6 +926,7 @@ class VDDKESXClient:
         self._lib: Optional[ctypes.CDLL] = None
         self._conn: _VixDiskLibConnection = _VixDiskLibConnection()
         self._connect_strings: dict[str, Optional[bytes]] = {}
+        self.last_read_tuning: Optional[dict[str, Any]] = None
 
     def __enter__(self) -> "VDDKESXClient":
         self.connect()
@@ -971,6 +1199,82 @@ class VDDKESXClient:
             except Exception:
                 pass
 
+    def _query_allocated_extents(
+        self,
+        h: _VixDiskLibHandle,
+        cap_sectors: int,
+        *,
+        chunk_sectors: int = 2048,
+    ) -> Optional[List[Tuple[int, int]]]:
+        """
+        Return merged allocated (start_sector, num_sectors) extents, or None when the
+        allocation map is unavailable (old VDDK, unsupported backing, transport error).
+
+        QueryAllocatedBlocks needs chunk-aligned ranges, so the unaligned tail of the
+        disk (if any) is reported as allocated.
+        """
+        self._require_connected()
+        assert self._lib is not None
+
+        if not hasattr(self._lib, "VixDiskLib_QueryAllocatedBlocks"):
+            self.logger.debug("VDDK: QueryAllocatedBlocks not available in this VDDK")
+            return None
+
+        chunk = max(_VIXDISKLIB_MIN_CHUNK_SIZE, int(chunk_sectors))
+        chunk -= chunk % _VIXDISKLIB_MIN_CHUNK_SIZE
+        aligned = (int(cap_sectors) // chunk) * chunk
+        window = chunk * _VIXDISKLIB_MAX_CHUNK_NUMBER
+
+        extents: List[Tuple[int, int]] = []
+        start = 0
+        while start < aligned:
+            n = min(window, aligned - start)
+            bl = ctypes.POINTER(_VixDiskLibBlockList)()
+            rc = self._lib.VixDiskLib_QueryAllocatedBlocks(
+                h,
+                ctypes.c_uint64(start),
+                ctypes.c_uint64(n),
+                ctypes.c_uint64(chunk),
+                ctypes.byref(bl),
+            )
+            if rc != 0:
+                msg = _err_text(self._lib, rc)
+                self.logger.warning(
+                    "VDDK: QueryAllocatedBlocks failed at sector=%d count=%d: %s (falling back to full read)",
+                    start,
+                    n,
+                    msg,
+                )
+                return None
+            try:
+                count = int(bl.contents.numBlocks)
+                if count:
+                    arr = ctypes.cast(
+                        ctypes.addressof(bl.contents.blocks),
+                        ctypes.POINTER(_VixDiskLibBlock * count),
+                    ).contents
+                    extents.extend((int(b.offset), int(b.length)) for b in arr)
+            finally:
+                try:
+                    self._lib.VixDiskLib_FreeBlockList(bl)
+                except Exception:
+                    pass
+            start += n
+
+        if aligned < cap_sectors:
+            extents.append((aligned, int(cap_sectors) - aligned))
+
+        merged = merge_extents(extents, cap_sectors)
+        alloc = sum(length for _, length in merged)
+        self.logger.debug(
+            "VDDK: allocation map: %d extent(s), %.2f/%.2f GiB allocated (%.1f%%)",
+            len(merged),
+            (alloc * _SECTOR_SIZE) / (1024**3),
+            (cap_sectors * _SECTOR_SIZE) / (1024**3),
+            (alloc / cap_sectors * 100.0) if cap_sectors else 0.0,
+        )
+        return merged
+
     def _read_with_retry(
         self,
         h: _VixDiskLibHandle,
@@ -1024,6 +1328,22 @@ class VDDKESXClient:
             )
             time.sleep(backoff)
 
+    def _punch_resume_prefix(self, tmp: Path, upto: int) -> None:
+        """Best-effort: punch holes over zero blocks already present in a resumed .part."""
+        try:
+            fd = os.open(str(tmp), os.O_RDWR)
+            try:
+                punched = punch_zero_blocks(fd, 0, int(upto))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.logger.warning("VDDK: hole punching on resume failed (ignored): %s", e)
+            return
+        if punched:
+            self.logger.info("VDDK: punched %.2f GiB of zero blocks in %s", punched / (1024**3), tmp)
+        else:
+            self.logger.debug("VDDK: no zero blocks punched in %s (none found or unsupported)", tmp)
+
     def download_vmdk(
         self,
         remote_vmdk: str,
@@ -1043,6 +1363,13 @@ class VDDKESXClient:
         jitter_s: float = 0.25,
         verify_size: bool = True,
         compute_sha256: bool = False,
+        allocated_only: bool = False,
+        skip_zero_blocks: bool = True,
+        punch_holes_on_resume: bool = False,
+        io_buffers: int = 4,
+        auto_tune: bool = False,
+        read_size_min: int = READ_SIZE_MIN,
+        read_size_max: int = READ_SIZE_MAX,
     ) -> Path:
         """
         Stream a remote VMDK into a local file by reading sectors.
@@ -1053,6 +1380,33 @@ class VDDKESXClient:
           "[datastore] vm/vm.vmdk"
 
         local_path is written atomically: <name>.part then rename.
+
+        allocated_only=True asks VDDK for the allocation map first
+        (VixDiskLib_QueryAllocatedBlocks) and reads only allocated extents,
+        seeking over holes so the .part file stays sparse. Progress/ETA then
+        count allocated bytes. Falls back to a full read when the map is
+        unavailable.
+
+        Resume relies on extents being written in ascending order: everything
+        below the .part size is either written data or a hole (which reads as
+        zeros), so the .part size is a valid restart point in both modes.
+
+        skip_zero_blocks=True checks each read buffer in 64 KiB sub-blocks and
+        leaves all-zero sub-blocks as holes instead of writing them.
+        punch_holes_on_resume=True re-sparsifies the already-downloaded prefix of
+        a resumed .part (e.g. one written densely by an older run) with
+        fallocate(PUNCH_HOLE) before continuing.
+
+        io_buffers sets the size of the read-buffer ring. With more than one
+        buffer, pwrite()/hashing/zero detection run on a writer thread while
+        this thread issues the next VixDiskLib_Read (ctypes drops the GIL for
+        the C call), so network and disk overlap. VDDK itself is still only
+        called from this thread. io_buffers=1 keeps everything serial.
+
+        auto_tune=True treats sectors_per_read as the starting point and lets a
+        ReadSizeTuner grow/shrink the read size within [read_size_min,
+        read_size_max] bytes from measured throughput. The result is logged and
+        kept in self.last_read_tuning.
         """
         self._require_connected()
         assert self._lib is not None
@@ -1086,8 +1440,22 @@ class VDDKESXClient:
                 raise VDDKError(f"Invalid capacity from VDDK GetInfo: sectors={cap_sectors}")
 
             spr = max(1, int(sectors_per_read))
-            buf = (ctypes.c_ubyte * (spr * _SECTOR_SIZE))()
-            buf_p = ctypes.cast(buf, ctypes.c_void_p)
+            tuner: Optional[ReadSizeTuner] = None
+            if auto_tune:
+                tuner = ReadSizeTuner(
+                    spr * _SECTOR_SIZE,
+                    min_size=read_size_min,
+                    max_size=read_size_max,
+                    align=_SECTOR_SIZE,
+                )
+            self.last_read_tuning = None
+
+            extents: List[Tuple[int, int]] = [(0, cap_sectors)]
+            if allocated_only:
+                alloc_map = self._query_allocated_extents(h, cap_sectors, chunk_sectors=spr)
+                if alloc_map is not None:
+                    extents = alloc_map
+            xfer_total = sum(length for _, length in extents) * _SECTOR_SIZE
 
             done = 0
             sector = 0
@@ -1096,14 +1464,13 @@ class VDDKESXClient:
             if resume and tmp.exists():
                 st = tmp.stat()
                 if st.st_size > 0 and st.st_size % _SECTOR_SIZE == 0:
-                    done = int(st.st_size)
-                    sector = done // _SECTOR_SIZE
+                    sector = int(st.st_size) // _SECTOR_SIZE
                     if sector > cap_sectors:
                         self.logger.warning("VDDK: existing .part > remote capacity; restarting: %s", tmp)
-                        done = 0
                         sector = 0
                         mode = "wb"
                     else:
+                        done = _extents_sectors_below(extents, sector) * _SECTOR_SIZE
                         mode = "r+b"
                         self.logger.info(
                             "VDDK: resuming from %s (%.2f GiB, sector=%d/%d)",
@@ -1112,22 +1479,24 @@ class VDDKESXClient:
                             sector,
                             cap_sectors,
                         )
+                        if punch_holes_on_resume:
+                            self._punch_resume_prefix(tmp, sector * _SECTOR_SIZE)
                 else:
                     self.logger.warning("VDDK: existing .part is not sector-aligned; restarting: %s", tmp)
                     try:
                         tmp.unlink()
                     except Exception:
                         pass
-                    done = 0
                     sector = 0
                     mode = "wb"
 
             self.logger.info(
-                "VDDK: download start: %s -> %s (sectors=%d, %.2f GiB)%s",
+                "VDDK: download start: %s -> %s (sectors=%d, %.2f GiB, to transfer %.2f GiB)%s",
                 remote_vmdk,
                 local_path,
                 cap_sectors,
                 total_bytes / (1024**3),
+                xfer_total / (1024**3),
                 " [resume]" if sector else "",
             )
 
@@ -1138,73 +1507,108 @@ class VDDKESXClient:
             win_bytes = done
             win_ts = time.time()
 
-            with open(tmp, mode) as f:
-                if mode == "r+b":
-                    f.seek(done, os.SEEK_SET)
-
-                while sector < cap_sectors:
-                    if cancel and cancel():
-                        raise VDDKCancelled("Download cancelled")
-
-                    n = min(spr, cap_sectors - sector)
-                    chunk_bytes = int(n) * _SECTOR_SIZE
-
-                    self._read_with_retry(
-                        h,
-                        start_sector=int(sector),
-                        num_sectors=int(n),
-                        buf_p=buf_p,
-                        max_retries=int(max_read_retries),
-                        base_backoff_s=float(base_backoff_s),
-                        max_backoff_s=float(max_backoff_s),
-                        jitter_s=float(jitter_s),
-                        cancel=cancel,
-                    )
-
-                    mv = memoryview(buf)[:chunk_bytes]
-                    f.write(mv)
-                    if sha256 is not None:
-                        sha256.update(mv)
-
-                    sector += int(n)
-                    done += chunk_bytes
-
-                    if progress:
-                        now = time.time()
-                        if (now - last_progress_ts) >= max(0.05, float(progress_interval_s)) or done == total_bytes:
-                            last_progress_ts = now
-                            pct = (done / total_bytes * 100.0) if total_bytes else 0.0
-                            progress(done, total_bytes, pct)
-
-                    if log_every_bytes and (done - last_log) >= int(log_every_bytes):
-                        last_log = done
-
-                        now = time.time()
-                        w_elapsed = max(0.001, now - win_ts)
-                        w_bytes = max(0, done - win_bytes)
-                        if w_elapsed >= 1.0:
-                            win_ts = now
-                            win_bytes = done
-                        mib_s = (w_bytes / (1024**2)) / w_elapsed if w_elapsed else 0.0
-
-                        remain = max(0, total_bytes - done)
-                        eta_s = remain / (mib_s * (1024**2)) if mib_s > 0 else 0.0
-
-                        self.logger.info(
-                            "VDDK: progress %.1f%% (%.1f/%.1f MiB) speed=%.1f MiB/s eta=%s",
-                            (done / total_bytes * 100.0) if total_bytes else 0.0,
-                            done / (1024**2),
-                            total_bytes / (1024**2),
-                            mib_s,
-                            _fmt_eta(eta_s),
-                        )
+            flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if mode == "wb" else 0)
+            fd = os.open(str(tmp), flags, 0o644)
+            try:
+                pipe = _WritePipeline(
+                    fd,
+                    spr * _SECTOR_SIZE,
+                    io_buffers,
+                    skip_zero_blocks=skip_zero_blocks,
+                    sha256=sha256,
+                )
+                try:
+                    for ext_start, ext_len in extents:
+                        ext_end = ext_start + ext_len
+                        if ext_end <= sector:
+                            continue
+
+                        zero_gap = (ext_start - sector) * _SECTOR_SIZE if ext_start > sector else 0
+                        sector = max(sector, ext_start)
+
+                        while sector < ext_end:
+                            if cancel and cancel():
+                                raise VDDKCancelled("Download cancelled")
+
+                            if tuner is not None:
+                                spr = tuner.size // _SECTOR_SIZE
+                            n = min(spr, ext_end - sector)
+                            chunk_bytes = int(n) * _SECTOR_SIZE
+
+                            slot = pipe.acquire()
+                            pipe.ensure(slot, chunk_bytes)
+                            t_read = time.monotonic()
+                            self._read_with_retry(
+                                h,
+                                start_sector=int(sector),
+                                num_sectors=int(n),
+                                buf_p=pipe.ptr(slot),
+                                max_retries=int(max_read_retries),
+                                base_backoff_s=float(base_backoff_s),
+                                max_backoff_s=float(max_backoff_s),
+                                jitter_s=float(jitter_s),
+                                cancel=cancel,
+                            )
+                            if tuner is not None:
+                                tuner.record(chunk_bytes, time.monotonic() - t_read)
+                            pipe.submit(slot, sector * _SECTOR_SIZE, chunk_bytes, zero_gap=zero_gap)
+                            zero_gap = 0
+
+                            sector += int(n)
+                            done += chunk_bytes
+
+                            if progress:
+                                now = time.time()
+                                if (now - last_progress_ts) >= max(0.05, float(progress_interval_s)) or done == xfer_total:
+                                    last_progress_ts = now
+                                    pct = (done / xfer_total * 100.0) if xfer_total else 0.0
+                                    progress(done, xfer_total, pct)
+
+                            if log_every_bytes and (done - last_log) >= int(log_every_bytes):
+                                last_log = done
+
+                                now = time.time()
+                                w_elapsed = max(0.001, now - win_ts)
+                                w_bytes = max(0, done - win_bytes)
+                                if w_elapsed >= 1.0:
+                                    win_ts = now
+                                    win_bytes = done
+                                mib_s = (w_bytes / (1024**2)) / w_elapsed if w_elapsed else 0.0
+
+                                remain = max(0, xfer_total - done)
+                                eta_s = remain / (mib_s * (1024**2)) if mib_s > 0 else 0.0
+
+                                self.logger.info(
+                                    "VDDK: progress %.1f%% (%.1f/%.1f MiB) speed=%.1f MiB/s eta=%s %s",
+                                    (done / xfer_total * 100.0) if xfer_total else 0.0,
+                                    done / (1024**2),
+                                    xfer_total / (1024**2),
+                                    mib_s,
+                                    _fmt_eta(eta_s),
+                                    pipe.stats_short(),
+                                )
+
+                    pipe.close()
+                except BaseException:
+                    pipe.abort()
+                    raise
+
+                zero_skipped = pipe.zero_skipped
+                self.logger.debug("VDDK: write pipeline: %s", pipe.stats_short())
+
+                if sha256 is not None and sector < cap_sectors:
+                    _sha256_update_zeros(sha256, (cap_sectors - sector) * _SECTOR_SIZE)
+                if os.fstat(fd).st_size < total_bytes:
+                    # Trailing hole: extend logically without writing zeros.
+                    os.ftruncate(fd, total_bytes)
 
                 if durable:
                     try:
-                        f.flush()
-                        os.fsync(f.fileno())
+                        os.fsync(fd)
                     except Exception as e:
                         self.logger.warning("VDDK: fsync failed (ignored): %s", e)
+            finally:
+                os.close(fd)
 
             if verify_size:
                 try:
@@ -1232,12 +1636,16 @@ class VDDKESXClient:
 
             if sha256 is not None:
                 self.logger.info("VDDK: sha256 %s %s", sha256.hexdigest(), local_path)
+            if tuner is not None:
+                self.last_read_tuning = tuner.summary()
+                self.logger.info("VDDK: auto-tuned %s", tuner.describe())
 
             self.logger.info(
-                "VDDK: download done: %s (%.2f GiB, %.1f MiB/s)",
+                "VDDK: download done: %s (%.2f GiB, %.1f MiB/s, %.2f GiB zero blocks left as holes)",
                 local_path,
                 done / (1024**3),
                 mib_s_total,
+                zero_skipped / (1024**3),
             )
             return local_path
 
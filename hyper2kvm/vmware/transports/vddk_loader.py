@@ -48,6 +48,11 @@ except Exception:  # pragma: no cover
     VDDKESXClient = None  # type: ignore
     VDDK_CLIENT_AVAILABLE = False
 
+try:
+    from .vddk_parallel import download_vmdk_sharded  # type: ignore
+except Exception:  # pragma: no cover
+    download_vmdk_sharded = None  # type: ignore
+
 
 def _require_vddk_client() -> None:
     if not VDDK_CLIENT_AVAILABLE:
@@ -109,6 +114,21 @@ def _default_vddk_download_path(client: Any, opt: V2VExportOptions, *, disk_inde
     return out_dir / f"{_safe_vm_name(opt.vm_name)}-disk{disk_index}.vmdk"
 
 
+def vddk_connection_spec(client: Any, esx_host: str, opt: V2VExportOptions) -> Any:
+    """VDDKConnectionSpec for the VM's ESXi host from the vddk_* export options."""
+    _require_vddk_client()
+    return VDDKConnectionSpec(  # type: ignore[misc]
+        host=esx_host,
+        user=client.user,
+        password=client.password,
+        port=443,
+        vddk_libdir=Path(opt.vddk_libdir) if opt.vddk_libdir else None,
+        transport_modes=opt.vddk_transports or "nbdssl:nbd",
+        thumbprint=opt.vddk_thumbprint,
+        insecure=bool(opt.no_verify),
+    )
+
+
 def vddk_download_disk(client: Any, opt: V2VExportOptions) -> Path:
     """
     export_mode="vddk_download" (EXPERIMENTAL)
@@ -139,18 +159,7 @@ def vddk_download_disk(client: Any, opt: V2VExportOptions) -> Path:
         else _default_vddk_download_path(client, opt, disk_index=disk_index)
     )
 
-    spec = VDDKConnectionSpec(  # type: ignore[misc]
-        host=esx_host,
-        user=client.user,
-        password=client.password,
-        port=443,
-        vddk_libdir=Path(opt.vddk_libdir) if opt.vddk_libdir else None,
-        transport_modes=opt.vddk_transports or "nbdssl:nbd",
-        thumbprint=opt.vddk_thumbprint,
-        insecure=bool(opt.no_verify),
-    )
-
-    c = VDDKESXClient(client.logger, spec)  # type: ignore[misc]
+    c = VDDKESXClient(client.logger, vddk_connection_spec(client, esx_host, opt))  # type: ignore[misc]
 
     def _progress(done: int, total: int, pct: float) -> None:
         le = int(opt.vddk_download_log_every_bytes or 0)
@@ -173,15 +182,40 @@ def vddk_download_disk(client: Any, opt: V2VExportOptions) -> Path:
         local_path,
     )
 
+    connections = max(1, int(getattr(opt, "vddk_download_connections", 1) or 1))
+
+    client.last_read_tuning = None
     c.connect()
     try:
+        if connections > 1 and download_vmdk_sharded is not None:
+            client.logger.info("VDDK download: sharded over %d connection(s)", connections)
+            out = download_vmdk_sharded(
+                c,
+                remote_vmdk,
+                Path(local_path),
+                connections=connections,
+                sectors_per_read=int(opt.vddk_download_sectors_per_read or 2048),
+                progress=_progress,
+                allocated_only=bool(getattr(opt, "vddk_download_allocated_only", False)),
+                skip_zero_blocks=bool(getattr(opt, "vddk_download_skip_zero_blocks", True)),
+            )
+            return Path(out)
+
         out = c.download_vmdk(
             remote_vmdk,
             Path(local_path),
             sectors_per_read=int(opt.vddk_download_sectors_per_read or 2048),
             progress=_progress,
             log_every_bytes=int(opt.vddk_download_log_every_bytes or 0),
+            allocated_only=bool(getattr(opt, "vddk_download_allocated_only", False)),
+            skip_zero_blocks=bool(getattr(opt, "vddk_download_skip_zero_blocks", True)),
+            punch_holes_on_resume=bool(getattr(opt, "vddk_download_punch_holes", False)),
+            io_buffers=int(getattr(opt, "vddk_download_io_buffers", 4) or 1),
+            auto_tune=bool(getattr(opt, "vddk_download_auto_tune", False)),
+            read_size_min=int(getattr(opt, "vddk_download_read_size_min", 256 * 1024)),
+            read_size_max=int(getattr(opt, "vddk_download_read_size_max", 64 * 1024 * 1024)),
         )
+        client.last_read_tuning = c.last_read_tuning
         return Path(out)
     finally:
         c.disconnect()
@@ -0,0 +1,419 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/vmware/transports/vddk_parallel.py
+"""
+Sharded multi-connection VDDK download.
+
+VDDKESXClient is single-threaded and one connection is one NBD stream. This
+module splits a disk into fixed-size blocks, groups the blocks into N
+contiguous shards and downloads each shard in its own *process* with its own
+VDDK init + connection (VDDK is not thread-safe, but separate processes are
+fine). Workers pwrite() into one shared, pre-sized .part file.
+
+Resume uses a completion bitmap sidecar (<local>.part.map) instead of the
+"file size equals done" rule: a fixed JSON header followed by one byte per
+block. A worker marks a block only after its data has been written, so any
+marked block is complete and unmarked blocks are simply fetched again.
+
+Workers are started with the "spawn" start method so no VDDK state from the
+parent is inherited across fork().
+"""
+
+from __future__ import annotations
+
+import ctypes
+import hashlib
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...core.sparse import ZERO_BLOCK_SIZE, data_runs
+from .vddk_client import (
+    _SECTOR_SIZE,
+    CancelFn,
+    ProgressFn,
+    VDDKCancelled,
+    VDDKConnectionSpec,
+    VDDKError,
+    VDDKESXClient,
+    _atomic_write_replace,
+    _fmt_eta,
+    _fsync_dir,
+    _is_flat_or_delta_vmdk,
+    _looks_like_datastore_path,
+)
+
+_MAP_HEADER_SIZE = 4096
+_MAP_VERSION = 1
+
+# A block's work: (block_index, [(start_sector, num_sectors), ...])
+Block = Tuple[int, List[Tuple[int, int]]]
+
+# Worker-process globals (set by _worker_init)
+_w_cancel: Any = None
+
+
+def plan_blocks(extents: List[Tuple[int, int]], block_sectors: int) -> List[Block]:
+    """
+    Cut merged extents at block boundaries.
+
+    Returns only blocks that contain work, in ascending order, each with the
+    extent pieces that fall inside it.
+    """
+    bs = max(1, int(block_sectors))
+    blocks: Dict[int, List[Tuple[int, int]]] = {}
+    for start, length in extents:
+        pos, end = int(start), int(start) + int(length)
+        while pos < end:
+            idx = pos // bs
+            piece_end = min(end, (idx + 1) * bs)
+            blocks.setdefault(idx, []).append((pos, piece_end - pos))
+            pos = piece_end
+    return sorted(blocks.items())
+
+
+def _block_sectors(block: Block) -> int:
+    return sum(n for _, n in block[1])
+
+
+def split_shards(blocks: List[Block], n: int) -> List[List[Block]]:
+    """Split blocks into at most n contiguous shards of roughly equal work."""
+    if not blocks:
+        return []
+    n = max(1, min(int(n), len(blocks)))
+    total = sum(_block_sectors(b) for b in blocks)
+    shards: List[List[Block]] = [[]]
+    acc = 0
+    for b in blocks:
+        target = total * len(shards) / n
+        if shards[-1] and acc >= target and len(shards) < n:
+            shards.append([])
+        shards[-1].append(b)
+        acc += _block_sectors(b)
+    return shards
+
+
+class _ShardMap:
+    """Completion bitmap sidecar: fixed JSON header + one byte per block."""
+
+    def __init__(self, path: Path, header: Dict[str, Any]):
+        self.path = path
+        self.header = header
+        self.nblocks = int(header["nblocks"])
+
+    @classmethod
+    def load_or_create(cls, path: Path, header: Dict[str, Any], *, resume: bool) -> Tuple["_ShardMap", bool]:
+        """Return (map, resumed). A header mismatch discards the old map."""
+        if resume and path.exists():
+            try:
+                with open(path, "rb") as f:
+                    old = json.loads(f.read(_MAP_HEADER_SIZE).rstrip(b"\0 ").decode("utf-8"))
+                if old == header and path.stat().st_size == _MAP_HEADER_SIZE + int(header["nblocks"]):
+                    return cls(path, header), True
+            except (OSError, ValueError):
+                pass
+
+        raw = json.dumps(header, sort_keys=True).encode("utf-8")
+        if len(raw) > _MAP_HEADER_SIZE:
+            raise VDDKError("VDDK shard map header too large")
+        with open(path, "wb") as f:
+            f.write(raw.ljust(_MAP_HEADER_SIZE, b" "))
+            f.truncate(_MAP_HEADER_SIZE + int(header["nblocks"]))
+        return cls(path, header), False
+
+    def done(self) -> bytes:
+        with open(self.path, "rb") as f:
+            f.seek(_MAP_HEADER_SIZE)
+            return f.read(self.nblocks)
+
+
+def _worker_init(cancel_event: Any) -> None:
+    global _w_cancel
+    _w_cancel = cancel_event
+
+
+def _shard_worker(
+    spec: VDDKConnectionSpec,
+    remote_vmdk: str,
+    part_path: str,
+    map_path: str,
+    blocks: List[Block],
+    opts: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Download one shard over a dedicated VDDK connection. Runs in a child process."""
+    logger = logging.getLogger(__name__)
+    spr = max(1, int(opts["sectors_per_read"]))
+    buf = bytearray(spr * _SECTOR_SIZE)
+    buf_c = (ctypes.c_ubyte * len(buf)).from_buffer(buf)
+    buf_p = ctypes.cast(buf_c, ctypes.c_void_p)
+
+    def _cancelled() -> bool:
+        return bool(_w_cancel is not None and _w_cancel.is_set())
+
+    read_bytes = 0
+    zero_skipped = 0
+    t0 = time.time()
+
+    client = VDDKESXClient(logger, spec)
+    client.connect()
+    data_fd = os.open(part_path, os.O_WRONLY)
+    map_fd = os.open(map_path, os.O_WRONLY)
+    h = None
+    try:
+        h = client._open_ro(remote_vmdk)
+        for idx, pieces in blocks:
+            for start, length in pieces:
+                sector, end = start, start + length
+                while sector < end:
+                    if _cancelled():
+                        raise VDDKCancelled("Download cancelled")
+                    n = min(spr, end - sector)
+                    nbytes = n * _SECTOR_SIZE
+                    client._read_with_retry(
+                        h,
+                        start_sector=sector,
+                        num_sectors=n,
+                        buf_p=buf_p,
+                        max_retries=int(opts["max_read_retries"]),
+                        base_backoff_s=float(opts["base_backoff_s"]),
+                        max_backoff_s=float(opts["max_backoff_s"]),
+                        jitter_s=float(opts["jitter_s"]),
+                        cancel=_cancelled,
+                    )
+                    mv = memoryview(buf)[:nbytes]
+                    base = sector * _SECTOR_SIZE
+                    if opts["skip_zero_blocks"]:
+                        runs = data_runs(buf, 0, nbytes, block_size=ZERO_BLOCK_SIZE)
+                        for off, ln in runs:
+                            os.pwrite(data_fd, mv[off : off + ln], base + off)
+                        zero_skipped += nbytes - sum(ln for _, ln in runs)
+                    else:
+                        os.pwrite(data_fd, mv, base)
+                    read_bytes += nbytes
+                    sector += n
+            if opts["durable"]:
+                os.fdatasync(data_fd)
+            os.pwrite(map_fd, b"\x01", _MAP_HEADER_SIZE + idx)
+    finally:
+        if h:
+            client._close(h)
+        os.close(map_fd)
+        os.close(data_fd)
+        client.disconnect()
+
+    return {"bytes": read_bytes, "zero_skipped": zero_skipped, "seconds": max(0.0, time.time() - t0)}
+
+
+def download_vmdk_sharded(
+    client: VDDKESXClient,
+    remote_vmdk: str,
+    local_path: Path,
+    *,
+    connections: int = 4,
+    sectors_per_read: int = 2048,
+    block_sectors: int = 32768,  # 16 MiB bitmap granularity
+    progress: Optional[ProgressFn] = None,
+    progress_interval_s: float = 0.5,
+    resume: bool = True,
+    durable: bool = False,
+    allow_flat: bool = False,
+    cancel: Optional[CancelFn] = None,
+    max_read_retries: int = 6,
+    base_backoff_s: float = 0.25,
+    max_backoff_s: float = 8.0,
+    jitter_s: float = 0.25,
+    compute_sha256: bool = False,
+    allocated_only: bool = False,
+    skip_zero_blocks: bool = True,
+) -> Path:
+    """
+    Download a remote VMDK over `connections` parallel VDDK sessions.
+
+    `client` must be connected; it is used in the parent only to read the
+    capacity and (optionally) the allocation map. Each worker process opens
+    its own connection from client.spec.
+    """
+    client._require_connected()
+    logger = client.logger
+
+    remote_vmdk = (remote_vmdk or "").strip()
+    if not remote_vmdk:
+        raise VDDKError("remote_vmdk is empty")
+    if not _looks_like_datastore_path(remote_vmdk):
+        logger.warning("VDDK: remote path doesn't look like datastore form: %r", remote_vmdk)
+    if _is_flat_or_delta_vmdk(remote_vmdk) and not allow_flat:
+        raise VDDKError(
+            f"Refusing to open non-descriptor VMDK {remote_vmdk!r}. "
+            "Pass the descriptor .vmdk (not -flat/-delta) or set allow_flat=True."
+        )
+
+    local_path = Path(local_path).expanduser().resolve()
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = local_path.with_suffix(local_path.suffix + ".part")
+    map_path = tmp.with_suffix(tmp.suffix + ".map")
+
+    h = client._open_ro(remote_vmdk)
+    try:
+        cap_sectors = client._capacity_sectors(h)
+        if cap_sectors <= 0:
+            raise VDDKError(f"Invalid capacity from VDDK GetInfo: sectors={cap_sectors}")
+        extents: List[Tuple[int, int]] = [(0, cap_sectors)]
+        if allocated_only:
+            alloc_map = client._query_allocated_extents(h, cap_sectors, chunk_sectors=sectors_per_read)
+            if alloc_map is not None:
+                extents = alloc_map
+    finally:
+        client._close(h)
+
+    total_bytes = cap_sectors * _SECTOR_SIZE
+    bs = max(1, int(block_sectors))
+    blocks = plan_blocks(extents, bs)
+    header = {
+        "version": _MAP_VERSION,
+        "remote": remote_vmdk,
+        "capacity_sectors": cap_sectors,
+        "block_sectors": bs,
+        "nblocks": (cap_sectors + bs - 1) // bs,
+        "allocated_only": bool(allocated_only),
+    }
+
+    smap, resumed = _ShardMap.load_or_create(map_path, header, resume=resume and tmp.exists())
+    if not resumed:
+        with open(tmp, "wb") as f:
+            f.truncate(total_bytes)
+    elif tmp.stat().st_size != total_bytes:
+        raise VDDKError(f"Shard map present but {tmp} has unexpected size; remove it to restart")
+
+    block_bytes = {idx: sum(n for _, n in pieces) * _SECTOR_SIZE for idx, pieces in blocks}
+    xfer_total = sum(block_bytes.values())
+
+    def _done_bytes() -> int:
+        bm = smap.done()
+        return sum(nb for idx, nb in block_bytes.items() if bm[idx])
+
+    done_map = smap.done()
+    todo = [b for b in blocks if not done_map[b[0]]]
+    shards = split_shards(todo, connections)
+    done_at_start = _done_bytes()
+
+    logger.info(
+        "VDDK: sharded download start: %s -> %s (%.2f GiB, to transfer %.2f GiB, %d block(s) left, %d connection(s))%s",
+        remote_vmdk,
+        local_path,
+        total_bytes / (1024**3),
+        xfer_total / (1024**3),
+        len(todo),
+        len(shards),
+        " [resume]" if resumed else "",
+    )
+
+    opts = {
+        "sectors_per_read": int(sectors_per_read),
+        "max_read_retries": int(max_read_retries),
+        "base_backoff_s": float(base_backoff_s),
+        "max_backoff_s": float(max_backoff_s),
+        "jitter_s": float(jitter_s),
+        "skip_zero_blocks": bool(skip_zero_blocks),
+        "durable": bool(durable),
+    }
+
+    start = time.time()
+    results: List[Dict[str, Any]] = []
+    if shards:
+        ctx = mp.get_context("spawn")
+        cancel_event = ctx.Event()
+        with ProcessPoolExecutor(
+            max_workers=len(shards),
+            mp_context=ctx,
+            initializer=_worker_init,
+            initargs=(cancel_event,),
+        ) as ex:
+            futs = [
+                ex.submit(_shard_worker, client.spec, remote_vmdk, str(tmp), str(map_path), shard, opts)
+                for shard in shards
+            ]
+            pending = set(futs)
+            try:
+                while pending:
+                    finished, pending = wait(
+                        pending,
+                        timeout=max(0.05, float(progress_interval_s)),
+                        return_when=FIRST_EXCEPTION,
+                    )
+                    for fut in finished:
+                        exc = fut.exception()
+                        if exc is not None:
+                            raise exc
+                    if cancel and cancel():
+                        raise VDDKCancelled("Download cancelled")
+                    if progress:
+                        done = _done_bytes()
+                        progress(done, xfer_total, (done / xfer_total * 100.0) if xfer_total else 100.0)
+            except VDDKCancelled:
+                cancel_event.set()
+                logger.warning("VDDK: sharded download cancelled; partial + map kept at %s", tmp)
+                raise
+            except BaseException:
+                cancel_event.set()
+                raise
+            results = [f.result() for f in futs]
+
+    final_map = smap.done()
+    missing = sum(1 for idx, _ in blocks if not final_map[idx])
+    if missing:
+        raise VDDKError(f"Sharded download incomplete: {missing} block(s) not marked done in {map_path}")
+
+    if durable:
+        fd = os.open(str(tmp), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    if compute_sha256:
+        sha256 = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            for chunk in iter(lambda: f.read(16 * 1024 * 1024), b""):
+                sha256.update(chunk)
+        logger.info("VDDK: sha256 %s %s", sha256.hexdigest(), local_path)
+
+    _atomic_write_replace(tmp, local_path)
+    try:
+        map_path.unlink()
+    except FileNotFoundError:
+        pass
+    if durable:
+        _fsync_dir(local_path.parent)
+
+    elapsed = max(0.0, time.time() - start)
+    moved = sum(r["bytes"] for r in results)
+    zero_skipped = sum(r["zero_skipped"] for r in results)
+    mib_s = (moved / (1024**2)) / elapsed if elapsed > 0 else 0.0
+    if progress:
+        progress(xfer_total, xfer_total, 100.0)
+    logger.info(
+        "VDDK: sharded download done: %s (%.2f GiB this run, %.2f GiB resumed, %.1f MiB/s aggregate, %.2f GiB zero blocks left as holes, elapsed=%s)",
+        local_path,
+        moved / (1024**3),
+        done_at_start / (1024**3),
+        mib_s,
+        zero_skipped / (1024**3),
+        _fmt_eta(elapsed),
+    )
+    for i, r in enumerate(results):
+        logger.debug(
+            "VDDK: shard %d: %.2f GiB in %.1fs (%.1f MiB/s)",
+            i,
+            r["bytes"] / (1024**3),
+            r["seconds"],
+            (r["bytes"] / (1024**2)) / r["seconds"] if r["seconds"] else 0.0,
+        )
+    return local_path
+
+
+__all__ = ["download_vmdk_sharded", "plan_blocks", "split_shards"]
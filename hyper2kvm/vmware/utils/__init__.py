@@ -6,6 +6,7 @@ VMware utility modules.
 This package provides utility functions and helpers:
 - vmdk_parser: VMDK descriptor file parsing
 - datastore: VMware datastore operations
+- snapshot: Snapshot and CBT control-plane operations
 - v2v: virt-v2v integration utilities
 - utils: General VMware utilities
 """
@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+# -*- coding: utf-8 -*-
+# hyper2kvm/vmware/utils/snapshot.py
+"""
+Snapshot and Changed Block Tracking (CBT) control-plane operations for VMware
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterator, Optional, Tuple
+
+# Optional: pyvmomi imports (conditional)
+try:
+    from pyVmomi import vim  # type: ignore
+
+    PYVMOMI_AVAILABLE = True
+except Exception:  # pragma: no cover
+    vim = None  # type: ignore
+    PYVMOMI_AVAILABLE = False
+
+# Import VMwareError from http_client or fallback
+try:
+    from ..transports.http_client import VMwareError
+except Exception:  # pragma: no cover
+    try:
+        from ...core.exceptions import VMwareError  # type: ignore
+    except Exception:  # pragma: no cover
+
+        class VMwareError(RuntimeError):
+            pass
+
+
+from .datastore import _require_pyvmomi, wait_for_task
+
+
+# CBT
+
+
+def enable_cbt(client: Any, vm_obj: Any) -> None:
+    """Turn on changeTrackingEnabled (no-op if it is already on)."""
+    _require_pyvmomi(client)
+    cfg = getattr(vm_obj, "config", None)
+    if bool(getattr(cfg, "changeTrackingEnabled", False)):
+        client.logger.debug("CBT already enabled on %s", getattr(vm_obj, "name", "?"))
+        return
+    spec = vim.vm.ConfigSpec()  # type: ignore[attr-defined]
+    spec.changeTrackingEnabled = True
+    client.logger.info("Enabling CBT on %s", getattr(vm_obj, "name", "?"))
+    wait_for_task(client, vm_obj.ReconfigVM_Task(spec=spec))
+
+
+def query_changed_disk_areas(
+    client: Any,
+    vm_obj: Any,
+    *,
+    snapshot: Any,
+    device_key: int,
+    start_offset: int,
+    change_id: str,
+) -> Any:
+    """Single QueryChangedDiskAreas call; returns vim.vm.DiskChangeInfo."""
+    _require_pyvmomi(client)
+    try:
+        return vm_obj.QueryChangedDiskAreas(
+            snapshot=snapshot,
+            deviceKey=int(device_key),
+            startOffset=int(start_offset),
+            changeId=str(change_id or "*"),
+        )
+    except Exception as e:
+        raise VMwareError(
+            f"QueryChangedDiskAreas failed (device_key={device_key} start={start_offset} change_id={change_id!r}): {e}"
+        )
+
+
+def iter_changed_areas(query: Any, capacity_bytes: int, change_id: str) -> Iterator[Tuple[int, int]]:
+    """
+    Page through QueryChangedDiskAreas and yield (offset, length) byte ranges.
+
+    query(start_offset, change_id) performs one call. Each DiskChangeInfo covers
+    [startOffset, startOffset + length); the next page starts where it ended.
+    """
+    offset = 0
+    capacity = int(capacity_bytes)
+    while offset < capacity:
+        info = query(offset, change_id)
+        for area in getattr(info, "changedArea", None) or []:
+            start = int(getattr(area, "start", 0) or 0)
+            length = int(getattr(area, "length", 0) or 0)
+            if length > 0:
+                yield start, length
+        nxt = int(getattr(info, "startOffset", offset) or 0) + int(getattr(info, "length", 0) or 0)
+        if nxt <= offset:
+            raise VMwareError(f"QueryChangedDiskAreas made no progress at offset {offset}")
+        offset = nxt
+
+
+# Snapshots
+
+
+def create_snapshot(
+    client: Any,
+    vm_obj: Any,
+    name: str,
+    *,
+    quiesce: bool = True,
+    memory: bool = False,
+    description: str = "Created by hyper2kvm",
+) -> Any:
+    """Create a snapshot and return its vim.vm.Snapshot reference."""
+    _require_pyvmomi(client)
+    client.logger.info(
+        "Creating snapshot %r on %s (quiesce=%s memory=%s)", name, getattr(vm_obj, "name", "?"), quiesce, memory
+    )
+    task = vm_obj.CreateSnapshot_Task(name=name, description=description, memory=bool(memory), quiesce=bool(quiesce))
+    wait_for_task(client, task)
+    snap = getattr(task.info, "result", None)
+    if snap is None:
+        raise VMwareError(f"CreateSnapshot_Task returned no snapshot for {name!r}")
+    return snap
+
+
+def remove_snapshot(client: Any, snapshot: Any, *, consolidate: bool = True) -> None:
+    _require_pyvmomi(client)
+    client.logger.info("Removing snapshot %s", snapshot_moref(snapshot))
+    wait_for_task(client, snapshot.RemoveSnapshot_Task(removeChildren=False, consolidate=bool(consolidate)))
+
+
+def snapshot_moref(snapshot: Any) -> Optional[str]:
+    moid = getattr(snapshot, "_moId", None)
+    return str(moid) if moid else None
+
+
+def snapshot_disk(snapshot: Any, device_key: int) -> Any:
+    """Return the VirtualDisk with device_key as captured in the snapshot config."""
+    devices = getattr(getattr(getattr(snapshot, "config", None), "hardware", None), "device", None) or []
+    for dev in devices:
+        if int(getattr(dev, "key", -1)) == int(device_key):
+            return dev
+    raise VMwareError(f"Disk device_key={device_key} not found in snapshot {snapshot_moref(snapshot)}")
+
+
+def snapshot_disk_change_id(snapshot: Any, device_key: int) -> str:
+    """changeId of the disk at snapshot time; the base for the next delta query."""
+    backing = getattr(snapshot_disk(snapshot, device_key), "backing", None)
+    change_id = getattr(backing, "changeId", None) if backing else None
+    if not change_id:
+        raise VMwareError(f"Disk device_key={device_key} has no changeId (is CBT enabled on the VM?)")
+    return str(change_id)
@@ -6,11 +6,16 @@ vSphere command orchestration for hyper2kvm.
 """
 from __future__ import annotations
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 from ...core.exceptions import VMwareError
 from ..clients.client import V2VExportOptions, VMwareClient
+from ..transports.cbt_sync import CBTState, HTTPRangeExtentReader, VDDKExtentReader, sync_generation
+from ..transports.vddk_client import VDDKESXClient
+from ..transports.vddk_loader import vddk_connection_spec
+from ..utils.snapshot import iter_changed_areas, snapshot_disk, snapshot_disk_change_id
 
 # Import from split modules
 from .errors import (
@@ -352,8 +357,11 @@ class VsphereCommands:
 
     def cbt_sync(self) -> Any:
         """
-        Scaffold: enable CBT + snapshot + one-shot QueryChangedDiskAreas summary.
-        (Real delta patching requires VDDK/NBD reads + applying extents into the base image.)
+        One CBT sync pass (warm migration): snapshot, copy the areas changed since the
+        changeId recorded next to local_path (everything allocated on the first pass),
+        patch them into the local base image and record the new generation.
+
+        Run repeatedly while the VM is live, then once more after power-off for cutover.
         """
         vm_name = _require(self.args, "vm_name")
         disk_sel = getattr(self.args, "disk", None)
@@ -361,42 +369,115 @@ class VsphereCommands:
         enable = bool(getattr(self.args, "enable_cbt", False))
         snapshot_name = getattr(self.args, "snapshot_name", "hyper2kvm-cbt") or "hyper2kvm-cbt"
         change_id = str(getattr(self.args, "change_id", "*") or "*")
+        keep_snapshot = bool(getattr(self.args, "keep_snapshot", False))
+        image_format = str(
+            getattr(self.args, "cbt_format", None) or ("qcow2" if local_path.suffix == ".qcow2" else "raw")
+        ).lower()
 
         vm = self._vm_or_raise(vm_name)
-
-        if enable:
-            self.client.enable_cbt(vm)
-
-        snap = self.client.create_snapshot(vm, snapshot_name, quiesce=True, memory=False)
-
         d = self.client.select_disk(vm, disk_sel)
         device_key = int(getattr(d, "key", 0) or 0)
         if not device_key:
             raise VMwareError("Could not resolve device_key for selected disk")
+        capacity = int(getattr(d, "capacityInBytes", 0) or 0) or int(getattr(d, "capacityInKB", 0) or 0) * 1024
 
-        # base pull so you at least have a consistent local artifact
-        self.download_vm_disk_with(vm_name=vm_name, disk_sel=disk_sel, local_path=local_path)
+        state = CBTState.load(CBTState.path_for(local_path))
+        state.bind(vm=vm_name, device_key=device_key, capacity_bytes=capacity, image_format=image_format)
+        if change_id != "*":
+            # explicit override, e.g. a changeId recorded by another tool for this base
+            state.change_id = change_id
 
-        r = self.client.query_changed_disk_areas(
-            vm,
-            snapshot=snap,
-            device_key=device_key,
-            start_offset=0,
-            change_id=change_id,
-        )
+        if enable:
+            self.client.enable_cbt(vm)
+
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        snap = self.client.create_snapshot(vm, snapshot_name, quiesce=True, memory=False)
+        try:
+            to_change_id = snapshot_disk_change_id(snap, device_key)
+            backing = str(getattr(getattr(snapshot_disk(snap, device_key), "backing", None), "fileName", "") or "")
+
+            def _areas(from_change_id: str) -> Any:
+                return iter_changed_areas(
+                    lambda off, cid: self.client.query_changed_disk_areas(
+                        vm, snapshot=snap, device_key=device_key, start_offset=off, change_id=cid
+                    ),
+                    capacity,
+                    from_change_id,
+                )
+
+            with self._cbt_reader(vm, snap, device_key, backing) as reader:
+                gen = sync_generation(
+                    state,
+                    image=local_path,
+                    areas_for=_areas,
+                    reader=reader,
+                    to_change_id=to_change_id,
+                    snapshot=self.client.snapshot_moref(snap),
+                    logger=self.logger,
+                )
+        finally:
+            if not keep_snapshot:
+                try:
+                    self.client.remove_snapshot(snap)
+                except Exception as e:
+                    self.logger.warning("CBT: failed to remove snapshot %s: %s", self.client.snapshot_moref(snap), e)
 
         out = {
             "ok": True,
             "vm": vm_name,
             "disk": disk_sel,
-            "snapshot_moref": self.client.snapshot_moref(snap),
             "device_key": device_key,
-            "change_id": change_id,
-            "changedArea_count": len(getattr(r, "changedArea", []) or []),
+            "local_path": str(local_path),
+            "format": image_format,
+            "generation": gen.generation,
+            "kind": gen.kind,
+            "from_change_id": gen.from_change_id,
+            "change_id": gen.to_change_id,
+            "snapshot_moref": gen.snapshot,
+            "extents": gen.extents,
+            "changed_bytes": gen.changed_bytes,
+            "seconds": round(gen.finished_at - gen.started_at, 3),
+            "state": str(state.path),
         }
         self.emit.emit(out)
         return out
 
+    @contextmanager
+    def _cbt_reader(self, vm: Any, snap: Any, device_key: int, backing: str) -> Iterator[Any]:
+        """VDDK reader when VDDK options are given (--cbt_transport vddk), else HTTPS Range reads."""
+        transport = str(getattr(self.args, "cbt_transport", None) or "auto").lower()
+        vddk_libdir = _p(_arg_any(self.args, "vddk_libdir", "vs_vddk_libdir2"))
+        if transport == "vddk" or (transport == "auto" and vddk_libdir):
+            opt = V2VExportOptions(
+                vm_name=str(getattr(vm, "name", "") or ""),
+                export_mode="vddk_download",
+                vddk_libdir=vddk_libdir,
+                vddk_thumbprint=_arg_any(self.args, "vddk_thumbprint", "vs_vddk_thumbprint2"),
+                vddk_transports=_arg_any(self.args, "vddk_transports", "vs_vddk_transports2"),
+                no_verify=bool(_arg_any(self.args, "no_verify", "vs_no_verify2", default=False)),
+            )
+            esx_host = self.client._resolve_esx_host_for_vm(vm)
+            vc = VDDKESXClient(self.logger, vddk_connection_spec(self.client, esx_host, opt))
+            vc.connect()
+            try:
+                with VDDKExtentReader(vc, backing) as reader:
+                    yield reader
+            finally:
+                vc.disconnect()
+            return
+
+        disk = snapshot_disk(snap, device_key)
+        if getattr(getattr(disk, "backing", None), "parent", None) is not None:
+            raise VMwareError("CBT over HTTPS needs a VM without earlier snapshots (delta chain); use --cbt_transport vddk")
+        ds_name, rel_path = self.client.parse_backing_filename(backing)
+        if rel_path.endswith(".vmdk") and not rel_path.endswith("-flat.vmdk"):
+            # the descriptor is text; CBT offsets address the flat extent
+            rel_path = rel_path[: -len(".vmdk")] + "-flat.vmdk"
+        dc_name = self.client._resolve_datacenter_for_download(getattr(self.args, "dc_name", None))
+        yield HTTPRangeExtentReader(
+            self.client._http_download_client(), datastore=ds_name, ds_path=rel_path, dc_name=dc_name
+        )
+
     def download_vm_disk_with(self, *, vm_name: str, disk_sel: Any, local_path: Path) -> Any:
         """
         Internal reuse helper: call download_vm_disk logic without mutating self.args.
@@ -455,6 +536,14 @@ class VsphereCommands:
         vddk_thumbprint = _arg_any(self.args, "vddk_thumbprint", "vs_vddk_thumbprint2")
         vddk_transports = _arg_any(self.args, "vddk_transports", "vs_vddk_transports2")
         no_verify = bool(_arg_any(self.args, "no_verify", "vs_no_verify2", default=False))
+        allocated_only = bool(_arg_any(self.args, "vddk_allocated_only", "vs_vddk_allocated_only", default=False))
+        skip_zero_blocks = bool(_arg_any(self.args, "vddk_skip_zero_blocks", "vs_vddk_skip_zero_blocks", default=True))
+        punch_holes = bool(_arg_any(self.args, "vddk_punch_holes", "vs_vddk_punch_holes", default=False))
+        connections = int(_arg_any(self.args, "vddk_connections", "vs_vddk_connections", default=1) or 1)
+        io_buffers = int(_arg_any(self.args, "vddk_io_buffers", "vs_vddk_io_buffers", default=4) or 1)
+        auto_tune = bool(_arg_any(self.args, "auto_read_size", "vs_auto_read_size", default=False))
+        read_min_kib = int(_arg_any(self.args, "read_size_min_kib", "vs_read_size_min_kib", default=256) or 256)
+        read_max_kib = int(_arg_any(self.args, "read_size_max_kib", "vs_read_size_max_kib", default=65536) or 65536)
 
         opt = V2VExportOptions(
             vm_name=vm_name,
@@ -466,10 +555,20 @@ class VsphereCommands:
             vddk_thumbprint=vddk_thumbprint,
             vddk_transports=vddk_transports,
             no_verify=no_verify,
+            vddk_download_allocated_only=allocated_only,
+            vddk_download_skip_zero_blocks=skip_zero_blocks,
+            vddk_download_punch_holes=punch_holes,
+            vddk_download_connections=connections,
+            vddk_download_io_buffers=io_buffers,
+            vddk_download_auto_tune=auto_tune,
+            vddk_download_read_size_min=read_min_kib * 1024,
+            vddk_download_read_size_max=read_max_kib * 1024,
         )
 
         res = self.client.export_vm(opt)
         out = {"ok": True, "vm": vm_name, "disk": disk_sel, "local_path": str(res)}
+        if self.client.last_read_tuning:
+            out["read_tuning"] = self.client.last_read_tuning
         self.emit.emit(out, human_msg=str(res))
         return out
 
@@ -310,6 +310,11 @@ def _download_one_folder_file(
         resume_download=True,  # Bonus: resume support!
         atomic=True,
         show_panels=False,  # Don't show extra UI panels in vsphere mode
+        auto_tune_chunk_size=bool(getattr(args, "vs_auto_read_size", False)),
+        chunk_size_min=int(getattr(args, "vs_read_size_min_kib", 256) or 256) * 1024,
+        chunk_size_max=int(getattr(args, "vs_read_size_max_kib", 65536) or 65536) * 1024,
+        segments=max(1, int(getattr(args, "vs_http_segments", 1) or 1)),
+        segment_size=max(1, int(getattr(args, "vs_http_segment_size_mib", 256) or 256)) * 1024 * 1024,
     )
 
     if _debug_enabled(args):
@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+"""
+Micro-benchmark for qemu-img convert performance profiles.
+
+Converts a synthetic thin raw image (1/4 data) with every profile and logs
+MB/s per profile, which is the evidence behind the PROFILES defaults. It is
+marked slow and deselected by default; run it on the conversion host with:
+
+    pytest -m slow --log-cli-level=INFO tests/integration/test_converters/test_convert_profiles.py
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from hyper2kvm.converters.qemu.profiles import PROFILES, benchmark_profiles
+
+_MB = 1024 * 1024
+_SIZE_MB = 512
+
+
+def _thin_raw(path: Path) -> None:
+    chunk = os.urandom(_MB)
+    with open(path, "wb") as f:
+        f.truncate(_SIZE_MB * _MB)
+        for i in range(0, _SIZE_MB, 4):  # 1 MiB of data every 4 MiB
+            f.seek(i * _MB)
+            f.write(chunk)
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(shutil.which("qemu-img") is None, reason="qemu-img not installed")
+@pytest.mark.parametrize("out_format", ["qcow2", "raw"])
+def test_benchmark_profiles(tmp_path, out_format):
+    src = tmp_path / "thin.raw"
+    _thin_raw(src)
+
+    results = benchmark_profiles(logging.getLogger("bench"), src, tmp_path, out_format=out_format)
+
+    summary = f"{out_format}: " + ", ".join(f"{name}={mbs:.0f} MB/s" for name, mbs in results)
+    assert [name for name, _ in results] == list(PROFILES), summary
+    assert all(mbs > 0 for _, mbs in results), summary
+
+
+# Integration test marker
+pytestmark = pytest.mark.integration
@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.extractors import decompress, tar_index
+from hyper2kvm.converters.extractors.decompress import detect_compression
+from hyper2kvm.converters.extractors.raw import RAW
+from hyper2kvm.converters.extractors.tar_index import TarReader, bytes_before, is_tar
+
+# gzip(1) stands in for pigz, which is not always installed
+_GZIP = {"gzip": (("gzip", "-dc"),)}
+
+
+def _write_tar(path, payloads):
+    with tarfile.open(path, "w") as tar:
+        for name, data in payloads.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class TestPipedTarReader(unittest.TestCase):
+    """Compressed tarballs stream from an external decompressor."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+        for cache in (tar_index._cache, tar_index._stream_cache):
+            cache.clear()
+            self.addCleanup(cache.clear)
+        self.payloads = {f"disk{i}.img": os.urandom(150_000 + i) for i in range(4)}
+        plain = self.dir / "a.tar"
+        _write_tar(plain, self.payloads)
+        self.gz = self.dir / "a.tar.gz"
+        with open(self.gz, "wb") as f:
+            subprocess.run(["gzip", "-c", str(plain)], stdout=f, check=True)
+        plain.unlink()
+
+    def _read(self, tar, member):
+        return tar.extractfile(member).read()
+
+    def test_detect_compression_uses_magic(self):
+        odd = self.dir / "renamed.bin"
+        shutil.copy(self.gz, odd)
+        self.assertEqual(detect_compression(odd), "gzip")
+        _write_tar(self.dir / "b.tar.gz", {"x": b"1"})  # plain tar despite the name
+        self.assertIsNone(detect_compression(self.dir / "b.tar.gz"))
+
+    def test_stream_listing_and_extraction(self):
+        with patch.dict(decompress.DECOMPRESSORS, _GZIP):
+            with TarReader(self.gz) as reader:
+                self.assertEqual(reader.decompressor, "gzip")
+                self.assertFalse(reader.parallel)
+                members = reader.members
+                before = bytes_before(members)
+                seen = []
+                results = reader.extract(
+                    members,
+                    lambda tar, m: (before[m], self._read(tar, m)),
+                    on_result=lambda m, _r: seen.append(m.name),
+                )
+
+        self.assertEqual([m.name for m in members], list(self.payloads))
+        self.assertEqual(seen, list(self.payloads))
+        self.assertEqual([r[1] for r in results], list(self.payloads.values()))
+        self.assertEqual(results[2][0], sum(len(d) for d in list(self.payloads.values())[:2]))
+
+    def test_listing_is_cached_and_stream_stops_after_last_wanted(self):
+        with patch.dict(decompress.DECOMPRESSORS, _GZIP):
+            with TarReader(self.gz) as reader:
+                first = reader.members
+            with patch.object(tar_index.DecompressPipe, "close", autospec=True, side_effect=decompress.DecompressPipe.close) as close:
+                with TarReader(self.gz) as reader:
+                    self.assertIs(reader.members, first)
+                    results = reader.extract([first[1]], self._read)
+
+        self.assertEqual(results, [self.payloads["disk1.img"]])
+        self.assertEqual(close.call_count, 1)  # extraction only; no second listing pass
+
+    def test_decompressor_failure_raises(self):
+        data = self.gz.read_bytes()
+        self.gz.write_bytes(data[: len(data) // 2])
+
+        with patch.dict(decompress.DECOMPRESSORS, _GZIP):
+            with self.assertRaises((tarfile.TarError, OSError)):
+                with TarReader(self.gz) as reader:
+                    reader.extract(reader.members, self._read)
+
+    def test_corrupt_trailer_is_detected(self):
+        # tar payload intact, gzip CRC32 in the trailer wrong: only a drained stream notices
+        data = bytearray(self.gz.read_bytes())
+        data[-8] ^= 0xFF
+        self.gz.write_bytes(bytes(data))
+
+        with patch.dict(decompress.DECOMPRESSORS, _GZIP):
+            with self.assertRaises(OSError):
+                TarReader(self.gz)
+
+    def test_falls_back_to_tarfile_without_tool(self):
+        with patch("hyper2kvm.converters.extractors.decompress.U.which", return_value=None):
+            with TarReader(self.gz) as reader:
+                self.assertIsNone(reader.decompressor)
+                results = reader.extract(reader.members, self._read)
+        self.assertEqual(results, list(self.payloads.values()))
+
+    def test_is_tar(self):
+        junk = self.dir / "junk.gz"
+        junk.write_bytes(b"\x1f\x8b" + b"\0" * 100)
+        with patch.dict(decompress.DECOMPRESSORS, _GZIP):
+            self.assertTrue(is_tar(self.gz))
+            self.assertFalse(is_tar(junk))
+
+    @unittest.skipIf(shutil.which("zstd") is None, "zstd not installed")
+    def test_raw_extracts_zstd_tarball(self):
+        plain = self.dir / "z.tar"
+        _write_tar(plain, self.payloads)
+        src = self.dir / "payload.tar.zst"
+        subprocess.run(["zstd", "-q", str(plain), "-o", str(src)], check=True)
+
+        result = RAW.extract_raw_or_tar(Mock(), src, self.dir / "out")
+
+        self.assertEqual(sorted(p.name for p in result), sorted(self.payloads))
+        for p in result:
+            self.assertEqual(p.read_bytes(), self.payloads[p.name])
+
+
+if __name__ == "__main__":
+    unittest.main()
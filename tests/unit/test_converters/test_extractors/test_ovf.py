@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import io
+import json
+import tarfile
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.extractors.ovf import OVF
+from hyper2kvm.converters.qemu.archive_source import ArchiveMember, sniff_image_format
+
+_OVF = """<?xml version="1.0"?>
+<Envelope xmlns="http://schemas.dmtf.org/ovf/envelope/1" xmlns:ovf="http://schemas.dmtf.org/ovf/envelope/1">
+  <References>
+    <File ovf:id="file1" ovf:href="vm-disk1.vmdk"/>
+    <File ovf:id="file2" ovf:href="vm-disk2.img"/>
+  </References>
+  <DiskSection>
+    <Disk ovf:diskId="d1" ovf:fileRef="file1"/>
+    <Disk ovf:diskId="d2" ovf:fileRef="file2"/>
+  </DiskSection>
+</Envelope>
+"""
+
+_VMDK = b"KDMV" + b"\x01" * 4092
+_RAW = b"\xeb\x63\x90" + b"\x00" * 8189
+
+
+def _add(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+class TestZeroCopyOva(unittest.TestCase):
+    """Test converting OVA disks in place from their tar offsets."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+        self.ova = self.dir / "vm.ova"
+        with tarfile.open(self.ova, "w") as tar:
+            _add(tar, "vm.ovf", _OVF.encode())
+            _add(tar, "vm.mf", b"SHA256(vm.ovf)= 00\n")
+            _add(tar, "vm-disk1.vmdk", _VMDK)
+            _add(tar, "vm-disk2.img", _RAW)
+        self.out = self.dir / "out"
+
+    def _extract(self, **kw):
+        converted = []
+
+        def convert(logger, src, dst, **_kw):
+            converted.append(src)
+            Path(dst).write_bytes(b"qcow2")
+
+        with patch("hyper2kvm.converters.qemu.converter.Convert.convert_image_with_progress", side_effect=convert), patch(
+            "hyper2kvm.converters.qemu.converter.Convert.validate"
+        ):
+            outputs = OVF.extract_ova(Mock(), self.ova, self.out, convert_to_qcow2=True, **kw)
+        return outputs, converted
+
+    def test_disks_are_read_in_place(self):
+        outputs, converted = self._extract(zero_copy=True)
+
+        self.assertEqual([p.name for p in outputs], ["vm-disk1.qcow2", "vm-disk2.img.qcow2"])
+        self.assertTrue(all(isinstance(src, ArchiveMember) for src in converted))
+        self.assertEqual([m.fmt for m in converted], ["vmdk", "raw"])
+        self.assertFalse((self.out / "vm-disk1.vmdk").exists())
+        self.assertTrue((self.out / "vm.mf").exists())
+
+        data = self.ova.read_bytes()
+        for member, payload in zip(converted, (_VMDK, _RAW)):
+            self.assertEqual(data[member.offset : member.offset + member.size], payload)
+
+    def test_spec_layers_format_over_raw_window(self):
+        _outputs, converted = self._extract(zero_copy=True)
+        spec = str(converted[0])
+
+        self.assertTrue(spec.startswith("json:"))
+        node = json.loads(spec[len("json:") :])
+        self.assertEqual(node["driver"], "vmdk")
+        self.assertEqual(node["file"]["driver"], "raw")
+        self.assertEqual(node["file"]["offset"], converted[0].offset)
+        self.assertEqual(node["file"]["file"]["filename"], str(self.ova.resolve()))
+
+    def test_compressed_ova_falls_back_to_extraction(self):
+        gz = self.dir / "vm.ova.gz"
+        with tarfile.open(gz, "w:gz") as tar:
+            for name in ("vm.ovf", "vm-disk1.vmdk", "vm-disk2.img"):
+                with tarfile.open(self.ova) as src:
+                    _add(tar, name, src.extractfile(name).read())
+        self.ova = gz
+
+        _outputs, converted = self._extract(zero_copy=True)
+
+        self.assertTrue(all(isinstance(src, Path) for src in converted))
+        self.assertTrue((self.out / "vm-disk1.vmdk").exists())
+
+    def test_descriptor_vmdk_is_not_self_contained(self):
+        p = self.dir / "desc.vmdk"
+        p.write_bytes(b"# Disk DescriptorFile\nversion=1\n")
+        self.assertIsNone(sniff_image_format(p, 0))
+
+    def test_sniff_recognises_formats_by_magic(self):
+        vdi = b"<<< Oracle VM VirtualBox Disk Image >>>\n".ljust(0x40, b"\0") + b"\x7f\x10\xda\xbe"
+        for head, fmt in (
+            (vdi, "vdi"),
+            (b"QED\x00" + bytes(60), "qed"),
+            (b"WithoutFreeSpace" + bytes(48), "parallels"),
+        ):
+            p = self.dir / f"disk.{fmt}"
+            p.write_bytes(head)
+            self.assertEqual(sniff_image_format(p, 0, "disk.bin"), fmt)
+
+    def test_sniff_unknown_header_is_raw_only_by_name(self):
+        p = self.dir / "blob"
+        p.write_bytes(b"\x1f\x8b" + bytes(100))
+        self.assertIsNone(sniff_image_format(p, 0, "disk.vmdk.gz"))
+        self.assertEqual(sniff_image_format(p, 0, "disk.img"), "raw")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,269 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from hyper2kvm.converters.extractors import tar_index
+from hyper2kvm.converters.extractors.raw import RAW
+from hyper2kvm.converters.extractors.tar_index import TarReader, bytes_before, copy_member, index_tar
+
+_MB = 1024 * 1024
+
+
+def _add(tar, name, data=b"", kind=tarfile.REGTYPE):
+    info = tarfile.TarInfo(name)
+    info.type = kind
+    info.size = len(data) if kind == tarfile.REGTYPE else 0
+    tar.addfile(info, io.BytesIO(data) if kind == tarfile.REGTYPE else None)
+
+
+class TestIndexTar(unittest.TestCase):
+    """Test the cached member index."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+        tar_index._cache.clear()
+        self.addCleanup(tar_index._cache.clear)
+
+    def test_offsets_point_at_payloads_and_index_is_cached(self):
+        path = self.dir / "a.tar"
+        with tarfile.open(path, "w") as tar:
+            _add(tar, "d", kind=tarfile.DIRTYPE)
+            _add(tar, "d/one.raw", b"1" * 1000)
+            _add(tar, "two.img", b"2" * 3000)
+
+        index = index_tar(path)
+
+        data = path.read_bytes()
+        entry = index.entry("two.img")
+        self.assertEqual(data[entry.offset : entry.offset + entry.size], b"2" * 3000)
+        self.assertEqual([e.type for e in index.entries], ["dir", "file", "file"])
+        self.assertIs(index_tar(path), index)
+
+    def test_cache_keeps_only_recent_archives(self):
+        paths = []
+        for i in range(tar_index._CACHE_ENTRIES + 2):
+            path = self.dir / f"{i}.tar"
+            with tarfile.open(path, "w") as tar:
+                _add(tar, "one.raw", b"1")
+            paths.append(path)
+        first = index_tar(paths[0])
+
+        for path in paths[1:]:
+            index_tar(path)
+            self.assertIs(index_tar(paths[0]), first)  # recently used, so kept
+
+        self.assertEqual(len(tar_index._cache), tar_index._CACHE_ENTRIES)
+        self.assertIsNone(tar_index._cache_get(tar_index._cache, tar_index._cache_key(paths[1])))
+
+    def test_compressed_tar_is_not_indexed(self):
+        path = self.dir / "a.tar.gz"
+        with tarfile.open(path, "w:gz") as tar:
+            _add(tar, "one.raw", b"1")
+        self.assertIsNone(index_tar(path))
+
+
+class TestTarReaderExtract(unittest.TestCase):
+    """Test parallel extraction through TarReader."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+        tar_index._cache.clear()
+        self.addCleanup(tar_index._cache.clear)
+        self.payloads = {f"disk{i}.raw": os.urandom(200_000 + i) for i in range(6)}
+
+    def _tar(self, mode="w", extra=()):
+        path = self.dir / ("a.tar" if mode == "w" else "a.tar.gz")
+        with tarfile.open(path, mode) as tar:
+            _add(tar, "sub", kind=tarfile.DIRTYPE)
+            for name, data in self.payloads.items():
+                _add(tar, name, data)
+            for name, data in extra:
+                _add(tar, name, data)
+        return path
+
+    def _read_all(self, path, workers=4):
+        threads = set()
+
+        def read(tar, member):
+            threads.add(threading.get_ident())
+            f = tar.extractfile(member)
+            return None if f is None else f.read()
+
+        seen = []
+        with TarReader(path, workers=workers) as reader:
+            results = reader.extract(reader.members, read, on_result=lambda m, _r: seen.append(m.name))
+            names = [m.name for m in reader.members]
+            parallel = reader.parallel
+        return names, results, seen, threads, parallel
+
+    def test_results_in_member_order(self):
+        names, results, seen, threads, parallel = self._read_all(self._tar())
+
+        self.assertTrue(parallel)
+        self.assertEqual(seen[0], "sub")  # directories first
+        self.assertEqual(sorted(seen), sorted(names))
+        self.assertEqual(results[0], None)
+        self.assertEqual(results[1:], list(self.payloads.values()))
+        self.assertGreater(len(threads), 1)
+
+    def test_compressed_tar_streams_serially(self):
+        names, results, _seen, threads, parallel = self._read_all(self._tar("w:gz"))
+
+        self.assertFalse(parallel)
+        self.assertEqual(results[1:], list(self.payloads.values()))
+        self.assertEqual(len(threads), 1)
+
+    def test_duplicate_names_keep_archive_order(self):
+        path = self._tar(extra=[("disk0.raw", b"last wins")])
+        names, results, seen, threads, _parallel = self._read_all(path)
+
+        self.assertEqual(seen, names)
+        self.assertEqual(results[-1], b"last wins")
+        self.assertEqual(len(threads), 1)
+
+    def test_exception_propagates(self):
+        def boom(tar, member):
+            if member.name == "disk3.raw":
+                raise RuntimeError("blocked")
+            return member.name
+
+        with TarReader(self._tar()) as reader:
+            with self.assertRaises(RuntimeError):
+                reader.extract(reader.members, boom)
+
+    def test_bytes_before(self):
+        with TarReader(self._tar()) as reader:
+            before = bytes_before(reader.members)
+            sizes = [m.size for m in reader.members]
+            self.assertEqual([before[m] for m in reader.members], [sum(sizes[:i]) for i in range(len(sizes))])
+
+
+class TestCopyMember(unittest.TestCase):
+    """Members are copied with holes left unwritten."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+        tar_index._cache.clear()
+        self.addCleanup(tar_index._cache.clear)
+        self.disk = self.dir / "disk.img"
+        with open(self.disk, "wb") as f:
+            f.truncate(40 * _MB)
+            f.seek(_MB + 100)
+            f.write(os.urandom(5000))
+            f.seek(30 * _MB)
+            f.write(b"B" * 70000)
+        self.image = self.disk.read_bytes()
+
+    def _copy_out(self, path, **kw):
+        out = self.dir / "out.img"
+        with TarReader(path) as reader:
+            member = reader.members[0]
+            with open(out, "wb") as f:
+                n = reader.extract([member], lambda tar, m: copy_member(tar, m, f, **kw))[0]
+        return member, n, out
+
+    def _assert_sparse_copy(self, out, n):
+        self.assertEqual(n, len(self.image))
+        self.assertEqual(out.read_bytes(), self.image)
+        self.assertLess(out.stat().st_blocks * 512, 4 * _MB)
+
+    def test_zero_runs_are_skipped(self):
+        path = self.dir / "dense.tar"
+        with tarfile.open(path, "w") as tar:
+            tar.add(self.disk, arcname="disk.img")
+
+        member, n, out = self._copy_out(path)
+
+        self.assertFalse(member.issparse())
+        self._assert_sparse_copy(out, n)
+
+    @unittest.skipIf(shutil.which("tar") is None, "tar not installed")
+    def test_gnu_and_pax_sparse_members(self):
+        for fmt in ("gnu", "pax"):
+            with self.subTest(fmt=fmt):
+                path = self.dir / f"{fmt}.tar"
+                subprocess.run(["tar", f"--format={fmt}", "-S", "-cf", str(path), "-C", str(self.dir), "disk.img"], check=True)
+                tar_index._cache.clear()
+
+                member, n, out = self._copy_out(path)
+
+                self.assertTrue(member.issparse())
+                self.assertLess(path.stat().st_size, 4 * _MB)
+                self._assert_sparse_copy(out, n)
+
+    def test_budget_callback_sees_logical_bytes(self):
+        path = self.dir / "dense.tar"
+        with tarfile.open(path, "w") as tar:
+            tar.add(self.disk, arcname="disk.img")
+
+        def budget(copied):
+            if copied > 10 * _MB:
+                raise RuntimeError("over budget")
+
+        with self.assertRaises(RuntimeError):
+            self._copy_out(path, on_chunk=budget)
+
+
+class TestRawTarParallel(unittest.TestCase):
+    """RAW tarball extraction goes through the shared indexer."""
+
+    def test_extracts_all_disks(self):
+        tar_index._cache.clear()
+        self.addCleanup(tar_index._cache.clear)
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "payload.tar"
+            disks = {f"d{i}.img": os.urandom(70_000) for i in range(4)}
+            with tarfile.open(src, "w") as tar:
+                for name, data in disks.items():
+                    _add(tar, name, data)
+                _add(tar, "../escape.img", b"x")
+
+            out = Path(td) / "out"
+            with self.assertRaises(RuntimeError):
+                RAW.extract_raw_or_tar(Mock(), src, out)
+            self.assertFalse((Path(td) / "escape.img").exists())
+
+            src2 = Path(td) / "payload2.tar"
+            with tarfile.open(src2, "w") as tar:
+                for name, data in disks.items():
+                    _add(tar, name, data)
+            result = RAW.extract_raw_or_tar(Mock(), src2, Path(td) / "out2")
+
+            self.assertEqual(sorted(p.name for p in result), sorted(disks))
+            for p in result:
+                self.assertEqual(p.read_bytes(), disks[p.name])
+
+    def test_skipped_manifest_does_not_count_against_budget(self):
+        tar_index._cache.clear()
+        self.addCleanup(tar_index._cache.clear)
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "payload.tar"
+            disk = os.urandom(1000)
+            with tarfile.open(src, "w") as tar:
+                _add(tar, "big.json", b"{}" * 1000)  # skipped: over max_manifest_bytes
+                _add(tar, "disk.img", disk)
+
+            result = RAW.extract_raw_or_tar(
+                Mock(), src, Path(td) / "out", max_total_bytes=1500, max_manifest_bytes=100
+            )
+
+            self.assertEqual([p.name for p in result], ["disk.img"])
+            self.assertEqual(result[0].read_bytes(), disk)
+
+
+if __name__ == "__main__":
+    unittest.main()
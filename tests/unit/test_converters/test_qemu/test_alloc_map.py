@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import json
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.qemu import alloc_map
+from hyper2kvm.converters.qemu.alloc_map import parse_map, plan_allocation
+
+_MB = 1024 * 1024
+
+# 1 GiB thin disk: 64 MiB data, 64 MiB allocated zeroes, the rest never written
+_MAP = [
+    {"start": 0, "length": 64 * _MB, "depth": 0, "present": True, "zero": False, "data": True, "offset": 0},
+    {"start": 64 * _MB, "length": 64 * _MB, "depth": 0, "present": True, "zero": True, "data": False},
+    {"start": 128 * _MB, "length": 896 * _MB, "depth": 0, "present": False, "zero": True, "data": False},
+]
+
+
+class TestParseMap(unittest.TestCase):
+    """Test condensing qemu-img map output."""
+
+    def test_counts(self):
+        plan = parse_map(_MAP)
+        self.assertEqual(plan.virtual_size, 1024 * _MB)
+        self.assertEqual(plan.data_bytes, 64 * _MB)
+        self.assertEqual(plan.zero_bytes, 960 * _MB)
+        self.assertEqual(plan.allocated_bytes, 128 * _MB)
+        self.assertEqual(plan.unallocated_bytes, 896 * _MB)
+        self.assertEqual(plan.skip_bytes, 960 * _MB)
+
+    def test_predicted_write_bytes(self):
+        plan = parse_map(_MAP)
+        self.assertEqual(plan.predicted_write_bytes("raw"), 64 * _MB)
+        qcow2 = plan.predicted_write_bytes("qcow2")
+        self.assertGreater(qcow2, 64 * _MB)
+        self.assertLess(qcow2, 70 * _MB)
+
+    def test_old_qemu_without_present(self):
+        entries = [{k: v for k, v in e.items() if k != "present"} for e in _MAP]
+        self.assertEqual(parse_map(entries).allocated_bytes, 64 * _MB)
+
+
+class TestPlanAllocation(unittest.TestCase):
+    """Test the cached qemu-img map runner."""
+
+    def setUp(self):
+        alloc_map._cache.clear()
+
+    def _run(self, src):
+        ok = subprocess.CompletedProcess([], 0, stdout=json.dumps(_MAP), stderr="")
+        with patch("hyper2kvm.converters.qemu.alloc_map.U.which", return_value="/usr/bin/qemu-img"), patch(
+            "hyper2kvm.converters.qemu.alloc_map.subprocess.run", return_value=ok
+        ) as run:
+            first = plan_allocation(Mock(), src, fmt="qcow2")
+            second = plan_allocation(Mock(), src, fmt="qcow2")
+        return first, second, run
+
+    def test_maps_once_per_source(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "disk.qcow2"
+            src.write_bytes(b"QFI\xfb")
+            first, second, run = self._run(src)
+
+        self.assertIs(first, second)
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(run.call_args[0][0], ["qemu-img", "map", "--output=json", "-f", "qcow2", str(src)])
+
+    def test_callers_with_and_without_format_share_one_map(self):
+        ok = subprocess.CompletedProcess([], 0, stdout=json.dumps(_MAP), stderr="")
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "disk.vmdk"
+            src.write_bytes(b"KDMV")
+            with patch("hyper2kvm.converters.qemu.alloc_map.U.which", return_value="/usr/bin/qemu-img"), patch(
+                "hyper2kvm.converters.qemu.alloc_map.subprocess.run", return_value=ok
+            ) as run:
+                converter = plan_allocation(Mock(), src, fmt="vmdk")
+                probed = plan_allocation(Mock(), src)  # scheduler / sanity checker
+                forced = plan_allocation(Mock(), src, fmt="raw")
+
+        self.assertIs(probed, converter)
+        self.assertIsNot(forced, converter)
+        self.assertEqual(run.call_count, 2)
+
+    def test_failure_returns_none(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "disk.qcow2"
+            src.write_bytes(b"x")
+            err = subprocess.CalledProcessError(1, ["qemu-img"])
+            with patch("hyper2kvm.converters.qemu.alloc_map.U.which", return_value="/usr/bin/qemu-img"), patch(
+                "hyper2kvm.converters.qemu.alloc_map.subprocess.run", side_effect=err
+            ):
+                self.assertIsNone(plan_allocation(Mock(), src))
+
+    def test_missing_source_returns_none(self):
+        self.assertIsNone(plan_allocation(Mock(), Path("/nonexistent/disk.vmdk")))
+
+
+if __name__ == "__main__":
+    unittest.main()
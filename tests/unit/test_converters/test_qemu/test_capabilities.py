@@ -0,0 +1,151 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.qemu import capabilities
+from hyper2kvm.converters.qemu.capabilities import QemuImgCaps, probe_qemu_img
+from hyper2kvm.converters.qemu.converter import Convert
+
+_HELP = """qemu-img version 8.2.0
+Command syntax:
+  convert [--object objectdef] [--image-opts] [--target-image-opts] [--target-is-zero] [--bitmaps] [-U] [-C] [-c] [-p] [-q] [-n] [-f fmt] [-t cache] [-T src_cache] [-O output_fmt] [-B backing_file [-F backing_fmt]] [-o options] [-l snapshot_param] [-S sparse_size] [-r rate_limit] [-m num_coroutines] [-W] [--salvage] filename [filename2 [...]] output_filename
+  create [--object objectdef] [-q] [-f fmt] [-b backing_file [-F backing_fmt]] [-u] [-o options] filename [size]
+"""
+
+_OLD_HELP = """qemu-img version 2.12.0
+Command syntax:
+  convert [--object objectdef] [--image-opts] [--target-image-opts] [-U] [-C] [-c] [-p] [-q] [-n] [-f fmt] [-t cache] [-T src_cache] [-O output_fmt] [-B backing_file] [-o options] [-l snapshot_param] [-S sparse_size] [-m num_coroutines] [-W] filename [filename2 [...]] output_filename
+"""
+
+
+def _fake_run(help_text, zstd=True):
+    calls = []
+
+    def run(cmd):
+        calls.append(cmd)
+        if cmd[1] == "--version":
+            return 0, help_text.splitlines()[0]
+        if cmd[1] == "--help":
+            return 0, help_text
+        if cmd[1] == "create":
+            if "compression_type=zstd" in cmd:
+                return (0, "") if zstd else (1, "Invalid parameter 'zstd'")
+            return 0, ""
+        return 1, ""
+
+    return run, calls
+
+
+class TestProbe(unittest.TestCase):
+    """Test parsing of qemu-img capabilities."""
+
+    def test_modern_qemu_img(self):
+        run, _ = _fake_run(_HELP)
+        with patch.object(capabilities, "_run", side_effect=run):
+            caps = capabilities._probe("/usr/bin/qemu-img", "8.2.0")
+
+        self.assertEqual(caps.compression_types, ("zstd", "zlib"))
+        self.assertTrue(caps.threads and caps.parallel_writes and caps.target_is_zero and caps.bitmaps)
+
+    def test_old_qemu_img(self):
+        run, _ = _fake_run(_OLD_HELP, zstd=False)
+        with patch.object(capabilities, "_run", side_effect=run):
+            caps = capabilities._probe("/usr/bin/qemu-img", "2.12.0")
+
+        self.assertEqual(caps.compression_types, ("zlib",))
+        self.assertTrue(caps.threads)
+        self.assertFalse(caps.target_is_zero or caps.bitmaps)
+
+
+class TestProbeCache(unittest.TestCase):
+    """Test the on-disk capability cache."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.binary = Path(self.td.name) / "qemu-img"
+        self.binary.write_text("#!/bin/sh\n")
+        env = patch.dict(os.environ, {"XDG_CACHE_HOME": self.td.name})
+        env.start()
+        self.addCleanup(env.stop)
+        for d in (capabilities._mem, capabilities._versions):
+            d.clear()
+            self.addCleanup(d.clear)
+
+    def _probe(self, run):
+        with patch.object(capabilities, "_run", side_effect=run), patch(
+            "hyper2kvm.converters.qemu.capabilities.U.which", return_value=str(self.binary)
+        ):
+            return probe_qemu_img(Mock())
+
+    def test_probes_once_then_reads_disk_cache(self):
+        run, calls = _fake_run(_HELP)
+        first = self._probe(run)
+        self.assertTrue(capabilities.cache_path().exists())
+
+        capabilities._mem.clear()
+        capabilities._versions.clear()
+        calls.clear()
+        second = self._probe(run)
+
+        self.assertEqual(first, second)
+        self.assertEqual([c[1] for c in calls], ["--version"])
+
+    def test_binary_change_reprobes(self):
+        run, calls = _fake_run(_HELP)
+        self._probe(run)
+        os.utime(self.binary, ns=(1, 1))
+        calls.clear()
+
+        self._probe(run)
+
+        self.assertIn("--help", [c[1] for c in calls])
+        self.assertEqual(len(json.loads(capabilities.cache_path().read_text())), 2)
+
+    def test_forget_replaces_the_cache_atomically(self):
+        run, _calls = _fake_run(_HELP)
+        self._probe(run)
+
+        with patch(
+            "hyper2kvm.converters.qemu.capabilities.U.which", return_value=str(self.binary)
+        ), patch.object(capabilities.os, "replace", wraps=os.replace) as replace:
+            capabilities.forget(Mock())
+
+        replace.assert_called_once()
+        self.assertEqual(json.loads(capabilities.cache_path().read_text()), {})
+        self.assertEqual(list(capabilities.cache_path().parent.glob("*.tmp")), [])
+
+
+class TestApplyCapabilities(unittest.TestCase):
+    """Test that probed capabilities shape the first convert attempt."""
+
+    def _apply(self, caps, direct_io=True, **base):
+        opt = Convert.ConvertOptions(**base)
+        with patch("hyper2kvm.converters.qemu.converter.direct_io_ok", return_value=direct_io):
+            return Convert._apply_capabilities(
+                Mock(), opt, caps, src_dir=Path("/src"), dst_dir=Path("/dst"), out_format="qcow2", compress=True
+            )
+
+    def test_unsupported_options_dropped(self):
+        caps = QemuImgCaps(version="2.12.0", compression_types=("zlib",), threads=False)
+        tuned = self._apply(caps, threads=8, compression_type="zstd")
+
+        self.assertIsNone(tuned.threads)
+        self.assertEqual(tuned.compression_type, "zlib")
+        self.assertEqual(tuned.cache_mode, "none")
+
+    def test_no_direct_io_disables_cache_none(self):
+        caps = QemuImgCaps(compression_types=("zstd", "zlib"), threads=True)
+        tuned = self._apply(caps, direct_io=False, threads=8)
+
+        self.assertEqual(tuned.cache_mode, "")
+        self.assertEqual(tuned.threads, 8)
+        self.assertEqual(tuned.compression_type, "zstd")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -150,6 +150,34 @@ class TestConvertImageWithProgress(unittest.TestCase):
                 self.assertTrue(mock_popen.called)
 
 
+class TestArchiveMemberSource(unittest.TestCase):
+    """Test converting a disk that lives inside an archive."""
+
+    def test_member_source_uses_json_spec_without_format(self):
+        from hyper2kvm.converters.qemu.archive_source import ArchiveMember
+
+        with tempfile.TemporaryDirectory() as td:
+            ova = Path(td) / "vm.ova"
+            ova.write_bytes(b"\0" * 4096)
+            member = ArchiveMember(ova, 1024, 2048, fmt="vmdk", name="disk.vmdk")
+
+            with patch("hyper2kvm.converters.qemu.converter.U.which", return_value="/usr/bin/qemu-img"), patch.object(
+                Convert, "_qemu_img_info", return_value=(2048, "vmdk")
+            ), patch("hyper2kvm.converters.qemu.converter.plan_allocation") as plan, patch(
+                "hyper2kvm.converters.qemu.converter.probe_qemu_img", return_value=None
+            ), patch.object(
+                Convert, "_run_convert_process", return_value=(0, [])
+            ) as run:
+                Convert.convert_image_with_progress(
+                    Mock(), member, Path(td) / "out.qcow2", out_format="qcow2", compress=False, in_format="vmdk", atomic=False
+                )
+
+        cmd = run.call_args[0][1]
+        self.assertNotIn("-f", cmd)
+        self.assertIn(member.spec(), cmd)
+        plan.assert_not_called()
+
+
 class TestValidate(unittest.TestCase):
     """Test image validation."""
 
@@ -278,5 +306,38 @@ class TestSnapshotOperations(unittest.TestCase):
             self.assertIn("snap1", result)
 
 
+class TestCreateOverlay(unittest.TestCase):
+    """Test thin qcow2 overlay creation for the overlay pipeline."""
+
+    @patch("hyper2kvm.core.utils.U.which", return_value="/usr/bin/qemu-img")
+    @patch("hyper2kvm.core.utils.U.run_cmd")
+    def test_overlay_pins_backing_format(self, mock_run, _which):
+        with tempfile.TemporaryDirectory() as td:
+            base = Path(td) / "disk.vmdk"
+            base.write_text("# Disk DescriptorFile")
+            overlay = Path(td) / "work" / "disk.overlay.qcow2"
+
+            with patch.object(Convert, "_qemu_img_info", return_value=(1 << 30, "vmdk")):
+                out = Convert.create_overlay(Mock(), base, overlay)
+
+            cmd = mock_run.call_args[0][1]
+            self.assertEqual(out, overlay)
+            self.assertEqual(cmd[:2], ["qemu-img", "create"])
+            self.assertEqual(cmd[cmd.index("-b") + 1], str(base.resolve()))
+            self.assertEqual(cmd[cmd.index("-F") + 1], "vmdk")
+            self.assertEqual(cmd[-1], str(overlay))
+
+    @patch("hyper2kvm.core.utils.U.which", return_value="/usr/bin/qemu-img")
+    @patch("hyper2kvm.core.utils.U.run_cmd")
+    def test_unknown_backing_format_rejected(self, mock_run, _which):
+        with tempfile.TemporaryDirectory() as td:
+            base = Path(td) / "disk.img"
+            base.write_bytes(b"x")
+            with patch.object(Convert, "_qemu_img_info", return_value=(0, None)):
+                with self.assertRaises(RuntimeError):
+                    Convert.create_overlay(Mock(), base, Path(td) / "o.qcow2")
+        mock_run.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,256 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.qemu import parallel_compress
+from hyper2kvm.converters.qemu.alloc_map import AllocationPlan
+from hyper2kvm.converters.qemu.converter import Convert
+from hyper2kvm.converters.qemu.parallel_compress import CLUSTER_SIZE, compress_to_qcow2
+from hyper2kvm.converters.qemu.profiles import PROFILES
+
+_MB = 1024 * 1024
+
+
+def _read_qcow2(path):
+    """Minimal qcow2 reader: (virtual image bytes, refcounts stored, refcounts implied by L1/L2)."""
+    data = Path(path).read_bytes()
+    (magic, version, _bfo, _bfs, cbits, size, _crypt, l1_size, l1_off, rt_off, rt_clusters) = struct.unpack_from(
+        ">IIQIIQIIQQI", data, 0
+    )
+    assert magic == 0x514649FB and version == 3 and cbits == 16
+    cs = 1 << cbits
+    x = 62 - (cbits - 8)
+
+    implied = {}
+
+    def ref(off, length=cs):
+        for hc in range(off // cs, (off + length - 1) // cs + 1):
+            implied[hc] = implied.get(hc, 0) + 1
+
+    ref(0)
+    for i in range(-(-l1_size * 8 // cs)):
+        ref(l1_off + i * cs)
+    for i in range(rt_clusters):
+        ref(rt_off + i * cs)
+
+    out = bytearray(size + cs)
+    for i, l1e in enumerate(struct.unpack_from(f">{l1_size}Q", data, l1_off)):
+        l2_off = l1e & ((1 << 56) - 1) & ~0x1FF
+        if not l2_off:
+            continue
+        assert l1e >> 63, "L1 entry without COPIED"
+        ref(l2_off)
+        for j, e in enumerate(struct.unpack_from(f">{cs // 8}Q", data, l2_off)):
+            if not e:
+                continue
+            voff = (i * (cs // 8) + j) * cs
+            if e & (1 << 62):
+                coff = e & ((1 << x) - 1)
+                nsec = ((e >> x) & ((1 << (62 - x)) - 1)) + 1
+                ref(coff & ~511, nsec * 512)
+                d = zlib.decompressobj(-12)
+                chunk = d.decompress(data[coff : (coff & ~511) + nsec * 512], cs)
+            else:
+                assert e >> 63, "plain cluster without COPIED"
+                hoff = e & ((1 << 56) - 1) & ~0x1FF
+                ref(hoff)
+                chunk = data[hoff : hoff + cs]
+            assert len(chunk) == cs
+            out[voff : voff + cs] = chunk
+
+    stored = {}
+    for b, blk in enumerate(struct.unpack_from(f">{rt_clusters * cs // 8}Q", data, rt_off)):
+        if blk:
+            ref(blk)
+            for k, rc in enumerate(struct.unpack_from(f">{cs // 2}H", data, blk)):
+                if rc:
+                    stored[b * (cs // 2) + k] = rc
+    return bytes(out[:size]), stored, implied
+
+
+class TestCompressToQcow2(unittest.TestCase):
+    """Round-trip the parallel compressed qcow2 writer through an independent reader."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.dir = Path(self.td.name)
+
+    def _image(self, size):
+        src = self.dir / "disk.raw"
+        text = (b"hyper2kvm compressible block " * 3000)[: 2 * _MB]
+        with open(src, "wb") as f:
+            f.truncate(size)
+            f.seek(0)
+            f.write(text)  # compressible
+            f.seek(5 * _MB + 1234)
+            f.write(os.urandom(CLUSTER_SIZE * 3))  # incompressible, unaligned
+            f.seek(size - 100)
+            f.write(b"tail" * 25)  # partial last cluster
+        return src
+
+    def test_round_trip_and_refcounts(self):
+        src = self._image(9 * _MB + 4096)
+        dst = self.dir / "disk.qcow2"
+        seen = []
+
+        stats = compress_to_qcow2(Mock(), src, dst, workers=4, compression_type="zlib", progress=seen.append)
+
+        image, stored, implied = _read_qcow2(dst)
+        self.assertEqual(image, src.read_bytes())
+        self.assertEqual(stored, implied)
+        self.assertEqual(seen[-1], 1.0)
+        self.assertGreater(stats.ratio, 1.5)
+        self.assertLess(stats.data_bytes, 9 * _MB)  # zero clusters skipped
+        self.assertEqual(stats.output_bytes, dst.stat().st_size)
+
+    def test_worker_count_does_not_change_output(self):
+        src = self._image(6 * _MB)
+        one, many = self.dir / "one.qcow2", self.dir / "many.qcow2"
+
+        compress_to_qcow2(Mock(), src, one, workers=1)
+        compress_to_qcow2(Mock(), src, many, workers=8)
+
+        self.assertEqual(one.read_bytes(), many.read_bytes())
+
+    def test_inflight_bytes_capped(self):
+        src = self._image(9 * _MB)
+        dst = self.dir / "disk.qcow2"
+        batch = parallel_compress._BATCH_CLUSTERS * CLUSTER_SIZE
+        queued = []
+        peak = []
+        real_submit = parallel_compress.ThreadPoolExecutor.submit
+        real_result = parallel_compress.Future.result
+
+        def submit(pool, fn, first, count):
+            queued.append(count * CLUSTER_SIZE)
+            peak.append(sum(queued))
+            return real_submit(pool, fn, first, count)
+
+        def result(fut, *a, **kw):
+            queued.pop(0)
+            return real_result(fut, *a, **kw)
+
+        with patch.object(parallel_compress.ThreadPoolExecutor, "submit", submit), patch.object(
+            parallel_compress.Future, "result", result
+        ):
+            compress_to_qcow2(Mock(), src, dst, workers=8, max_inflight_bytes=batch)
+
+        self.assertGreater(len(peak), 1)
+        self.assertLessEqual(max(peak), batch)
+        image, _stored, _implied = _read_qcow2(dst)
+        self.assertEqual(image, src.read_bytes())
+
+    def test_refcounts_past_one_refcount_block(self):
+        w = parallel_compress._Writer(os.open(self.dir / "rc.bin", os.O_RDWR | os.O_CREAT))
+        self.addCleanup(os.close, w.fd)
+        far = parallel_compress._RC_ENTRIES * 2 + 5
+        w._ref(far)
+        w._ref(far, add=True)
+
+        self.assertEqual(w.refcounts[far], 2)
+        for _ in range(0xFFFF - 2):
+            w._ref(far, add=True)
+        with self.assertRaises(ValueError):
+            w._ref(far, add=True)
+
+    def test_zstd_requires_module(self):
+        with patch.object(parallel_compress, "zstandard", None):
+            with self.assertRaises(ValueError):
+                compress_to_qcow2(Mock(), self._image(_MB), self.dir / "z.qcow2", compression_type="zstd")
+
+    @unittest.skipIf(shutil.which("qemu-img") is None, "qemu-img not installed")
+    def test_qemu_img_check(self):
+        src = self._image(9 * _MB)
+        dst = self.dir / "disk.qcow2"
+        compress_to_qcow2(Mock(), src, dst, workers=4)
+
+        subprocess.run(["qemu-img", "check", str(dst)], check=True, capture_output=True)
+        subprocess.run(["qemu-img", "compare", "-f", "raw", "-F", "qcow2", str(src), str(dst)], check=True)
+
+
+class TestConvertUsesParallelEngine(unittest.TestCase):
+    """Test the compressed-qcow2 dispatch in Convert.convert_image_with_progress."""
+
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.addCleanup(self.td.cleanup)
+        self.src = Path(self.td.name) / "disk.raw"
+        self.src.write_bytes(b"\0" * CLUSTER_SIZE)
+        self.dst = Path(self.td.name) / "out.qcow2"
+        for target, value in (
+            ("U.which", "/usr/bin/qemu-img"),
+            ("Convert._qemu_img_info", (CLUSTER_SIZE, "raw")),
+            ("plan_allocation", None),
+            ("probe_qemu_img", None),
+        ):
+            p = patch(f"hyper2kvm.converters.qemu.converter.{target}", return_value=value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _convert(self, **kw):
+        return Convert.convert_image_with_progress(Mock(), self.src, self.dst, out_format="qcow2", compress=True, **kw)
+
+    def test_raw_source_goes_straight_to_engine(self):
+        with patch.object(Convert, "_run_convert_process") as qemu:
+            self._convert(compress_threads=4)
+
+        qemu.assert_not_called()
+        image, _stored, _implied = _read_qcow2(self.dst)
+        self.assertEqual(image, self.src.read_bytes())
+
+    def test_engine_failure_falls_back_to_qemu_img(self):
+        with patch(
+            "hyper2kvm.converters.qemu.converter.compress_to_qcow2", side_effect=OSError("ENOSPC")
+        ), patch.object(Convert, "_run_convert_process", return_value=(0, [])) as qemu:
+            with patch.object(Path, "replace"):
+                self._convert(compress_threads=4)
+
+        cmd = qemu.call_args[0][1]
+        self.assertIn("-c", cmd)
+
+    def test_low_memory_profile_limits_engine(self):
+        with patch("hyper2kvm.converters.qemu.converter.compress_to_qcow2") as engine, patch.object(Path, "replace"):
+            self._convert(profile="low-memory")
+
+        kw = engine.call_args[1]
+        self.assertEqual(kw["workers"], 2)
+        self.assertEqual(kw["max_inflight_bytes"], PROFILES["low-memory"].compress_inflight_bytes)
+
+    def test_single_thread_uses_qemu_img(self):
+        with patch.object(Convert, "_run_convert_process", return_value=(0, [])) as qemu, patch.object(
+            Path, "replace"
+        ):
+            self._convert(compress_threads=1)
+
+        qemu.assert_called_once()
+
+    def test_no_room_to_stage_uses_qemu_img(self):
+        plan = AllocationPlan(
+            virtual_size=64 * _MB, data_bytes=10 * _MB, zero_bytes=0, allocated_bytes=10 * _MB, extents=1
+        )
+        self.dst.write_bytes(b"qcow2")  # what qemu-img would have left behind
+        with patch(
+            "hyper2kvm.converters.qemu.converter.Convert._qemu_img_info", return_value=(64 * _MB, "vmdk")
+        ), patch(
+            "hyper2kvm.converters.qemu.converter.shutil.disk_usage", return_value=Mock(free=16 * _MB)
+        ), patch(
+            "hyper2kvm.converters.qemu.converter.compress_to_qcow2"
+        ) as engine, patch.object(Convert, "_run_convert_process", return_value=(0, [])) as qemu, patch.object(
+            Path, "replace"
+        ):
+            self._convert(compress_threads=4, alloc=plan)
+
+        engine.assert_not_called()
+        self.assertIn("-c", qemu.call_args[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
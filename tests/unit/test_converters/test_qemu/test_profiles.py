@@ -0,0 +1,93 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters.qemu.alloc_map import AllocationPlan
+from hyper2kvm.converters.qemu.converter import Convert
+from hyper2kvm.converters.qemu.profiles import PROFILES, select_profile
+
+_GB = 1024**3
+
+
+def _plan(data_ratio):
+    return AllocationPlan(
+        virtual_size=10 * _GB,
+        data_bytes=int(10 * _GB * data_ratio),
+        zero_bytes=0,
+        allocated_bytes=int(10 * _GB * data_ratio),
+        extents=1,
+    )
+
+
+class TestSelectProfile(unittest.TestCase):
+    """Test automatic and explicit profile selection."""
+
+    def _select(self, src_fs="ext4", dst_fs="xfs", mem=64 * _GB, nvme=False, **kw):
+        fs = {Path("/src/disk.vmdk"): src_fs, Path("/out"): dst_fs}
+        with patch("hyper2kvm.converters.qemu.profiles.fs_type", side_effect=lambda p: fs[p]), patch(
+            "hyper2kvm.converters.qemu.profiles.mem_available", return_value=mem
+        ), patch("hyper2kvm.converters.qemu.profiles.is_nvme", return_value=nvme):
+            return select_profile(Mock(), src=Path("/src/disk.vmdk"), dst_dir=Path("/out"), **kw)
+
+    def test_auto_local(self):
+        self.assertEqual(self._select().name, "throughput")
+
+    def test_auto_network_source(self):
+        self.assertEqual(self._select(src_fs="nfs4").name, "nfs")
+
+    def test_auto_nvme_target(self):
+        self.assertEqual(self._select(nvme=True).name, "nvme")
+
+    def test_auto_low_memory_wins(self):
+        self.assertEqual(self._select(src_fs="nfs", mem=_GB).name, "low-memory")
+
+    def test_override(self):
+        self.assertEqual(self._select(override="nfs").name, "nfs")
+
+    def test_dense_source_raises_sparse_threshold(self):
+        self.assertEqual(self._select(alloc=_plan(0.9)).sparse_size, "64k")
+        self.assertIsNone(self._select(alloc=_plan(0.1)).sparse_size)
+
+
+class TestProfileOptions(unittest.TestCase):
+    """Test how profiles map onto qemu-img convert arguments."""
+
+    def _cmd(self, name, out_format, compress=False):
+        opt = Convert.options_from_profile(PROFILES[name], out_format=out_format, compress=compress)
+        return Convert._build_convert_cmd(
+            src=Path("in.vmdk"), dst=Path("out.img"), in_format="vmdk", out_format=out_format, compress=compress, opt=opt
+        )
+
+    def test_throughput_raw_uses_out_of_order_writes(self):
+        cmd = self._cmd("throughput", "raw")
+        self.assertIn("-W", cmd)
+        self.assertEqual(cmd[cmd.index("-m") + 1], "8")
+
+    def test_throughput_qcow2_keeps_in_order_writes(self):
+        self.assertNotIn("-W", self._cmd("throughput", "qcow2"))
+
+    def test_no_out_of_order_writes_with_compression(self):
+        self.assertNotIn("-W", self._cmd("nvme", "qcow2", compress=True))
+
+    def test_nfs_keeps_default_cluster_layout(self):
+        cmd = self._cmd("nfs", "qcow2")
+        self.assertNotIn("cluster_size", " ".join(cmd))
+        self.assertNotIn("extended_l2", " ".join(cmd))
+        self.assertEqual(cmd[cmd.index("-t") + 1], "writeback")
+
+    def test_nfs_subclusters_cluster_layout(self):
+        cmd = self._cmd("nfs-subclusters", "qcow2")
+        self.assertIn("cluster_size=2M,extended_l2=on", cmd[cmd.index("-o") + 1])
+
+    def test_fallback_drops_tuning_first(self):
+        opt = Convert.options_from_profile(PROFILES["nfs"], out_format="qcow2", compress=False)
+        plan = list(Convert._fallback_plan(opt, out_format="qcow2", compress=False))
+
+        self.assertEqual(plan[0], opt)
+        self.assertEqual(plan[1], opt.without_tuning())
+        self.assertEqual(plan[1].threads, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
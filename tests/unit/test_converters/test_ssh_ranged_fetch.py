@@ -0,0 +1,123 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import asyncio
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.converters import ssh_ranged_fetch as srf
+from hyper2kvm.converters.ssh_ranged_fetch import (
+    SSHFetchOptions,
+    plan_ranges,
+    remote_range_cmd,
+    ssh_ranged_fetch,
+)
+
+# An empty ssh_base runs the "remote" sh -lc command locally.
+_LOCAL = []
+
+
+def _source(path: Path, size: int) -> bytes:
+    data = bytearray(size)
+    data[:4096] = bytes((i % 251) + 1 for i in range(4096))
+    data[size - 1000:] = b"\x07" * 1000
+    path.write_bytes(bytes(data))
+    return bytes(data)
+
+
+class TestPlanRanges(unittest.TestCase):
+    def test_ranges_cover_file(self):
+        self.assertEqual(plan_ranges(10, 4, 2), [(0, 4), (4, 4), (8, 2)])
+
+    def test_range_size_rounded_to_block(self):
+        self.assertEqual(plan_ranges(10, 5, 2), [(0, 4), (4, 4), (8, 2)])
+
+    def test_remote_cmd(self):
+        cmd = remote_range_cmd("/vmfs/volumes/ds/vm/a b-flat.vmdk", 8 << 20, 4 << 20, 1 << 20, "gzip")
+        self.assertEqual(
+            cmd,
+            "dd if='/vmfs/volumes/ds/vm/a b-flat.vmdk' bs=1048576 skip=8 count=4 2>/dev/null | gzip -c -1",
+        )
+
+
+@unittest.skipUnless(shutil.which("dd"), "dd not available")
+class TestRangedFetch(unittest.TestCase):
+    SIZE = 3 * 1024 * 1024 + 12345
+
+    def _fetch(self, td, **kw):
+        src = Path(td) / "src-flat.vmdk"
+        expected = _source(src, self.SIZE)
+        local = Path(td) / "out" / "src-flat.vmdk"
+        opt = SSHFetchOptions(streams=3, range_size=1024 * 1024, block_size=64 * 1024, **kw)
+        asyncio.run(ssh_ranged_fetch(Mock(), _LOCAL, str(src), local, self.SIZE, opt))
+        return local, expected
+
+    def test_parallel_ranges_reassemble(self):
+        with tempfile.TemporaryDirectory() as td:
+            local, expected = self._fetch(td)
+
+            self.assertEqual(local.read_bytes(), expected)
+            self.assertFalse(local.with_suffix(".vmdk.part").exists())
+
+    @unittest.skipUnless(hasattr(os, "SEEK_HOLE"), "SEEK_HOLE not supported")
+    def test_zero_ranges_stay_holes(self):
+        with tempfile.TemporaryDirectory() as td:
+            local, _ = self._fetch(td)
+            st = local.stat()
+
+        self.assertLess(st.st_blocks * 512, st.st_size // 2)
+
+    @unittest.skipUnless(shutil.which("gzip"), "gzip not available")
+    def test_compressed_transfer(self):
+        with tempfile.TemporaryDirectory() as td:
+            local, expected = self._fetch(td, compress="gzip")
+
+            self.assertEqual(local.read_bytes(), expected)
+
+    def test_retried_range_is_not_counted_twice(self):
+        failed = []
+
+        async def flaky(_ssh, _path, _fd, offset, length, *, opt, codec, on_bytes):
+            on_bytes(length // 2)
+            if offset == 0 and not failed:
+                failed.append(offset)
+                raise RuntimeError("connection reset")
+            on_bytes(length - length // 2)
+
+        logger = Mock()
+        clock = Mock(monotonic=Mock(side_effect=itertools.count(0, 1.0)))  # every update logs
+        opt = SSHFetchOptions(streams=2, range_size=1024 * 1024, block_size=64 * 1024)
+        with tempfile.TemporaryDirectory() as td, patch.object(srf, "_fetch_range", flaky), patch.object(
+            srf, "time", clock
+        ):
+            asyncio.run(ssh_ranged_fetch(logger, _LOCAL, "/src", Path(td) / "out.vmdk", self.SIZE, opt))
+
+        done = [
+            int(m.group(1))
+            for c in logger.info.call_args_list
+            for m in [re.search(r": (-?\d+)/\d+ \(", c[0][0])]
+            if m and "Progress" in c[0][0]
+        ]
+        self.assertEqual(failed, [0])
+        self.assertLessEqual(max(done), self.SIZE)
+        self.assertEqual(done[-1], self.SIZE)
+
+    def test_short_remote_file_fails(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "src-flat.vmdk"
+            _source(src, self.SIZE)
+            opt = SSHFetchOptions(streams=2, range_size=1024 * 1024, block_size=64 * 1024, range_retries=0)
+            local = Path(td) / "out.vmdk"
+
+            with self.assertRaises(RuntimeError):
+                asyncio.run(ssh_ranged_fetch(Mock(), _LOCAL, str(src), local, self.SIZE + 4096, opt))
+            self.assertFalse(local.exists())
+            self.assertFalse(Path(td, "out.vmdk.part").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
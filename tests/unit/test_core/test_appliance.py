@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import importlib
+import json
+
+import pytest
+
+
+@pytest.fixture
+def ap(monkeypatch):
+    try:
+        mod = importlib.import_module("hyper2kvm.core.appliance")
+    except Exception as e:
+        pytest.skip(f"Cannot import appliance: {e}")
+    for name in (
+        "LIBGUESTFS_MEMSIZE",
+        "HYPER2KVM_GUESTFS_MEMSIZE",
+        "VMDK2KVM_GUESTFS_MEMSIZE",
+        "HYPER2KVM_GUESTFS_SMP",
+        mod.APPLIANCE_DIR_ENV,
+    ):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(mod, "host_memory_mib", lambda: 32768)
+    monkeypatch.setattr(mod.os, "cpu_count", lambda: 8)
+    mod.set_default_appliance_dir(None)
+    return mod
+
+
+class KnobGuestFS:
+    def __init__(self):
+        self.knobs = {}
+
+    def __getattr__(self, name):
+        if not name.startswith("set_"):
+            raise AttributeError(name)
+        return lambda value: self.knobs.__setitem__(name, value)
+
+
+def test_profiles_sized_per_workload(ap):
+    inspect = ap.ApplianceProfile.for_workload("inspect")
+    fix = ap.ApplianceProfile.for_workload("fix")
+    repair = ap.ApplianceProfile.for_workload("repair")
+
+    assert (inspect.memsize_mib, inspect.smp) == (768, 1)
+    assert (fix.memsize_mib, fix.smp) == (1536, 2)
+    # repair scales with the host: a quarter of 32 GiB
+    assert (repair.memsize_mib, repair.smp) == (8192, 4)
+    assert fix.covers(inspect) and not inspect.covers(fix)
+    assert inspect.merged(repair).memsize_mib == 8192
+    assert not any(p.network for p in (inspect, fix, repair))
+
+
+def test_small_host_and_env_overrides(ap, monkeypatch):
+    monkeypatch.setattr(ap, "host_memory_mib", lambda: 2048)
+    monkeypatch.setattr(ap.os, "cpu_count", lambda: 1)
+    small = ap.ApplianceProfile.for_workload("repair")
+    assert (small.memsize_mib, small.smp) == (1024, 1)
+
+    monkeypatch.setenv("LIBGUESTFS_MEMSIZE", "4096")
+    assert ap.ApplianceProfile.for_workload("fix").memsize_mib is None
+
+    monkeypatch.setenv("HYPER2KVM_GUESTFS_MEMSIZE", "3000")
+    monkeypatch.setenv("HYPER2KVM_GUESTFS_SMP", "3")
+    over = ap.ApplianceProfile.for_workload("fix")
+    assert (over.memsize_mib, over.smp) == (3000, 3)
+
+
+def test_configure_and_drive_opts(ap, tmp_path):
+    fixed = tmp_path / "appliance"
+    fixed.mkdir()
+    for name in ("kernel", "initrd", "root", "README.fixed"):
+        (fixed / name).write_text("")
+    ap.set_default_appliance_dir(fixed)
+
+    p = ap.ApplianceProfile.for_workload("fix", throwaway=True)
+    g = KnobGuestFS()
+    p.configure(g)
+
+    assert g.knobs == {"set_network": False, "set_memsize": 1536, "set_smp": 2, "set_path": str(fixed)}
+    assert p.drive_opts(readonly=False) == {"readonly": False, "cachemode": "unsafe"}
+    assert ap.ApplianceProfile.for_workload("fix").drive_opts(readonly=True) == {"readonly": True}
+
+    # a directory that is not (yet) a fixed appliance is not handed to libguestfs
+    (fixed / "README.fixed").unlink()
+    g = KnobGuestFS()
+    p.configure(g)
+    assert "set_path" not in g.knobs
+    ap.set_default_appliance_dir(None)
+
+
+def test_build_fixed_appliance_checks_stamp(ap, tmp_path, monkeypatch):
+    from fakes.fake_logger import FakeLogger
+
+    monkeypatch.setattr(ap.shutil, "which", lambda _name: None)
+    assert ap.build_fixed_appliance(tmp_path / "missing", FakeLogger()) is None
+
+    fixed = tmp_path / "fixed"
+    fixed.mkdir()
+    for name in ("kernel", "initrd", "root", "README.fixed"):
+        (fixed / name).write_text("")
+    # no stamp: stale, and without the tool it is not rebuilt (nor used)
+    assert ap.build_fixed_appliance(fixed, FakeLogger()) is None
+
+    stamp = fixed / ".hyper2kvm-stamp.json"
+    stamp.write_text(json.dumps(ap.appliance_stamp(None)))
+    assert ap.build_fixed_appliance(fixed, FakeLogger()) == fixed.resolve()
+
+    monkeypatch.setattr(ap, "_libguestfs_version", lambda: "99.0.0")
+    assert ap.build_fixed_appliance(fixed, FakeLogger()) is None
+
+
+def test_concurrent_appliances_share_the_host_cap(ap):
+    assert ap.ApplianceProfile.for_workload("repair").memsize_mib == 8192
+
+    token = ap.reserve_appliance_slots(2)  # e.g. daemon workers
+    try:
+        with ap.concurrent_appliances(2):  # one of them processing two disks in parallel
+            assert ap.appliance_concurrency() == 3
+            assert ap.ApplianceProfile.for_workload("repair").memsize_mib == 16384 // 3
+            assert ap.ApplianceProfile.for_workload("fix").memsize_mib == 1536
+        assert ap.appliance_concurrency() == 2
+        assert ap.ApplianceProfile.for_workload("repair").memsize_mib == 8192
+    finally:
+        ap.release_appliance_slots(token)
+    assert ap.appliance_concurrency() == 1
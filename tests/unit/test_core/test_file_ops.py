@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import errno
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from hyper2kvm.core.file_ops import fast_copy
+
+_MB = 1024 * 1024
+
+
+def _thin_source(path: Path) -> bytes:
+    """8 MiB file: 1 MiB of data, a 6 MiB hole, then 1 MiB of data."""
+    head = bytes((i % 251) + 1 for i in range(_MB))
+    tail = b"\x5a" * _MB
+    with open(path, "wb") as f:
+        f.write(head)
+        f.seek(7 * _MB)
+        f.write(tail)
+    return head + bytes(6 * _MB) + tail
+
+
+def _no_reflink(*args, **kwargs):
+    raise OSError(errno.EOPNOTSUPP, "no reflink")
+
+
+class TestFastCopy(unittest.TestCase):
+    """Test the reflink / copy_file_range / sparse copy helper."""
+
+    def _copy(self, td, **patches):
+        src, dst = Path(td) / "src.raw", Path(td) / "dst.raw"
+        expected = _thin_source(src)
+        seen = []
+        with patch("hyper2kvm.core.file_ops.fcntl.ioctl", side_effect=_no_reflink):
+            if patches:
+                with patch.multiple("hyper2kvm.core.file_ops.os", **patches):
+                    method = fast_copy(src, dst, progress=seen.append, chunk_size=_MB)
+            else:
+                method = fast_copy(src, dst, progress=seen.append, chunk_size=_MB)
+        return dst, expected, method, seen
+
+    def test_copies_content_and_reports_progress(self):
+        with tempfile.TemporaryDirectory() as td:
+            dst, expected, method, seen = self._copy(td)
+
+            self.assertEqual(dst.read_bytes(), expected)
+        self.assertEqual(sum(seen), len(expected))
+        self.assertIn(method, ("copy_file_range", "copy"))
+
+    def test_falls_back_to_userspace_copy(self):
+        def refuse(*args, **kwargs):
+            raise OSError(errno.EXDEV, "cross-device")
+
+        with tempfile.TemporaryDirectory() as td:
+            dst, expected, method, seen = self._copy(td, copy_file_range=refuse)
+
+            self.assertEqual(dst.read_bytes(), expected)
+        self.assertEqual(method, "copy")
+        self.assertEqual(sum(seen), len(expected))
+
+    @unittest.skipUnless(hasattr(os, "SEEK_HOLE"), "SEEK_HOLE not supported")
+    def test_holes_stay_holes(self):
+        with tempfile.TemporaryDirectory() as td:
+            src = Path(td) / "src.raw"
+            _thin_source(src)
+            if src.stat().st_blocks * 512 >= src.stat().st_size:
+                self.skipTest("filesystem does not keep holes")
+            dst, _, _, _ = self._copy(td)
+
+            self.assertLess(dst.stat().st_blocks * 512, 4 * _MB)
+
+    def test_prefix_length(self):
+        with tempfile.TemporaryDirectory() as td:
+            src, dst = Path(td) / "src.raw", Path(td) / "dst.raw"
+            expected = _thin_source(src)
+
+            fast_copy(src, dst, length=3 * _MB)
+
+            self.assertEqual(dst.read_bytes(), expected[: 3 * _MB])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import importlib
+
+import pytest
+
+from fakes.fake_guestfs import FakeGuestFS
+from fakes.fake_logger import FakeLogger
+
+
+@pytest.fixture
+def gs(monkeypatch):
+    try:
+        mod = importlib.import_module("hyper2kvm.core.guest_session")
+    except Exception as e:
+        pytest.skip(f"Cannot import guest_session: {e}")
+
+    created = []
+
+    class CountingGuestFS(FakeGuestFS):
+        def __init__(self, *_a, **_k):
+            super().__init__()
+            self.drives = []
+            self.inspections = 0
+            self.closed = False
+            created.append(self)
+
+        def add_drive_opts(self, path, readonly=False):
+            self.drives.append((path, readonly))
+
+        def inspect_os(self):
+            self.inspections += 1
+            return super().inspect_os()
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(mod.guestfs, "GuestFS", CountingGuestFS)
+    mod.created = created
+    return mod
+
+
+def test_handle_is_shared_and_launched_once(gs, tmp_path):
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    assert not s.launched
+
+    g1 = s.handle()
+    g2 = s.handle(readonly=True)
+
+    assert g1 is g2
+    assert s.launches == 1
+    assert g1.drives == [(str((tmp_path / "disk.qcow2").resolve()), True)]
+
+
+def test_readwrite_request_upgrades_and_never_downgrades(gs, tmp_path):
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    ro = s.handle(readonly=True)
+    rw = s.handle(readonly=False)
+
+    assert rw is not ro
+    assert ro.closed
+    assert not s.readonly
+    assert rw.drives[0][1] is False
+    assert s.handle(readonly=True) is rw
+    assert s.launches == 2
+
+
+def test_roots_cached_per_launch(gs, tmp_path):
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    assert s.roots() == ["/dev/sda2"]
+    assert s.roots() == ["/dev/sda2"]
+    assert gs.created[0].inspections == 1
+
+    s.roots(refresh=True)
+    assert gs.created[0].inspections == 2
+
+    # inspection state lives in the appliance: a relaunch inspects again
+    s.handle(readonly=False)
+    s.roots()
+    assert gs.created[1].inspections == 1
+
+
+def test_release_keeps_identity(gs, tmp_path):
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    s.handle()
+    s.identity = object()
+    s.release()
+
+    assert not s.launched
+    assert s.identity is not None
+    assert gs.created[0].closed
+
+
+def test_registry_shares_sessions_and_rebases(gs, tmp_path):
+    reg = gs.GuestSessionRegistry(FakeLogger())
+    src = tmp_path / "work" / ".." / "disk.qcow2"
+    out = tmp_path / "out.qcow2"
+
+    s = reg.session([src])
+    assert reg.session([tmp_path / "disk.qcow2"]) is s
+    s.handle()
+    s.identity = "linux"
+
+    assert reg.rebase([src], [out]) is s
+    assert reg.lookup([src]) is None
+    assert reg.lookup([out]) is s
+    assert s.identity == "linux"
+    assert not s.launched
+
+    reg.close_all()
+    assert reg.lookup([out]) is None
+
+
+def test_detect_reuses_session_identity(gs, tmp_path, monkeypatch):
+    try:
+        gi = importlib.import_module("hyper2kvm.core.guest_identity")
+    except Exception as e:
+        pytest.skip(f"Cannot import guest_identity: {e}")
+
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    first = gi.GuestDetector.detect(tmp_path / "disk.qcow2", FakeLogger(), session=s)
+    second = gi.GuestDetector.detect(tmp_path / "disk.qcow2", FakeLogger(), session=s)
+
+    assert first is not None
+    assert second is first
+    assert s.launches == 1
+    assert gs.created[0].inspections == 1
+    # detect launched the appliance, so it released it again (no lingering image locks)
+    assert not s.launched
+    assert s.identity is first
+
+
+def test_detect_keeps_a_running_session_up(gs, tmp_path):
+    try:
+        gi = importlib.import_module("hyper2kvm.core.guest_identity")
+    except Exception as e:
+        pytest.skip(f"Cannot import guest_identity: {e}")
+
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger())
+    g = s.handle(readonly=False)
+    assert gi.GuestDetector.detect(tmp_path / "disk.qcow2", FakeLogger(), session=s) is not None
+
+    # a borrowed, already running appliance stays up for the next consumer
+    assert s.launched
+    assert s.handle(readonly=False) is g
+    assert s.launches == 1
+
+
+def test_larger_profile_relaunches_and_keeps_readwrite(gs, tmp_path):
+    try:
+        ap = importlib.import_module("hyper2kvm.core.appliance")
+    except Exception as e:
+        pytest.skip(f"Cannot import appliance: {e}")
+
+    small = ap.ApplianceProfile(workload="inspect", memsize_mib=768, smp=1)
+    big = ap.ApplianceProfile(workload="repair", memsize_mib=4096, smp=4)
+    s = gs.GuestSession([tmp_path / "disk.qcow2"], FakeLogger(), profile=small)
+
+    rw = s.handle(readonly=False)
+    assert s.handle(profile=small) is rw
+
+    g = s.handle(readonly=True, profile=big)
+    assert g is not rw and rw.closed
+    assert not s.readonly
+    assert s.profile.workload == "repair"
+    assert s.launches == 2
+    assert len(s.boot_seconds) == 2
+    assert s.appliance_report()["profile"]["memsize_mib"] == 4096
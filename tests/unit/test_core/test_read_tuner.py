@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import unittest
+
+from hyper2kvm.core.read_tuner import ReadSizeTuner
+
+_MIB = 1024 * 1024
+
+
+class _Link:
+    """Simulated transport: fixed per-request latency plus a bandwidth cap."""
+
+    def __init__(self, rtt_s: float, bandwidth: float):
+        self.rtt_s = rtt_s
+        self.bandwidth = bandwidth
+        self.now = 0.0
+
+    def clock(self) -> float:
+        return self.now
+
+    def request(self, nbytes: int) -> float:
+        dt = self.rtt_s + nbytes / self.bandwidth
+        self.now += dt
+        return dt
+
+
+def _run(tuner: ReadSizeTuner, link: _Link, requests: int = 400) -> int:
+    for _ in range(requests):
+        n = tuner.size
+        tuner.record(n, link.request(n))
+    return tuner.size
+
+
+class TestReadSizeTuner(unittest.TestCase):
+    """Test the online read-size hill climber."""
+
+    def test_grows_on_high_latency_link(self):
+        link = _Link(rtt_s=0.1, bandwidth=200 * _MIB)
+        tuner = ReadSizeTuner(1 * _MIB, window_s=1.0, clock=link.clock)
+
+        size = _run(tuner, link)
+
+        self.assertGreaterEqual(size, 16 * _MIB)
+        self.assertEqual(tuner.phase, "settled")
+        self.assertEqual(tuner.summary()["chosen_bytes"], size)
+
+    def test_stays_small_on_low_latency_link(self):
+        link = _Link(rtt_s=0.0002, bandwidth=100 * _MIB)
+        tuner = ReadSizeTuner(1 * _MIB, window_s=1.0, clock=link.clock)
+
+        size = _run(tuner, link)
+
+        self.assertLessEqual(size, 2 * _MIB)
+        self.assertEqual(tuner.phase, "settled")
+
+    def test_respects_bounds_and_alignment(self):
+        link = _Link(rtt_s=1.0, bandwidth=1000 * _MIB)
+        tuner = ReadSizeTuner(1000, min_size=512 * 1024, max_size=4 * _MIB, align=512, window_s=1.0, clock=link.clock)
+
+        self.assertEqual(tuner.size, 512 * 1024)
+        size = _run(tuner, link)
+
+        self.assertEqual(size, 4 * _MIB)
+        self.assertEqual(size % 512, 0)
+
+    def test_no_decision_before_window_closes(self):
+        link = _Link(rtt_s=0.01, bandwidth=100 * _MIB)
+        tuner = ReadSizeTuner(1 * _MIB, window_s=60.0, clock=link.clock)
+
+        _run(tuner, link, requests=10)
+
+        self.assertEqual(tuner.size, 1 * _MIB)
+        self.assertEqual(tuner.summary()["windows"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
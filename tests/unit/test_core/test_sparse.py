@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import tempfile
+import unittest
+
+from hyper2kvm.core.sparse import ZERO_BLOCK_SIZE, data_runs, is_zero, punch_zero_blocks
+
+_BS = ZERO_BLOCK_SIZE
+
+
+class TestZeroDetection(unittest.TestCase):
+    """Test zero-block detection helpers."""
+
+    def test_is_zero(self):
+        buf = bytearray(3 * _BS + 100)
+        self.assertTrue(is_zero(buf))
+        buf[-1] = 1
+        self.assertFalse(is_zero(buf))
+        self.assertTrue(is_zero(buf, 0, len(buf) - 1))
+
+    def test_data_runs_all_zero(self):
+        self.assertEqual(data_runs(bytearray(4 * _BS)), [])
+
+    def test_data_runs_coalesces_blocks(self):
+        buf = bytearray(6 * _BS)
+        buf[_BS + 5] = 1
+        buf[2 * _BS] = 1
+        buf[5 * _BS + 7] = 1
+        self.assertEqual(data_runs(buf), [(_BS, 2 * _BS), (5 * _BS, _BS)])
+
+    def test_data_runs_partial_tail_and_window(self):
+        buf = bytearray(2 * _BS + 10)
+        buf[-1] = 1
+        self.assertEqual(data_runs(buf), [(2 * _BS, 10)])
+        self.assertEqual(data_runs(buf, 0, 2 * _BS), [])
+
+    def test_data_runs_custom_block_size(self):
+        buf = bytearray(16)
+        buf[5] = 1
+        self.assertEqual(data_runs(buf, block_size=4), [(4, 4)])
+
+
+class TestPunchZeroBlocks(unittest.TestCase):
+    """Test re-sparsifying an existing file."""
+
+    def test_content_preserved(self):
+        data = bytearray(8 * _BS)
+        data[3 * _BS] = 7
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "img")
+            with open(path, "wb") as f:
+                f.write(data)
+            fd = os.open(path, os.O_RDWR)
+            try:
+                punched = punch_zero_blocks(fd, 0, len(data))
+            finally:
+                os.close(fd)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes(data))
+            self.assertEqual(os.path.getsize(path), len(data))
+        self.assertIn(punched, (0, 7 * _BS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import importlib
+
+import pytest
+
+from fakes.fake_guestfs import FakeGuestFS
+
+
+class BlkidGuestFS(FakeGuestFS):
+    def __init__(self):
+        super().__init__()
+        self.parts = ["/dev/sda1", "/dev/sda2", "/dev/sdb1"]
+        self.listfs = {"/dev/sda1": "vfat", "/dev/sda2": "xfs", "/dev/vg0/data": "ext4"}
+        self.ids = {
+            "/dev/sda1": {"TYPE": "vfat", "UUID": "AB12-CD34", "PARTUUID": "1111-01", "LABEL": "EFI"},
+            "/dev/sda2": {"type": "xfs", "uuid": "0f5e8a3c-root", "partuuid": "1111-02"},
+            "/dev/sdb1": {"TYPE": "LVM2_member", "UUID": "pv-uuid", "PARTUUID": "2222-01"},
+            "/dev/vg0/data": {"TYPE": "ext4", "UUID": "data-uuid", "LABEL": "data"},
+        }
+        self.blkid_calls = []
+
+    def list_devices(self):
+        return ["/dev/sda", "/dev/sdb"]
+
+    def lvs(self):
+        return ["/dev/vg0/data"]
+
+    def pvs(self):
+        return ["/dev/sdb1"]
+
+    def blkid(self, dev):
+        self.blkid_calls.append(dev)
+        if dev not in self.ids:
+            raise RuntimeError(f"blkid: {dev}: no such device")
+        return dict(self.ids[dev])
+
+    def blockdev_getsize64(self, dev):
+        return 1 << 30
+
+    def part_to_dev(self, dev):
+        return dev.rstrip("0123456789")
+
+
+@pytest.fixture
+def inv_mod():
+    try:
+        return importlib.import_module("hyper2kvm.fixers.filesystem.inventory")
+    except Exception as e:
+        pytest.skip(f"Cannot import inventory: {e}")
+
+
+def test_build_indexes_every_device_once(inv_mod):
+    g = BlkidGuestFS()
+    inv = inv_mod.device_inventory(g).build()
+
+    assert inv.resolve("PARTUUID", "1111-02") == "/dev/sda2"
+    assert inv.resolve("UUID", "0F5E8A3C-ROOT") == "/dev/sda2"
+    assert inv.resolve_spec('LABEL="data"') == "/dev/vg0/data"
+    # a PV carries the VG's UUID, not a mountable one
+    assert inv.resolve("UUID", "pv-uuid") is None
+    assert inv.devices["/dev/sdb1"].lvm_pv
+    assert inv.devices["/dev/sda2"].parent == "/dev/sda"
+    assert inv.devices["/dev/vg0/data"].role == "lv"
+    assert inv.vfs_type("/dev/sda2") == "xfs"
+
+    assert inv_mod.device_inventory(g) is inv
+    assert sorted(g.blkid_calls) == sorted(set(g.blkid_calls))
+
+
+def test_consumers_share_the_inventory(inv_mod):
+    try:
+        fstab = importlib.import_module("hyper2kvm.fixers.filesystem.fstab")
+        grub = importlib.import_module("hyper2kvm.fixers.bootloader.grub")
+    except Exception as e:
+        pytest.skip(f"Cannot import consumers: {e}")
+
+    g = BlkidGuestFS()
+    inv_mod.device_inventory(g).build()
+    probes = len(g.blkid_calls)
+
+    assert fstab.Ident.g_blkid_map(g, "/dev/sda1")["UUID"] == "AB12-CD34"
+    assert grub._resolve_spec_to_dev(object(), g, "PARTUUID=2222-01") == "/dev/sdb1"
+    assert grub._resolve_spec_to_dev(object(), g, "PARTUUID=9999-99") is None
+    assert fstab.Ident.g_blkid_map(g, "/dev/sdz9") == {}
+    assert fstab.Ident.g_blkid_map(g, "/dev/sdz9") == {}
+    assert len(g.blkid_calls) == probes + 1
+
+    inv_mod.invalidate_device_inventory(g)
+    g.ids["/dev/sda2"]["LABEL"] = "root"
+    assert grub._resolve_spec_to_dev(object(), g, "LABEL=root") == "/dev/sda2"
@@ -0,0 +1,234 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import fnmatch
+import importlib
+import os
+import shutil
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from fakes.fake_logger import FakeLogger
+
+
+@pytest.fixture
+def vfs_mod():
+    try:
+        return importlib.import_module("hyper2kvm.fixers.offline.guest_vfs")
+    except Exception as e:
+        pytest.skip(f"Cannot import guest_vfs: {e}")
+
+
+class DirGuestFS:
+    """guestfs-ish handle over a host directory standing in for the mounted guest."""
+
+    def __init__(self, sysroot: Path):
+        self.sysroot = sysroot
+        self.calls = []
+
+    def _h(self, p: str) -> Path:
+        return self.sysroot / p.lstrip("/")
+
+    def _log(self, name):
+        self.calls.append(name)
+
+    def count(self, name):
+        return self.calls.count(name)
+
+    def is_dir(self, p, followsymlinks=False):
+        self._log("is_dir")
+        h = self._h(p)
+        return h.is_dir() and (followsymlinks or not h.is_symlink())
+
+    def is_file(self, p, followsymlinks=False):
+        self._log("is_file")
+        h = self._h(p)
+        return h.is_file() and (followsymlinks or not h.is_symlink())
+
+    def read_file(self, p):
+        self._log("read_file")
+        return self._h(p).read_bytes()
+
+    def tar_out(self, d, dest, numericowner=False, excludes=(), **_kw):
+        self._log("tar_out")
+
+        def _filter(ti):
+            if any(fnmatch.fnmatch(part, pat) for part in Path(ti.name).parts for pat in excludes):
+                return None
+            return ti
+
+        with tarfile.open(dest, "w") as tf:
+            tf.add(self._h(d), arcname=".", filter=_filter)
+
+    def find0(self, d, dest):
+        self._log("find0")
+        base = self._h(d)
+        names = sorted(str(p.relative_to(base)) for p in base.rglob("*"))
+        Path(dest).write_bytes(b"\0".join(n.encode() for n in names))
+
+    def tar_in(self, src, d, **_kw):
+        self._log("tar_in")
+        with tarfile.open(src) as tf:
+            kw = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+            tf.extractall(self._h(d), **kw)
+
+    def rm_rf(self, p):
+        self._log("rm_rf")
+        h = self._h(p)
+        if h.is_dir() and not h.is_symlink():
+            shutil.rmtree(h)
+        elif h.exists() or h.is_symlink():
+            h.unlink()
+
+    def command(self, argv):
+        self._log("command")
+        return ""
+
+    def sync(self):
+        self._log("sync")
+
+
+@pytest.fixture
+def guest(tmp_path):
+    root = tmp_path / "sysroot"
+    (root / "etc" / "default").mkdir(parents=True)
+    (root / "etc" / "sysconfig" / "network-scripts").mkdir(parents=True)
+    (root / "boot" / "grub2").mkdir(parents=True)
+    (root / "etc" / "default" / "grub").write_text('GRUB_CMDLINE_LINUX="quiet"\n')
+    (root / "etc" / "fstab").write_text("/dev/sda2 / ext4 defaults 0 1\n")
+    (root / "etc" / "sysconfig" / "network-scripts" / "ifcfg-ens192").write_text("DEVICE=ens192\n")
+    (root / "etc" / "hidden.d").mkdir()
+    (root / "etc" / ".secret").write_text("x")
+    (root / "boot" / "grub2" / "grub.cfg").write_text("menuentry\n")
+    (root / "boot" / "vmlinuz-5.14").write_bytes(b"\x7fELF" * 64)
+    os.symlink("grub2/grub.cfg", root / "boot" / "grub.cfg")
+    os.symlink("/boot/grub2/grub.cfg", root / "etc" / "grub2.cfg")
+    return DirGuestFS(root)
+
+
+def test_reads_served_from_one_prefetch(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+
+    assert vfs.read_file("/etc/fstab").startswith(b"/dev/sda2")
+    assert vfs.is_file("/etc/default/grub")
+    assert not vfs.is_file("/etc/missing")
+    # is_file does not follow symlinks unless asked; an absolute link into /boot resolves in the cache
+    assert not vfs.is_file("/etc/grub2.cfg")
+    assert vfs.is_file("/etc/grub2.cfg", followsymlinks=True)
+    assert vfs.cat("/etc/grub2.cfg") == "menuentry\n"
+    assert vfs.stat("/etc/fstab")["mode"] & 0o777 == 0o644
+    assert vfs.glob_expand("/etc/sysconfig/network-scripts/ifcfg-*") == [
+        "/etc/sysconfig/network-scripts/ifcfg-ens192"
+    ]
+    assert vfs.glob_expand("/etc/*.d") == ["/etc/hidden.d/"]
+    assert ".secret" in vfs.ls("/etc")
+    assert vfs.vfs_glob("/etc/*") == ["/etc/default", "/etc/fstab", "/etc/hidden.d", "/etc/sysconfig"]
+    assert vfs.vfs_glob("/etc/{a,b}") is None
+
+    assert guest.count("tar_out") == 2
+    assert guest.count("read_file") == 0
+    assert vfs.stats["prefetches"] == 2
+
+
+def test_excluded_files_are_forwarded(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+
+    assert vfs.is_file("/boot/vmlinuz-5.14")
+    assert vfs.read_file("/boot/vmlinuz-5.14").startswith(b"\x7fELF")
+    assert vfs.vfs_glob("/boot/vmlinuz-*") is None
+    assert vfs.glob_expand("/boot/grub2/*.cfg") == ["/boot/grub2/grub.cfg"]
+    assert guest.count("read_file") == 1
+
+
+def test_writes_are_batched_until_sync(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+    host = guest.sysroot
+
+    vfs.write("/etc/default/grub.tmp", b'GRUB_CMDLINE_LINUX="console=ttyS0"\n')
+    vfs.chmod(0o600, "/etc/default/grub.tmp")
+    vfs.rename("/etc/default/grub.tmp", "/etc/default/grub")
+    vfs.cp("/etc/fstab", "/etc/fstab.bak")
+    vfs.rm_f("/etc/sysconfig/network-scripts/ifcfg-ens192")
+    vfs.mkdir_p("/etc/cloud/cloud.cfg.d")
+    vfs.write("/etc/cloud/cloud.cfg.d/99-h2k.cfg", "datasource_list: [NoCloud]\n")
+
+    # nothing reached the guest yet, but the cache already shows the new tree
+    assert "quiet" in (host / "etc" / "default" / "grub").read_text()
+    assert b"console=ttyS0" in vfs.read_file("/etc/default/grub")
+    assert not vfs.exists("/etc/sysconfig/network-scripts/ifcfg-ens192")
+    assert vfs.is_dir("/etc/cloud/cloud.cfg.d")
+
+    vfs.sync()
+
+    assert guest.count("tar_in") == 1
+    assert guest.count("sync") == 1
+    assert "console=ttyS0" in (host / "etc" / "default" / "grub").read_text()
+    assert (host / "etc" / "default" / "grub").stat().st_mode & 0o777 == 0o600
+    assert not (host / "etc" / "default" / "grub.tmp").exists()
+    assert (host / "etc" / "fstab.bak").read_text() == (host / "etc" / "fstab").read_text()
+    assert not (host / "etc" / "sysconfig" / "network-scripts" / "ifcfg-ens192").exists()
+    assert (host / "etc" / "cloud" / "cloud.cfg.d" / "99-h2k.cfg").read_text().startswith("datasource_list")
+
+    vfs.sync()
+    assert guest.count("tar_in") == 1
+
+
+def test_other_calls_flush_and_drop_the_cache(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+    vfs.write("/etc/hostname", b"vm1\n")
+
+    vfs.command(["dracut", "-f"])
+
+    assert (guest.sysroot / "etc" / "hostname").read_text() == "vm1\n"
+    assert guest.calls.index("tar_in") < guest.calls.index("command")
+    (guest.sysroot / "etc" / "hostname").write_text("vm2\n")
+    assert vfs.read_file("/etc/hostname") == b"vm2\n"
+    assert guest.count("tar_out") == 2
+
+
+def test_probe_commands_keep_the_cache(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+
+    # the bootloader fixer's probe sequence, interleaved with config reads
+    assert vfs.is_file("/etc/default/grub")
+    vfs.command(["sh", "-c", "command -v grub2-mkconfig >/dev/null 2>&1"])
+    assert vfs.read_file("/boot/grub2/grub.cfg") == b"menuentry\n"
+    vfs.command(["sh", "-c", "grub2-install --version 2>/dev/null || grub-install --version 2>/dev/null || true"])
+    vfs.command(["grub2-probe", "--target=device", "/boot"])
+    assert vfs.read_file("/etc/fstab").startswith(b"/dev/sda2")
+    assert vfs.is_file("/boot/grub.cfg", followsymlinks=True)
+
+    assert guest.count("command") == 3
+    assert guest.count("tar_out") == 2
+    assert vfs.stats["invalidations"] == 0
+
+    vfs.command(["grub2-mkconfig", "-o", "/boot/grub2/grub.cfg"])
+    assert vfs.read_file("/boot/grub2/grub.cfg") == b"menuentry\n"
+    assert guest.count("tar_out") == 3
+    assert vfs.stats["invalidations"] == 1
+
+
+def test_shell_writes_drop_the_cache(vfs_mod):
+    for script in ("echo vm1 > /etc/hostname", "sed -i s/quiet// /etc/default/grub", "dracut -f && true"):
+        assert vfs_mod._script_writes(script), script
+    for script in ("ls -1 /dev/md* 2>/dev/null || true", "cat /etc/os-release | grep ^ID="):
+        assert not vfs_mod._script_writes(script), script
+
+
+def test_failed_write_back_raises_and_is_not_cached(vfs_mod, guest):
+    vfs = vfs_mod.GuestVFS(guest, FakeLogger())
+    original = vfs.read_file("/etc/fstab")
+
+    def _broken_tar_in(*_a, **_kw):
+        raise RuntimeError("tar_in: No space left on device")
+
+    guest.tar_in = _broken_tar_in  # and DirGuestFS has no write(): the fallback fails too
+    vfs.write("/etc/fstab", b"/dev/vda2 / ext4 defaults 0 1\n")
+
+    with pytest.raises(RuntimeError, match="/etc/fstab"):
+        vfs.sync()
+
+    assert "/etc/fstab" in vfs.stats["write_errors"]
+    assert guest.count("sync") == 0
+    # the cache was dropped: reads show what the guest really has
+    assert vfs.read_file("/etc/fstab") == original
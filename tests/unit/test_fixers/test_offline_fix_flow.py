@@ -61,3 +61,49 @@ def test_offline_fixer_runs_and_builds_report(monkeypatch, tmp_path):
     fx.run()
     assert isinstance(fx.report, dict)
     assert "validation" in fx.report
+
+def test_offline_fixer_borrows_session_and_records_identity(monkeypatch, tmp_path):
+    try:
+        offline_fixer = importlib.import_module("hyper2kvm.fixers.offline_fixer")
+        guest_session = importlib.import_module("hyper2kvm.core.guest_session")
+    except Exception as e:
+        pytest.skip(f"Cannot import offline_fixer: {e}")
+
+    fake = FakeGuestFS()
+    fake.dirs |= {"/etc", "/boot", "/tmp"}
+    fake.fs["/etc/fstab"] = b"UUID=111 / ext4 defaults 0 1\n"
+    fake.fs["/etc/os-release"] = b'NAME="Photon"\nID=photon\n'
+    launches = []
+    closed = []
+    monkeypatch.setattr(fake, "launch", lambda: launches.append(1))
+    monkeypatch.setattr(fake, "close", lambda: closed.append(1))
+    monkeypatch.setattr(guest_session.guestfs, "GuestFS", lambda *a, **k: fake)
+
+    monkeypatch.setattr(offline_fixer.network_fixer, "fix_network_config", lambda self, g: {"enabled": True, "changed": 0})
+    monkeypatch.setattr(offline_fixer.grub_fixer, "regen", lambda self, g: {"enabled": False})
+    monkeypatch.setattr(offline_fixer.windows_fixer, "is_windows", lambda self, g: False)
+    monkeypatch.setattr(offline_fixer, "write_report", lambda self: None)
+
+    image = tmp_path / "disk.qcow2"
+    image.write_bytes(b"fake")
+    session = guest_session.GuestSession([image], FakeLogger())
+
+    fx = offline_fixer.OfflineFSFix(
+        logger=FakeLogger(),
+        image=image,
+        dry_run=True,
+        no_backup=True,
+        print_fstab=False,
+        update_grub=False,
+        regen_initramfs=False,
+        fstab_mode=_pick_fstab_mode(offline_fixer),
+        report_path=None,
+        session=session,
+    )
+    fx.run()
+
+    assert launches == [1]
+    assert closed == []
+    assert session.launched
+    assert session.identity is not None
+    assert session.identity.type.value == "linux"
@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import argparse
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from hyper2kvm.core.exceptions import Fatal
+from hyper2kvm.core.guest_session import GuestSessionRegistry
+from hyper2kvm.orchestrator.disk_processor import DiskProcessor
+
+
+def _args(**kw):
+    base = dict(flatten=True, to_output="out.qcow2", out_format="qcow2", dry_run=False, overlay_pipeline=True)
+    base.update(kw)
+    return argparse.Namespace(**base)
+
+
+class TestOverlayPipeline(unittest.TestCase):
+    """Test the overlay + single convert pipeline in process_single_disk."""
+
+    def _run(self, args, td):
+        disk = Path(td) / "vm.vmdk"
+        disk.write_text("# Disk DescriptorFile")
+        out_root = Path(td) / "out"
+        seen = {}
+
+        def create_overlay(logger, base, overlay):
+            overlay.parent.mkdir(parents=True, exist_ok=True)
+            overlay.write_bytes(b"qcow2")
+            seen["overlay"] = overlay
+            return overlay
+
+        def fixer(logger, image, **kw):
+            seen["fixed"] = image
+            return Mock()
+
+        with patch("hyper2kvm.orchestrator.disk_processor.Convert") as conv, patch(
+            "hyper2kvm.orchestrator.disk_processor.Flatten"
+        ) as flat, patch("hyper2kvm.orchestrator.disk_processor.OfflineFSFix", side_effect=fixer), patch.object(
+            DiskProcessor, "log_input_layout"
+        ):
+            conv.create_overlay.side_effect = create_overlay
+            flat.to_working.return_value = Path(td) / "flat.qcow2"
+            out = DiskProcessor(Mock(), args).process_single_disk(disk, out_root, 0, 1)
+        return out, seen, conv, flat
+
+    def test_fixes_overlay_and_converts_once(self):
+        with tempfile.TemporaryDirectory() as td:
+            out, seen, conv, flat = self._run(_args(), td)
+
+            flat.to_working.assert_not_called()
+            self.assertEqual(seen["fixed"], seen["overlay"])
+            src = conv.convert_image_with_progress.call_args[0][1]
+            self.assertEqual(src, seen["overlay"])
+            self.assertEqual(conv.convert_image_with_progress.call_args[1]["in_format"], "qcow2")
+            self.assertEqual(out, (Path(td) / "out" / "out.qcow2").resolve())
+            self.assertFalse(seen["overlay"].exists())
+
+    def test_without_output_falls_back_to_in_place(self):
+        with tempfile.TemporaryDirectory() as td:
+            out, seen, conv, flat = self._run(_args(to_output=None), td)
+
+        conv.create_overlay.assert_not_called()
+        flat.to_working.assert_called_once()
+        self.assertEqual(seen["fixed"], Path(td) / "flat.qcow2")
+
+
+class TestVmLevelFix(unittest.TestCase):
+    """Test process_vm_disks: one fixer over all disks, then per-disk converts."""
+
+    def test_fixes_all_disks_in_one_session(self):
+        with tempfile.TemporaryDirectory() as td:
+            disks = []
+            for name in ("root.vmdk", "var.vmdk", "data.vmdk"):
+                d = Path(td) / name
+                d.write_bytes(b"x")
+                disks.append(d)
+            fixers = []
+
+            def fixer(logger, image, **kw):
+                fixers.append((image, kw["session"], list(kw["session"].images)))
+                return Mock()
+
+            registry = GuestSessionRegistry(Mock())
+            with patch("hyper2kvm.orchestrator.disk_processor.Convert") as conv, patch(
+                "hyper2kvm.orchestrator.disk_processor.OfflineFSFix", side_effect=fixer
+            ), patch("hyper2kvm.orchestrator.disk_processor.default_registry", return_value=registry), patch(
+                "hyper2kvm.orchestrator.disk_processor.plan_allocation", return_value=None
+            ), patch.object(DiskProcessor, "log_input_layout"):
+                out = DiskProcessor(Mock(), _args(flatten=False, overlay_pipeline=False)).process_vm_disks(
+                    disks, Path(td) / "out"
+                )
+
+            self.assertEqual(len(fixers), 1)
+            image, session, attached = fixers[0]
+            self.assertEqual(image, disks[0])
+            self.assertEqual(attached, [d.resolve() for d in disks])
+            self.assertEqual(conv.convert_image_with_progress.call_count, 3)
+            self.assertEqual([p.name for p in out], ["out_disk0.qcow2", "out_disk1.qcow2", "out_disk2.qcow2"])
+            # domain emission finds the fixer's session under the converted images
+            self.assertIs(registry.lookup(out), session)
+
+    def test_rejects_resize(self):
+        with tempfile.TemporaryDirectory() as td:
+            disks = [Path(td) / "root.vmdk", Path(td) / "var.vmdk"]
+            for d in disks:
+                d.write_bytes(b"x")
+            with patch("hyper2kvm.orchestrator.disk_processor.OfflineFSFix") as fixer, patch(
+                "hyper2kvm.orchestrator.disk_processor.Convert"
+            ) as conv:
+                with self.assertRaises(Fatal):
+                    DiskProcessor(Mock(), _args(resize="+10G")).process_vm_disks(disks, Path(td) / "out")
+
+            fixer.assert_not_called()
+            conv.convert_image_with_progress.assert_not_called()
+
+
+class TestLargestFirst(unittest.TestCase):
+    """Test allocation-driven disk scheduling."""
+
+    def test_orders_by_predicted_write(self):
+        sizes = {"a.vmdk": 10, "b.vmdk": 300, "c.vmdk": None, "d.vmdk": 50}
+
+        def plan(logger, disk):
+            n = sizes[disk.name]
+            return None if n is None else Mock(predicted_write_bytes=Mock(return_value=n))
+
+        disks = [Path(n) for n in sizes]
+        with patch("hyper2kvm.orchestrator.disk_processor.plan_allocation", side_effect=plan):
+            order = DiskProcessor(Mock(), _args())._largest_first(disks)
+
+        self.assertEqual([disks[i].name for i in order], ["b.vmdk", "d.vmdk", "a.vmdk", "c.vmdk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import subprocess
+import unittest
+from unittest.mock import Mock, patch
+
+from hyper2kvm.ssh.ssh_client import SSHClient
+from hyper2kvm.ssh.ssh_config import SSHConfig
+from hyper2kvm.ssh.ssh_mux import SSHMuxPool
+
+
+def _ok(*args, **kwargs):
+    return subprocess.CompletedProcess(args[0], 0)
+
+
+class TestSSHMuxPool(unittest.TestCase):
+    """Test the shared ControlMaster pool."""
+
+    def setUp(self):
+        self.pool = SSHMuxPool(Mock())
+        self.addCleanup(self._close)
+
+    def _close(self):
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", side_effect=_ok):
+            self.pool.close_all()
+
+    def test_master_started_once_per_key(self):
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", side_effect=_ok) as run:
+            first = self.pool.acquire("esx1", "root", 22, ["-p", "22"])
+            second = self.pool.acquire("esx1", "root", 22, ["-p", "22"])
+
+        self.assertEqual(first, second)
+        self.assertIn("ControlMaster=no", first)
+        self.assertEqual(run.call_count, 1)
+        argv = run.call_args[0][0]
+        self.assertIn("ControlMaster=yes", argv)
+        self.assertIn("-N", argv)
+        self.assertEqual(argv[-1], "root@esx1")
+
+    def test_distinct_keys_get_distinct_sockets(self):
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", side_effect=_ok) as run:
+            a = self.pool.acquire("esx1", "root", 22, [])
+            b = self.pool.acquire("esx1", "root", 2222, [])
+
+        self.assertNotEqual(a, b)
+        self.assertEqual(run.call_count, 2)
+
+    def test_failed_master_falls_back_to_plain_ssh(self):
+        failed = subprocess.CompletedProcess([], 255)
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", return_value=failed) as run:
+            self.assertEqual(self.pool.acquire("esx1", "root", 22, []), [])
+            self.assertEqual(self.pool.acquire("esx1", "root", 22, []), [])
+
+        self.assertEqual(run.call_count, 1)
+
+    def test_close_all_exits_masters(self):
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", side_effect=_ok):
+            self.pool.acquire("esx1", "root", 22, [])
+        sock_dir = self.pool._dir
+
+        with patch("hyper2kvm.ssh.ssh_mux.subprocess.run", side_effect=_ok) as run:
+            self.pool.close_all()
+
+        argv = run.call_args[0][0]
+        self.assertEqual(argv[-3:], ["-O", "exit", "root@esx1"])
+        self.assertFalse(sock_dir.exists())
+
+
+class TestSSHClientMux(unittest.TestCase):
+    """Test that SSHClient routes through the shared pool when enabled."""
+
+    def _client(self, control_master):
+        return SSHClient(Mock(), SSHConfig(host="esx1", control_master=control_master))
+
+    def test_uses_pool_when_enabled(self):
+        pool = Mock()
+        pool.acquire.return_value = ["-o", "ControlPath=/tmp/x", "-o", "ControlMaster=no"]
+        with patch("hyper2kvm.ssh.ssh_client.default_pool", return_value=pool):
+            argv = self._client(True)._ssh_args()
+
+        self.assertIn("ControlPath=/tmp/x", argv)
+        host, user, port, base = pool.acquire.call_args[0]
+        self.assertEqual((host, user, port), ("esx1", "root", 22))
+        self.assertNotIn("ControlPath=/tmp/x", base)
+
+    def test_plain_ssh_when_disabled(self):
+        with patch("hyper2kvm.ssh.ssh_client.default_pool") as default_pool:
+            argv = self._client(False)._ssh_args()
+
+        default_pool.assert_not_called()
+        self.assertFalse(any("ControlPath" in a for a in argv))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from hyper2kvm.vmware.transports.cbt_sync import (
+    CBTState,
+    Qcow2ImagePatcher,
+    VMwareError,
+    merge_areas,
+    sync_generation,
+)
+from hyper2kvm.vmware.utils.snapshot import iter_changed_areas
+
+_KIB = 1024
+_CAP = 1024 * _KIB
+
+
+class _DiskReader:
+    """Serves reads from an in-memory disk image."""
+
+    def __init__(self, data: bytearray):
+        self.data = data
+        self.reads = []
+
+    def read(self, offset, length):
+        self.reads.append((offset, length))
+        return bytes(self.data[offset : offset + length])
+
+
+def _disk(fill_byte: int) -> bytearray:
+    data = bytearray(_CAP)
+    data[0 : 128 * _KIB] = bytes([fill_byte]) * (128 * _KIB)
+    data[512 * _KIB : 576 * _KIB] = bytes([fill_byte + 1]) * (64 * _KIB)
+    return data
+
+
+def _info(start, length, areas):
+    return SimpleNamespace(
+        startOffset=start,
+        length=length,
+        changedArea=[SimpleNamespace(start=s, length=n) for s, n in areas],
+    )
+
+
+class TestIterChangedAreas(unittest.TestCase):
+    """Test QueryChangedDiskAreas paging."""
+
+    def test_follows_pages_until_capacity(self):
+        pages = {
+            0: _info(0, 400, [(0, 100), (200, 50)]),
+            400: _info(400, 600, [(900, 100)]),
+        }
+        query = Mock(side_effect=lambda off, cid: pages[off])
+
+        areas = list(iter_changed_areas(query, 1000, "52 aa/1"))
+
+        self.assertEqual(areas, [(0, 100), (200, 50), (900, 100)])
+        self.assertEqual([c.args for c in query.call_args_list], [(0, "52 aa/1"), (400, "52 aa/1")])
+
+    def test_raises_when_no_progress(self):
+        query = Mock(return_value=_info(0, 0, []))
+        with self.assertRaises(VMwareError):
+            list(iter_changed_areas(query, 1000, "*"))
+
+
+class TestMergeAreas(unittest.TestCase):
+    def test_coalesces_and_clamps(self):
+        self.assertEqual(merge_areas([(100, 50), (0, 100), (900, 500)], 1000), [(0, 150), (900, 100)])
+
+
+class TestCBTState(unittest.TestCase):
+    """Test per-disk CBT state persistence."""
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = CBTState.path_for(Path(td) / "disk.raw")
+            st = CBTState.load(path)
+            self.assertIsNone(st.change_id)
+            st.bind(vm="vm1", device_key=2000, capacity_bytes=_CAP, image_format="raw")
+            st.change_id = "52 aa/7"
+            st.save()
+
+            loaded = CBTState.load(path)
+
+        self.assertEqual((loaded.vm, loaded.device_key, loaded.change_id), ("vm1", 2000, "52 aa/7"))
+
+    def test_bind_rejects_other_disk_or_resize(self):
+        st = CBTState(path=Path("x.cbt.json"), vm="vm1", device_key=2000, capacity_bytes=_CAP, change_id="c1")
+        with self.assertRaises(VMwareError):
+            st.bind(vm="vm1", device_key=2001, capacity_bytes=_CAP, image_format="raw")
+        with self.assertRaises(VMwareError):
+            st.bind(vm="vm1", device_key=2000, capacity_bytes=2 * _CAP, image_format="raw")
+
+
+class TestSyncGeneration(unittest.TestCase):
+    """Test base + delta passes into a raw image."""
+
+    def _sync(self, state, image, disk, areas, change_id):
+        reader = _DiskReader(disk)
+        gen = sync_generation(
+            state,
+            image=image,
+            areas_for=lambda cid: areas[cid],
+            reader=reader,
+            to_change_id=change_id,
+            snapshot="snapshot-1",
+            logger=Mock(),
+        )
+        return gen, reader
+
+    def test_base_then_delta_patches_in_place(self):
+        with tempfile.TemporaryDirectory() as td:
+            image = Path(td) / "disk.raw"
+            state = CBTState.load(CBTState.path_for(image))
+            state.bind(vm="vm1", device_key=2000, capacity_bytes=_CAP, image_format="raw")
+
+            disk = _disk(0x11)
+            gen0, _ = self._sync(state, image, disk, {"*": [(0, 128 * _KIB), (512 * _KIB, 64 * _KIB)]}, "c1")
+            self.assertEqual(image.read_bytes(), bytes(disk))
+
+            # guest rewrites one range and zeroes another
+            disk[64 * _KIB : 96 * _KIB] = bytes([0x33]) * (32 * _KIB)
+            disk[512 * _KIB : 576 * _KIB] = bytes(64 * _KIB)
+            gen1, reader = self._sync(state, image, disk, {"c1": [(64 * _KIB, 32 * _KIB), (512 * _KIB, 64 * _KIB)]}, "c2")
+
+            self.assertEqual(image.read_bytes(), bytes(disk))
+            saved = CBTState.load(state.path)
+
+        self.assertEqual((gen0.kind, gen0.from_change_id), ("base", "*"))
+        self.assertEqual((gen1.kind, gen1.from_change_id, gen1.generation), ("delta", "c1", 1))
+        self.assertEqual(gen1.changed_bytes, 96 * _KIB)
+        self.assertEqual(reader.reads, [(64 * _KIB, 32 * _KIB), (512 * _KIB, 64 * _KIB)])
+        self.assertEqual(saved.change_id, "c2")
+        self.assertEqual([g.to_change_id for g in saved.generations], ["c1", "c2"])
+
+    def test_failed_pass_keeps_previous_change_id(self):
+        with tempfile.TemporaryDirectory() as td:
+            image = Path(td) / "disk.raw"
+            state = CBTState.load(CBTState.path_for(image))
+            state.bind(vm="vm1", device_key=2000, capacity_bytes=_CAP, image_format="raw")
+            self._sync(state, image, _disk(0x11), {"*": [(0, 128 * _KIB)]}, "c1")
+
+            reader = Mock()
+            reader.read.side_effect = OSError("connection reset")
+            with self.assertRaises(OSError):
+                sync_generation(
+                    state,
+                    image=image,
+                    areas_for=lambda cid: [(0, 64 * _KIB)],
+                    reader=reader,
+                    to_change_id="c2",
+                    snapshot=None,
+                    logger=Mock(),
+                )
+            saved = CBTState.load(state.path)
+            size = os.path.getsize(image)
+
+        self.assertEqual(saved.change_id, "c1")
+        self.assertEqual(len(saved.generations), 1)
+        self.assertEqual(size, _CAP)
+
+
+class TestQcow2ImagePatcher(unittest.TestCase):
+    def _apply(self, stdout):
+        with tempfile.TemporaryDirectory() as td, patch(
+            "hyper2kvm.vmware.transports.cbt_sync.U.which", return_value="/usr/bin/qemu-io"
+        ), patch("hyper2kvm.vmware.transports.cbt_sync.U.run_cmd", return_value=SimpleNamespace(stdout=stdout, stderr="")):
+            p = Qcow2ImagePatcher(Path(td) / "disk.qcow2", _CAP, logger=Mock(), create=False)
+            try:
+                p.write(0, b"a" * 512)
+                p.write(4096, b"b" * 1024)
+                p.flush()
+                return p._pending
+            finally:
+                p.close()
+
+    def test_every_write_must_be_confirmed(self):
+        ok = (
+            "wrote 512/512 bytes at offset 0\n512 bytes, 1 ops; 0.0001 sec\n"
+            "wrote 1024/1024 bytes at offset 4096\n1 KiB, 1 ops; 0.0001 sec\n"
+        )
+        self.assertEqual(self._apply(ok), [])
+
+    def test_missing_confirmation_fails(self):
+        # a failure message qemu-io words some other way (no "error"/"failed" in it)
+        with self.assertRaises(VMwareError):
+            self._apply("wrote 512/512 bytes at offset 0\nwrite: Operation not permitted\n")
+
+    def test_words_in_output_do_not_fail_confirmed_writes(self):
+        out = "wrote 512/512 bytes at offset 0\nwrote 1024/1024 bytes at offset 4096\nno errors, nothing failed\n"
+        self.assertEqual(self._apply(out), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from hyper2kvm.core.file_ops import clone_file_prefix
+from hyper2kvm.vmware.transports.http_client import HTTPDownloadClient, HTTPDownloadOptions
+
+
+class _Response:
+    def __init__(self, status, body, headers=None, fail_after=None):
+        self.status_code = status
+        self.headers = headers or {}
+        self._body = body
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        sent = 0
+        for i in range(0, len(self._body), chunk_size):
+            if self._fail_after is not None and sent >= self._fail_after:
+                raise ConnectionError("connection reset")
+            chunk = self._body[i:i + chunk_size]
+            sent += len(chunk)
+            yield chunk
+
+
+class _Session:
+    """HEAD + (ranged) GET over an in-memory blob; optionally drops the first GET mid-body."""
+
+    def __init__(self, blob, etag='"v1"', fail_after=None):
+        self.blob = blob
+        self.etag = etag
+        self.fail_after = fail_after
+        self.gets = []
+
+    def head(self, url, headers=None, timeout=None):
+        return _Response(200, b"", {"content-length": str(len(self.blob)), "etag": self.etag})
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.gets.append(dict(headers))
+        fail_after, self.fail_after = self.fail_after, None
+        rng = headers.get("Range")
+        if rng:
+            start = int(rng.split("=", 1)[1].rstrip("-"))
+            return _Response(206, self.blob[start:], fail_after=fail_after)
+        return _Response(200, self.blob, fail_after=fail_after)
+
+
+def _client(session):
+    c = HTTPDownloadClient(Mock(), "esx.example")
+    c.set_session_cookie("vmware_soap_session=abc")
+    c._session_pool = session
+    return c
+
+
+def _download(client, local):
+    client.download_file(
+        datastore="ds1",
+        ds_path="vm/vm-flat.vmdk",
+        local_path=local,
+        dc_name="dc",
+        options=HTTPDownloadOptions(show_progress=False, show_panels=False, retries=1, retry_backoff_s=0.0, chunk_size=1024),
+    )
+
+
+class TestAtomicResume(unittest.TestCase):
+    BLOB = bytes(range(256)) * 64  # 16 KiB
+
+    def test_retry_appends_to_part_in_place(self):
+        session = _Session(self.BLOB, fail_after=4096)
+
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "vm-flat.vmdk"
+            _download(_client(session), local)
+
+            self.assertEqual(local.read_bytes(), self.BLOB)
+            self.assertEqual(sorted(p.name for p in Path(td).iterdir()), ["vm-flat.vmdk"])
+        self.assertEqual(session.gets[1]["Range"], "bytes=4096-")
+        self.assertEqual(session.gets[1]["If-Range"], '"v1"')
+
+    def test_resumes_part_left_by_previous_run(self):
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "vm-flat.vmdk"
+            part = Path(td) / "vm-flat.vmdk.part"
+            part.write_bytes(self.BLOB[:5000])
+            (Path(td) / "vm-flat.vmdk.part.meta").write_text(
+                json.dumps({"size": len(self.BLOB), "etag": '"v1"', "last_modified": None})
+            )
+            session = _Session(self.BLOB)
+
+            _download(_client(session), local)
+
+            self.assertEqual(local.read_bytes(), self.BLOB)
+        self.assertEqual(session.gets[0]["Range"], "bytes=5000-")
+
+    def test_part_for_changed_remote_file_is_discarded(self):
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "vm-flat.vmdk"
+            (Path(td) / "vm-flat.vmdk.part").write_bytes(b"x" * 5000)
+            (Path(td) / "vm-flat.vmdk.part.meta").write_text(
+                json.dumps({"size": len(self.BLOB), "etag": '"v0"', "last_modified": None})
+            )
+            session = _Session(self.BLOB)
+
+            _download(_client(session), local)
+
+            self.assertEqual(local.read_bytes(), self.BLOB)
+        self.assertNotIn("Range", session.gets[0])
+
+    def test_partial_local_file_seeds_part(self):
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "vm-flat.vmdk"
+            local.write_bytes(self.BLOB[:3000])
+            session = _Session(self.BLOB)
+
+            _download(_client(session), local)
+
+            self.assertEqual(local.read_bytes(), self.BLOB)
+        self.assertEqual(session.gets[0]["Range"], "bytes=3000-")
+
+
+class TestCloneFilePrefix(unittest.TestCase):
+    def test_copies_prefix(self):
+        with tempfile.TemporaryDirectory() as td:
+            src, dst = Path(td) / "src", Path(td) / "dst"
+            src.write_bytes(b"abcdef" * 1000)
+            dst.write_bytes(b"stale" * 5000)
+
+            method = clone_file_prefix(src, dst, 100)
+
+            self.assertEqual(dst.read_bytes(), (b"abcdef" * 1000)[:100])
+        self.assertIn(method, ("reflink", "copy_file_range", "copy"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from hyper2kvm.vmware.transports.http_segmented import (
+    RangeNotSupported,
+    SegmentMap,
+    download_segmented,
+    plan_segments,
+)
+
+
+class _Response:
+    def __init__(self, status, body):
+        self.status_code = status
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self._body), chunk_size):
+            yield self._body[i:i + chunk_size]
+
+
+class _RangeSession:
+    """Serves Range GETs out of an in-memory blob and records the ranges asked for."""
+
+    def __init__(self, blob, honor_range=True, fail_at=None):
+        self.blob = blob
+        self.honor_range = honor_range
+        self.fail_at = fail_at
+        self.ranges = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        start, end = (int(x) for x in headers["Range"].split("=", 1)[1].split("-"))
+        with self._lock:
+            self.ranges.append((start, end))
+        if not self.honor_range:
+            return _Response(200, self.blob)
+        if start == self.fail_at:
+            return _Response(503, b"")
+        return _Response(206, self.blob[start:end + 1])
+
+
+def _blob(size):
+    return bytes((i * 7) % 251 for i in range(size))
+
+
+class TestPlanSegments(unittest.TestCase):
+    def test_last_segment_is_shorter(self):
+        self.assertEqual(plan_segments(10, 4), [(0, 4), (4, 4), (8, 2)])
+
+    def test_empty_file(self):
+        self.assertEqual(plan_segments(0, 4), [])
+
+
+class TestSegmentMap(unittest.TestCase):
+    def test_resume_keeps_done_for_same_identity(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "disk.part.segments"
+            m = SegmentMap.load_or_create(path, {"size": 10, "etag": "a"}, resume=False)
+            m.mark(2)
+
+            again = SegmentMap.load_or_create(path, {"size": 10, "etag": "a"}, resume=True)
+
+            self.assertEqual(again.done, {2})
+
+    def test_changed_identity_discards_progress(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "disk.part.segments"
+            SegmentMap.load_or_create(path, {"size": 10, "etag": "a"}, resume=False).mark(1)
+
+            again = SegmentMap.load_or_create(path, {"size": 10, "etag": "b"}, resume=True)
+
+            self.assertEqual(again.done, set())
+            self.assertEqual(json.loads(path.read_text())["identity"]["etag"], "b")
+
+
+class TestDownloadSegmented(unittest.TestCase):
+    SEG = 64 * 1024
+
+    def _client(self, session):
+        c = Mock()
+        c.session = session
+        c.timeout = 5.0
+        return c
+
+    def _download(self, client, local, size, segments=3, **kw):
+        return download_segmented(
+            client,
+            url="https://esx/folder/vm/disk-flat.vmdk",
+            headers={"Cookie": "x"},
+            local_path=local,
+            identity={"size": size, "etag": "e1"},
+            segments=segments,
+            segment_size=self.SEG,
+            chunk_size=16 * 1024,
+            reporter=Mock(),
+            **kw,
+        )
+
+    def test_reassembles_file_from_ranges(self):
+        blob = _blob(5 * self.SEG + 123)
+        session = _RangeSession(blob)
+
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "disk-flat.vmdk"
+            fetched = self._download(self._client(session), local, len(blob))
+
+            self.assertEqual(local.read_bytes(), blob)
+            self.assertFalse((Path(td) / "disk-flat.vmdk.part").exists())
+            self.assertFalse((Path(td) / "disk-flat.vmdk.part.segments").exists())
+        self.assertEqual(fetched, len(blob))
+        self.assertEqual(len(session.ranges), 6)
+
+    def test_resume_fetches_only_missing_segments(self):
+        blob = _blob(4 * self.SEG)
+        failing = _RangeSession(blob, fail_at=2 * self.SEG)
+
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "disk-flat.vmdk"
+            with self.assertRaises(Exception):
+                self._download(self._client(failing), local, len(blob), segments=1)
+            self.assertTrue((Path(td) / "disk-flat.vmdk.part.segments").exists())
+
+            session = _RangeSession(blob)
+            self._download(self._client(session), local, len(blob))
+
+            self.assertEqual(local.read_bytes(), blob)
+        # segments 0 and 1 completed before the failure and are not fetched again
+        self.assertEqual(session.ranges[0], (2 * self.SEG, 3 * self.SEG - 1))
+        self.assertTrue(all(start >= 2 * self.SEG for start, _ in session.ranges))
+
+    def test_server_without_range_support(self):
+        blob = _blob(2 * self.SEG)
+
+        with tempfile.TemporaryDirectory() as td:
+            with self.assertRaises(RangeNotSupported):
+                self._download(self._client(_RangeSession(blob, honor_range=False)), Path(td) / "d", len(blob))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import ctypes
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock
+
+from hyper2kvm.vmware.transports.vddk_client import (
+    VDDKConnectionSpec,
+    VDDKError,
+    VDDKESXClient,
+    _WritePipeline,
+    merge_extents,
+)
+
+_SECTOR = 512
+
+
+def _sector_byte(sector: int) -> int:
+    return (sector % 251) + 1
+
+
+def _expected_image(cap_sectors: int, extents):
+    data = bytearray(cap_sectors * _SECTOR)
+    for start, length in extents:
+        for s in range(start, start + length):
+            data[s * _SECTOR:(s + 1) * _SECTOR] = bytes([_sector_byte(s)]) * _SECTOR
+    return bytes(data)
+
+
+class _FakeLib:
+    """Fills read buffers with a per-sector pattern and records read calls."""
+
+    def __init__(self, zero_sectors=()):
+        self.reads = []
+        self.zero_sectors = set(zero_sectors)
+
+    def VixDiskLib_Read(self, h, start, count, buf_p):
+        start, count = int(start.value), int(count.value)
+        self.reads.append((start, count))
+        out = bytearray()
+        for s in range(start, start + count):
+            out += bytes([0 if s in self.zero_sectors else _sector_byte(s)]) * _SECTOR
+        ctypes.memmove(buf_p, bytes(out), len(out))
+        return 0
+
+
+class TestMergeExtents(unittest.TestCase):
+    """Test allocation extent normalization."""
+
+    def test_merges_adjacent_and_overlapping(self):
+        self.assertEqual(merge_extents([(10, 5), (0, 4), (4, 2), (12, 10)], 100), [(0, 6), (10, 12)])
+
+    def test_clamps_to_capacity(self):
+        self.assertEqual(merge_extents([(90, 50), (200, 10)], 100), [(90, 10)])
+
+    def test_drops_empty_extents(self):
+        self.assertEqual(merge_extents([(5, 0), (-4, 2)], 100), [])
+
+
+class TestAllocatedOnlyDownload(unittest.TestCase):
+    """Test allocation-aware VDDK download loop."""
+
+    CAP = 64
+
+    def _client(self, extents):
+        c = VDDKESXClient(Mock(), VDDKConnectionSpec(host="esx", user="u", password="p"))
+        c._lib = _FakeLib()
+        c._conn = ctypes.c_void_p(1)
+        c._open_ro = Mock(return_value=ctypes.c_void_p(1))
+        c._close = Mock()
+        c._capacity_sectors = Mock(return_value=self.CAP)
+        c._query_allocated_extents = Mock(return_value=extents)
+        return c
+
+    def test_reads_only_allocated_extents(self):
+        extents = [(8, 4), (40, 6)]
+        c = self._client(extents)
+        progress = Mock()
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk(
+                "[ds] vm/vm.vmdk",
+                Path(td) / "disk.raw",
+                sectors_per_read=4,
+                progress=progress,
+                progress_interval_s=0.0,
+                allocated_only=True,
+                compute_sha256=True,
+            )
+            data = out.read_bytes()
+
+        self.assertEqual(data, _expected_image(self.CAP, extents))
+        self.assertEqual(c._lib.reads, [(8, 4), (40, 4), (44, 2)])
+        done, total, pct = progress.call_args[0]
+        self.assertEqual((done, total), (10 * _SECTOR, 10 * _SECTOR))
+        self.assertEqual(pct, 100.0)
+
+    def test_falls_back_to_full_read_without_allocation_map(self):
+        c = self._client(None)
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk("[ds] vm/vm.vmdk", Path(td) / "disk.raw", sectors_per_read=16, allocated_only=True)
+            data = out.read_bytes()
+
+        self.assertEqual(data, _expected_image(self.CAP, [(0, self.CAP)]))
+        self.assertEqual(sum(n for _, n in c._lib.reads), self.CAP)
+
+    def test_resume_skips_extents_below_part_size(self):
+        extents = [(8, 4), (40, 6)]
+        c = self._client(extents)
+
+        with tempfile.TemporaryDirectory() as td:
+            local = Path(td) / "disk.raw"
+            part = local.with_suffix(local.suffix + ".part")
+            part.write_bytes(_expected_image(self.CAP, extents)[: 42 * _SECTOR])
+
+            out = c.download_vmdk("[ds] vm/vm.vmdk", local, sectors_per_read=4, allocated_only=True)
+            data = out.read_bytes()
+
+        self.assertEqual(data, _expected_image(self.CAP, extents))
+        self.assertEqual(c._lib.reads, [(42, 4)])
+
+    @unittest.skipUnless(hasattr(os, "SEEK_HOLE"), "SEEK_HOLE not supported")
+    def test_output_keeps_holes(self):
+        c = self._client([(0, 1)])
+        c._capacity_sectors = Mock(return_value=64 * 1024)  # 32 MiB
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk("[ds] vm/vm.vmdk", Path(td) / "disk.raw", allocated_only=True)
+            st = out.stat()
+
+        self.assertEqual(st.st_size, 32 * 1024 * 1024)
+        self.assertLess(st.st_blocks * 512, st.st_size)
+
+    @unittest.skipUnless(hasattr(os, "SEEK_HOLE"), "SEEK_HOLE not supported")
+    def test_zero_blocks_left_as_holes(self):
+        cap = 64 * 1024  # 32 MiB
+        c = self._client(None)
+        c._capacity_sectors = Mock(return_value=cap)
+        # only the first 64 KiB sub-block carries data
+        c._lib = _FakeLib(zero_sectors=range(128, cap))
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk("[ds] vm/vm.vmdk", Path(td) / "disk.raw")
+            st = out.stat()
+            with open(out, "rb") as f:
+                head = f.read(128 * _SECTOR)
+                rest_is_zero = f.read(1024 * 1024) == bytes(1024 * 1024)
+
+        self.assertEqual(st.st_size, cap * _SECTOR)
+        self.assertEqual(head, _expected_image(128, [(0, 128)]))
+        self.assertTrue(rest_is_zero)
+        self.assertLess(st.st_blocks * 512, st.st_size // 2)
+
+    def test_dense_write_when_zero_skipping_disabled(self):
+        c = self._client(None)
+        c._lib = _FakeLib(zero_sectors=range(0, self.CAP))
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk("[ds] vm/vm.vmdk", Path(td) / "disk.raw", skip_zero_blocks=False)
+            data = out.read_bytes()
+
+        self.assertEqual(data, bytes(self.CAP * _SECTOR))
+
+
+    def test_serial_and_pipelined_outputs_match(self):
+        extents = [(0, 20), (30, 34)]
+        outputs = []
+        for io_buffers in (1, 3):
+            c = self._client(extents)
+            c._lib = _FakeLib(zero_sectors=range(10, 14))
+            with tempfile.TemporaryDirectory() as td:
+                out = c.download_vmdk(
+                    "[ds] vm/vm.vmdk",
+                    Path(td) / "disk.raw",
+                    sectors_per_read=4,
+                    allocated_only=True,
+                    io_buffers=io_buffers,
+                )
+                outputs.append(out.read_bytes())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(len(outputs[0]), self.CAP * _SECTOR)
+
+    def test_auto_tune_reports_read_size(self):
+        extents = [(0, 20), (30, 34)]
+        c = self._client(extents)
+
+        with tempfile.TemporaryDirectory() as td:
+            out = c.download_vmdk(
+                "[ds] vm/vm.vmdk",
+                Path(td) / "disk.raw",
+                sectors_per_read=4,
+                allocated_only=True,
+                auto_tune=True,
+                read_size_min=_SECTOR,
+                read_size_max=16 * _SECTOR,
+            )
+            data = out.read_bytes()
+
+        self.assertEqual(data, _expected_image(self.CAP, extents))
+        self.assertEqual(c.last_read_tuning["chosen_bytes"], 4 * _SECTOR)
+
+
+class TestWritePipeline(unittest.TestCase):
+    """Test the overlapped read/write buffer ring."""
+
+    def test_writes_in_order_and_hashes_gaps(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "out"
+            fd = os.open(str(path), os.O_WRONLY | os.O_CREAT, 0o644)
+            sha = hashlib.sha256()
+            try:
+                pipe = _WritePipeline(fd, 1024, 2, skip_zero_blocks=True, sha256=sha)
+                for i, off in enumerate((0, 2048, 3072)):
+                    slot = pipe.acquire()
+                    ctypes.memset(pipe.ptr(slot), i + 1, 1024)
+                    pipe.submit(slot, off, 1024, zero_gap=1024 if off == 2048 else 0)
+                pipe.close()
+            finally:
+                os.close(fd)
+            data = path.read_bytes()
+
+        expected = bytes([1]) * 1024 + bytes(1024) + bytes([2]) * 1024 + bytes([3]) * 1024
+        self.assertEqual(data, expected)
+        self.assertEqual(sha.hexdigest(), hashlib.sha256(expected).hexdigest())
+
+    def test_writer_error_surfaces_on_close(self):
+        pipe = _WritePipeline(-1, 512, 2, skip_zero_blocks=False)
+        slot = pipe.acquire()
+        pipe.submit(slot, 0, 512)
+        with self.assertRaises(VDDKError):
+            pipe.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+# SPDX-License-Identifier: LGPL-3.0-or-later
+import ctypes
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from hyper2kvm.vmware.transports import vddk_parallel
+from hyper2kvm.vmware.transports.vddk_client import VDDKConnectionSpec
+from hyper2kvm.vmware.transports.vddk_parallel import _MAP_HEADER_SIZE, _ShardMap, plan_blocks, split_shards
+
+_SECTOR = 512
+
+
+class TestPlanBlocks(unittest.TestCase):
+    """Test block planning for sharded downloads."""
+
+    def test_cuts_extents_at_block_boundaries(self):
+        blocks = plan_blocks([(2, 10), (40, 4)], 8)
+        self.assertEqual(blocks, [(0, [(2, 6)]), (1, [(8, 4)]), (5, [(40, 4)])])
+
+    def test_full_disk(self):
+        blocks = plan_blocks([(0, 20)], 8)
+        self.assertEqual([idx for idx, _ in blocks], [0, 1, 2])
+        self.assertEqual(blocks[-1], (2, [(16, 4)]))
+
+
+class TestSplitShards(unittest.TestCase):
+    """Test shard balancing."""
+
+    def test_balanced_contiguous_shards(self):
+        blocks = plan_blocks([(0, 80)], 8)
+        shards = split_shards(blocks, 4)
+        self.assertEqual(len(shards), 4)
+        self.assertEqual([b for shard in shards for b in shard], blocks)
+        self.assertTrue(all(len(s) in (2, 3) for s in shards))
+
+    def test_never_more_shards_than_blocks(self):
+        self.assertEqual(len(split_shards(plan_blocks([(0, 16)], 8), 8)), 2)
+        self.assertEqual(split_shards([], 4), [])
+
+
+class TestShardMap(unittest.TestCase):
+    """Test the completion bitmap sidecar."""
+
+    HEADER = {"version": 1, "capacity_sectors": 64, "block_sectors": 8, "nblocks": 8}
+
+    def test_resume_keeps_marks(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "d.part.map"
+            smap, resumed = _ShardMap.load_or_create(path, dict(self.HEADER), resume=True)
+            self.assertFalse(resumed)
+            with open(path, "r+b") as f:
+                f.seek(_MAP_HEADER_SIZE + 3)
+                f.write(b"\x01")
+
+            smap, resumed = _ShardMap.load_or_create(path, dict(self.HEADER), resume=True)
+            self.assertTrue(resumed)
+            self.assertEqual(smap.done(), b"\0\0\0\x01\0\0\0\0")
+
+    def test_header_mismatch_restarts(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "d.part.map"
+            _ShardMap.load_or_create(path, dict(self.HEADER), resume=True)
+            other = dict(self.HEADER, capacity_sectors=72, nblocks=9)
+            smap, resumed = _ShardMap.load_or_create(path, other, resume=True)
+            self.assertFalse(resumed)
+            self.assertEqual(smap.done(), bytes(9))
+
+
+class _FakeWorkerClient:
+    def __init__(self, logger, spec):
+        self.reads = []
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def _open_ro(self, remote):
+        return ctypes.c_void_p(1)
+
+    def _close(self, h):
+        pass
+
+    def _read_with_retry(self, h, start_sector, num_sectors, buf_p, **kw):
+        self.reads.append((start_sector, num_sectors))
+        ctypes.memset(buf_p, (start_sector % 200) + 1, num_sectors * _SECTOR)
+
+
+class TestShardWorker(unittest.TestCase):
+    """Test the per-process shard worker."""
+
+    def test_writes_blocks_and_marks_map(self):
+        header = {"version": 1, "capacity_sectors": 32, "block_sectors": 8, "nblocks": 4}
+        opts = {
+            "sectors_per_read": 4,
+            "max_read_retries": 0,
+            "base_backoff_s": 0.0,
+            "max_backoff_s": 0.0,
+            "jitter_s": 0.0,
+            "skip_zero_blocks": True,
+            "durable": False,
+        }
+        with tempfile.TemporaryDirectory() as td:
+            part = Path(td) / "d.part"
+            with open(part, "wb") as f:
+                f.truncate(32 * _SECTOR)
+            smap, _ = _ShardMap.load_or_create(Path(td) / "d.part.map", header, resume=False)
+
+            blocks = plan_blocks([(8, 12)], 8)
+            with patch.object(vddk_parallel, "VDDKESXClient", _FakeWorkerClient):
+                res = vddk_parallel._shard_worker(
+                    VDDKConnectionSpec(host="esx", user="u", password="p"),
+                    "[ds] vm/vm.vmdk",
+                    str(part),
+                    str(smap.path),
+                    blocks,
+                    opts,
+                )
+            data = part.read_bytes()
+            done = smap.done()
+
+        self.assertEqual(res["bytes"], 12 * _SECTOR)
+        self.assertEqual(done, b"\0\x01\x01\0")
+        self.assertEqual(data[: 8 * _SECTOR], bytes(8 * _SECTOR))
+        self.assertEqual(data[8 * _SECTOR : 12 * _SECTOR], bytes([9]) * (4 * _SECTOR))
+        self.assertEqual(data[16 * _SECTOR : 20 * _SECTOR], bytes([17]) * (4 * _SECTOR))
+        self.assertEqual(data[20 * _SECTOR :], bytes(12 * _SECTOR))
+
+
+if __name__ == "__main__":
+    unittest.main()